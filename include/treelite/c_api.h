@@ -270,6 +270,27 @@ TREELITE_DLL int TreeliteLoadProtobufModel(const char* filename,
  */
 TREELITE_DLL int TreeliteExportProtobufModel(const char* filename,
                                              ModelHandle model);
+/*!
+ * \brief load a model in the flat binary format, as written by
+ *        TreeliteExportBinaryModel(). The file is memory-mapped and its trees
+ *        are rebuilt node by node, each node being checked as it is
+ *        converted, so that loading takes time proportional to the size of
+ *        the model. (The runtime, by contrast, evaluates the file in place.)
+ * \param filename name of model file; must be a local file
+ * \param out loaded model
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteLoadBinaryModel(const char* filename,
+                                         ModelHandle* out);
+/*!
+ * \brief export a model in the flat binary format, which the runtime can
+ *        evaluate directly, without compiling the model into a shared library
+ * \param filename name of model file
+ * \param model model to export
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteExportBinaryModel(const char* filename,
+                                           ModelHandle model);
 /*!
  * \brief Query the number of trees in the model
  * \param handle model to query
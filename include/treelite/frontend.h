@@ -58,6 +58,24 @@ Model LoadProtobufModel(const char* filename);
  * \param model model to export
  */
 void ExportProtobufModel(const char* filename, const Model& model);
+/*!
+ * \brief load a model in the flat binary format of binary_model.h. The file
+ *        is memory-mapped and its trees are rebuilt node by node, each node
+ *        being checked as it is converted, so that loading takes time
+ *        proportional to the size of the model. Node statistics (data count,
+ *        hessian sum, gain) are not part of the format and are therefore
+ *        absent from the loaded model.
+ * \param filename name of model file; must be a local file
+ * \return loaded model
+ */
+Model LoadBinaryModel(const char* filename);
+/*!
+ * \brief export a model in the flat binary format of binary_model.h, which
+ *        the runtime can evaluate directly, without a C compiler
+ * \param filename name of model file
+ * \param model model to export
+ */
+void ExportBinaryModel(const char* filename, const Model& model);
 
 //--------------------------------------------------------------------------
 // model builder interface: build trees incrementally
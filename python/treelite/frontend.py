@@ -278,6 +278,31 @@ class Model():
     """
     _check_call(_LIB.TreeliteExportProtobufModel(c_str(filename), self.handle))
 
+  def export_binary(self, filename):
+    """
+    Export a tree ensemble model in a flat binary format. The runtime can load
+    the file directly with :py:class:`treelite_runtime.Predictor` and evaluate
+    the trees without a C compiler, at some cost in prediction speed compared
+    to a compiled shared library. The file is laid out so that the runtime can
+    memory-map it and evaluate it in place, so that even large models load
+    almost instantly there. ``Model.load(filename, 'binary')`` reads the file
+    back into a :py:class:`Model`, which rebuilds the trees node by node and
+    hence takes time proportional to the size of the model.
+
+    Parameters
+    ----------
+    filename : :py:class:`str <python:str>`
+        path to save the binary model
+
+    Example
+    -------
+    .. code-block:: python
+
+       model.export_binary('./my.tlbin')
+       predictor = treelite_runtime.Predictor('./my.tlbin')
+    """
+    _check_call(_LIB.TreeliteExportBinaryModel(c_str(filename), self.handle))
+
   @staticmethod
   def _set_compiler_param(compiler_handle, params, value=None):
     """
@@ -352,7 +377,8 @@ class Model():
     filename : :py:class:`str <python:str>`
         path to model file
     model_format : :py:class:`str <python:str>`
-        model file format. Must be one or 'xgboost', 'lightgbm', 'protobuf'
+        model file format. Must be one or 'xgboost', 'lightgbm', 'protobuf',
+        'binary' (see :py:meth:`export_binary`)
 
     Returns
     -------
@@ -379,9 +405,12 @@ class Model():
     elif model_format == 'protobuf':
       _check_call(_LIB.TreeliteLoadProtobufModel(c_str(filename),
                                                  ctypes.byref(handle)))
+    elif model_format == 'binary':
+      _check_call(_LIB.TreeliteLoadBinaryModel(c_str(filename),
+                                               ctypes.byref(handle)))
     else:
       raise ValueError('Unknown model_format: must be one of ' \
-                        + '{lightgbm, xgboost, protobuf}')
+                        + '{lightgbm, xgboost, protobuf, binary}')
     return Model(handle)
 
 class ModelBuilder():
@@ -16,7 +16,8 @@ public class DenseBatch {
    * Create a dense batch representing a 2D dense matrix
    * @param data array of entries, should be of length ``[num_row]*[num_col]``
    * @param missing_value floating-point value representing a missing value;
-   *                      usually set of ``Float.NaN``.
+   *                      usually set of ``Float.NaN``. NaN is always
+   *                      treated as missing as well.
    * @param num_row number of rows (data instances) in the matrix
    * @param num_row number of columns (features) in the matrix
    * @return Created dense batch
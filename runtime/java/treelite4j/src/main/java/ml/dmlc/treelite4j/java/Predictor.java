@@ -165,6 +165,32 @@ public class Predictor implements Serializable {
     return this.global_bias;
   }
 
+  /**
+   * Get the performance counters of the predictor, accumulated since the
+   * library was loaded or since the counters were last reset. The counters
+   * are always on, and may be queried while predictions are being made.
+   *
+   * @return Snapshot of the performance counters
+   * @throws TreeliteError
+   */
+  public PredictorStats GetStats() throws TreeliteError {
+    long[] counters = new long[7];
+    long[][] latency_histogram = new long[1][];
+    long[][] thread_busy_ns = new long[1][];
+    TreeliteJNI.checkCall(TreeliteJNI.TreelitePredictorQueryStats(
+            this.handle, counters, latency_histogram, thread_busy_ns));
+    return new PredictorStats(counters, latency_histogram[0], thread_busy_ns[0]);
+  }
+
+  /**
+   * Reset the performance counters of the predictor to zero.
+   *
+   * @throws TreeliteError
+   */
+  public void ResetStats() throws TreeliteError {
+    TreeliteJNI.checkCall(TreeliteJNI.TreelitePredictorResetStats(this.handle));
+  }
+
   /**
    * Perform single-instance prediction. Prediction is run by the calling thread.
    *
@@ -0,0 +1,99 @@
+package ml.dmlc.treelite4j.java;
+
+/**
+ * Performance counters of a :java:ref:`Predictor`, as returned by
+ * :java:meth:`Predictor.GetStats()`. Times are in nanoseconds; times spent by
+ * threads are summed over threads.
+ */
+public class PredictorStats {
+  private final long num_batch;
+  private final long num_row;
+  private final long num_inst;
+  private final long batch_ns;
+  private final long assemble_ns;
+  private final long eval_ns;
+  private final long wait_ns;
+  private final long[] latency_histogram;
+  private final long[] thread_busy_ns;
+
+  PredictorStats(long[] counters, long[] latency_histogram,
+                 long[] thread_busy_ns) {
+    this.num_batch = counters[0];
+    this.num_row = counters[1];
+    this.num_inst = counters[2];
+    this.batch_ns = counters[3];
+    this.assemble_ns = counters[4];
+    this.eval_ns = counters[5];
+    this.wait_ns = counters[6];
+    this.latency_histogram = latency_histogram;
+    this.thread_busy_ns = thread_busy_ns;
+  }
+
+  /**
+   * @return Number of batches scored
+   */
+  public long GetNumBatch() {
+    return this.num_batch;
+  }
+
+  /**
+   * @return Number of rows scored as part of batches
+   */
+  public long GetNumRow() {
+    return this.num_row;
+  }
+
+  /**
+   * @return Number of single rows scored
+   */
+  public long GetNumInst() {
+    return this.num_inst;
+  }
+
+  /**
+   * @return Total time from the start to the end of each batch
+   */
+  public long GetBatchTime() {
+    return this.batch_ns;
+  }
+
+  /**
+   * @return Time spent converting rows into the layout taken by the compiled
+   *         model
+   */
+  public long GetAssembleTime() {
+    return this.assemble_ns;
+  }
+
+  /**
+   * @return Time spent evaluating trees
+   */
+  public long GetEvalTime() {
+    return this.eval_ns;
+  }
+
+  /**
+   * @return Time the calling thread spent waiting for worker threads
+   */
+  public long GetWaitTime() {
+    return this.wait_ns;
+  }
+
+  /**
+   * Get the per-batch latency histogram. Element k counts the batches that
+   * took between 2^k and 2^(k+1) microseconds; the first element also counts
+   * faster batches, and the last element also counts slower ones.
+   *
+   * @return Count of batches in each bucket
+   */
+  public long[] GetLatencyHistogram() {
+    return this.latency_histogram;
+  }
+
+  /**
+   * @return Time each thread spent scoring rows, calling thread first
+   */
+  public long[] GetThreadBusyTime() {
+    return this.thread_busy_ns;
+  }
+}
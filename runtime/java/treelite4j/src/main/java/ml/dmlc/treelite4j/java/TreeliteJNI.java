@@ -81,4 +81,10 @@ class TreeliteJNI {
 
   public final static native int TreelitePredictorFree(long handle);
 
+  public final static native int TreelitePredictorQueryStats(
+    long handle, long[] out_counters, long[][] out_latency_histogram,
+    long[][] out_thread_busy_ns);
+
+  public final static native int TreelitePredictorResetStats(long handle);
+
 }
@@ -379,3 +379,69 @@ Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorFree(
   JNIEnv* jenv, jclass jcls, jlong jhandle) {
   return (jint)TreelitePredictorFree((PredictorHandle)jhandle);
 }
+
+namespace {
+
+// query a list of counters with a function that takes (handle, buffer, length)
+// and store it as a new long[] in out[0]
+template <typename QueryFunc>
+jint queryCounterList(JNIEnv* jenv, PredictorHandle handle, QueryFunc func,
+                      jobjectArray jout) {
+  size_t len;
+  jint ret = (jint)func(handle, nullptr, &len);
+  if (ret != 0) {
+    return ret;
+  }
+  std::vector<uint64_t> counts(len);
+  ret = (jint)func(handle, counts.data(), &len);
+  std::vector<jlong> values(counts.begin(), counts.end());
+  jlongArray out = jenv->NewLongArray(static_cast<jsize>(len));
+  jenv->SetLongArrayRegion(out, 0, static_cast<jsize>(len), values.data());
+  jenv->SetObjectArrayElement(jout, 0, out);
+  return ret;
+}
+
+}  // namespace anonymous
+
+/*
+ * Class:     ml_dmlc_treelite4j_java_TreeliteJNI
+ * Method:    TreelitePredictorQueryStats
+ * Signature: (J[J[[J[[J)I
+ */
+JNIEXPORT jint JNICALL
+Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorQueryStats(
+  JNIEnv* jenv, jclass jcls, jlong jhandle, jlongArray jout_counters,
+  jobjectArray jout_histogram, jobjectArray jout_busy) {
+  PredictorHandle handle = (PredictorHandle)jhandle;
+  uint64_t counters[7];
+  jint ret = (jint)TreelitePredictorQueryStats(
+    handle, &counters[0], &counters[1], &counters[2], &counters[3],
+    &counters[4], &counters[5], &counters[6]);
+  if (ret != 0) {
+    return ret;
+  }
+  // store data
+  jlong* out = jenv->GetLongArrayElements(jout_counters, 0);
+  for (int i = 0; i < 7; ++i) {
+    out[i] = (jlong)counters[i];
+  }
+  jenv->ReleaseLongArrayElements(jout_counters, out, 0);
+  ret = queryCounterList(jenv, handle, TreelitePredictorQueryLatencyHistogram,
+                         jout_histogram);
+  if (ret != 0) {
+    return ret;
+  }
+  return queryCounterList(jenv, handle, TreelitePredictorQueryThreadBusyTime,
+                          jout_busy);
+}
+
+/*
+ * Class:     ml_dmlc_treelite4j_java_TreeliteJNI
+ * Method:    TreelitePredictorResetStats
+ * Signature: (J)I
+ */
+JNIEXPORT jint JNICALL
+Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorResetStats(
+  JNIEnv* jenv, jclass jcls, jlong jhandle) {
+  return (jint)TreelitePredictorResetStats((PredictorHandle)jhandle);
+}
@@ -143,6 +143,22 @@ JNIEXPORT jint JNICALL Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredicto
 JNIEXPORT jint JNICALL Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorFree
   (JNIEnv *, jclass, jlong);
 
+/*
+ * Class:     ml_dmlc_treelite4j_java_TreeliteJNI
+ * Method:    TreelitePredictorQueryStats
+ * Signature: (J[J[[J[[J)I
+ */
+JNIEXPORT jint JNICALL Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorQueryStats
+  (JNIEnv *, jclass, jlong, jlongArray, jobjectArray, jobjectArray);
+
+/*
+ * Class:     ml_dmlc_treelite4j_java_TreeliteJNI
+ * Method:    TreelitePredictorResetStats
+ * Signature: (J)I
+ */
+JNIEXPORT jint JNICALL Java_ml_dmlc_treelite4j_java_TreeliteJNI_TreelitePredictorResetStats
+  (JNIEnv *, jclass, jlong);
+
 #ifdef __cplusplus
 }
 #endif
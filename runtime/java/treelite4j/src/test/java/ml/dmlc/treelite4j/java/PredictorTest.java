@@ -95,6 +95,34 @@ public class PredictorTest {
     }
   }
 
+  @Test
+  public void testStats() throws TreeliteError, IOException {
+    Predictor predictor = new Predictor(mushroomLibLocation, -1, true);
+    List<DataPoint> dmat
+        = BatchBuilder.LoadDatasetFromLibSVM(mushroomTestDataLocation);
+    SparseBatch sparse_batch = BatchBuilder.CreateSparseBatch(dmat.iterator());
+    predictor.predict(sparse_batch, true, false);
+    predictor.predict(sparse_batch, true, false);
+
+    PredictorStats stats = predictor.GetStats();
+    TestCase.assertEquals(2, stats.GetNumBatch());
+    TestCase.assertEquals(2 * dmat.size(), stats.GetNumRow());
+    long num_batch = 0;
+    for (long count : stats.GetLatencyHistogram()) {
+      num_batch += count;
+    }
+    TestCase.assertEquals(2, num_batch);
+    long busy_ns = 0;
+    for (long t : stats.GetThreadBusyTime()) {
+      busy_ns += t;
+    }
+    TestCase.assertEquals(stats.GetAssembleTime() + stats.GetEvalTime(),
+                          busy_ns);
+
+    predictor.ResetStats();
+    TestCase.assertEquals(0, predictor.GetStats().GetNumBatch());
+  }
+
   @Test
   public void testPredictInst() throws TreeliteError, IOException {
     Predictor predictor = new Predictor(mushroomLibLocation, -1, true);
@@ -0,0 +1,285 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file binary_model.h
+ * \brief flat binary format for tree ensembles, which the runtime evaluates
+ *        directly, without compiling the model into a shared library
+ *
+ * A file holds a Header, followed by four arrays, each starting right after
+ * the previous one (every element is 8 bytes wide, so that all arrays are
+ * 8-byte aligned):
+ *
+ * - tree_offset: num_tree + 1 uint64 values; the nodes of tree i are
+ *   nodes[tree_offset[i]] to nodes[tree_offset[i + 1] - 1], with the root
+ *   first. Child indices are relative to the first node of the tree.
+ * - nodes: num_node Node records
+ * - category_bitmap: num_category_word uint64 words, holding the categories
+ *   that go to the left child in categorical splits. Category c is bit
+ *   (c % 64) of word (c / 64).
+ * - leaf_vector: num_leaf_vector_elem double values, holding the outputs of
+ *   leaves that produce one value per output group (e.g. multi-class random
+ *   forests).
+ *
+ * All values are stored little-endian. Since every array is used as it is
+ * laid out in the file, a model can be memory-mapped and evaluated in place,
+ * without being parsed first.
+ */
+#ifndef TREELITE_BINARY_MODEL_H_
+#define TREELITE_BINARY_MODEL_H_
+
+#include <dmlc/logging.h>
+#include <cstdint>
+#include <cstring>
+
+namespace treelite {
+namespace binary_model {
+
+/*! \brief first bytes of every file */
+constexpr char kMagic[8] = {'T', 'L', 'B', 'I', 'N', 'M', 'D', 'L'};
+/*! \brief version of the format written by this version of treelite */
+constexpr uint32_t kFormatVersion = 2;
+/*! \brief value of Header::common_op if splits use different operators */
+constexpr uint32_t kNoCommonOp = 0xFFFFFFFF;
+
+/*! \brief kind of node */
+enum class NodeType : uint8_t {
+  kLeaf = 0, kNumericalSplit = 1, kCategoricalSplit = 2
+};
+
+/*!
+ * \brief comparison operator of a numerical split, same as
+ *        treelite::Operator. The split sends a row to the left child if
+ *        [feature value] OP [threshold] holds.
+ */
+enum class Operator : uint8_t {
+  kEQ = 0, kLT = 1, kLE = 2, kGT = 3, kGE = 4
+};
+
+/*! \brief bit flags of a node */
+enum NodeFlag : uint8_t {
+  /*! \brief missing values go to the left child */
+  kDefaultLeft = 1,
+  /*! \brief categorical split that treats missing values as category 0 */
+  kMissingCategoryToZero = 2,
+  /*! \brief leaf whose output is a vector in leaf_vector */
+  kLeafVector = 4
+};
+
+/*! \brief range of elements in one of the arrays of the file */
+struct ArrayRef {
+  uint32_t offset;
+  uint32_t length;
+};
+
+/*! \brief tree node */
+struct Node {
+  union {
+    /*! \brief threshold of a numerical split */
+    double threshold;
+    /*! \brief output of a leaf, unless it has the kLeafVector flag */
+    double leaf_value;
+    /*! \brief words of category_bitmap used by a categorical split */
+    ArrayRef category_bitmap;
+    /*! \brief elements of leaf_vector output by a leaf with kLeafVector */
+    ArrayRef leaf_vector;
+  };
+  /*! \brief feature tested by a split */
+  uint32_t split_index;
+  /*! \brief index of the left child; -1 for leaves */
+  int32_t cleft;
+  /*! \brief index of the right child; -1 for leaves */
+  int32_t cright;
+  /*! \brief kind of node: see NodeType */
+  uint8_t type;
+  /*! \brief comparison operator of a numerical split: see Operator */
+  uint8_t op;
+  /*! \brief bit flags: see NodeFlag */
+  uint8_t flags;
+  uint8_t reserved;
+};
+static_assert(sizeof(Node) == 24, "Node must be packed into 24 bytes");
+
+/*! \brief header at the start of a file */
+struct Header {
+  char magic[8];
+  uint32_t format_version;
+  uint32_t num_feature;
+  uint32_t num_output_group;
+  uint32_t num_tree;
+  /*!
+   * \brief 1 if the outputs of the trees are averaged (random forests), 0
+   *        if they are summed (gradient boosted trees)
+   */
+  uint32_t average_tree_output;
+  float global_bias;
+  float sigmoid_alpha;
+  /*!
+   * \brief operator used by every split, if all splits are numerical and
+   *        use the same operator; kNoCommonOp otherwise. Lets a reader pick
+   *        a specialized evaluation loop without scanning the nodes.
+   */
+  uint32_t common_op;
+  /*! \brief name of the prediction transform, padded with NUL characters */
+  char pred_transform[32];
+  uint64_t num_node;
+  uint64_t num_category_word;
+  uint64_t num_leaf_vector_elem;
+};
+static_assert(sizeof(Header) % 8 == 0, "Header must keep arrays aligned");
+
+/*! \brief model stored in a file, with its arrays located in memory */
+struct ModelView {
+  const Header* header;
+  const uint64_t* tree_offset;
+  const Node* nodes;
+  const uint64_t* category_bitmap;
+  const double* leaf_vector;
+};
+
+/*! \brief whether the format can be read in place on this machine */
+inline bool IsLittleEndian() {
+  const uint32_t one = 1;
+  uint8_t first_byte;
+  std::memcpy(&first_byte, &one, 1);
+  return first_byte == 1;
+}
+
+/*! \brief whether a buffer starts with the magic bytes of the format */
+inline bool HasMagic(const void* buf, size_t len) {
+  return len >= sizeof(kMagic) && std::memcmp(buf, kMagic, sizeof(kMagic)) == 0;
+}
+
+/*!
+ * \brief locate the arrays of a model stored in a buffer, checking that the
+ *        buffer holds a well-formed file
+ * \param buf contents of the file; must be 8-byte aligned
+ * \param len size of the file, in bytes
+ * \return view of the model, pointing into buf
+ */
+inline ModelView GetModelView(const void* buf, size_t len) {
+  CHECK(IsLittleEndian())
+    << "The binary model format can only be read on little-endian machines";
+  CHECK_EQ(reinterpret_cast<uintptr_t>(buf) % 8, 0)
+    << "Binary model must be loaded at an 8-byte aligned address";
+  CHECK(HasMagic(buf, len)) << "Not a treelite binary model";
+  CHECK_GE(len, sizeof(Header)) << "Binary model is truncated";
+  ModelView view;
+  view.header = static_cast<const Header*>(buf);
+  const Header& header = *view.header;
+  CHECK_EQ(header.format_version, kFormatVersion)
+    << "Binary model has format version " << header.format_version
+    << ", but only version " << kFormatVersion << " is supported";
+  CHECK_GT(header.num_feature, 0) << "num_feature cannot be zero";
+  CHECK_GT(header.num_output_group, 0) << "num_output_group cannot be zero";
+  CHECK_EQ(header.pred_transform[sizeof(header.pred_transform) - 1], '\0')
+    << "Binary model has a malformed pred_transform";
+  CHECK(header.common_op <= static_cast<uint32_t>(Operator::kGE)
+        || header.common_op == kNoCommonOp)
+    << "Binary model has an unknown operator";
+  const uint64_t num_word = header.num_tree + 1 + header.num_node * 3
+                            + header.num_category_word
+                            + header.num_leaf_vector_elem;
+  CHECK_EQ(len, sizeof(Header) + num_word * 8)
+    << "Binary model has a wrong size";
+  const uint64_t* words = reinterpret_cast<const uint64_t*>(view.header + 1);
+  view.tree_offset = words;
+  words += header.num_tree + 1;
+  view.nodes = reinterpret_cast<const Node*>(words);
+  words += header.num_node * 3;
+  view.category_bitmap = words;
+  words += header.num_category_word;
+  view.leaf_vector = reinterpret_cast<const double*>(words);
+  return view;
+}
+
+/*!
+ * \brief check that every tree of a model is non-empty and lies within the
+ *        node array. Takes time proportional to the number of trees.
+ * \param view model to check
+ */
+inline void CheckTreeOffsets(const ModelView& view) {
+  const Header& header = *view.header;
+  CHECK_EQ(view.tree_offset[0], 0) << "Binary model has malformed trees";
+  CHECK_EQ(view.tree_offset[header.num_tree], header.num_node)
+    << "Binary model has malformed trees";
+  for (uint32_t tree_id = 0; tree_id < header.num_tree; ++tree_id) {
+    CHECK_LT(view.tree_offset[tree_id], view.tree_offset[tree_id + 1])
+      << "Tree " << tree_id << " has no node";
+  }
+}
+
+/*!
+ * \brief check that a node is well-formed: that its children and array
+ *        ranges stay within bounds, and that its leaf vector, if any, has one
+ *        element per output group. Assumes CheckTreeOffsets() has passed.
+ * \param view model to check
+ * \param tree_id tree of the node
+ * \param nid index of the node within its tree
+ */
+inline void CheckNode(const ModelView& view, uint32_t tree_id, int64_t nid) {
+  const Header& header = *view.header;
+  const uint64_t begin = view.tree_offset[tree_id];
+  const int64_t num_node
+    = static_cast<int64_t>(view.tree_offset[tree_id + 1] - begin);
+  CHECK(nid >= 0 && nid < num_node)
+    << "Node of tree " << tree_id << " is out of bounds";
+  const Node& node = view.nodes[begin + nid];
+  switch (static_cast<NodeType>(node.type)) {
+   case NodeType::kLeaf:
+    CHECK_EQ(node.cleft, -1) << "Leaf of tree " << tree_id << " has a child";
+    if (node.flags & kLeafVector) {
+      CHECK_EQ(node.leaf_vector.length, header.num_output_group)
+        << "Leaf vector of tree " << tree_id << " must have one element "
+        << "per output group";
+      CHECK_LE(static_cast<uint64_t>(node.leaf_vector.offset)
+               + node.leaf_vector.length, header.num_leaf_vector_elem)
+        << "Leaf vector of tree " << tree_id << " is out of bounds";
+    }
+    break;
+   case NodeType::kCategoricalSplit:
+    CHECK_LE(static_cast<uint64_t>(node.category_bitmap.offset)
+             + node.category_bitmap.length, header.num_category_word)
+      << "Categories of a split in tree " << tree_id << " are out of bounds";
+    // fall through
+   case NodeType::kNumericalSplit:
+    CHECK_LT(node.split_index, header.num_feature)
+      << "Split in tree " << tree_id << " tests a feature beyond "
+      << "num_feature";
+    CHECK_LE(node.op, static_cast<uint8_t>(Operator::kGE))
+      << "Split in tree " << tree_id << " has an unknown operator";
+    CHECK(header.common_op == kNoCommonOp
+          || (node.type == static_cast<uint8_t>(NodeType::kNumericalSplit)
+              && node.op == header.common_op))
+      << "Split in tree " << tree_id << " does not use the operator "
+      << "given in the header";
+    // children come after their parent, so that traversal cannot loop
+    CHECK(node.cleft > nid && node.cleft < num_node
+          && node.cright > nid && node.cright < num_node)
+      << "Split in tree " << tree_id << " has a child out of bounds";
+    break;
+   default:
+    LOG(FATAL) << "Node of tree " << tree_id << " has an unknown type";
+  }
+}
+
+/*!
+ * \brief check that the trees of a model are well-formed, with
+ *        CheckTreeOffsets() and CheckNode() on every node. Takes time
+ *        proportional to the number of nodes, and reads the whole node array.
+ * \param view model to check
+ */
+inline void CheckModel(const ModelView& view) {
+  CheckTreeOffsets(view);
+  const Header& header = *view.header;
+  for (uint32_t tree_id = 0; tree_id < header.num_tree; ++tree_id) {
+    const int64_t num_node = static_cast<int64_t>(
+      view.tree_offset[tree_id + 1] - view.tree_offset[tree_id]);
+    for (int64_t nid = 0; nid < num_node; ++nid) {
+      CheckNode(view, tree_id, nid);
+    }
+  }
+}
+
+}  // namespace binary_model
+}  // namespace treelite
+
+#endif  // TREELITE_BINARY_MODEL_H_
@@ -26,6 +26,10 @@ typedef void* PredictorHandle;
 typedef void* CSRBatchHandle;
 /*! \brief handle to batch of dense data rows */
 typedef void* DenseBatchHandle;
+/*! \brief handle to single-row predictor */
+typedef void* SingleRowPredictorHandle;
+/*! \brief handle to predictor group */
+typedef void* PredictorGroupHandle;
 /*! \} */
 
 /*!
@@ -57,7 +61,8 @@ TREELITE_DLL int TreeliteDeleteSparseBatch(CSRBatchHandle handle);
 /*!
  * \brief assemble a dense batch
  * \param data feature values
- * \param missing_value value to represent the missing value
+ * \param missing_value value to represent the missing value. NaN is always
+ *                      treated as missing as well.
  * \param num_row number of data rows in the batch
  * \param num_col number of columns (features) in the batch
  * \param out handle to sparse batch
@@ -67,6 +72,71 @@ TREELITE_DLL int TreeliteAssembleDenseBatch(const float* data,
                                             float missing_value,
                                             size_t num_row, size_t num_col,
                                             DenseBatchHandle* out);
+/*!
+ * \brief assemble a dense batch with arbitrary layout. Feature value (i, j)
+ *        is read from data[i * row_stride + j * col_stride], so that both
+ *        row-major and column-major matrices (and strided views into them)
+ *        can be used without making a copy.
+ * \param data feature values
+ * \param dtype type of feature values; either "float32" or "float64"
+ * \param missing_value value to represent the missing value. NaN is always
+ *                      treated as missing as well.
+ * \param num_row number of data rows in the batch
+ * \param num_col number of columns (features) in the batch
+ * \param row_stride distance between consecutive rows, in number of elements
+ * \param col_stride distance between consecutive columns, in number of
+ *                   elements
+ * \param out handle to dense batch
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteAssembleDenseBatchEx(const void* data,
+                                              const char* dtype,
+                                              float missing_value,
+                                              size_t num_row, size_t num_col,
+                                              size_t row_stride,
+                                              size_t col_stride,
+                                              DenseBatchHandle* out);
+/*!
+ * \brief assemble a dense batch of pre-binned features. For each feature with
+ *        cut points (see TreelitePredictorQueryCutPoints()), entry (i, j)
+ *        gives the number of cut points less than the feature value plus the
+ *        number of cut points less than or equal to it. Other features are
+ *        given as they are. The batch can only be used with libraries
+ *        compiled with quantize=1, and lets them skip quantization.
+ * \param data bin indices
+ * \param dtype type of bin indices; either "uint8" or "uint16"
+ * \param missing_value bin index to represent the missing value
+ * \param num_row number of data rows in the batch
+ * \param num_col number of columns (features) in the batch
+ * \param row_stride distance between consecutive rows, in number of elements
+ * \param col_stride distance between consecutive columns, in number of
+ *                   elements
+ * \param out handle to dense batch
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteAssembleBinnedBatch(const void* data,
+                                             const char* dtype,
+                                             float missing_value,
+                                             size_t num_row, size_t num_col,
+                                             size_t row_stride,
+                                             size_t col_stride,
+                                             DenseBatchHandle* out);
+/*!
+ * \brief point an existing dense batch to a new matrix of the same
+ *        dimensions, so that the batch can be reused without allocating
+ * \param handle dense batch
+ * \param data feature values
+ * \param dtype type of feature values; either "float32" or "float64"
+ * \param row_stride distance between consecutive rows, in number of elements
+ * \param col_stride distance between consecutive columns, in number of
+ *                   elements
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteUpdateDenseBatch(DenseBatchHandle handle,
+                                          const void* data,
+                                          const char* dtype,
+                                          size_t row_stride,
+                                          size_t col_stride);
 /*!
  * \brief delete a dense batch from memory
  * \param handle dense batch
@@ -90,7 +160,9 @@ TREELITE_DLL int TreeliteBatchGetDimension(void* handle,
 /*!
  * \brief load prediction code into memory.
  * This function assumes that the prediction code has been already compiled into
- * a dynamic shared library object (.so/.dll/.dylib).
+ * a dynamic shared library object (.so/.dll/.dylib). Alternatively, a model
+ * exported with TreeliteExportBinaryModel() may be given, in which case its
+ * trees are evaluated by an interpreter.
  * \param library_path path to library object file containing prediction code
  * \param num_worker_thread number of worker threads (-1 to use max number)
  * \param out handle to predictor
@@ -99,9 +171,217 @@ TREELITE_DLL int TreeliteBatchGetDimension(void* handle,
 TREELITE_DLL int TreelitePredictorLoad(const char* library_path,
                                        int num_worker_thread,
                                        PredictorHandle* out);
+/*!
+ * \brief load prediction code into memory, to be run on the process-wide
+ *        thread pool. Unlike TreelitePredictorLoad(), the resulting predictor
+ *        accepts concurrent calls to TreelitePredictorPredictBatch() from
+ *        multiple threads, and all predictors loaded this way share the same
+ *        worker threads.
+ * \param library_path path to library object file containing prediction code
+ * \param num_worker_thread maximum number of threads to use for each batch
+ *                          (-1 to use max number)
+ * \param out handle to predictor
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorLoadWithSharedPool(const char* library_path,
+                                                     int num_worker_thread,
+                                                     PredictorHandle* out);
+/*!
+ * \brief load prediction code into memory, laying out work by NUMA node.
+ *        Worker threads are grouped by node, each node scores a contiguous
+ *        range of the rows in a batch, and each node runs its own copy of
+ *        the prediction code and model data. On machines with a single node,
+ *        this behaves like TreelitePredictorLoad().
+ * \param library_path path to library object file containing prediction code
+ * \param num_worker_thread number of worker threads (-1 to use max number)
+ * \param out handle to predictor
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorLoadNumaAware(const char* library_path,
+                                                int num_worker_thread,
+                                                PredictorHandle* out);
+/*!
+ * \brief replace the prediction code of a loaded predictor with code from
+ *        another dynamic shared library, keeping the predictor's threads.
+ *        Predictions started after this function returns use the new
+ *        library; predictions already in progress finish with the old one,
+ *        which is unloaded once they are done. The new library must accept
+ *        the same number of features and produce the same number of output
+ *        groups as the current one. This function may be called while other
+ *        threads are making predictions with the same predictor.
+ * \param handle predictor
+ * \param library_path path to library object file containing prediction code
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorReload(PredictorHandle handle,
+                                         const char* library_path);
+/*!
+ * \brief set the number of rows that a thread claims at a time when making
+ *        predictions on a batch. Threads keep claiming chunks until the
+ *        batch is exhausted, so that a slow thread does not hold up the rest.
+ * \param handle predictor
+ * \param chunk_size number of rows per chunk (0 to choose automatically)
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorSetChunkSize(PredictorHandle handle,
+                                               size_t chunk_size);
+/*!
+ * \brief set the minimum number of rows that each thread must get for a
+ *        batch to be spread over threads. Smaller batches are scored on the
+ *        calling thread alone. By default, the threshold is chosen from the
+ *        measured cost of handing a batch out to worker threads and of
+ *        scoring a row, and follows these costs over recent batches.
+ * \param handle predictor
+ * \param threshold minimum number of rows per thread (0 to choose
+ *                  automatically)
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorSetParallelThreshold(PredictorHandle handle,
+                                                       size_t threshold);
+/*!
+ * \brief get the minimum number of rows that each thread gets for a batch to
+ *        be spread over threads
+ * \param handle predictor
+ * \param out used to save the threshold in use, or 0 if it is chosen
+ *            automatically and no batch has been scored yet to measure the
+ *            costs it is based on
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryParallelThreshold(PredictorHandle handle,
+                                                         size_t* out);
+/*!
+ * \brief set how the threads of a predictor wait when they have nothing to
+ *        do. For a predictor that uses the shared thread pool, this sets how
+ *        the threads of the pool wait, for every predictor in the process.
+ * \param handle predictor
+ * \param wait_policy one of "spin" (keep spinning), "spin_then_park" (spin
+ *                    for a time that follows recent gaps between batches,
+ *                    then sleep; the default) and "park" (sleep right away)
+ * \param max_spin_us upper bound on the time spent spinning under
+ *                    "spin_then_park", in microseconds (see
+ *                    TreeliteQueryDefaultMaxSpin() for the default)
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorSetWaitPolicy(PredictorHandle handle,
+                                                const char* wait_policy,
+                                                unsigned max_spin_us);
+/*!
+ * \brief get the default upper bound on the time spent spinning under the
+ *        "spin_then_park" wait policy
+ * \param out used to save the bound, in microseconds
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteQueryDefaultMaxSpin(unsigned* out);
+/*!
+ * \brief get statistics on how the worker threads of a predictor waited for
+ *        batches, summed over worker threads. All times are in nanoseconds.
+ * \param handle predictor
+ * \param out_num_wait used to save the number of times a thread had to wait
+ * \param out_num_park used to save the number of times a thread slept
+ * \param out_spin_ns used to save the total time spent spinning
+ * \param out_park_ns used to save the total time spent asleep
+ * \param out_wake_latency_ns used to save the total time between a batch
+ *                            being handed over and a waiting thread picking
+ *                            it up
+ * \param out_max_wake_latency_ns used to save the longest such time
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryWaitStats(
+    PredictorHandle handle, uint64_t* out_num_wait, uint64_t* out_num_park,
+    uint64_t* out_spin_ns, uint64_t* out_park_ns,
+    uint64_t* out_wake_latency_ns, uint64_t* out_max_wake_latency_ns);
+
+/*!
+ * \brief callback to be invoked when a predictor starts on a batch
+ * \param arg user-supplied argument given to
+ *            TreelitePredictorSetBatchCallbacks()
+ * \param num_row number of rows in the batch
+ */
+typedef void (*TreelitePredictorBatchBeginCallback)(void* arg, size_t num_row);
+/*!
+ * \brief callback to be invoked when a predictor is done with a batch
+ * \param arg user-supplied argument given to
+ *            TreelitePredictorSetBatchCallbacks()
+ * \param num_row number of rows in the batch
+ * \param elapsed_sec time taken, in seconds
+ * \param error_msg error message if prediction failed; NULL otherwise
+ */
+typedef void (*TreelitePredictorBatchEndCallback)(void* arg, size_t num_row,
+                                                  double elapsed_sec,
+                                                  const char* error_msg);
+/*!
+ * \brief set callbacks to be invoked at the start and at the end of every
+ *        batch, e.g. to feed a tracing system. Callbacks are invoked from
+ *        the thread that runs the batch. Must not be called while
+ *        predictions are being made.
+ * \param handle predictor
+ * \param begin callback invoked at the start of a batch; may be NULL
+ * \param end callback invoked at the end of a batch; may be NULL
+ * \param callback_arg argument to pass to the callbacks
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorSetBatchCallbacks(
+    PredictorHandle handle, TreelitePredictorBatchBeginCallback begin,
+    TreelitePredictorBatchEndCallback end, void* callback_arg);
+/*!
+ * \brief get the performance counters of a predictor, accumulated since the
+ *        library was loaded or the counters were last reset. All times are
+ *        in nanoseconds; times spent by threads are summed over threads.
+ * \param handle predictor
+ * \param out_num_batch used to save the number of batches scored
+ * \param out_num_row used to save the number of rows scored in batches
+ * \param out_num_inst used to save the number of single rows scored
+ * \param out_batch_ns used to save the total time from start to end of
+ *                     each batch
+ * \param out_assemble_ns used to save the time spent converting rows into
+ *                        the layout taken by the prediction code
+ * \param out_eval_ns used to save the time spent evaluating trees
+ * \param out_wait_ns used to save the time the submitting thread spent
+ *                    waiting for worker threads
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryStats(
+    PredictorHandle handle, uint64_t* out_num_batch, uint64_t* out_num_row,
+    uint64_t* out_num_inst, uint64_t* out_batch_ns, uint64_t* out_assemble_ns,
+    uint64_t* out_eval_ns, uint64_t* out_wait_ns);
+/*!
+ * \brief get the per-batch latency histogram of a predictor. Bucket k counts
+ *        the batches that took between 2^k and 2^(k+1) microseconds; the
+ *        first bucket also counts faster batches, and the last bucket also
+ *        counts slower ones.
+ * \param handle predictor
+ * \param out_counts buffer to store the count of each bucket, or NULL to
+ *                   query the number of buckets only
+ * \param out_len used to save the number of buckets
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryLatencyHistogram(PredictorHandle handle,
+                                                        uint64_t* out_counts,
+                                                        size_t* out_len);
+/*!
+ * \brief get the time each thread of a predictor spent scoring rows, in
+ *        nanoseconds: the thread that submits batches first, followed by
+ *        the workers. No thread is given if the predictor uses the shared
+ *        thread pool.
+ * \param handle predictor
+ * \param out_busy_ns buffer to store the busy time of each thread, or NULL to
+ *                    query the number of threads only
+ * \param out_len used to save the number of threads
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryThreadBusyTime(PredictorHandle handle,
+                                                      uint64_t* out_busy_ns,
+                                                      size_t* out_len);
+/*!
+ * \brief reset the performance counters of a predictor to zero
+ * \param handle predictor
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorResetStats(PredictorHandle handle);
 /*!
  * \brief Make predictions on a batch of data rows (synchronously). This
- *        function internally divides the workload among all worker threads.
+ *        function internally divides the workload into chunks, which are
+ *        claimed by worker threads as they become free.
  * \param handle predictor
  * \param batch a batch of rows (must be of type SparseBatch or DenseBatch)
  * \param batch_sparse whether batch is sparse (1) or dense (0)
@@ -124,6 +404,47 @@ TREELITE_DLL int TreelitePredictorPredictBatch(PredictorHandle handle,
                                                float* out_result,
                                                size_t* out_result_size);
 
+/*!
+ * \brief callback to be invoked when an asynchronous batch prediction
+ *        completes
+ * \param arg user-supplied argument given to
+ *            TreelitePredictorPredictBatchAsync()
+ * \param result_size length of the output vector
+ * \param error_msg error message if prediction failed; NULL otherwise
+ */
+typedef void (*TreelitePredictorCallback)(void* arg, size_t result_size,
+                                          const char* error_msg);
+
+/*!
+ * \brief Make predictions on a batch of data rows (asynchronously). The
+ *        batch is scored on the process-wide thread pool and this function
+ *        returns immediately; once prediction has finished, the callback is
+ *        invoked from a pool thread. The predictor must have been loaded with
+ *        TreelitePredictorLoadWithSharedPool(). The predictor, the batch, and
+ *        out_result must remain valid until the callback is invoked.
+ * \param handle predictor
+ * \param batch a batch of rows (must be of type SparseBatch or DenseBatch)
+ * \param batch_sparse whether batch is sparse (1) or dense (0)
+ * \param verbose whether to produce extra messages
+ * \param pred_margin whether to produce raw margin scores instead of
+ *                    transformed probabilities
+ * \param out_result resulting output vector; use
+ *                   TreelitePredictorQueryResultSize() to allocate sufficient
+ *                   space
+ * \param callback function to be invoked upon completion
+ * \param callback_arg argument to be passed to the callback
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorPredictBatchAsync(
+                                         PredictorHandle handle,
+                                         void* batch,
+                                         int batch_sparse,
+                                         int verbose,
+                                         int pred_margin,
+                                         float* out_result,
+                                         TreelitePredictorCallback callback,
+                                         void* callback_arg);
+
 /*!
  * \brief Make predictions on a single data row (synchronously). The work
  *        will be scheduled to the calling thread.
@@ -142,6 +463,64 @@ TREELITE_DLL int TreelitePredictorPredictInst(PredictorHandle handle,
                                               int pred_margin, float* out_result,
                                               size_t* out_result_size);
 
+/*!
+ * \brief create a single-row predictor, which owns a reusable row of entries
+ *        so that rows can be scored with minimal per-call overhead. It should
+ *        be used by one thread at a time, and freed before the predictor.
+ * \param predictor predictor with a loaded library
+ * \param out handle to single-row predictor
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteSingleRowPredictorCreate(
+                                         PredictorHandle predictor,
+                                         SingleRowPredictorHandle* out);
+/*!
+ * \brief Make prediction on a dense row, using a single-row predictor
+ * \param handle single-row predictor
+ * \param row feature values
+ * \param num_col number of feature values in the row
+ * \param missing_value value representing the missing value (usually nan).
+ *                      NaN is always treated as missing as well.
+ * \param pred_margin whether to produce raw margin scores instead of
+ *                    transformed probabilities
+ * \param out_result resulting output vector; use
+ *        TreelitePredictorQueryResultSizeSingleInst() to allocate sufficient space
+ * \param out_result_size used to save length of the output vector
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteSingleRowPredictorPredictDense(
+                                         SingleRowPredictorHandle handle,
+                                         const float* row, size_t num_col,
+                                         float missing_value, int pred_margin,
+                                         float* out_result,
+                                         size_t* out_result_size);
+/*!
+ * \brief Make prediction on a sparse row, using a single-row predictor
+ * \param handle single-row predictor
+ * \param indices feature indices of the nonzero entries
+ * \param values feature values of the nonzero entries
+ * \param nnz number of nonzero entries
+ * \param pred_margin whether to produce raw margin scores instead of
+ *                    transformed probabilities
+ * \param out_result resulting output vector; use
+ *        TreelitePredictorQueryResultSizeSingleInst() to allocate sufficient space
+ * \param out_result_size used to save length of the output vector
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteSingleRowPredictorPredictSparse(
+                                         SingleRowPredictorHandle handle,
+                                         const uint32_t* indices,
+                                         const float* values, size_t nnz,
+                                         int pred_margin, float* out_result,
+                                         size_t* out_result_size);
+/*!
+ * \brief delete single-row predictor from memory
+ * \param handle single-row predictor to remove
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreeliteSingleRowPredictorFree(
+                                         SingleRowPredictorHandle handle);
+
 /*!
  * \brief Given a batch of data rows, query the necessary size of array to
  *        hold predictions for all data points.
@@ -212,12 +591,128 @@ TREELITE_DLL int TreelitePredictorQuerySigmoidAlpha(PredictorHandle handle,
  */
 TREELITE_DLL int TreelitePredictorQueryGlobalBias(PredictorHandle handle,
                                                   float* out);
+/*!
+ * \brief Get the number of threads used to make predictions on a batch. By
+ *        default, this is the number of CPU cores the process may run on,
+ *        limited further by its cgroup CPU quota.
+ * \param handle predictor
+ * \param out used to save the number of threads
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryNumThread(PredictorHandle handle,
+                                                 int* out);
+/*!
+ * \brief Get the cores that the threads of a predictor were bound to: the
+ *        thread that loaded the library first, followed by the workers. No
+ *        core is given if threads were not bound (shared thread pool, or
+ *        TREELITE_BIND_THREADS=0).
+ * \param handle predictor
+ * \param out_cores set to point to the list of core IDs, which is valid
+ *                  until the predictor is freed
+ * \param out_len used to save the length of the list
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryThreadAffinity(PredictorHandle handle,
+                                                      const int** out_cores,
+                                                      size_t* out_len);
+/*!
+ * \brief Get the cut points (thresholds) at which a feature is divided into
+ *        bins, for libraries compiled with quantize=1
+ * \param handle predictor
+ * \param fid feature index
+ * \param out_cut_points set to point to the ascending list of cut points.
+ *                       The list is valid until the library is unloaded or
+ *                       replaced with TreelitePredictorReload().
+ * \param out_len used to save the number of cut points (0 if the feature
+ *                is not binned)
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorQueryCutPoints(PredictorHandle handle,
+                                                 unsigned fid,
+                                                 const double** out_cut_points,
+                                                 size_t* out_len);
 /*!
  * \brief delete predictor from memory
  * \param handle predictor to remove
  * \return 0 for success, -1 for failure
  */
 TREELITE_DLL int TreelitePredictorFree(PredictorHandle handle);
+
+/*!
+ * \brief create an empty predictor group. Models are added with
+ *        TreelitePredictorGroupLoad(); their outputs are placed side by side
+ *        in the order they were loaded.
+ * \param num_worker_thread number of worker threads (-1 to use max number)
+ * \param out handle to predictor group
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupCreate(int num_worker_thread,
+                                              PredictorGroupHandle* out);
+/*!
+ * \brief load prediction code into the predictor group as a new model
+ * \param handle predictor group
+ * \param library_path path to dynamically loadable library
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupLoad(PredictorGroupHandle handle,
+                                            const char* library_path);
+/*!
+ * \brief set the number of rows that a thread claims at a time when making
+ *        predictions on a batch
+ * \param handle predictor group
+ * \param chunk_size number of rows per chunk (0 to choose automatically)
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupSetChunkSize(PredictorGroupHandle handle,
+                                                    size_t chunk_size);
+/*!
+ * \brief Get the length of output per row, i.e. the sum of the number of
+ *        output groups over all models in the group
+ * \param handle predictor group
+ * \param out length of output per row
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupQueryNumOutput(
+                                                 PredictorGroupHandle handle,
+                                                 size_t* out);
+/*!
+ * \brief Get the position of the output of a model within the output of
+ *        each row
+ * \param handle predictor group
+ * \param index index of the model, in order of loading
+ * \param out offset of the model output
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupQueryOutputOffset(
+                                                 PredictorGroupHandle handle,
+                                                 size_t index, size_t* out);
+/*!
+ * \brief Make predictions on a batch of data rows with every model in the
+ *        group (synchronously). Each row is read only once for all models.
+ * \param handle predictor group
+ * \param batch a batch of rows (must be of type SparseBatch or DenseBatch)
+ * \param batch_sparse whether batch is sparse (1) or dense (0)
+ * \param verbose whether to produce extra messages
+ * \param pred_margin whether to produce raw margin scores instead of
+ *                    transformed probabilities
+ * \param out_result resulting output vector, of length
+ *                   [number of rows] * TreelitePredictorGroupQueryNumOutput()
+ * \param out_result_size used to save length of the output vector
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupPredictBatch(PredictorGroupHandle handle,
+                                                    void* batch,
+                                                    int batch_sparse,
+                                                    int verbose,
+                                                    int pred_margin,
+                                                    float* out_result,
+                                                    size_t* out_result_size);
+/*!
+ * \brief delete predictor group from memory
+ * \param handle predictor group to remove
+ * \return 0 for success, -1 for failure
+ */
+TREELITE_DLL int TreelitePredictorGroupFree(PredictorGroupHandle handle);
 /*! \} */
 
 #endif  // TREELITE_C_API_RUNTIME_H_
@@ -11,7 +11,8 @@
 union TreelitePredictorEntry {
   int missing;
   float fvalue;
-  // may contain extra fields later, such as qvalue
+  /* bin index, used by libraries compiled with quantize=1 */
+  int qvalue;
 };
 
 #endif  /* TREELITE_ENTRY_H_ */
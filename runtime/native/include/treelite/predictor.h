@@ -9,7 +9,13 @@
 
 #include <dmlc/logging.h>
 #include <treelite/entry.h>
+#include <treelite/wait_policy.h>
+#include <atomic>
 #include <cstdint>
+#include <functional>
+#include <memory>
+#include <string>
+#include <vector>
 
 namespace treelite {
 
@@ -19,6 +25,10 @@ class TemporaryDirectory;  // forward declaration
 }
 }
 
+class PerfCounters;  // forward declaration
+class ParallelCostModel;  // forward declaration
+class Interpreter;  // forward declaration
+
 /*! \brief sparse batch in Compressed Sparse Row (CSR) format */
 struct CSRBatch {
   /*! \brief feature values */
@@ -33,16 +43,80 @@ struct CSRBatch {
   size_t num_col;
 };
 
-/*! \brief dense batch */
+/*!
+ * \brief dense batch. Feature value (i, j) is found at
+ *        data[i * row_stride + j * col_stride], so that row-major (C order)
+ *        and column-major (Fortran order) matrices, as well as views into
+ *        larger matrices, can all be read in place.
+ */
 struct DenseBatch {
-  /*! \brief feature values */
+  /*! \brief feature values, if stored as float32; nullptr otherwise */
   const float* data;
-  /*! \brief value representing the missing value (usually nan) */
+  /*!
+   * \brief value representing the missing value (usually nan). NaN is always
+   *        treated as missing as well.
+   */
   float missing_value;
   /*! \brief number of rows */
   size_t num_row;
   /*! \brief number of columns (i.e. # of features used) */
   size_t num_col;
+  /*! \brief feature values, if stored as float64; nullptr otherwise */
+  const double* data_f64;
+  /*! \brief distance between consecutive rows, in number of elements */
+  size_t row_stride;
+  /*! \brief distance between consecutive columns, in number of elements */
+  size_t col_stride;
+  /*!
+   * \brief bin indices, if the batch holds pre-binned features stored as
+   *        uint8; nullptr otherwise. See Predictor::QueryCutPoints().
+   */
+  const uint8_t* bin_u8;
+  /*! \brief bin indices, if stored as uint16; nullptr otherwise */
+  const uint16_t* bin_u16;
+};
+
+/*!
+ * \brief performance counters of a predictor, accumulated since the library
+ *        was loaded (or since the counters were last reset). All times are in
+ *        nanoseconds.
+ */
+struct PredictorStats {
+  /*! \brief number of buckets in the latency histogram */
+  static constexpr int kNumLatencyBucket = 32;
+  /*! \brief number of batches scored */
+  uint64_t num_batch;
+  /*! \brief number of rows scored as part of batches */
+  uint64_t num_row;
+  /*! \brief number of single rows scored with PredictInst() */
+  uint64_t num_inst;
+  /*! \brief total time from the start to the end of each batch */
+  uint64_t batch_ns;
+  /*!
+   * \brief time threads spent converting rows into the layout that
+   *        predict_batch() takes. Rows scored one at a time are converted
+   *        and evaluated in one go, and are counted under eval_ns.
+   */
+  uint64_t assemble_ns;
+  /*! \brief time threads spent evaluating trees, summed over threads */
+  uint64_t eval_ns;
+  /*!
+   * \brief time the thread that submitted a batch spent waiting for workers
+   *        to finish, after it had run out of rows to score itself
+   */
+  uint64_t wait_ns;
+  /*!
+   * \brief per-batch latency histogram. Bucket k counts the batches that took
+   *        between 2^k and 2^(k+1) microseconds; the first bucket also counts
+   *        faster batches, and the last bucket also counts slower ones.
+   */
+  std::vector<uint64_t> latency_histogram;
+  /*!
+   * \brief time each thread spent scoring rows: the thread that submits
+   *        batches first, followed by the workers. Empty if the predictor
+   *        uses the shared thread pool.
+   */
+  std::vector<uint64_t> thread_busy_ns;
 };
 
 /*! \brief predictor class: wrapper for optimized prediction code */
@@ -53,22 +127,127 @@ class Predictor {
   typedef void* PredFuncHandle;
   typedef void* LibraryHandle;
   typedef void* ThreadPoolHandle;
+  /*!
+   * \brief function to be called when an asynchronous prediction completes.
+   *        It receives the length of the output vector and, if prediction
+   *        failed, an error message (nullptr otherwise).
+   */
+  typedef std::function<void(size_t, const char*)> AsyncCallback;
+  /*!
+   * \brief function to be called when the predictor starts on a batch. It
+   *        receives the number of rows in the batch.
+   */
+  typedef std::function<void(size_t)> BatchBeginCallback;
+  /*!
+   * \brief function to be called when the predictor is done with a batch. It
+   *        receives the number of rows in the batch, the time taken in
+   *        seconds and, if prediction failed, an error message (nullptr
+   *        otherwise).
+   */
+  typedef std::function<void(size_t, double, const char*)> BatchEndCallback;
 
-  Predictor(int num_worker_thread = -1);
+  /*!
+   * \brief constructor
+   * \param num_worker_thread number of threads to use for each batch
+   *                          (-1 to use max number)
+   * \param use_shared_pool whether to score batches on the process-wide
+   *                        thread pool rather than a pool owned by this
+   *                        predictor. With the shared pool, PredictBatch()
+   *                        may be called from multiple threads at once, and
+   *                        all predictors in the process share the same
+   *                        worker threads.
+   * \param numa_aware whether to lay out work by NUMA node. Threads are
+   *                   grouped by node, each node scores a contiguous range
+   *                   of rows, and each node runs its own copy of the
+   *                   prediction code and model data, so that workers mostly
+   *                   read memory local to their node. Cannot be combined
+   *                   with use_shared_pool.
+   */
+  Predictor(int num_worker_thread = -1, bool use_shared_pool = false,
+            bool numa_aware = false);
   ~Predictor();
   /*!
    * \brief load the prediction function from dynamic shared library.
-   * \param name name of dynamic shared library (.so/.dll/.dylib).
+   *        If the library exports predict_batch(), it will be used to score
+   *        dense batches block by block. A model exported in the flat binary
+   *        format (see binary_model.h) may be given instead of a library, in
+   *        which case its trees are evaluated by an interpreter.
+   * \param name name of dynamic shared library (.so/.dll/.dylib), or of a
+   *             binary model
    */
   void Load(const char* name);
+  /*!
+   * \brief replace the loaded prediction function with one from another
+   *        library, without interrupting service. Requests that start after
+   *        this function returns use the new library, while requests already
+   *        in flight finish with the old one; the old library is unloaded
+   *        once the last of them is done. The thread pool is kept as is. The
+   *        new library must accept the same number of features and produce
+   *        the same number of output groups as the current one, since
+   *        callers size their buffers accordingly. Safe to call while other
+   *        threads are making predictions. Either library may be a binary
+   *        model, e.g. to serve a model through the interpreter until its
+   *        compiled library is ready.
+   * \param name name of dynamic shared library (.so/.dll/.dylib), or of a
+   *             binary model
+   */
+  void Reload(const char* name);
   /*!
    * \brief unload the prediction function
    */
   void Free();
+  /*!
+   * \brief set the number of rows that a thread claims at a time when
+   *        running PredictBatch(). Threads keep claiming chunks until the
+   *        batch is exhausted, so that a slow thread does not hold up the
+   *        others.
+   * \param chunk_size number of rows per chunk (0 to choose automatically)
+   */
+  void SetChunkSize(size_t chunk_size);
+  /*!
+   * \brief set the minimum number of rows that each thread must get for a
+   *        batch to be spread over threads. A batch of fewer rows is scored
+   *        on the calling thread alone, and a larger batch gets one thread
+   *        per threshold rows, up to the number of threads of the predictor.
+   *        By default, the threshold is chosen automatically: the predictor
+   *        measures what it costs to hand a batch out to worker threads and
+   *        to score a row, and only adds a thread if the rows it takes on
+   *        are worth at least twice the cost of handing them out. Both costs
+   *        are followed over recent batches, so that the threshold adapts to
+   *        the model and to the load on the machine. May be called at any
+   *        time, including while predictions are being made.
+   * \param threshold minimum number of rows per thread (0 to choose
+   *                  automatically)
+   */
+  void SetParallelThreshold(size_t threshold);
+  /*!
+   * \brief set how the threads of this predictor wait when they have nothing
+   *        to do, e.g. worker threads between batches. Spinning reacts to a
+   *        new batch the quickest but keeps cores busy while the predictor is
+   *        idle; parking frees the cores at the cost of waking threads up.
+   *        May be called at any time, including while predictions are being
+   *        made. With the shared thread pool, the policy applies to the
+   *        threads of the pool, and hence to every predictor that uses it.
+   * \param policy wait policy (default: WaitPolicy::kSpinThenPark)
+   * \param max_spin_us upper bound on the time spent spinning under
+   *                    WaitPolicy::kSpinThenPark, in microseconds
+   */
+  void SetWaitPolicy(WaitPolicy policy,
+                     uint32_t max_spin_us = kDefaultMaxSpinMicroseconds);
+  /*!
+   * \brief set functions to be called at the start and at the end of every
+   *        batch, e.g. to feed a tracing system. The functions are called
+   *        from the thread that runs the batch and must not throw. Must not
+   *        be called while predictions are being made.
+   * \param begin function called at the start of a batch (may be empty)
+   * \param end function called at the end of a batch (may be empty)
+   */
+  void SetBatchCallbacks(BatchBeginCallback begin, BatchEndCallback end);
 
   /*!
    * \brief Make predictions on a batch of data rows (synchronously). This
-   *        function internally divides the workload among all worker threads.
+   *        function internally divides the workload into chunks, which are
+   *        claimed by worker threads as they become free.
    * \param batch a batch of rows
    * \param verbose whether to produce extra messages
    * \param pred_margin whether to produce raw margin scores instead of
@@ -82,6 +261,27 @@ class Predictor {
                       bool pred_margin, float* out_result);
   size_t PredictBatch(const DenseBatch* batch, int verbose,
                       bool pred_margin, float* out_result);
+  /*!
+   * \brief Make predictions on a batch of data rows (asynchronously). The
+   *        batch is scored on the process-wide thread pool, and this function
+   *        returns immediately. Only available when the predictor was
+   *        constructed with use_shared_pool=true. The batch and out_result
+   *        must stay valid until the callback is invoked.
+   * \param batch a batch of rows
+   * \param verbose whether to produce extra messages
+   * \param pred_margin whether to produce raw margin scores instead of
+   *                    transformed probabilities
+   * \param out_result resulting output vector; use
+   *                   QueryResultSize() to allocate sufficient space
+   * \param callback function to be called, from a pool thread, once
+   *                 prediction has finished
+   */
+  void PredictBatchAsync(const CSRBatch* batch, int verbose,
+                         bool pred_margin, float* out_result,
+                         AsyncCallback callback);
+  void PredictBatchAsync(const DenseBatch* batch, int verbose,
+                         bool pred_margin, float* out_result,
+                         AsyncCallback callback);
   /*!
    * \brief Make predictions on a single data row (synchronously). The work
    *        will be scheduled to the calling thread.
@@ -103,7 +303,7 @@ class Predictor {
    * \return length of prediction array
    */
   inline size_t QueryResultSize(const CSRBatch* batch) const {
-    CHECK(pred_func_handle_ != nullptr)
+    CHECK(num_feature_ > 0)
       << "A shared library needs to be loaded first using Load()";
     return batch->num_row * num_output_group_;
   }
@@ -114,7 +314,7 @@ class Predictor {
    * \return length of prediction array
    */
   inline size_t QueryResultSize(const DenseBatch* batch) const {
-    CHECK(pred_func_handle_ != nullptr)
+    CHECK(num_feature_ > 0)
       << "A shared library needs to be loaded first using Load()";
     return batch->num_row * num_output_group_;
   }
@@ -128,7 +328,7 @@ class Predictor {
    */
   inline size_t QueryResultSize(const CSRBatch* batch,
                                 size_t rbegin, size_t rend) const {
-    CHECK(pred_func_handle_ != nullptr)
+    CHECK(num_feature_ > 0)
       << "A shared library needs to be loaded first using Load()";
     CHECK(rbegin < rend && rend <= batch->num_row);
     return (rend - rbegin) * num_output_group_;
@@ -143,7 +343,7 @@ class Predictor {
    */
   inline size_t QueryResultSize(const DenseBatch* batch,
                                 size_t rbegin, size_t rend) const {
-    CHECK(pred_func_handle_ != nullptr)
+    CHECK(num_feature_ > 0)
       << "A shared library needs to be loaded first using Load()";
     CHECK(rbegin < rend && rend <= batch->num_row);
     return (rend - rbegin) * num_output_group_;
@@ -154,7 +354,7 @@ class Predictor {
    * \return length of prediction array
    */
   inline size_t QueryResultSizeSingleInst() const {
-    CHECK(pred_func_handle_ != nullptr)
+    CHECK(num_feature_ > 0)
       << "A shared library needs to be loaded first using Load()";
     return num_output_group_;
   }
@@ -182,7 +382,7 @@ class Predictor {
    * \return name of prediction transformation
    */
   inline std::string QueryPredTransform() const {
-    return pred_transform_;
+    return AcquireLibrary_()->pred_transform;
   }
 
   /*!
@@ -190,7 +390,7 @@ class Predictor {
    * \return alpha value in sigmoid transformation
    */
   inline float QuerySigmoidAlpha() const {
-    return sigmoid_alpha_;
+    return AcquireLibrary_()->sigmoid_alpha;
   }
 
   /*!
@@ -198,29 +398,358 @@ class Predictor {
    * \return global bias
    */
   inline float QueryGlobalBias() const {
-    return global_bias_;
+    return AcquireLibrary_()->global_bias;
   }
 
+  /*!
+   * \brief Get the number of threads used to make predictions on a batch.
+   *        Unless given explicitly, this is the number of CPU cores the
+   *        process may run on, limited further by its cgroup CPU quota.
+   * \return number of threads
+   */
+  inline int QueryNumThread() const {
+    return num_worker_thread_;
+  }
+
+  /*!
+   * \brief Get the cores that the threads of this predictor were bound to:
+   *        the thread that loaded the library first, followed by the workers.
+   *        Threads are bound only to cores the process may run on. Empty if
+   *        threads were not bound, either because the shared thread pool is
+   *        used or because TREELITE_BIND_THREADS=0 was set.
+   * \return list of core IDs
+   */
+  inline const std::vector<int>& QueryThreadAffinity() const {
+    return thread_affinity_;
+  }
+
+  /*!
+   * \brief Get the NUMA node of each thread of this predictor, in the same
+   *        order as QueryThreadAffinity(). Nodes are numbered from 0 in the
+   *        order they were given threads, so that the thread that loaded the
+   *        library is on node 0. Empty unless the predictor is NUMA-aware.
+   * \return list of node indices
+   */
+  inline const std::vector<int>& QueryThreadNode() const {
+    return thread_node_;
+  }
+
+  /*!
+   * \brief Get the minimum number of rows that each thread gets for a batch
+   *        to be spread over threads; see SetParallelThreshold(). Batches of
+   *        fewer rows are scored on the calling thread.
+   * \return threshold in use, or 0 if it is to be chosen automatically and
+   *         the predictor has not yet scored a batch to measure its costs,
+   *         in which case the next batch is spread over all threads
+   */
+  size_t QueryParallelThreshold() const;
+
+  /*!
+   * \brief Get the thresholds at which a feature is divided into bins, for
+   *        libraries compiled with quantize=1. A pre-binned batch (see
+   *        DenseBatch::bin_u8) gives, for each feature value x, the number
+   *        of thresholds less than x plus the number of thresholds less than
+   *        or equal to x. Features without thresholds are given as they are;
+   *        for categorical features, this is the category.
+   * \param fid feature index
+   * \param out_cut_points set to point to the ascending list of thresholds.
+   *                       The list belongs to the loaded library and is
+   *                       valid until the library is unloaded or replaced.
+   * \return number of thresholds (0 if the feature is not binned)
+   */
+  size_t QueryCutPoints(unsigned fid, const double** out_cut_points) const;
+
+  /*!
+   * \brief Get statistics on how the worker threads of this predictor waited
+   *        for batches since the library was loaded: how often and how long
+   *        they spun or slept, and how long they took to pick up a batch.
+   *        With the shared thread pool, the statistics are those of the
+   *        threads of the pool, counted since the pool was created. All zero
+   *        if the predictor has no worker threads.
+   * \return wait statistics, summed over worker threads
+   */
+  WaitStats QueryWaitStats() const;
+
+  /*!
+   * \brief Get the performance counters of this predictor. The counters are
+   *        always on and are updated with relaxed atomic operations, so they
+   *        may be read while predictions are being made.
+   * \return snapshot of the counters
+   */
+  PredictorStats QueryStats() const;
+  /*!
+   * \brief Reset all performance counters to zero
+   */
+  void ResetStats();
+
  private:
-  LibraryHandle lib_handle_;
-  QueryFuncHandle num_output_group_query_func_handle_;
-  QueryFuncHandle num_feature_query_func_handle_;
-  QueryFuncHandle pred_transform_query_func_handle_;
-  QueryFuncHandle sigmoid_alpha_query_func_handle_;
-  QueryFuncHandle global_bias_query_func_handle_;
-  PredFuncHandle pred_func_handle_;
+  // score single rows with a library they hold on to; see PredictInstWith_()
+  friend class SingleRowPredictor;
+  friend class PredictorGroup;
+
+  /*!
+   * \brief a loaded library, along with the functions and metadata obtained
+   *        from it. Each request holds a reference to the library that was
+   *        current when it started, so that Reload() can publish a new
+   *        library while the old one stays loaded until its last user is
+   *        done (read-copy-update).
+   */
+  struct Library {
+    LibraryHandle lib_handle;
+    PredFuncHandle pred_func_handle;
+    PredFuncHandle batch_pred_func_handle;  // null if library lacks predict_batch()
+    // predict_binned() and get_cut_points(); null unless the library was
+    // compiled with quantize=1
+    PredFuncHandle binned_pred_func_handle;
+    QueryFuncHandle cut_points_query_func_handle;
+    // features whose entries the prediction function overwrites in place,
+    // as listed by get_overwritten_features() (with quantize=1, those it
+    // quantizes)
+    std::vector<unsigned> overwritten_feature;
+    // whether the prediction function may overwrite any entry; true for
+    // libraries lacking get_overwritten_features(), built by older versions
+    // of treelite
+    bool may_overwrite_input;
+    // evaluates the trees of a binary model; null if a shared library was
+    // loaded, in which case the function handles are used instead
+    std::unique_ptr<Interpreter> interpreter;
+    size_t num_output_group;
+    size_t num_feature;
+    std::string pred_transform;
+    float sigmoid_alpha;
+    float global_bias;
+    // local file the library was loaded from
+    std::string path;
+    // temporary directory holding a copy of a remote library
+    std::unique_ptr<common::filesystem::TemporaryDirectory> tempdir;
+    // copies of the library for NUMA nodes 1, 2, ...; empty unless the
+    // predictor is NUMA-aware. Node 0 uses this library.
+    std::vector<std::shared_ptr<const Library>> node_replicas;
+
+    inline const Library* GetReplica(int node) const {
+      return (node == 0 || node_replicas.empty())
+             ? this : node_replicas[node - 1].get();
+    }
+
+    Library();
+    ~Library();
+  };
+
+  // library in use; only accessed with std::atomic_load / std::atomic_store
+  std::shared_ptr<const Library> lib_;
+  // incremented whenever lib_ is replaced, so that callers holding on to a
+  // library can tell cheaply whether it is still current, without the
+  // atomic_load of lib_ (which takes a lock in common implementations)
+  std::atomic<uint64_t> lib_generation_;
   ThreadPoolHandle thread_pool_handle_;
   size_t num_output_group_;
-  size_t num_feature_;
-  std::string pred_transform_;
-  float sigmoid_alpha_;
-  float global_bias_;
+  size_t num_feature_;  // 0 until a library is loaded
   int num_worker_thread_;
+  std::vector<int> thread_affinity_;  // empty if threads are not bound
+  std::vector<int> thread_node_;  // NUMA node of each thread, if NUMA-aware
+  std::vector<std::vector<int>> numa_nodes_;  // cores of nodes with threads
+  bool use_shared_pool_;
+  bool numa_aware_;
+  WaitPolicy wait_policy_;
+  uint32_t max_spin_us_;
+  std::unique_ptr<PerfCounters> perf_;
+  std::unique_ptr<ParallelCostModel> cost_model_;
+  BatchBeginCallback batch_begin_callback_;
+  BatchEndCallback batch_end_callback_;
+  size_t chunk_size_;  // 0 if chunk size is to be chosen automatically
 
-  bool using_remote_lib_;  // load lib from remote location?
-  // information for temporary file to cache remote lib
-  std::unique_ptr<common::filesystem::TemporaryDirectory> tempdir_;
-  std::string temp_libfile_;
+  static std::shared_ptr<Library> OpenLibrary_(const char* name);
+  // open the library, along with a copy for each NUMA node if NUMA-aware
+  std::shared_ptr<const Library> OpenLibraryForNodes_(const char* name) const;
+  inline std::shared_ptr<const Library> AcquireLibrary_() const {
+    std::shared_ptr<const Library> lib = std::atomic_load(&lib_);
+    CHECK(lib != nullptr)
+      << "A shared library needs to be loaded first using Load()";
+    return lib;
+  }
+  // replace the library in use (null to unload it)
+  void PublishLibrary_(std::shared_ptr<const Library> lib);
+  // PredictInst() with a library acquired beforehand, so that callers
+  // scoring many rows need not acquire it for every row
+  size_t PredictInstWith_(const Library& lib, TreelitePredictorEntry* inst,
+                          bool pred_margin, float* out_result);
+
+  template <typename BatchType>
+  size_t PredictBatchBase_(const BatchType* batch, int verbose,
+                           bool pred_margin, float* out_result);
+  template <typename BatchType>
+  size_t ScoreBatch_(const BatchType* batch, bool pred_margin,
+                     float* out_result);
+  template <typename BatchType>
+  void PredictBatchAsyncBase_(const BatchType* batch, int verbose,
+                              bool pred_margin, float* out_result,
+                              AsyncCallback callback);
+};
+
+/*!
+ * \brief helper for making predictions on one data row at a time with
+ *        minimal overhead. It owns a row of entries that is filled from the
+ *        input and passed straight to the prediction function; only the
+ *        entries that were touched are reset afterwards. It also holds on to
+ *        the library of the predictor, and acquires it again only once the
+ *        predictor has loaded another one (so that a library replaced by
+ *        Predictor::Reload() stays loaded until the next row is scored).
+ *        Each thread should use its own SingleRowPredictor.
+ */
+class SingleRowPredictor {
+ public:
+  /*!
+   * \brief constructor
+   * \param predictor predictor with a loaded library; must outlive this
+   *                  object
+   */
+  explicit SingleRowPredictor(Predictor* predictor);
+  /*!
+   * \brief Make prediction on a dense row
+   * \param row feature values
+   * \param num_col number of feature values in the row
+   * \param missing_value value representing the missing value (usually nan).
+   *                      NaN is always treated as missing as well.
+   * \param pred_margin whether to produce raw margin scores instead of
+   *                    transformed probabilities
+   * \param out_result resulting output vector; use
+   *                   Predictor::QueryResultSizeSingleInst() to allocate
+   *                   sufficient space
+   * \return length of the output vector
+   */
+  size_t PredictDense(const float* row, size_t num_col, float missing_value,
+                      bool pred_margin, float* out_result);
+  /*!
+   * \brief Make prediction on a sparse row
+   * \param indices feature indices of the nonzero entries
+   * \param values feature values of the nonzero entries
+   * \param nnz number of nonzero entries
+   * \param pred_margin whether to produce raw margin scores instead of
+   *                    transformed probabilities
+   * \param out_result resulting output vector; use
+   *                   Predictor::QueryResultSizeSingleInst() to allocate
+   *                   sufficient space
+   * \return length of the output vector
+   */
+  size_t PredictSparse(const uint32_t* indices, const float* values,
+                       size_t nnz, bool pred_margin, float* out_result);
+
+ private:
+  Predictor* predictor_;
+  std::vector<TreelitePredictorEntry> inst_;
+  // number of leading entries that may hold values from the last dense row
+  size_t num_dense_filled_;
+  // library of the predictor, and the value of Predictor::lib_generation_
+  // when it was acquired
+  std::shared_ptr<const Predictor::Library> lib_;
+  uint64_t lib_generation_;
+
+  // get the library in use, acquiring it again if it was replaced
+  const Predictor::Library& AcquireLibrary_();
+};
+
+/*!
+ * \brief group of predictors that score the same batch together, e.g. an
+ *        ensemble of models or several models sharing one input schema. Each
+ *        row is converted to entries only once and then handed to every
+ *        model in turn, so that the cost of reading the batch is paid once
+ *        rather than once per model. Outputs of the models are placed side
+ *        by side: the output of row i has QueryNumOutput() elements, with
+ *        model k occupying the elements starting at QueryOutputOffset(k).
+ *        Batches are scored on the process-wide thread pool, so that
+ *        PredictBatch() may be called from multiple threads at once.
+ */
+class PredictorGroup {
+ public:
+  /*!
+   * \brief constructor
+   * \param num_worker_thread number of threads to use for each batch
+   *                          (-1 to use max number)
+   */
+  explicit PredictorGroup(int num_worker_thread = -1);
+  /*!
+   * \brief load a prediction function from dynamic shared library and add it
+   *        to the group
+   * \param name name of dynamic shared library (.so/.dll/.dylib).
+   */
+  void Load(const char* name);
+  /*!
+   * \brief set the number of rows that a thread claims at a time; see
+   *        Predictor::SetChunkSize()
+   * \param chunk_size number of rows per chunk (0 to choose automatically)
+   */
+  void SetChunkSize(size_t chunk_size);
+  /*!
+   * \brief Make predictions on a batch of data rows with every model in the
+   *        group (synchronously). If a model produces fewer outputs than it
+   *        has output groups (e.g. due to the "max_index" transformation),
+   *        the remaining elements of its slot are set to NaN.
+   * \param batch a batch of rows
+   * \param verbose whether to produce extra messages
+   * \param pred_margin whether to produce raw margin scores instead of
+   *                    transformed probabilities
+   * \param out_result resulting output vector; use
+   *                   QueryResultSize() to allocate sufficient space
+   * \return length of the output vector, which equals QueryResultSize()
+   */
+  size_t PredictBatch(const CSRBatch* batch, int verbose,
+                      bool pred_margin, float* out_result);
+  size_t PredictBatch(const DenseBatch* batch, int verbose,
+                      bool pred_margin, float* out_result);
+
+  /*!
+   * \brief Get the number of models in the group
+   * \return number of models
+   */
+  inline size_t QueryNumPredictor() const {
+    return predictors_.size();
+  }
+  /*!
+   * \brief Get the length of output per row, i.e. the sum of the number of
+   *        output groups over all models in the group
+   * \return length of output per row
+   */
+  inline size_t QueryNumOutput() const {
+    return num_output_;
+  }
+  /*!
+   * \brief Get the position of the output of a model within the output of
+   *        each row
+   * \param index index of the model, in order of loading
+   * \return offset of the model output
+   */
+  inline size_t QueryOutputOffset(size_t index) const {
+    CHECK_LT(index, output_offset_.size());
+    return output_offset_[index];
+  }
+  /*!
+   * \brief Get the width (number of features) of the widest model in the
+   *        group
+   * \return number of features
+   */
+  inline size_t QueryNumFeature() const {
+    return num_feature_;
+  }
+  /*!
+   * \brief Given a batch of data rows, query the necessary size of array to
+   *        hold predictions for all data points.
+   * \param batch a batch of rows
+   * \return length of prediction array
+   */
+  template <typename BatchType>
+  inline size_t QueryResultSize(const BatchType* batch) const {
+    CHECK(!predictors_.empty())
+      << "At least one shared library needs to be loaded first using Load()";
+    return batch->num_row * num_output_;
+  }
+
+ private:
+  std::vector<std::unique_ptr<Predictor>> predictors_;
+  std::vector<size_t> output_offset_;
+  size_t num_output_;
+  size_t num_feature_;
+  int num_worker_thread_;
+  size_t chunk_size_;  // 0 if chunk size is to be chosen automatically
 
   template <typename BatchType>
   size_t PredictBatchBase_(const BatchType* batch, int verbose,
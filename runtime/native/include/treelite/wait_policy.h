@@ -0,0 +1,53 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file wait_policy.h
+ * \brief how idle worker threads wait for work, and statistics on their
+ *        waiting
+ */
+#ifndef TREELITE_WAIT_POLICY_H_
+#define TREELITE_WAIT_POLICY_H_
+
+#include <cstdint>
+
+namespace treelite {
+
+/*! \brief how a worker thread waits for work when it has none */
+enum class WaitPolicy : int {
+  /*! \brief keep spinning: quickest to react, but occupies a core while idle */
+  kSpin = 0,
+  /*!
+   * \brief spin for a while, then sleep until work arrives. The time spent
+   *        spinning follows the recent gaps between arrivals of work: it
+   *        grows while work arrives in quick succession and shrinks while
+   *        the thread is idle, never exceeding a given maximum.
+   */
+  kSpinThenPark = 1,
+  /*! \brief sleep right away: uses no CPU time while idle */
+  kPark = 2
+};
+
+/*! \brief default upper bound on the time spent spinning, in microseconds */
+constexpr uint32_t kDefaultMaxSpinMicroseconds = 1000;
+
+/*! \brief statistics on how worker threads waited for work */
+struct WaitStats {
+  /*! \brief number of times a thread found no work and had to wait */
+  uint64_t num_wait;
+  /*! \brief number of times a thread went to sleep */
+  uint64_t num_park;
+  /*! \brief total time spent spinning, in nanoseconds */
+  uint64_t spin_ns;
+  /*! \brief total time spent asleep, in nanoseconds */
+  uint64_t park_ns;
+  /*!
+   * \brief total wake latency, in nanoseconds: over all waits, the time from
+   *        when work was handed over until the waiting thread picked it up
+   */
+  uint64_t wake_latency_ns;
+  /*! \brief longest wake latency, in nanoseconds */
+  uint64_t max_wake_latency_ns;
+};
+
+}  // namespace treelite
+
+#endif  // TREELITE_WAIT_POLICY_H_
@@ -5,10 +5,13 @@ import ctypes
 import sys
 import os
 import re
+import threading
+import itertools
 import numpy as np
 import scipy.sparse
 from .common.util import c_str, _get_log_callback_func, TreeliteError, \
                           lineno, log_info, _load_ver
+from .common.compat import py_str
 from .libpath import TreeliteLibraryNotFound, find_lib_path
 
 __version__ = _load_ver()
@@ -47,6 +50,84 @@ def _check_call(ret):
   if ret != 0:
     raise TreeliteError(_LIB.TreeliteGetLastError())
 
+# Pending asynchronous predictions, keyed by the argument given to the native
+# callback. Each entry keeps the future along with a closure that holds on to
+# the batch and the output buffer until the prediction is finished.
+_PENDING_ASYNC = {}
+_PENDING_ASYNC_LOCK = threading.Lock()
+_PENDING_ASYNC_ID = itertools.count(1)
+
+def _async_callback(arg, result_size, error_msg):
+  """Deliver the result of an asynchronous prediction to its future"""
+  with _PENDING_ASYNC_LOCK:
+    future, finalize = _PENDING_ASYNC.pop(arg)
+  if error_msg is not None:
+    future.set_exception(TreeliteError(py_str(error_msg)))
+  else:
+    future.set_result(finalize(result_size))
+
+#pylint: disable=invalid-name
+_ASYNC_CALLBACK = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_size_t,
+                                   ctypes.c_char_p)(_async_callback)
+_BATCH_BEGIN_CALLBACK = ctypes.CFUNCTYPE(None, ctypes.c_void_p,
+                                         ctypes.c_size_t)
+_BATCH_END_CALLBACK = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_size_t,
+                                       ctypes.c_double, ctypes.c_char_p)
+
+def _is_readable_in_place(mat):
+  """Whether the native runtime can read a 2D matrix without a copy: its
+  elements must be float32 or float64, aligned and in native byte order, and
+  its strides whole, nonnegative numbers of elements"""
+  return mat.dtype in (np.float32, np.float64) \
+         and mat.dtype.isnative and mat.flags.aligned \
+         and all(s >= 0 and s % mat.itemsize == 0 for s in mat.strides)
+
+def _dense_layout(mat):
+  """Describe a 2D matrix as (dtype, row stride, column stride) for the
+  native runtime, with strides in number of elements"""
+  return (c_str(mat.dtype.name),
+          ctypes.c_size_t(mat.strides[0] // mat.itemsize),
+          ctypes.c_size_t(mat.strides[1] // mat.itemsize))
+
+def _is_binary_model(path):
+  """Whether path is a local file holding a model exported with
+  Model.export_binary()"""
+  if not os.path.isfile(path):
+    return False
+  with open(path, 'rb') as f:
+    return f.read(8) == b'TLBINMDL'
+
+def _resolve_libpath(libpath):
+  """Locate the dynamic shared library given by libpath, which may be either
+  the library itself, the directory containing it, or a binary model"""
+  if os.path.isdir(libpath):  # libpath is a directory
+    # directory is given; locate shared library inside it
+    basename = os.path.basename(libpath.rstrip('/\\'))
+    lib_found = False
+    for ext in ['.so', '.dll', '.dylib']:
+      path = os.path.join(libpath, basename + ext)
+      if os.path.exists(path):
+        lib_found = True
+        break
+    if not lib_found:
+      raise TreeliteError('Directory {} doesn\'t appear '.format(libpath)+\
+                          'to have any dynamic shared library '+\
+                          '(.so/.dll/.dylib).')
+  else:      # libpath is actually the name of shared library file
+    fileext = os.path.splitext(libpath)[1]
+    if fileext == '.dll' or fileext == '.so' or fileext == '.dylib' \
+       or _is_binary_model(libpath):
+      path = libpath
+    else:
+      raise TreeliteError('Specified path {} has wrong '.format(libpath) + \
+                          'file extension ({}); '.format(fileext) +\
+                          'the share library must have one of the '+\
+                          'following extensions: .so / .dll / .dylib, '+\
+                          'or be a model exported with Model.export_binary()')
+  if not re.match(r'^[a-zA-Z]+://', path):
+    path = os.path.abspath(path)
+  return path
+
 class PredictorEntry(ctypes.Union):
   _fields_ = [('missing', ctypes.c_int), ('fvalue', ctypes.c_float)]
 
@@ -55,6 +136,7 @@ class Batch(object):
   def __init__(self):
     self.handle = None
     self.kind = None
+    self.buffer = None  # converted copy of input matrix, if one was needed
 
   def __del__(self):
     if self.handle is not None:
@@ -89,12 +171,10 @@ class Batch(object):
   def from_npy2d(cls, mat, rbegin=0, rend=None, missing=None):
     """
     Get a dense batch from a 2D numpy matrix.
-    If ``mat`` does not have ``order='C'`` (also known as row-major) or is not
-    contiguous, a temporary copy will be made.
-    If ``mat`` does not have ``dtype=numpy.float32``, a temporary copy will be
-    made also.
-    Thus, as many as two temporary copies of data can be made. One should set
-    input layout and type judiciously to conserve memory.
+    If ``mat`` has ``dtype=numpy.float32`` or ``dtype=numpy.float64``, it
+    will be read in place, whether it is row-major (``order='C'``),
+    column-major (``order='F'``), or a strided view into a larger matrix.
+    Otherwise, a temporary copy with ``dtype=numpy.float32`` will be made.
 
     Parameters
     ----------
@@ -107,6 +187,7 @@ class Batch(object):
         the end of the matrix.
     missing : :py:class:`float <python:float>`, optional
         value indicating missing value. If missing, set to ``numpy.nan``.
+        NaN entries are always treated as missing.
 
     Returns
     -------
@@ -127,22 +208,141 @@ class Batch(object):
       raise TreeliteError('rbegin must be nonnegative')
     if rend > num_row:
       raise TreeliteError('rend must be less than number of rows in mat')
-    # flatten the array by rows and ensure it is float32.
-    # we try to avoid data copies if possible
-    # (reshape returns a view when possible and we explicitly tell np.array to
-    #  avoid copying)
-    data_subset = np.array(mat[rbegin:rend, :].reshape((rend - rbegin)*num_col),
-                           copy=False, dtype=np.float32)
+    # the native runtime reads float32 and float64 matrices of any layout in
+    # place, as long as their elements are aligned and the strides are whole,
+    # nonnegative numbers of elements
+    batch = Batch()
+    data_subset = mat[rbegin:rend, :]
+    if not _is_readable_in_place(data_subset):
+      data_subset = np.array(data_subset, dtype=np.float32, order='C')
+      batch.buffer = data_subset
     missing = missing if missing is not None else np.nan
+    dtype, row_stride, col_stride = _dense_layout(data_subset)
+
+    batch.handle = ctypes.c_void_p()
+    batch.kind = 'dense'
+    _check_call(_LIB.TreeliteAssembleDenseBatchEx(
+        ctypes.c_void_p(data_subset.ctypes.data),
+        dtype,
+        ctypes.c_float(missing),
+        ctypes.c_size_t(rend - rbegin),
+        ctypes.c_size_t(num_col),
+        row_stride,
+        col_stride,
+        ctypes.byref(batch.handle)))
+    # save handles for internal arrays
+    batch.data = data_subset
+    # save pointer to mat so that it doesn't get garbage-collected prematurely
+    batch.mat = mat
+    return batch
+
+  def update_from(self, mat):
+    """
+    Refill a dense batch with the rows of another matrix of the same
+    dimensions, so that a batch can be reused for a stream of requests. Like
+    :py:meth:`from_npy2d`, float32 and float64 matrices are read in place;
+    other matrices (of other types, or whose elements are misaligned) are
+    converted into a buffer kept by the batch, which is allocated only once.
+
+    Parameters
+    ----------
+    mat : object of type :py:class:`numpy.ndarray`, with dimension 2
+        data matrix, with the same number of rows and columns as the batch
+    """
+    if self.kind != 'dense':
+      raise TreeliteError('update_from() is only supported for dense batches')
+    if not isinstance(mat, np.ndarray):
+      raise ValueError('mat must be of type numpy.ndarray')
+    if mat.shape != self.shape():
+      raise ValueError('mat must have shape {}'.format(self.shape()))
+    if _is_readable_in_place(mat):
+      data = mat
+    else:
+      if self.buffer is None or self.buffer.shape != mat.shape:
+        self.buffer = np.empty(mat.shape, dtype=np.float32, order='C')
+      np.copyto(self.buffer, mat, casting='unsafe')
+      data = self.buffer
+    dtype, row_stride, col_stride = _dense_layout(data)
+    _check_call(_LIB.TreeliteUpdateDenseBatch(
+        self.handle,
+        ctypes.c_void_p(data.ctypes.data),
+        dtype,
+        row_stride,
+        col_stride))
+    self.data = data
+    self.mat = mat
+
+  @classmethod
+  def from_binned(cls, mat, rbegin=0, rend=None, missing=None):
+    """
+    Get a dense batch from a 2D numpy matrix of pre-binned features, to be
+    used with a library compiled with ``quantize=1``. Such a library then
+    skips converting feature values into bin indices. Given the cut points
+    of a feature (see :py:attr:`Predictor.cut_points`), the bin index of a
+    value ``x`` is the number of cut points less than ``x`` plus the number
+    of cut points less than or equal to ``x``::
+
+      bin = (np.searchsorted(cut_points, x, side='left')
+             + np.searchsorted(cut_points, x, side='right'))
+
+    Features without cut points are given as they are; for categorical
+    features, this is the category. The matrix is read in place, whatever
+    its layout, unless its elements are misaligned.
+
+    Parameters
+    ----------
+    mat : object of type :py:class:`numpy.ndarray`, with dimension 2
+        matrix of bin indices, with ``dtype=numpy.uint8`` or
+        ``dtype=numpy.uint16``
+    rbegin : :py:class:`int <python:int>`, optional
+        the index of the first row in the subset
+    rend : :py:class:`int <python:int>`, optional
+        one past the index of the last row in the subset. If missing, set to
+        the end of the matrix.
+    missing : :py:class:`int <python:int>`, optional
+        bin index indicating missing value. If missing, set to the largest
+        value representable by ``mat.dtype``.
+
+    Returns
+    -------
+    dense_batch : :py:class:`Batch`
+        a dense batch consisting of rows ``[rbegin, rend)``
+    """
+    if not isinstance(mat, np.ndarray):
+      raise ValueError('mat must be of type numpy.ndarray')
+    if len(mat.shape) != 2:
+      raise ValueError('Input numpy.ndarray must be two-dimensional')
+    if mat.dtype not in (np.uint8, np.uint16):
+      raise ValueError('mat must have dtype numpy.uint8 or numpy.uint16')
+    num_row = mat.shape[0]
+    num_col = mat.shape[1]
+    rbegin = rbegin if rbegin is not None else 0
+    rend = rend if rend is not None else num_row
+    if rbegin >= rend:
+      raise TreeliteError('rbegin must be less than rend')
+    if rbegin < 0:
+      raise TreeliteError('rbegin must be nonnegative')
+    if rend > num_row:
+      raise TreeliteError('rend must be less than number of rows in mat')
+    data_subset = mat[rbegin:rend, :]
+    if not data_subset.flags.aligned \
+       or any(s < 0 or s % data_subset.itemsize != 0
+              for s in data_subset.strides):
+      data_subset = np.array(data_subset, order='C')
+    missing = missing if missing is not None else np.iinfo(mat.dtype).max
+    dtype, row_stride, col_stride = _dense_layout(data_subset)
 
     batch = Batch()
     batch.handle = ctypes.c_void_p()
     batch.kind = 'dense'
-    _check_call(_LIB.TreeliteAssembleDenseBatch(
-        data_subset.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+    _check_call(_LIB.TreeliteAssembleBinnedBatch(
+        ctypes.c_void_p(data_subset.ctypes.data),
+        dtype,
         ctypes.c_float(missing),
         ctypes.c_size_t(rend - rbegin),
         ctypes.c_size_t(num_col),
+        row_stride,
+        col_stride,
         ctypes.byref(batch.handle)))
     # save handles for internal arrays
     batch.data = data_subset
@@ -227,45 +427,264 @@ class Predictor(object):
   Parameters
   ----------
   libpath: :py:class:`str <python:str>`
-      location of dynamic shared library (.dll/.so/.dylib)
+      location of dynamic shared library (.dll/.so/.dylib). A model exported
+      with :py:meth:`treelite.Model.export_binary` may be given instead, in
+      which case its trees are evaluated by an interpreter, with no need to
+      compile the model.
   nthread: :py:class:`int <python:int>`, optional
       number of worker threads to use; if unspecified, use maximum number of
       hardware threads
   verbose : :py:class:`bool <python:bool>`, optional
       Whether to print extra messages during construction
+  chunk_size : :py:class:`int <python:int>`, optional
+      number of rows that a worker thread claims at a time when making
+      predictions on a batch; if unspecified or 0, a chunk size will be
+      chosen based on the batch size and the number of threads
+  shared_pool : :py:class:`bool <python:bool>`, optional
+      Whether to run prediction on the thread pool shared by all predictors in
+      the process. If set, :py:meth:`predict` may be called from multiple
+      threads at once, and ``nthread`` only limits the number of threads used
+      for each batch.
+  numa : :py:class:`bool <python:bool>`, optional
+      Whether to lay out work by NUMA node: worker threads are grouped by
+      node, each node scores a contiguous range of rows, and each node runs
+      its own copy of the compiled model. Cannot be combined with
+      ``shared_pool``.
+  wait_policy : :py:class:`str <python:str>`, optional
+      How worker threads wait between batches; see :py:meth:`set_wait_policy`.
+      If unspecified, ``'spin_then_park'`` is used.
   """
   # pylint: disable=R0903
 
-  def __init__(self, libpath, nthread=None, verbose=False):
-    if os.path.isdir(libpath):  # libpath is a directory
-      # directory is given; locate shared library inside it
-      basename = os.path.basename(libpath.rstrip('/\\'))
-      lib_found = False
-      for ext in ['.so', '.dll', '.dylib']:
-        path = os.path.join(libpath, basename + ext)
-        if os.path.exists(path):
-          lib_found = True
-          break
-      if not lib_found:
-        raise TreeliteError('Directory {} doesn\'t appear '.format(libpath)+\
-                            'to have any dynamic shared library '+\
-                            '(.so/.dll/.dylib).')
-    else:      # libpath is actually the name of shared library file
-      fileext = os.path.splitext(libpath)[1]
-      if fileext == '.dll' or fileext == '.so' or fileext == '.dylib':
-        path = libpath
-      else:
-        raise TreeliteError('Specified path {} has wrong '.format(libpath) + \
-                            'file extension ({}); '.format(fileext) +\
-                            'the share library must have one of the '+\
-                            'following extensions: .so / .dll / .dylib')
+  def __init__(self, libpath, nthread=None, verbose=False, chunk_size=None,
+               shared_pool=False, numa=False, wait_policy=None):
+    if shared_pool and numa:
+      raise TreeliteError('numa cannot be combined with shared_pool')
+    path = _resolve_libpath(libpath)
     self.handle = ctypes.c_void_p()
-    if not re.match(r'^[a-zA-Z]+://', path):
-      path = os.path.abspath(path)
-    _check_call(_LIB.TreelitePredictorLoad(
+    if shared_pool:
+      load_func = _LIB.TreelitePredictorLoadWithSharedPool
+    elif numa:
+      load_func = _LIB.TreelitePredictorLoadNumaAware
+    else:
+      load_func = _LIB.TreelitePredictorLoad
+    _check_call(load_func(
         c_str(path),
         ctypes.c_int(nthread if nthread is not None else -1),
         ctypes.byref(self.handle)))
+    if chunk_size is not None:
+      if chunk_size < 0:
+        raise TreeliteError('chunk_size must be non-negative')
+      _check_call(_LIB.TreelitePredictorSetChunkSize(
+          self.handle, ctypes.c_size_t(chunk_size)))
+    if wait_policy is not None:
+      self.set_wait_policy(wait_policy)
+    # save # of threads and the cores they are bound to
+    num_thread = ctypes.c_int()
+    _check_call(_LIB.TreelitePredictorQueryNumThread(
+        self.handle,
+        ctypes.byref(num_thread)))
+    self.nthread_ = num_thread.value
+    cores = ctypes.POINTER(ctypes.c_int)()
+    num_core = ctypes.c_size_t()
+    _check_call(_LIB.TreelitePredictorQueryThreadAffinity(
+        self.handle,
+        ctypes.byref(cores),
+        ctypes.byref(num_core)))
+    self.thread_affinity_ = [cores[i] for i in range(num_core.value)]
+    self._query_model_info()
+
+    if verbose:
+      log_info(__file__, lineno(),
+               'Dynamic shared library {} has been '.format(path)+\
+               'successfully loaded into memory')
+
+  def reload(self, libpath, verbose=False):
+    """
+    Replace the loaded model with the one in another compiled library, without
+    interrupting service. Predictions that start after this method returns use
+    the new library, while predictions already in progress (from other threads,
+    or submitted with :py:meth:`predict_async`) finish with the old one. The
+    old library is unloaded once they are done. Worker threads are kept.
+
+    Parameters
+    ----------
+    libpath: :py:class:`str <python:str>`
+        location of dynamic shared library (.dll/.so/.dylib), or of a model
+        exported with :py:meth:`treelite.Model.export_binary`
+    verbose : :py:class:`bool <python:bool>`, optional
+        Whether to print extra messages
+    """
+    path = _resolve_libpath(libpath)
+    _check_call(_LIB.TreelitePredictorReload(self.handle, c_str(path)))
+    self._query_model_info()
+    if verbose:
+      log_info(__file__, lineno(),
+               'Dynamic shared library {} has been '.format(path)+\
+               'successfully reloaded into memory')
+
+  def set_parallel_threshold(self, threshold):
+    """
+    Set the minimum number of rows that each thread must get for a batch to be
+    spread over threads. Smaller batches are scored on the calling thread
+    alone, and larger ones get one thread per ``threshold`` rows, up to
+    :py:attr:`nthread`. By default, the threshold is chosen automatically
+    from the measured cost of handing a batch out to worker threads and of
+    scoring a row, and follows these costs over recent batches. May be called
+    at any time.
+
+    Parameters
+    ----------
+    threshold : :py:class:`int <python:int>`
+        minimum number of rows per thread; 0 to choose automatically
+    """
+    if threshold < 0:
+      raise TreeliteError('threshold must be non-negative')
+    _check_call(_LIB.TreelitePredictorSetParallelThreshold(
+        self.handle, ctypes.c_size_t(threshold)))
+
+  def set_wait_policy(self, policy, max_spin_us=None):
+    """
+    Set how worker threads wait when they have nothing to do. Spinning reacts
+    to a new batch the quickest but keeps CPU cores busy while the predictor
+    is idle, whereas sleeping (parking) frees the cores at the cost of waking
+    threads up. May be called at any time. With ``shared_pool``, this sets
+    how the threads of the shared pool wait, and hence affects every
+    predictor in the process that uses it.
+
+    Parameters
+    ----------
+    policy : :py:class:`str <python:str>`
+        One of ``'spin'`` (keep spinning; for latency-critical predictors),
+        ``'spin_then_park'`` (spin for a time that follows the recent gaps
+        between batches, then sleep) and ``'park'`` (sleep right away; for
+        background predictors)
+    max_spin_us : :py:class:`int <python:int>`, optional
+        upper bound on the time spent spinning under ``'spin_then_park'``, in
+        microseconds. If unspecified, the default of the runtime is used.
+    """
+    if policy not in ['spin', 'spin_then_park', 'park']:
+      raise ValueError('policy must be one of spin, spin_then_park, park')
+    if max_spin_us is None:
+      default_max_spin = ctypes.c_uint()
+      _check_call(_LIB.TreeliteQueryDefaultMaxSpin(
+          ctypes.byref(default_max_spin)))
+      max_spin_us = default_max_spin.value
+    _check_call(_LIB.TreelitePredictorSetWaitPolicy(
+        self.handle, c_str(policy), ctypes.c_uint(max_spin_us)))
+
+  @property
+  def wait_stats(self):
+    """
+    Query statistics on how worker threads waited for batches, summed over
+    worker threads. Times are in seconds.
+
+    Returns
+    -------
+    stats : :py:class:`dict <python:dict>`
+        ``num_wait`` (number of times a thread had to wait), ``num_park``
+        (number of times a thread slept), ``spin_time`` and ``park_time``
+        (total time spent spinning and asleep, i.e. CPU time burnt while
+        idle and time given up), ``wake_latency`` (mean time between a batch
+        being handed over and a waiting thread picking it up) and
+        ``max_wake_latency``
+    """
+    fields = [ctypes.c_uint64() for _ in range(6)]
+    _check_call(_LIB.TreelitePredictorQueryWaitStats(
+        self.handle, *[ctypes.byref(x) for x in fields]))
+    num_wait, num_park, spin_ns, park_ns, wake_latency_ns, \
+      max_wake_latency_ns = [x.value for x in fields]
+    return {'num_wait': num_wait,
+            'num_park': num_park,
+            'spin_time': spin_ns * 1e-9,
+            'park_time': park_ns * 1e-9,
+            'wake_latency': (wake_latency_ns * 1e-9 / num_wait
+                             if num_wait > 0 else 0.0),
+            'max_wake_latency': max_wake_latency_ns * 1e-9}
+
+  def stats(self):
+    """
+    Query the performance counters of the predictor, accumulated since the
+    library was loaded or since :py:meth:`reset_stats` was last called. The
+    counters are always on, and may be queried while predictions are being
+    made. Times are in seconds; times spent by threads are summed over
+    threads.
+
+    Returns
+    -------
+    stats : :py:class:`dict <python:dict>`
+        ``num_batch`` (number of batches scored), ``num_row`` (number of rows
+        scored in batches), ``num_inst`` (number of single rows scored),
+        ``batch_time`` (total time from start to end of each batch),
+        ``assemble_time`` (time spent converting rows into the layout taken
+        by the compiled model), ``eval_time`` (time spent evaluating trees),
+        ``wait_time`` (time the calling thread spent waiting for worker
+        threads), ``latency_histogram`` (list whose k-th element counts the
+        batches that took between 2^k and 2^(k+1) microseconds, with the
+        first and last elements also counting faster and slower batches) and
+        ``thread_busy_time`` (list of time each thread spent scoring rows,
+        calling thread first; empty with ``shared_pool``)
+    """
+    fields = [ctypes.c_uint64() for _ in range(7)]
+    _check_call(_LIB.TreelitePredictorQueryStats(
+        self.handle, *[ctypes.byref(x) for x in fields]))
+    num_batch, num_row, num_inst, batch_ns, assemble_ns, eval_ns, wait_ns \
+      = [x.value for x in fields]
+    def _query_list(query_func):
+      length = ctypes.c_size_t()
+      _check_call(query_func(self.handle, None, ctypes.byref(length)))
+      values = (ctypes.c_uint64 * length.value)()
+      _check_call(query_func(self.handle, values, ctypes.byref(length)))
+      return list(values)
+    return {'num_batch': num_batch,
+            'num_row': num_row,
+            'num_inst': num_inst,
+            'batch_time': batch_ns * 1e-9,
+            'assemble_time': assemble_ns * 1e-9,
+            'eval_time': eval_ns * 1e-9,
+            'wait_time': wait_ns * 1e-9,
+            'latency_histogram':
+              _query_list(_LIB.TreelitePredictorQueryLatencyHistogram),
+            'thread_busy_time':
+              [x * 1e-9 for x in
+               _query_list(_LIB.TreelitePredictorQueryThreadBusyTime)]}
+
+  def reset_stats(self):
+    """Reset the performance counters of the predictor to zero"""
+    _check_call(_LIB.TreelitePredictorResetStats(self.handle))
+
+  def set_batch_callbacks(self, begin=None, end=None):
+    """
+    Set functions to be called at the start and at the end of every batch,
+    e.g. to feed a tracing system. The functions are called from the thread
+    that runs the batch, and must not raise. Must not be called while
+    predictions are being made.
+
+    Parameters
+    ----------
+    begin : callable, optional
+        function called with the number of rows at the start of a batch
+    end : callable, optional
+        function called at the end of a batch with the number of rows, the
+        time taken in seconds, and an error message if prediction failed
+        (``None`` otherwise)
+    """
+    # keep the native callbacks alive as long as the predictor may call them
+    self.batch_callbacks_ = (
+        _BATCH_BEGIN_CALLBACK(lambda _, num_row: begin(num_row))
+        if begin is not None else _BATCH_BEGIN_CALLBACK(),
+        _BATCH_END_CALLBACK(
+            lambda _, num_row, elapsed, error_msg: end(
+                num_row, elapsed,
+                py_str(error_msg) if error_msg is not None else None))
+        if end is not None else _BATCH_END_CALLBACK())
+    _check_call(_LIB.TreelitePredictorSetBatchCallbacks(
+        self.handle, self.batch_callbacks_[0], self.batch_callbacks_[1],
+        None))
+
+  def _query_model_info(self):
+    """Save information about the model currently loaded"""
+    self.cut_points_ = None  # queried when first needed
     # save # of features
     num_feature = ctypes.c_size_t()
     _check_call(_LIB.TreelitePredictorQueryNumFeature(
@@ -297,11 +716,6 @@ class Predictor(object):
         ctypes.byref(global_bias)))
     self.global_bias_ = global_bias.value
 
-    if verbose:
-      log_info(__file__, lineno(),
-               'Dynamic shared library {} has been '.format(path)+\
-               'successfully loaded into memory')
-
   def predict_instance(self, inst, missing=None, pred_margin=False):
     """
     Perform single-instance prediction. Prediction is run by the calling thread.
@@ -319,8 +733,9 @@ class Predictor(object):
         feature values.
     missing : :py:class:`float <python:float>`, optional
         Value in the data instance that represents a missing value. If set to
-        ``None``, ``numpy.nan`` will be used. Only applicable if ``inst`` is
-        of type :py:class:`numpy.ndarray`.
+        ``None``, ``numpy.nan`` will be used. NaN entries are always treated
+        as missing. Only applicable if ``inst`` is of type
+        :py:class:`numpy.ndarray`.
     pred_margin: :py:class:`bool <python:bool>`, optional
         Whether to produce raw margins rather than transformed probabilities
     """
@@ -350,7 +765,7 @@ class Predictor(object):
             entry[i].fvalue = inst[i]
       else:
         for i in range(inst.shape[0]):
-          if inst[i] != missing:
+          if not np.isnan(inst[i]) and inst[i] != missing:
             entry[i].fvalue = inst[i]
     elif isinstance(inst, dict):
       for k, v in inst.items():
@@ -376,11 +791,12 @@ class Predictor(object):
       res = res.reshape((-1, self.num_output_group_))
     return res
 
-  def predict(self, batch, verbose=False, pred_margin=False):
+  def predict(self, batch, verbose=False, pred_margin=False, out=None):
     """
     Perform batch prediction with a 2D sparse data matrix. Worker threads will
     internally divide up work for batch prediction. **Note that this function
-    may be called by only one thread at a time.** In order to use multiple
+    may be called by only one thread at a time, unless the predictor was
+    created with** ``shared_pool=True``. Otherwise, in order to use multiple
     threads to process multiple prediction requests simultaneously, use
     :py:meth:`predict_instance` instead.
 
@@ -392,7 +808,102 @@ class Predictor(object):
         Whether to print extra messages during prediction
     pred_margin: :py:class:`bool <python:bool>`, optional
         whether to produce raw margins rather than transformed probabilities
+    out: :py:class:`numpy.ndarray`, optional
+        C-contiguous float32 array in which to store the predictions, with at
+        least (number of rows) * :py:attr:`num_output_group` elements. If
+        given, the result is returned as a view into ``out``, and no memory is
+        allocated for it.
+    """
+    out_result = self._alloc_result(batch, out)
+    out_result_size = ctypes.c_size_t()
+    _check_call(_LIB.TreelitePredictorPredictBatch(
+        self.handle,
+        batch.handle,
+        ctypes.c_int(1 if batch.kind == 'sparse' else 0),
+        ctypes.c_int(1 if verbose else 0),
+        ctypes.c_int(1 if pred_margin else 0),
+        out_result.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+        ctypes.byref(out_result_size)))
+    return self._reshape_result(batch, out_result, out_result_size.value)
+
+  def predict_async(self, batch, verbose=False, pred_margin=False):
+    """
+    Perform batch prediction asynchronously. The batch is scored by the
+    thread pool shared by all predictors in the process, and the calling
+    thread is not blocked. The predictor must have been created with
+    ``shared_pool=True``.
+
+    Parameters
+    ----------
+    batch: object of type :py:class:`Batch`
+        batch of rows for which predictions will be made
+    verbose : :py:class:`bool <python:bool>`, optional
+        Whether to print extra messages during prediction
+    pred_margin: :py:class:`bool <python:bool>`, optional
+        whether to produce raw margins rather than transformed probabilities
+
+    Returns
+    -------
+    future : :py:class:`concurrent.futures.Future`
+        future that will hold the same result as :py:meth:`predict` would
+        return
     """
+    from concurrent.futures import Future
+    out_result = self._alloc_result(batch)
+    future = Future()
+    future.set_running_or_notify_cancel()
+    def finalize(result_size):
+      return self._reshape_result(batch, out_result, result_size)
+    with _PENDING_ASYNC_LOCK:
+      async_id = next(_PENDING_ASYNC_ID)
+      _PENDING_ASYNC[async_id] = (future, finalize)
+    try:
+      _check_call(_LIB.TreelitePredictorPredictBatchAsync(
+          self.handle,
+          batch.handle,
+          ctypes.c_int(1 if batch.kind == 'sparse' else 0),
+          ctypes.c_int(1 if verbose else 0),
+          ctypes.c_int(1 if pred_margin else 0),
+          out_result.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+          _ASYNC_CALLBACK,
+          ctypes.c_void_p(async_id)))
+    except TreeliteError:
+      with _PENDING_ASYNC_LOCK:
+        del _PENDING_ASYNC[async_id]
+      raise
+    return future
+
+  def predict_asyncio(self, batch, verbose=False, pred_margin=False,
+                      loop=None):
+    """
+    Perform batch prediction asynchronously, returning an :py:mod:`asyncio`
+    future that can be awaited. See :py:meth:`predict_async`.
+
+    Parameters
+    ----------
+    batch: object of type :py:class:`Batch`
+        batch of rows for which predictions will be made
+    verbose : :py:class:`bool <python:bool>`, optional
+        Whether to print extra messages during prediction
+    pred_margin: :py:class:`bool <python:bool>`, optional
+        whether to produce raw margins rather than transformed probabilities
+    loop : :py:class:`asyncio.AbstractEventLoop`, optional
+        event loop to which the future is attached; if unspecified, the
+        current event loop is used
+
+    Returns
+    -------
+    future : :py:class:`asyncio.Future`
+        awaitable future holding the prediction result
+    """
+    import asyncio
+    return asyncio.wrap_future(
+        self.predict_async(batch, verbose=verbose, pred_margin=pred_margin),
+        loop=loop)
+
+  def _alloc_result(self, batch, out=None):
+    """Allocate an output buffer large enough to hold predictions for batch,
+    or check that the user-supplied buffer out is suitable"""
     if not isinstance(batch, Batch):
       raise TreeliteError('batch must be of type Batch')
     if batch.handle is None or batch.kind is None:
@@ -403,17 +914,19 @@ class Predictor(object):
         batch.handle,
         ctypes.c_int(1 if batch.kind == 'sparse' else 0),
         ctypes.byref(result_size)))
-    out_result = np.zeros(result_size.value, dtype=np.float32, order='C')
-    out_result_size = ctypes.c_size_t()
-    _check_call(_LIB.TreelitePredictorPredictBatch(
-        self.handle,
-        batch.handle,
-        ctypes.c_int(1 if batch.kind == 'sparse' else 0),
-        ctypes.c_int(1 if verbose else 0),
-        ctypes.c_int(1 if pred_margin else 0),
-        out_result.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
-        ctypes.byref(out_result_size)))
-    idx = int(out_result_size.value)
+    if out is None:
+      return np.zeros(result_size.value, dtype=np.float32, order='C')
+    if not isinstance(out, np.ndarray) or out.dtype != np.float32 \
+       or not out.flags.c_contiguous:
+      raise ValueError('out must be a C-contiguous numpy.ndarray of float32')
+    if out.size < result_size.value:
+      raise ValueError('out must have at least {} elements'
+                       .format(result_size.value))
+    return out.reshape(-1)
+
+  def _reshape_result(self, batch, out_result, out_result_size):
+    """Shape the first out_result_size elements of out_result by rows"""
+    idx = int(out_result_size)
     res = out_result[0:idx].reshape((batch.shape()[0], -1)).squeeze()
     if self.num_output_group_ > 1 and batch.shape()[0] != idx:
       res = res.reshape((-1, self.num_output_group_))
@@ -424,6 +937,41 @@ class Predictor(object):
       _check_call(_LIB.TreelitePredictorFree(self.handle))
       self.handle = None
 
+  @property
+  def nthread(self):
+    """
+    Query number of threads used to make predictions on a batch. Unless given
+    explicitly, this is the number of CPU cores that the process may run on,
+    limited further by the CPU quota of its cgroup (e.g. a container's CPU
+    limit).
+    """
+    return self.nthread_
+
+  @property
+  def thread_affinity(self):
+    """
+    Query the CPU cores that threads were bound to: the thread that created
+    the predictor first, followed by the worker threads. Only cores that the
+    process may run on are used. Empty if threads were not bound, either
+    because ``shared_pool`` was set or because the environment variable
+    ``TREELITE_BIND_THREADS`` was set to 0.
+    """
+    return self.thread_affinity_
+
+  @property
+  def parallel_threshold(self):
+    """
+    Query the minimum number of rows that each thread gets for a batch to be
+    spread over threads; see :py:meth:`set_parallel_threshold`. Batches of
+    fewer rows are scored on the calling thread. This is 0 if the threshold is
+    chosen automatically and no batch has been scored yet to measure the
+    costs it is based on.
+    """
+    threshold = ctypes.c_size_t()
+    _check_call(_LIB.TreelitePredictorQueryParallelThreshold(
+        self.handle, ctypes.byref(threshold)))
+    return threshold.value
+
   @property
   def num_feature(self):
     """Query number of features used in the model"""
@@ -449,4 +997,234 @@ class Predictor(object):
     """Query sigmoid alpha of the model"""
     return self.sigmoid_alpha_
 
-__all__ = ['Predictor', 'Batch', '__version__']
+  @property
+  def cut_points(self):
+    """
+    Query the cut points at which each feature is divided into bins, for
+    libraries compiled with ``quantize=1``. This is a list of length
+    :py:attr:`num_feature`, holding an ascending array of cut points for each
+    feature (empty if the feature is not binned). See
+    :py:meth:`Batch.from_binned`.
+    """
+    if self.cut_points_ is None:
+      cut_points = []
+      for fid in range(self.num_feature_):
+        out = ctypes.POINTER(ctypes.c_double)()
+        out_len = ctypes.c_size_t()
+        _check_call(_LIB.TreelitePredictorQueryCutPoints(
+            self.handle, ctypes.c_uint(fid), ctypes.byref(out),
+            ctypes.byref(out_len)))
+        if out_len.value > 0:
+          cut_points.append(np.ctypeslib.as_array(out, (out_len.value,)).copy())
+        else:
+          cut_points.append(np.empty(0, dtype=np.float64))
+      self.cut_points_ = cut_points
+    return self.cut_points_
+
+class SingleRowPredictor(object):
+  """
+  Helper for scoring one data row at a time with minimal overhead. It keeps
+  a row of entries in native memory along with an output buffer, so that
+  each call only fills in the given feature values and runs the prediction
+  function. Use one object per thread.
+
+  Parameters
+  ----------
+  predictor: object of type :py:class:`Predictor`
+      predictor whose model will be used
+  """
+  def __init__(self, predictor):
+    self.handle = None
+    handle = ctypes.c_void_p()
+    _check_call(_LIB.TreeliteSingleRowPredictorCreate(
+        predictor.handle, ctypes.byref(handle)))
+    self.handle = handle
+    # keep the predictor alive for as long as this object
+    self.predictor = predictor
+    self.out_result = np.zeros(predictor.num_output_group, dtype=np.float32)
+    self.out_result_ptr \
+      = self.out_result.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+    self.out_result_size = ctypes.c_size_t()
+
+  def predict(self, inst, missing=None, pred_margin=False):
+    """
+    Make prediction on a single data row. Prediction is run by the calling
+    thread. **The returned array is overwritten by the next call**; copy it
+    if it needs to be kept.
+
+    Parameters
+    ----------
+    inst: :py:class:`numpy.ndarray` / :py:class:`tuple <python:tuple>`
+        Data row for which a prediction will be made. Either a
+        one-dimensional array of feature values (read in place if it is a
+        contiguous float32 array), or a pair ``(indices, values)`` giving the
+        feature indices (0-based) and values of the present features.
+    missing : :py:class:`float <python:float>`, optional
+        Value in the data row that represents a missing value. If set to
+        ``None``, ``numpy.nan`` will be used. NaN entries are always treated
+        as missing. Only applicable if ``inst`` is of type
+        :py:class:`numpy.ndarray`.
+    pred_margin: :py:class:`bool <python:bool>`, optional
+        Whether to produce raw margins rather than transformed probabilities
+    """
+    if isinstance(inst, tuple):
+      indices, values = inst
+      indices = np.ascontiguousarray(indices, dtype=np.uint32)
+      values = np.ascontiguousarray(values, dtype=np.float32)
+      if indices.shape != values.shape or len(indices.shape) != 1:
+        raise ValueError('indices and values must be 1D and of same length')
+      _check_call(_LIB.TreeliteSingleRowPredictorPredictSparse(
+          self.handle,
+          indices.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32)),
+          values.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+          ctypes.c_size_t(indices.shape[0]),
+          ctypes.c_int(1 if pred_margin else 0),
+          self.out_result_ptr,
+          ctypes.byref(self.out_result_size)))
+    elif isinstance(inst, np.ndarray):
+      if len(inst.shape) != 1:
+        raise ValueError('inst must be 1D')
+      inst = np.ascontiguousarray(inst, dtype=np.float32)
+      _check_call(_LIB.TreeliteSingleRowPredictorPredictDense(
+          self.handle,
+          inst.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+          ctypes.c_size_t(inst.shape[0]),
+          ctypes.c_float(missing if missing is not None else np.nan),
+          ctypes.c_int(1 if pred_margin else 0),
+          self.out_result_ptr,
+          ctypes.byref(self.out_result_size)))
+    else:
+      raise TypeError('inst must be NumPy array or a tuple (indices, values)')
+    idx = int(self.out_result_size.value)
+    res = self.out_result[0:idx].reshape((1, -1)).squeeze()
+    if idx > 1:
+      res = res.reshape((-1, self.predictor.num_output_group))
+    return res
+
+  def __del__(self):
+    if self.handle is not None:
+      _check_call(_LIB.TreeliteSingleRowPredictorFree(self.handle))
+      self.handle = None
+
+class PredictorGroup(object):
+  """
+  Group of compiled models that make predictions on the same batches. Each
+  row of a batch is read only once and then scored by every model in the
+  group, which is cheaper than calling :py:meth:`Predictor.predict` once per
+  model. The group runs on the thread pool shared by all predictors in the
+  process, so :py:meth:`predict` may be called from multiple threads at once.
+
+  Parameters
+  ----------
+  libpaths: :py:class:`list <python:list>` of :py:class:`str <python:str>`
+      locations of dynamic shared libraries (.dll/.so/.dylib), one per model
+  nthread: :py:class:`int <python:int>`, optional
+      number of threads to use for each batch; if unspecified, use maximum
+      number of hardware threads
+  verbose : :py:class:`bool <python:bool>`, optional
+      Whether to print extra messages during construction
+  chunk_size : :py:class:`int <python:int>`, optional
+      number of rows that a thread claims at a time when making predictions
+      on a batch; if unspecified or 0, a chunk size will be chosen based on
+      the batch size and the number of threads
+  """
+  def __init__(self, libpaths, nthread=None, verbose=False, chunk_size=None):
+    if not libpaths:
+      raise TreeliteError('libpaths must contain at least one library')
+    paths = [_resolve_libpath(libpath) for libpath in libpaths]
+    self.handle = None
+    handle = ctypes.c_void_p()
+    _check_call(_LIB.TreelitePredictorGroupCreate(
+        ctypes.c_int(nthread if nthread is not None else -1),
+        ctypes.byref(handle)))
+    self.handle = handle
+    for path in paths:
+      _check_call(_LIB.TreelitePredictorGroupLoad(self.handle, c_str(path)))
+      if verbose:
+        log_info(__file__, lineno(),
+                 'Dynamic shared library {} has been '.format(path)+\
+                 'successfully loaded into memory')
+    if chunk_size is not None:
+      if chunk_size < 0:
+        raise TreeliteError('chunk_size must be non-negative')
+      _check_call(_LIB.TreelitePredictorGroupSetChunkSize(
+          self.handle, ctypes.c_size_t(chunk_size)))
+    num_output = ctypes.c_size_t()
+    _check_call(_LIB.TreelitePredictorGroupQueryNumOutput(
+        self.handle, ctypes.byref(num_output)))
+    self.num_output_ = num_output.value
+    self.output_offset_ = []
+    for i in range(len(paths)):
+      offset = ctypes.c_size_t()
+      _check_call(_LIB.TreelitePredictorGroupQueryOutputOffset(
+          self.handle, ctypes.c_size_t(i), ctypes.byref(offset)))
+      self.output_offset_.append(offset.value)
+
+  def predict(self, batch, verbose=False, pred_margin=False, out=None):
+    """
+    Perform batch prediction with every model in the group.
+
+    Parameters
+    ----------
+    batch: object of type :py:class:`Batch`
+        batch of rows for which predictions will be made
+    verbose : :py:class:`bool <python:bool>`, optional
+        Whether to print extra messages during prediction
+    pred_margin: :py:class:`bool <python:bool>`, optional
+        whether to produce raw margins rather than transformed probabilities
+    out: :py:class:`numpy.ndarray`, optional
+        C-contiguous float32 array in which to store the predictions, with at
+        least (number of rows) * :py:attr:`num_output` elements
+
+    Returns
+    -------
+    result : :py:class:`numpy.ndarray`
+        array of shape (number of rows, :py:attr:`num_output`). The output of
+        the i-th model occupies the columns starting at
+        ``output_offset[i]``; if a model outputs fewer values than it has
+        output groups (e.g. a class index), the rest of its columns hold NaN.
+    """
+    if not isinstance(batch, Batch):
+      raise TreeliteError('batch must be of type Batch')
+    if batch.handle is None or batch.kind is None:
+      raise TreeliteError('batch cannot be empty')
+    result_size = batch.shape()[0] * self.num_output_
+    if out is None:
+      out_result = np.zeros(result_size, dtype=np.float32, order='C')
+    else:
+      if not isinstance(out, np.ndarray) or out.dtype != np.float32 \
+         or not out.flags.c_contiguous:
+        raise ValueError('out must be a C-contiguous numpy.ndarray of float32')
+      if out.size < result_size:
+        raise ValueError('out must have at least {} elements'
+                         .format(result_size))
+      out_result = out.reshape(-1)
+    out_result_size = ctypes.c_size_t()
+    _check_call(_LIB.TreelitePredictorGroupPredictBatch(
+        self.handle,
+        batch.handle,
+        ctypes.c_int(1 if batch.kind == 'sparse' else 0),
+        ctypes.c_int(1 if verbose else 0),
+        ctypes.c_int(1 if pred_margin else 0),
+        out_result.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
+        ctypes.byref(out_result_size)))
+    return out_result[0:out_result_size.value].reshape((-1, self.num_output_))
+
+  def __del__(self):
+    if self.handle is not None:
+      _check_call(_LIB.TreelitePredictorGroupFree(self.handle))
+      self.handle = None
+
+  @property
+  def num_output(self):
+    """Query length of output per row, summed over all models"""
+    return self.num_output_
+
+  @property
+  def output_offset(self):
+    """Query position of the output of each model within the output of a
+    row"""
+    return list(self.output_offset_)
+
+__all__ = ['Predictor', 'SingleRowPredictor', 'PredictorGroup', 'Batch',
+           '__version__']
@@ -7,8 +7,11 @@
 
 #include <treelite/predictor.h>
 #include <treelite/c_api_runtime.h>
+#include <algorithm>
 #include <string>
 #include <cstring>
+#include <memory>
+#include <vector>
 #include "./c_api_error.h"
 
 using namespace treelite;
@@ -44,10 +47,92 @@ int TreeliteAssembleDenseBatch(const float* data, float missing_value,
   batch->missing_value = missing_value;
   batch->num_row = num_row;
   batch->num_col = num_col;
+  batch->data_f64 = nullptr;
+  batch->row_stride = num_col;
+  batch->col_stride = 1;
+  batch->bin_u8 = nullptr;
+  batch->bin_u16 = nullptr;
   *out = static_cast<DenseBatchHandle>(batch);
   API_END();
 }
 
+int TreeliteAssembleDenseBatchEx(const void* data, const char* dtype,
+                                 float missing_value,
+                                 size_t num_row, size_t num_col,
+                                 size_t row_stride, size_t col_stride,
+                                 DenseBatchHandle* out) {
+  API_BEGIN();
+  const std::string dtype_(dtype);
+  CHECK(dtype_ == "float32" || dtype_ == "float64")
+    << "dtype must be either float32 or float64";
+  std::unique_ptr<DenseBatch> batch(new DenseBatch());
+  if (dtype_ == "float32") {
+    batch->data = static_cast<const float*>(data);
+    batch->data_f64 = nullptr;
+  } else {
+    batch->data = nullptr;
+    batch->data_f64 = static_cast<const double*>(data);
+  }
+  batch->missing_value = missing_value;
+  batch->num_row = num_row;
+  batch->num_col = num_col;
+  batch->row_stride = row_stride;
+  batch->col_stride = col_stride;
+  batch->bin_u8 = nullptr;
+  batch->bin_u16 = nullptr;
+  *out = static_cast<DenseBatchHandle>(batch.release());
+  API_END();
+}
+
+int TreeliteAssembleBinnedBatch(const void* data, const char* dtype,
+                                float missing_value,
+                                size_t num_row, size_t num_col,
+                                size_t row_stride, size_t col_stride,
+                                DenseBatchHandle* out) {
+  API_BEGIN();
+  const std::string dtype_(dtype);
+  CHECK(dtype_ == "uint8" || dtype_ == "uint16")
+    << "dtype must be either uint8 or uint16";
+  std::unique_ptr<DenseBatch> batch(new DenseBatch());
+  batch->data = nullptr;
+  batch->data_f64 = nullptr;
+  if (dtype_ == "uint8") {
+    batch->bin_u8 = static_cast<const uint8_t*>(data);
+    batch->bin_u16 = nullptr;
+  } else {
+    batch->bin_u8 = nullptr;
+    batch->bin_u16 = static_cast<const uint16_t*>(data);
+  }
+  batch->missing_value = missing_value;
+  batch->num_row = num_row;
+  batch->num_col = num_col;
+  batch->row_stride = row_stride;
+  batch->col_stride = col_stride;
+  *out = static_cast<DenseBatchHandle>(batch.release());
+  API_END();
+}
+
+int TreeliteUpdateDenseBatch(DenseBatchHandle handle, const void* data,
+                             const char* dtype,
+                             size_t row_stride, size_t col_stride) {
+  API_BEGIN();
+  DenseBatch* batch = static_cast<DenseBatch*>(handle);
+  CHECK(batch->bin_u8 == nullptr && batch->bin_u16 == nullptr)
+    << "Pre-binned batches cannot be updated";
+  if (std::strcmp(dtype, "float32") == 0) {
+    batch->data = static_cast<const float*>(data);
+    batch->data_f64 = nullptr;
+  } else if (std::strcmp(dtype, "float64") == 0) {
+    batch->data = nullptr;
+    batch->data_f64 = static_cast<const double*>(data);
+  } else {
+    LOG(FATAL) << "dtype must be either float32 or float64";
+  }
+  batch->row_stride = row_stride;
+  batch->col_stride = col_stride;
+  API_END();
+}
+
 int TreeliteDeleteDenseBatch(DenseBatchHandle handle) {
   API_BEGIN();
   delete static_cast<DenseBatch*>(handle);
@@ -81,6 +166,171 @@ int TreelitePredictorLoad(const char* library_path,
   API_END();
 }
 
+int TreelitePredictorLoadWithSharedPool(const char* library_path,
+                                        int num_worker_thread,
+                                        PredictorHandle* out) {
+  API_BEGIN();
+  Predictor* predictor = new Predictor(num_worker_thread, true);
+  predictor->Load(library_path);
+  *out = static_cast<PredictorHandle>(predictor);
+  API_END();
+}
+
+int TreelitePredictorLoadNumaAware(const char* library_path,
+                                   int num_worker_thread,
+                                   PredictorHandle* out) {
+  API_BEGIN();
+  Predictor* predictor = new Predictor(num_worker_thread, false, true);
+  predictor->Load(library_path);
+  *out = static_cast<PredictorHandle>(predictor);
+  API_END();
+}
+
+int TreelitePredictorReload(PredictorHandle handle,
+                            const char* library_path) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  predictor_->Reload(library_path);
+  API_END();
+}
+
+int TreelitePredictorSetChunkSize(PredictorHandle handle, size_t chunk_size) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  predictor_->SetChunkSize(chunk_size);
+  API_END();
+}
+
+int TreelitePredictorSetParallelThreshold(PredictorHandle handle,
+                                          size_t threshold) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  predictor_->SetParallelThreshold(threshold);
+  API_END();
+}
+
+int TreelitePredictorQueryParallelThreshold(PredictorHandle handle,
+                                            size_t* out) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  *out = predictor_->QueryParallelThreshold();
+  API_END();
+}
+
+int TreelitePredictorSetWaitPolicy(PredictorHandle handle,
+                                   const char* wait_policy,
+                                   unsigned max_spin_us) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  WaitPolicy policy = WaitPolicy::kSpinThenPark;
+  if (std::strcmp(wait_policy, "spin") == 0) {
+    policy = WaitPolicy::kSpin;
+  } else if (std::strcmp(wait_policy, "spin_then_park") == 0) {
+    policy = WaitPolicy::kSpinThenPark;
+  } else if (std::strcmp(wait_policy, "park") == 0) {
+    policy = WaitPolicy::kPark;
+  } else {
+    LOG(FATAL) << "wait_policy must be one of spin, spin_then_park, park";
+  }
+  predictor_->SetWaitPolicy(policy, max_spin_us);
+  API_END();
+}
+
+int TreeliteQueryDefaultMaxSpin(unsigned* out) {
+  API_BEGIN();
+  *out = kDefaultMaxSpinMicroseconds;
+  API_END();
+}
+
+int TreelitePredictorQueryWaitStats(
+    PredictorHandle handle, uint64_t* out_num_wait, uint64_t* out_num_park,
+    uint64_t* out_spin_ns, uint64_t* out_park_ns,
+    uint64_t* out_wake_latency_ns, uint64_t* out_max_wake_latency_ns) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const WaitStats stats = predictor_->QueryWaitStats();
+  *out_num_wait = stats.num_wait;
+  *out_num_park = stats.num_park;
+  *out_spin_ns = stats.spin_ns;
+  *out_park_ns = stats.park_ns;
+  *out_wake_latency_ns = stats.wake_latency_ns;
+  *out_max_wake_latency_ns = stats.max_wake_latency_ns;
+  API_END();
+}
+
+int TreelitePredictorSetBatchCallbacks(
+    PredictorHandle handle, TreelitePredictorBatchBeginCallback begin,
+    TreelitePredictorBatchEndCallback end, void* callback_arg) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  Predictor::BatchBeginCallback begin_;
+  Predictor::BatchEndCallback end_;
+  if (begin != nullptr) {
+    begin_ = [begin, callback_arg](size_t num_row) {
+      begin(callback_arg, num_row);
+    };
+  }
+  if (end != nullptr) {
+    end_ = [end, callback_arg](size_t num_row, double elapsed_sec,
+                               const char* error_msg) {
+      end(callback_arg, num_row, elapsed_sec, error_msg);
+    };
+  }
+  predictor_->SetBatchCallbacks(begin_, end_);
+  API_END();
+}
+
+int TreelitePredictorQueryStats(
+    PredictorHandle handle, uint64_t* out_num_batch, uint64_t* out_num_row,
+    uint64_t* out_num_inst, uint64_t* out_batch_ns, uint64_t* out_assemble_ns,
+    uint64_t* out_eval_ns, uint64_t* out_wait_ns) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const PredictorStats stats = predictor_->QueryStats();
+  *out_num_batch = stats.num_batch;
+  *out_num_row = stats.num_row;
+  *out_num_inst = stats.num_inst;
+  *out_batch_ns = stats.batch_ns;
+  *out_assemble_ns = stats.assemble_ns;
+  *out_eval_ns = stats.eval_ns;
+  *out_wait_ns = stats.wait_ns;
+  API_END();
+}
+
+int TreelitePredictorQueryLatencyHistogram(PredictorHandle handle,
+                                           uint64_t* out_counts,
+                                           size_t* out_len) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const std::vector<uint64_t> counts
+    = predictor_->QueryStats().latency_histogram;
+  if (out_counts != nullptr) {
+    std::copy(counts.begin(), counts.end(), out_counts);
+  }
+  *out_len = counts.size();
+  API_END();
+}
+
+int TreelitePredictorQueryThreadBusyTime(PredictorHandle handle,
+                                         uint64_t* out_busy_ns,
+                                         size_t* out_len) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const std::vector<uint64_t> busy_ns = predictor_->QueryStats().thread_busy_ns;
+  if (out_busy_ns != nullptr) {
+    std::copy(busy_ns.begin(), busy_ns.end(), out_busy_ns);
+  }
+  *out_len = busy_ns.size();
+  API_END();
+}
+
+int TreelitePredictorResetStats(PredictorHandle handle) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  predictor_->ResetStats();
+  API_END();
+}
+
 int TreelitePredictorPredictBatch(PredictorHandle handle,
                                   void* batch,
                                   int batch_sparse,
@@ -109,6 +359,39 @@ int TreelitePredictorPredictBatch(PredictorHandle handle,
   API_END();
 }
 
+int TreelitePredictorPredictBatchAsync(PredictorHandle handle,
+                                       void* batch,
+                                       int batch_sparse,
+                                       int verbose,
+                                       int pred_margin,
+                                       float* out_result,
+                                       TreelitePredictorCallback callback,
+                                       void* callback_arg) {
+  API_BEGIN();
+  Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const size_t num_feature = predictor_->QueryNumFeature();
+  const std::string err_msg
+    = std::string("Too many columns (features) in the given batch. "
+                  "Number of features must not exceed ")
+      + std::to_string(num_feature);
+  auto callback_ = [callback, callback_arg]
+                   (size_t result_size, const char* error_msg) {
+    callback(callback_arg, result_size, error_msg);
+  };
+  if (batch_sparse) {
+    const CSRBatch* batch_ = static_cast<CSRBatch*>(batch);
+    CHECK_LE(batch_->num_col, num_feature) << err_msg;
+    predictor_->PredictBatchAsync(batch_, verbose, (pred_margin != 0),
+                                  out_result, callback_);
+  } else {
+    const DenseBatch* batch_ = static_cast<DenseBatch*>(batch);
+    CHECK_LE(batch_->num_col, num_feature) << err_msg;
+    predictor_->PredictBatchAsync(batch_, verbose, (pred_margin != 0),
+                                  out_result, callback_);
+  }
+  API_END();
+}
+
 int TreelitePredictorPredictInst(PredictorHandle handle,
                                  union TreelitePredictorEntry* inst,
                                  int pred_margin,
@@ -120,6 +403,45 @@ int TreelitePredictorPredictInst(PredictorHandle handle,
   API_END();
 }
 
+int TreeliteSingleRowPredictorCreate(PredictorHandle predictor,
+                                     SingleRowPredictorHandle* out) {
+  API_BEGIN();
+  SingleRowPredictor* single_row_predictor
+    = new SingleRowPredictor(static_cast<Predictor*>(predictor));
+  *out = static_cast<SingleRowPredictorHandle>(single_row_predictor);
+  API_END();
+}
+
+int TreeliteSingleRowPredictorPredictDense(SingleRowPredictorHandle handle,
+                                           const float* row, size_t num_col,
+                                           float missing_value,
+                                           int pred_margin, float* out_result,
+                                           size_t* out_result_size) {
+  API_BEGIN();
+  SingleRowPredictor* predictor_ = static_cast<SingleRowPredictor*>(handle);
+  *out_result_size = predictor_->PredictDense(row, num_col, missing_value,
+                                              (pred_margin != 0), out_result);
+  API_END();
+}
+
+int TreeliteSingleRowPredictorPredictSparse(SingleRowPredictorHandle handle,
+                                            const uint32_t* indices,
+                                            const float* values, size_t nnz,
+                                            int pred_margin, float* out_result,
+                                            size_t* out_result_size) {
+  API_BEGIN();
+  SingleRowPredictor* predictor_ = static_cast<SingleRowPredictor*>(handle);
+  *out_result_size = predictor_->PredictSparse(indices, values, nnz,
+                                               (pred_margin != 0), out_result);
+  API_END();
+}
+
+int TreeliteSingleRowPredictorFree(SingleRowPredictorHandle handle) {
+  API_BEGIN();
+  delete static_cast<SingleRowPredictor*>(handle);
+  API_END();
+}
+
 int TreelitePredictorQueryResultSize(PredictorHandle handle,
                                      void* batch,
                                      int batch_sparse,
@@ -181,8 +503,109 @@ int TreelitePredictorQueryGlobalBias(PredictorHandle handle, float* out) {
   API_END();
 }
 
+int TreelitePredictorQueryNumThread(PredictorHandle handle, int* out) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  *out = predictor_->QueryNumThread();
+  API_END();
+}
+
+int TreelitePredictorQueryThreadAffinity(PredictorHandle handle,
+                                         const int** out_cores,
+                                         size_t* out_len) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  const std::vector<int>& affinity = predictor_->QueryThreadAffinity();
+  *out_cores = affinity.data();
+  *out_len = affinity.size();
+  API_END();
+}
+
+int TreelitePredictorQueryCutPoints(PredictorHandle handle, unsigned fid,
+                                    const double** out_cut_points,
+                                    size_t* out_len) {
+  API_BEGIN();
+  const Predictor* predictor_ = static_cast<Predictor*>(handle);
+  *out_len = predictor_->QueryCutPoints(fid, out_cut_points);
+  API_END();
+}
+
 int TreelitePredictorFree(PredictorHandle handle) {
   API_BEGIN();
   delete static_cast<Predictor*>(handle);
   API_END();
 }
+
+int TreelitePredictorGroupCreate(int num_worker_thread,
+                                 PredictorGroupHandle* out) {
+  API_BEGIN();
+  PredictorGroup* group = new PredictorGroup(num_worker_thread);
+  *out = static_cast<PredictorGroupHandle>(group);
+  API_END();
+}
+
+int TreelitePredictorGroupLoad(PredictorGroupHandle handle,
+                               const char* library_path) {
+  API_BEGIN();
+  PredictorGroup* group_ = static_cast<PredictorGroup*>(handle);
+  group_->Load(library_path);
+  API_END();
+}
+
+int TreelitePredictorGroupSetChunkSize(PredictorGroupHandle handle,
+                                       size_t chunk_size) {
+  API_BEGIN();
+  PredictorGroup* group_ = static_cast<PredictorGroup*>(handle);
+  group_->SetChunkSize(chunk_size);
+  API_END();
+}
+
+int TreelitePredictorGroupQueryNumOutput(PredictorGroupHandle handle,
+                                         size_t* out) {
+  API_BEGIN();
+  const PredictorGroup* group_ = static_cast<PredictorGroup*>(handle);
+  *out = group_->QueryNumOutput();
+  API_END();
+}
+
+int TreelitePredictorGroupQueryOutputOffset(PredictorGroupHandle handle,
+                                            size_t index, size_t* out) {
+  API_BEGIN();
+  const PredictorGroup* group_ = static_cast<PredictorGroup*>(handle);
+  *out = group_->QueryOutputOffset(index);
+  API_END();
+}
+
+int TreelitePredictorGroupPredictBatch(PredictorGroupHandle handle,
+                                       void* batch,
+                                       int batch_sparse,
+                                       int verbose,
+                                       int pred_margin,
+                                       float* out_result,
+                                       size_t* out_result_size) {
+  API_BEGIN();
+  PredictorGroup* group_ = static_cast<PredictorGroup*>(handle);
+  const size_t num_feature = group_->QueryNumFeature();
+  const std::string err_msg
+    = std::string("Too many columns (features) in the given batch. "
+                  "Number of features must not exceed ")
+      + std::to_string(num_feature);
+  if (batch_sparse) {
+    const CSRBatch* batch_ = static_cast<CSRBatch*>(batch);
+    CHECK_LE(batch_->num_col, num_feature) << err_msg;
+    *out_result_size = group_->PredictBatch(batch_, verbose,
+                                            (pred_margin != 0), out_result);
+  } else {
+    const DenseBatch* batch_ = static_cast<DenseBatch*>(batch);
+    CHECK_LE(batch_->num_col, num_feature) << err_msg;
+    *out_result_size = group_->PredictBatch(batch_, verbose,
+                                            (pred_margin != 0), out_result);
+  }
+  API_END();
+}
+
+int TreelitePredictorGroupFree(PredictorGroupHandle handle) {
+  API_BEGIN();
+  delete static_cast<PredictorGroup*>(handle);
+  API_END();
+}
@@ -0,0 +1,384 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file interpreter.cc
+ * \brief evaluate tree ensembles stored in the flat binary format, without
+ *        compiling them into a shared library
+ */
+
+#include <dmlc/logging.h>
+#include <algorithm>
+#include <cmath>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <limits>
+#include <vector>
+#include "./interpreter.h"
+#include "../common/mmap.h"
+
+namespace {
+
+using treelite::binary_model::ModelView;
+using treelite::binary_model::Node;
+using treelite::binary_model::NodeType;
+using treelite::binary_model::Operator;
+
+inline float FeatureValue(const float* row, uint32_t fid) {
+  return row[fid];
+}
+
+/* A missing entry holds -1, whose bit pattern is a NaN, so that entries can
+   be tested for missing values the same way as dense rows */
+inline float FeatureValue(const TreelitePredictorEntry* row, uint32_t fid) {
+  return row[fid].fvalue;
+}
+
+/* Compare with the operator kOp if it is known at compile time, or with the
+   operator of the node otherwise (kOp < 0) */
+template <int kOp>
+inline bool CompareWithOp(double lhs, uint8_t op, double rhs) {
+  switch (static_cast<Operator>(kOp < 0 ? op : kOp)) {
+   case Operator::kEQ: return lhs == rhs;
+   case Operator::kLT: return lhs <  rhs;
+   case Operator::kLE: return lhs <= rhs;
+   case Operator::kGT: return lhs >  rhs;
+   case Operator::kGE: return lhs >= rhs;
+   default: return false;
+  }
+}
+
+inline bool CategoryGoesLeft(const Node& node, float fvalue,
+                             const uint64_t* category_bitmap) {
+  namespace bm = treelite::binary_model;
+  if (std::isnan(fvalue)) {
+    if (!(node.flags & bm::kMissingCategoryToZero)) {
+      return (node.flags & bm::kDefaultLeft) != 0;
+    }
+    fvalue = 0.0f;
+  }
+  // the compiled code truncates feature values to unsigned integers
+  const uint32_t num_category = node.category_bitmap.length * 64;
+  if (!(fvalue > -1.0f && fvalue < static_cast<float>(num_category))) {
+    return false;
+  }
+  const uint32_t category = static_cast<uint32_t>(fvalue);
+  const uint64_t word
+    = category_bitmap[node.category_bitmap.offset + category / 64];
+  return ((word >> (category % 64)) & 1) != 0;
+}
+
+/* Called on a node that failed one of the checks of FindLeaf(); reports
+   what is wrong with it */
+void ReportMalformedNode(const ModelView& model, uint32_t tree_id,
+                         int64_t nid) {
+  treelite::binary_model::CheckNode(model, tree_id, nid);
+  LOG(FATAL) << "Node of tree " << tree_id << " is malformed";
+}
+
+/* Nodes are checked as they are visited, rather than all of them on load,
+   so that loading does not read the whole file: a split must test a feature
+   within the row and its child must come after it within the tree (so that
+   traversal cannot loop), and arrays indexed by a node must cover the range
+   it gives. */
+template <int kOp, typename RowType>
+inline const Node* FindLeaf(const ModelView& model, uint32_t tree_id,
+                            const Node* tree, int64_t num_node,
+                            const RowType* row) {
+  namespace bm = treelite::binary_model;
+  const bm::Header& header = *model.header;
+  int64_t nid = 0;
+  while (tree[nid].type != static_cast<uint8_t>(NodeType::kLeaf)) {
+    const Node& node = tree[nid];
+    if (node.split_index >= header.num_feature) {
+      ReportMalformedNode(model, tree_id, nid);
+    }
+    const float fvalue = FeatureValue(row, node.split_index);
+    bool go_left;
+    if (kOp >= 0
+        || node.type == static_cast<uint8_t>(NodeType::kNumericalSplit)) {
+      go_left = std::isnan(fvalue)
+                ? (node.flags & bm::kDefaultLeft) != 0
+                : CompareWithOp<kOp>(static_cast<double>(fvalue), node.op,
+                                     node.threshold);
+    } else {
+      if (static_cast<uint64_t>(node.category_bitmap.offset)
+          + node.category_bitmap.length > header.num_category_word) {
+        ReportMalformedNode(model, tree_id, nid);
+      }
+      go_left = CategoryGoesLeft(node, fvalue, model.category_bitmap);
+    }
+    const int64_t child = go_left ? node.cleft : node.cright;
+    if (child <= nid || child >= num_node) {
+      ReportMalformedNode(model, tree_id, nid);
+    }
+    nid = child;
+  }
+  const Node& leaf = tree[nid];
+  if ((leaf.flags & bm::kLeafVector)
+      && static_cast<uint64_t>(leaf.leaf_vector.offset)
+         + header.num_output_group > header.num_leaf_vector_elem) {
+    ReportMalformedNode(model, tree_id, nid);
+  }
+  return &leaf;
+}
+
+// whether TREELITE_CHECK_BINARY_MODEL=1 was set
+inline bool CheckNodesOnLoad() {
+  const char* check_flag = std::getenv("TREELITE_CHECK_BINARY_MODEL");
+  return check_flag != nullptr && std::strcmp(check_flag, "1") == 0;
+}
+
+inline float Sigmoid(float alpha, float margin) {
+  return 1.0f / (1.0f + std::exp(-alpha * margin));
+}
+
+}  // anonymous namespace
+
+namespace treelite {
+
+Interpreter::Interpreter(const std::string& path)
+    : file_(new common::MappedFile(path)) {
+  namespace bm = binary_model;
+  // read ahead in the background, so that prediction rarely waits for disk
+  file_->Prefetch();
+  model_ = bm::GetModelView(file_->data(), file_->size());
+  if (CheckNodesOnLoad()) {
+    bm::CheckModel(model_);
+  } else {
+    bm::CheckTreeOffsets(model_);
+  }
+
+  const bm::Header& header = *model_.header;
+  num_feature_ = header.num_feature;
+  num_output_group_ = header.num_output_group;
+  num_tree_ = header.num_tree;
+  average_tree_output_ = (header.average_tree_output != 0);
+  pred_transform_ = header.pred_transform;
+  sigmoid_alpha_ = header.sigmoid_alpha;
+  global_bias_ = header.global_bias;
+
+  if (num_output_group_ > 1) {
+    if (pred_transform_ == "identity_multiclass") {
+      transform_ = PredTransform::kIdentityMulticlass;
+    } else if (pred_transform_ == "max_index") {
+      transform_ = PredTransform::kMaxIndex;
+    } else if (pred_transform_ == "softmax") {
+      transform_ = PredTransform::kSoftmax;
+    } else if (pred_transform_ == "multiclass_ova") {
+      CHECK_GT(sigmoid_alpha_, 0.0f)
+        << "multiclass_ova: alpha must be strictly positive";
+      transform_ = PredTransform::kMulticlassOva;
+    } else {
+      LOG(FATAL) << "Binary model `" << path << "' has unknown pred_transform `"
+                 << pred_transform_ << "' for a multi-class classifier";
+    }
+  } else {
+    if (pred_transform_ == "identity") {
+      transform_ = PredTransform::kIdentity;
+    } else if (pred_transform_ == "sigmoid") {
+      CHECK_GT(sigmoid_alpha_, 0.0f)
+        << "sigmoid: alpha must be strictly positive";
+      transform_ = PredTransform::kSigmoid;
+    } else if (pred_transform_ == "exponential") {
+      transform_ = PredTransform::kExponential;
+    } else if (pred_transform_ == "logarithm_one_plus_exp") {
+      transform_ = PredTransform::kLogarithmOnePlusExp;
+    } else {
+      LOG(FATAL) << "Binary model `" << path << "' has unknown pred_transform `"
+                 << pred_transform_ << "'";
+    }
+  }
+
+  /* Most models only have numerical splits with one operator (e.g. `<' for
+     XGBoost and `<=' for LightGBM), for which trees are traversed by a loop
+     specialized to that operator */
+  common_op_ = (header.common_op == bm::kNoCommonOp)
+               ? -1 : static_cast<int>(header.common_op);
+}
+
+Interpreter::~Interpreter() = default;
+
+bool
+Interpreter::IsBinaryModel(const std::string& path) {
+  std::ifstream is(path, std::ios::binary);
+  char magic[sizeof(binary_model::kMagic)];
+  is.read(magic, sizeof(magic));
+  return is && binary_model::HasMagic(magic, sizeof(magic));
+}
+
+template <int kOp, typename RowType>
+void
+Interpreter::AccumulateTrees_(const RowType* data, size_t n,
+                              float* sum) const {
+  namespace bm = binary_model;
+  const size_t num_output_group = num_output_group_;
+  for (uint32_t tree_id = 0; tree_id < num_tree_; ++tree_id) {
+    const uint64_t begin = model_.tree_offset[tree_id];
+    const bm::Node* tree = model_.nodes + begin;
+    const int64_t num_node
+      = static_cast<int64_t>(model_.tree_offset[tree_id + 1] - begin);
+    // output group of the leaves of gradient boosted trees
+    const size_t group = tree_id % num_output_group;
+    for (size_t r = 0; r < n; ++r) {
+      const bm::Node* leaf
+        = FindLeaf<kOp>(model_, tree_id, tree, num_node, data[r]);
+      float* row_sum = &sum[r * num_output_group];
+      if (leaf->flags & bm::kLeafVector) {
+        const double* leaf_vector
+          = &model_.leaf_vector[leaf->leaf_vector.offset];
+        for (size_t k = 0; k < num_output_group; ++k) {
+          row_sum[k] += static_cast<float>(leaf_vector[k]);
+        }
+      } else {
+        row_sum[group] += static_cast<float>(leaf->leaf_value);
+      }
+    }
+  }
+}
+
+template <typename RowType>
+void
+Interpreter::Accumulate_(const RowType* data, size_t n, float* sum) const {
+  switch (common_op_) {
+   case static_cast<int>(Operator::kEQ):
+    AccumulateTrees_<static_cast<int>(Operator::kEQ)>(data, n, sum);
+    break;
+   case static_cast<int>(Operator::kLT):
+    AccumulateTrees_<static_cast<int>(Operator::kLT)>(data, n, sum);
+    break;
+   case static_cast<int>(Operator::kLE):
+    AccumulateTrees_<static_cast<int>(Operator::kLE)>(data, n, sum);
+    break;
+   case static_cast<int>(Operator::kGT):
+    AccumulateTrees_<static_cast<int>(Operator::kGT)>(data, n, sum);
+    break;
+   case static_cast<int>(Operator::kGE):
+    AccumulateTrees_<static_cast<int>(Operator::kGE)>(data, n, sum);
+    break;
+   default:
+    AccumulateTrees_<-1>(data, n, sum);
+  }
+}
+
+size_t
+Interpreter::Finalize_(float* sum, bool pred_margin, float* out) const {
+  const size_t num_output_group = num_output_group_;
+  for (size_t k = 0; k < num_output_group; ++k) {
+    out[k] = (average_tree_output_ ? sum[k] / static_cast<float>(num_tree_)
+                                   : sum[k]) + global_bias_;
+  }
+  if (pred_margin) {
+    return num_output_group;
+  }
+  switch (transform_) {
+   case PredTransform::kIdentity:
+   case PredTransform::kIdentityMulticlass:
+    break;
+   case PredTransform::kSigmoid:
+    out[0] = Sigmoid(sigmoid_alpha_, out[0]);
+    break;
+   case PredTransform::kExponential:
+    out[0] = std::exp(out[0]);
+    break;
+   case PredTransform::kLogarithmOnePlusExp:
+    out[0] = std::log1p(std::exp(out[0]));
+    break;
+   case PredTransform::kMaxIndex:
+    {
+      size_t max_index = 0;
+      float max_margin = out[0];
+      for (size_t k = 1; k < num_output_group; ++k) {
+        if (out[k] > max_margin) {
+          max_margin = out[k];
+          max_index = k;
+        }
+      }
+      out[0] = static_cast<float>(max_index);
+      return 1;
+    }
+   case PredTransform::kSoftmax:
+    {
+      float max_margin = out[0];
+      for (size_t k = 1; k < num_output_group; ++k) {
+        max_margin = std::max(max_margin, out[k]);
+      }
+      double norm_const = 0.0;
+      for (size_t k = 0; k < num_output_group; ++k) {
+        const float t = std::exp(out[k] - max_margin);
+        norm_const += t;
+        out[k] = t;
+      }
+      for (size_t k = 0; k < num_output_group; ++k) {
+        out[k] /= static_cast<float>(norm_const);
+      }
+    }
+    break;
+   case PredTransform::kMulticlassOva:
+    for (size_t k = 0; k < num_output_group; ++k) {
+      out[k] = Sigmoid(sigmoid_alpha_, out[k]);
+    }
+    break;
+  }
+  return num_output_group;
+}
+
+size_t
+Interpreter::PredictInst(const TreelitePredictorEntry* inst, bool pred_margin,
+                         float* out) const {
+  static thread_local std::vector<float> sum;
+  sum.assign(num_output_group_, 0.0f);
+  Accumulate_(&inst, 1, sum.data());
+  return Finalize_(sum.data(), pred_margin, out);
+}
+
+size_t
+Interpreter::PredictBatch(const float* rows, size_t nrow, size_t ncol,
+                          float missing, bool pred_margin, float* out) const {
+  /* Rows are processed in blocks, within which each tree is evaluated for
+     all rows before moving on to the next tree. Blocks are sized the same
+     way as in the compiled predict_batch(). */
+  constexpr size_t kMaxBlockSize = 64;
+  const size_t num_feature = num_feature_;
+  const size_t num_output_group = num_output_group_;
+  const size_t block_size
+    = std::max(size_t(1), std::min(kMaxBlockSize, 32768 / num_feature));
+  const bool missing_is_nan = std::isnan(missing);
+  // rows can be read in place if they mark missing values with NaN
+  const bool read_in_place = missing_is_nan && ncol >= num_feature;
+  static thread_local std::vector<float> block;
+  static thread_local std::vector<float> sum;
+  if (!read_in_place) {
+    block.resize(block_size * num_feature);
+  }
+  sum.resize(block_size * num_output_group);
+  const float* row_data[kMaxBlockSize];
+  size_t total = 0;
+  for (size_t rbegin = 0; rbegin < nrow; rbegin += block_size) {
+    const size_t nblock = std::min(nrow - rbegin, block_size);
+    for (size_t r = 0; r < nblock; ++r) {
+      const float* row = &rows[(rbegin + r) * ncol];
+      if (read_in_place) {
+        row_data[r] = row;
+        continue;
+      }
+      float* data = &block[r * num_feature];
+      size_t j = 0;
+      for (; j < ncol && j < num_feature; ++j) {
+        data[j] = (!missing_is_nan && row[j] == missing)
+                  ? std::numeric_limits<float>::quiet_NaN() : row[j];
+      }
+      std::fill(data + j, data + num_feature,
+                std::numeric_limits<float>::quiet_NaN());
+      row_data[r] = data;
+    }
+    std::fill(sum.begin(), sum.begin() + nblock * num_output_group, 0.0f);
+    Accumulate_(row_data, nblock, sum.data());
+    for (size_t r = 0; r < nblock; ++r) {
+      total += Finalize_(&sum[r * num_output_group], pred_margin,
+                         &out[(rbegin + r) * num_output_group]);
+    }
+  }
+  return total;
+}
+
+}  // namespace treelite
@@ -0,0 +1,132 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file interpreter.h
+ * \brief evaluate tree ensembles stored in the flat binary format, without
+ *        compiling them into a shared library
+ */
+#ifndef TREELITE_INTERPRETER_INTERPRETER_H_
+#define TREELITE_INTERPRETER_INTERPRETER_H_
+
+#include <treelite/binary_model.h>
+#include <treelite/entry.h>
+#include <cstdint>
+#include <memory>
+#include <string>
+
+namespace treelite {
+
+namespace common {
+class MappedFile;  // forward declaration
+}
+
+/*!
+ * \brief Evaluates a model stored in the flat binary format of
+ *        binary_model.h. Predictions agree with those of the shared library
+ *        that the ast_native compiler would produce for the same model
+ *        (without quantization), so that a model can be served while it is
+ *        being compiled, or where no C compiler is available. An Interpreter
+ *        is immutable once loaded and may be used from many threads at once.
+ *
+ *        The file is memory-mapped and evaluated in place, so that loading
+ *        takes next to no time and processes that load the same file share
+ *        its pages, which are only read as prediction needs them. On
+ *        loading, only the bounds of the trees are checked; each node is
+ *        checked when prediction visits it, so that a malformed file fails
+ *        the prediction instead of causing reads out of bounds. Set
+ *        TREELITE_CHECK_BINARY_MODEL=1 to check every node on loading as
+ *        well, at the cost of reading the whole file.
+ */
+class Interpreter {
+ public:
+  /*!
+   * \brief load a model from a local file
+   * \param path path to the file
+   */
+  explicit Interpreter(const std::string& path);
+  ~Interpreter();
+
+  /*!
+   * \brief whether a local file is in the flat binary format
+   * \param path path to the file
+   */
+  static bool IsBinaryModel(const std::string& path);
+
+  inline size_t QueryNumOutputGroup() const {
+    return num_output_group_;
+  }
+  inline size_t QueryNumFeature() const {
+    return num_feature_;
+  }
+  inline const std::string& QueryPredTransform() const {
+    return pred_transform_;
+  }
+  inline float QuerySigmoidAlpha() const {
+    return sigmoid_alpha_;
+  }
+  inline float QueryGlobalBias() const {
+    return global_bias_;
+  }
+
+  /*!
+   * \brief make prediction on a single row, with the same semantics as the
+   *        predict() and predict_multiclass() functions of a compiled
+   *        library
+   * \param inst feature values, with missing entries marked by
+   *             TreelitePredictorEntry::missing == -1
+   * \param pred_margin whether to produce raw margin scores
+   * \param out output vector, with room for QueryNumOutputGroup() elements
+   * \return length of the output vector
+   */
+  size_t PredictInst(const TreelitePredictorEntry* inst, bool pred_margin,
+                     float* out) const;
+
+  /*!
+   * \brief make predictions on a block of dense rows, with the same
+   *        semantics as the predict_batch() function of a compiled library
+   * \param rows row-major matrix of feature values
+   * \param nrow number of rows
+   * \param ncol number of columns; columns beyond ncol are missing
+   * \param missing value representing the missing value (usually NaN)
+   * \param pred_margin whether to produce raw margin scores
+   * \param out output vector; the output of row i is stored at
+   *            out[i * QueryNumOutputGroup()]
+   * \return total length of the outputs
+   */
+  size_t PredictBatch(const float* rows, size_t nrow, size_t ncol,
+                      float missing, bool pred_margin, float* out) const;
+
+ private:
+  enum class PredTransform : uint8_t {
+    kIdentity, kSigmoid, kExponential, kLogarithmOnePlusExp,
+    kIdentityMulticlass, kMaxIndex, kSoftmax, kMulticlassOva
+  };
+
+  // the file, mapped into memory at a page-aligned address
+  std::unique_ptr<common::MappedFile> file_;
+  binary_model::ModelView model_;
+  size_t num_feature_;
+  size_t num_output_group_;
+  size_t num_tree_;
+  bool average_tree_output_;
+  std::string pred_transform_;
+  PredTransform transform_;
+  float sigmoid_alpha_;
+  float global_bias_;
+  /* operator shared by every split, if all splits are numerical and use the
+     same operator (the case for most models); -1 otherwise */
+  int common_op_;
+
+  /* Add the leaf outputs of all trees for rows [data[0], ..., data[n - 1]]
+     to sum[], evaluating one tree for all rows before moving on to the
+     next. Feature j of row r is read as FeatureValue(data[r], j). */
+  template <int kOp, typename RowType>
+  void AccumulateTrees_(const RowType* data, size_t n, float* sum) const;
+  template <typename RowType>
+  void Accumulate_(const RowType* data, size_t n, float* sum) const;
+  // turn the sum of leaf outputs into the final output of one row
+  size_t Finalize_(float* sum, bool pred_margin, float* out) const;
+};
+
+}  // namespace treelite
+
+#endif  // TREELITE_INTERPRETER_INTERPRETER_H_
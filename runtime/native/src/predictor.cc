@@ -11,15 +11,22 @@
 #include <dmlc/io.h>
 #include <dmlc/timer.h>
 #include <cstdint>
+#include <cmath>
 #include <algorithm>
 #include <memory>
 #include <fstream>
 #include <limits>
 #include <functional>
 #include <type_traits>
+#include <atomic>
+#include <chrono>
+#include <thread>
+#include <exception>
 #include "common/math.h"
 #include "common/filesystem.h"
 #include "thread_pool/thread_pool.h"
+#include "thread_pool/shared_thread_pool.h"
+#include "interpreter/interpreter.h"
 
 #ifdef _WIN32
 #define NOMINMAX
@@ -28,12 +35,261 @@
 #include <dlfcn.h>
 #endif
 
+namespace treelite {
+
+/* Always-on performance counters of a predictor. Counters are updated with
+   relaxed atomic operations by whichever thread does the work, once per
+   chunk of rows or once per batch (once per row only for single rows, on
+   sharded counters), so that keeping them costs next to nothing. */
+class PerfCounters {
+ public:
+  PerfCounters() : num_thread_(0) {
+    Reset();
+  }
+
+  void Reset() {
+    num_batch_ = 0;
+    num_row_ = 0;
+    for (InstShard& shard : num_inst_) {
+      shard.count = 0;
+    }
+    batch_ns_ = 0;
+    assemble_ns_ = 0;
+    eval_ns_ = 0;
+    wait_ns_ = 0;
+    for (std::atomic<uint64_t>& count : latency_histogram_) {
+      count = 0;
+    }
+    for (size_t i = 0; i < num_thread_; ++i) {
+      thread_busy_ns_[i] = 0;
+    }
+  }
+
+  // set the number of threads whose busy time is tracked
+  void SetNumThread(size_t num_thread) {
+    num_thread_ = num_thread;
+    thread_busy_ns_.reset(new std::atomic<uint64_t>[num_thread]);
+    for (size_t i = 0; i < num_thread_; ++i) {
+      thread_busy_ns_[i] = 0;
+    }
+  }
+
+  void RecordBatch(size_t num_row, uint64_t elapsed_ns) {
+    num_batch_.fetch_add(1, std::memory_order_relaxed);
+    num_row_.fetch_add(num_row, std::memory_order_relaxed);
+    batch_ns_.fetch_add(elapsed_ns, std::memory_order_relaxed);
+    int bucket = 0;
+    for (uint64_t us = elapsed_ns / 1000; us > 1; us >>= 1) {
+      ++bucket;
+    }
+    bucket = std::min(bucket, PredictorStats::kNumLatencyBucket - 1);
+    latency_histogram_[bucket].fetch_add(1, std::memory_order_relaxed);
+  }
+
+  // record work done by a thread (thread_index < 0 if not tracked)
+  void RecordWork(int thread_index, uint64_t busy_ns, uint64_t assemble_ns) {
+    assemble_ns_.fetch_add(assemble_ns, std::memory_order_relaxed);
+    eval_ns_.fetch_add(busy_ns - assemble_ns, std::memory_order_relaxed);
+    if (thread_index >= 0 && static_cast<size_t>(thread_index) < num_thread_) {
+      thread_busy_ns_[thread_index].fetch_add(busy_ns,
+                                              std::memory_order_relaxed);
+    }
+  }
+
+  void RecordWait(uint64_t wait_ns) {
+    wait_ns_.fetch_add(wait_ns, std::memory_order_relaxed);
+  }
+
+  void RecordInst() {
+    num_inst_[GetInstShard()].count.fetch_add(1, std::memory_order_relaxed);
+  }
+
+  PredictorStats Snapshot() const {
+    PredictorStats stats;
+    stats.num_batch = num_batch_.load(std::memory_order_relaxed);
+    stats.num_row = num_row_.load(std::memory_order_relaxed);
+    stats.num_inst = 0;
+    for (const InstShard& shard : num_inst_) {
+      stats.num_inst += shard.count.load(std::memory_order_relaxed);
+    }
+    stats.batch_ns = batch_ns_.load(std::memory_order_relaxed);
+    stats.assemble_ns = assemble_ns_.load(std::memory_order_relaxed);
+    stats.eval_ns = eval_ns_.load(std::memory_order_relaxed);
+    stats.wait_ns = wait_ns_.load(std::memory_order_relaxed);
+    for (const std::atomic<uint64_t>& count : latency_histogram_) {
+      stats.latency_histogram.push_back(count.load(std::memory_order_relaxed));
+    }
+    for (size_t i = 0; i < num_thread_; ++i) {
+      stats.thread_busy_ns.push_back(
+        thread_busy_ns_[i].load(std::memory_order_relaxed));
+    }
+    return stats;
+  }
+
+ private:
+  std::atomic<uint64_t> num_batch_;
+  std::atomic<uint64_t> num_row_;
+  std::atomic<uint64_t> batch_ns_;
+  std::atomic<uint64_t> assemble_ns_;
+  std::atomic<uint64_t> eval_ns_;
+  std::atomic<uint64_t> wait_ns_;
+  std::atomic<uint64_t> latency_histogram_[PredictorStats::kNumLatencyBucket];
+  std::unique_ptr<std::atomic<uint64_t>[]> thread_busy_ns_;
+  size_t num_thread_;
+  /* Count of single rows. It is updated for every row, possibly from many
+     threads at once, so it is split into shards, each on its own cache line
+     and off the cache lines of the other counters, that threads update
+     without contending with each other; Snapshot() sums them up. (Padding
+     rather than alignas, since operator new ignores extended alignment
+     before C++17.) */
+  static constexpr int kNumInstShard = 16;
+  struct InstShard {
+    std::atomic<uint64_t> count;
+    char padding[64 - sizeof(std::atomic<uint64_t>)];
+  };
+  char padding_[64];
+  InstShard num_inst_[kNumInstShard];
+
+  // shard of the calling thread; threads are dealt shards in turn, in the
+  // order they first record a row
+  static int GetInstShard() {
+    static std::atomic<int> next_shard{0};
+    thread_local const int shard
+      = next_shard.fetch_add(1, std::memory_order_relaxed) % kNumInstShard;
+    return shard;
+  }
+};
+
+/* Estimates of what it costs to score a row and to hand a batch out to
+   worker threads, from which the predictor decides how many threads a batch
+   is worth. Both are exponential moving averages over recent batches, kept
+   in relaxed atomics; of two updates that race, one may be lost, which only
+   makes the averages a little less smooth. */
+class ParallelCostModel {
+ public:
+  ParallelCostModel() : threshold_(0), num_inline_(0) {
+    Reset();
+  }
+
+  void Reset() {
+    row_ns_ = -1.0;
+    dispatch_ns_ = -1.0;
+  }
+
+  // forget the cost of a row, e.g. once a different model is loaded
+  void ResetRowCost() {
+    row_ns_ = -1.0;
+  }
+
+  void SetThreshold(size_t threshold) {
+    threshold_.store(threshold, std::memory_order_relaxed);
+  }
+
+  void SetDispatchCost(double dispatch_ns) {
+    dispatch_ns_.store(dispatch_ns, std::memory_order_relaxed);
+  }
+
+  // minimum number of rows per thread; 0 if the costs are not known yet
+  size_t GetThreshold() const {
+    const size_t threshold = threshold_.load(std::memory_order_relaxed);
+    if (threshold > 0) {
+      return threshold;
+    }
+    const double row_ns = row_ns_.load(std::memory_order_relaxed);
+    const double dispatch_ns = dispatch_ns_.load(std::memory_order_relaxed);
+    if (row_ns < 0.0 || dispatch_ns < 0.0) {
+      return 0;
+    }
+    return static_cast<size_t>(
+      std::max(std::ceil(kAmortization * dispatch_ns / std::max(row_ns, 1.0)),
+               1.0));
+  }
+
+  /* number of threads worth using for a batch, at most [max_thread].
+     [probe] is set if the batch is to be spread out so as to measure the
+     costs, in which case it must be spread out however small it is. */
+  int GetNumThread(size_t num_row, int max_thread, bool* probe) {
+    const size_t threshold = GetThreshold();
+    *probe = false;
+    if (threshold == 0) {  // spread the batch out, so as to measure the costs
+      *probe = true;
+      return max_thread;
+    }
+    size_t nthread = num_row / threshold;
+    /* The dispatch cost is only measured on batches that are spread out.
+       Once in a while, a batch that would run inline is given a second
+       thread, so that a threshold pushed up by a spell of slow hand-offs
+       comes back down when they speed up again. */
+    if (nthread < 2 && max_thread > 1 && num_row > 1
+        && threshold_.load(std::memory_order_relaxed) == 0
+        && num_inline_.fetch_add(1, std::memory_order_relaxed) % kProbeInterval
+           == kProbeInterval - 1) {
+      *probe = true;
+      nthread = 2;
+    }
+    return static_cast<int>(std::max(
+      std::min(nthread, static_cast<size_t>(max_thread)), size_t(1)));
+  }
+
+  /* Record a batch of [num_row] rows scored by [nthread] threads in
+     [elapsed_ns], of which the threads spent [busy_ns] scoring rows. Time
+     not spent scoring by the average thread is put down to dispatch. */
+  void RecordBatch(size_t num_row, int nthread, uint64_t elapsed_ns,
+                   uint64_t busy_ns) {
+    Update(&row_ns_, static_cast<double>(busy_ns) / num_row);
+    if (nthread > 1) {
+      const double idle_ns = static_cast<double>(elapsed_ns)
+                             - static_cast<double>(busy_ns) / nthread;
+      Update(&dispatch_ns_, std::max(idle_ns, 0.0));
+    }
+  }
+
+ private:
+  // a thread is added only if its rows cost this many times the dispatch
+  static constexpr double kAmortization = 2.0;
+  // weight of the newest sample in the moving averages
+  static constexpr double kSmoothing = 0.125;
+  // one in this many inline batches is given a second thread
+  static constexpr uint64_t kProbeInterval = 64;
+
+  static void Update(std::atomic<double>* average, double sample) {
+    const double value = average->load(std::memory_order_relaxed);
+    average->store(value < 0.0 ? sample
+                               : value + kSmoothing * (sample - value),
+                   std::memory_order_relaxed);
+  }
+
+  std::atomic<size_t> threshold_;  // 0 if chosen automatically
+  std::atomic<double> row_ns_;  // negative if not measured yet
+  std::atomic<double> dispatch_ns_;  // negative if not measured yet
+  std::atomic<uint64_t> num_inline_;
+};
+
+constexpr double ParallelCostModel::kAmortization;
+constexpr double ParallelCostModel::kSmoothing;
+constexpr uint64_t ParallelCostModel::kProbeInterval;
+
+}  // namespace treelite
+
 namespace {
 
+inline uint64_t GetTimeNs() {
+  return static_cast<uint64_t>(
+    std::chrono::duration_cast<std::chrono::nanoseconds>(
+      std::chrono::steady_clock::now().time_since_epoch()).count());
+}
+
 enum class InputType : uint8_t {
   kSparseBatch = 0, kDenseBatch = 1
 };
 
+/* A range of rows whose chunks are claimed by the threads working on a
+   batch. In NUMA-aware mode, each node has a range of its own. */
+struct RowRange {
+  std::atomic<size_t> next_row;  // first row not yet claimed
+  size_t rend;  // end of the range
+};
+
 struct InputToken {
   InputType input_type;
   const void* data;  // pointer to input data
@@ -43,14 +299,30 @@ struct InputToken {
   size_t num_output_group;
     // size of output per instance (row)
   treelite::Predictor::PredFuncHandle pred_func_handle;
+  treelite::Predictor::PredFuncHandle batch_pred_func_handle;
+    // predict_batch() from the shared library; null if not available
+  const treelite::Interpreter* interpreter;
+    // interpreter of a binary model; null if a shared library is loaded
   size_t rbegin, rend;
-    // range of instances (rows) assigned to each worker
+    // range of instances (rows) in the batch
+  size_t chunk_size;
+    // number of rows claimed at a time
+  RowRange* row_ranges;
+  int num_range;
+    // ranges of rows to claim; shared by all threads working on the batch
+  int home_range;
+    // range to claim from first
+  treelite::PerfCounters* perf;
+  int thread_index;
+    // index of the thread among the predictor's threads; -1 if not tracked
   float* out_pred;
     // buffer to store output from each worker
 };
 
 struct OutputToken {
   size_t query_result_size;
+  uint64_t busy_ns;  // time spent scoring rows
+  std::exception_ptr error;  // exception thrown while scoring rows, if any
 };
 
 inline std::string GetProtocol(const char* name) {
@@ -93,13 +365,24 @@ inline HandleType LoadFunction(treelite::Predictor::LibraryHandle lib_handle,
   return static_cast<HandleType>(func_handle);
 }
 
+/* Get a row of entries with all features marked missing. The buffer belongs
+   to the calling thread and is reused across calls, so that prediction does
+   not allocate once the buffer has grown to the model width. */
+inline TreelitePredictorEntry* GetScratchRow(size_t num_entry) {
+  static thread_local std::vector<TreelitePredictorEntry> inst;
+  TreelitePredictorEntry missing;
+  missing.missing = -1;
+  inst.assign(num_entry, missing);
+  return inst.data();
+}
+
 template <typename PredFunc>
 inline size_t PredLoop(const treelite::CSRBatch* batch, size_t num_feature,
                        size_t rbegin, size_t rend,
                        float* out_pred, PredFunc func) {
   CHECK_LE(batch->num_col, num_feature);
-  std::vector<TreelitePredictorEntry> inst(
-    std::max(batch->num_col, num_feature), {-1});
+  TreelitePredictorEntry* inst
+    = GetScratchRow(std::max(batch->num_col, num_feature));
   CHECK(rbegin < rend && rend <= batch->num_row);
   CHECK(sizeof(size_t) < sizeof(int64_t)
      || (rbegin <= static_cast<size_t>(std::numeric_limits<int64_t>::max())
@@ -125,15 +408,14 @@ inline size_t PredLoop(const treelite::CSRBatch* batch, size_t num_feature,
   return total_output_size;
 }
 
-template <typename PredFunc>
-inline size_t PredLoop(const treelite::DenseBatch* batch, size_t num_feature,
-                       size_t rbegin, size_t rend,
-                       float* out_pred, PredFunc func) {
-  const bool nan_missing
-                      = treelite::common::math::CheckNAN(batch->missing_value);
+template <typename ElementType, typename PredFunc>
+inline size_t PredLoopDense_(const treelite::DenseBatch* batch,
+                             const ElementType* data, size_t num_feature,
+                             size_t rbegin, size_t rend,
+                             float* out_pred, PredFunc func) {
   CHECK_LE(batch->num_col, num_feature);
-  std::vector<TreelitePredictorEntry> inst(
-    std::max(batch->num_col, num_feature), {-1});
+  TreelitePredictorEntry* inst
+    = GetScratchRow(std::max(batch->num_col, num_feature));
   CHECK(rbegin < rend && rend <= batch->num_row);
   CHECK(sizeof(size_t) < sizeof(int64_t)
      || (rbegin <= static_cast<size_t>(std::numeric_limits<int64_t>::max())
@@ -141,19 +423,59 @@ inline size_t PredLoop(const treelite::DenseBatch* batch, size_t num_feature,
   const int64_t rbegin_ = static_cast<int64_t>(rbegin);
   const int64_t rend_ = static_cast<int64_t>(rend);
   const size_t num_col = batch->num_col;
+  const size_t row_stride = batch->row_stride;
+  const size_t col_stride = batch->col_stride;
   const float missing_value = batch->missing_value;
-  const float* data = batch->data;
-  const float* row;
+  const ElementType* row;
+  float fvalue;
+  size_t total_output_size = 0;
+  for (int64_t rid = rbegin_; rid < rend_; ++rid) {
+    row = &data[rid * row_stride];
+    for (size_t j = 0; j < num_col; ++j) {
+      fvalue = static_cast<float>(row[j * col_stride]);
+      // NaN marks a missing value whatever missing_value is, same as in
+      // predict_batch()
+      if (!treelite::common::math::CheckNAN(fvalue)
+          && fvalue != missing_value) {
+        inst[j].fvalue = fvalue;
+      }
+    }
+    total_output_size += func(rid, &inst[0], out_pred);
+    for (size_t j = 0; j < num_col; ++j) {
+      inst[j].missing = -1;
+    }
+  }
+  return total_output_size;
+}
+
+/* Fill entries with bin indices, for use with predict_binned() */
+template <typename BinType, typename PredFunc>
+inline size_t PredLoopBinned_(const treelite::DenseBatch* batch,
+                              const BinType* data, size_t num_feature,
+                              size_t rbegin, size_t rend,
+                              float* out_pred, PredFunc func) {
+  CHECK_LE(batch->num_col, num_feature);
+  TreelitePredictorEntry* inst
+    = GetScratchRow(std::max(batch->num_col, num_feature));
+  CHECK(rbegin < rend && rend <= batch->num_row);
+  CHECK(sizeof(size_t) < sizeof(int64_t)
+     || (rbegin <= static_cast<size_t>(std::numeric_limits<int64_t>::max())
+        && rend <= static_cast<size_t>(std::numeric_limits<int64_t>::max())));
+  const int64_t rbegin_ = static_cast<int64_t>(rbegin);
+  const int64_t rend_ = static_cast<int64_t>(rend);
+  const size_t num_col = batch->num_col;
+  const size_t row_stride = batch->row_stride;
+  const size_t col_stride = batch->col_stride;
+  const float missing_value = batch->missing_value;
+  const BinType* row;
+  BinType bin;
   size_t total_output_size = 0;
   for (int64_t rid = rbegin_; rid < rend_; ++rid) {
-    row = &data[rid * num_col];
+    row = &data[rid * row_stride];
     for (size_t j = 0; j < num_col; ++j) {
-      if (treelite::common::math::CheckNAN(row[j])) {
-        CHECK(nan_missing)
-          << "The missing_value argument must be set to NaN if there is any "
-          << "NaN in the matrix.";
-      } else if (nan_missing || row[j] != missing_value) {
-        inst[j].fvalue = row[j];
+      bin = row[j * col_stride];
+      if (static_cast<float>(bin) != missing_value) {
+        inst[j].qvalue = static_cast<int>(bin);
       }
     }
     total_output_size += func(rid, &inst[0], out_pred);
@@ -164,14 +486,176 @@ inline size_t PredLoop(const treelite::DenseBatch* batch, size_t num_feature,
   return total_output_size;
 }
 
+inline bool IsBinned(const treelite::CSRBatch* batch) {
+  return false;
+}
+
+inline bool IsBinned(const treelite::DenseBatch* batch) {
+  return batch->bin_u8 != nullptr || batch->bin_u16 != nullptr;
+}
+
+template <typename PredFunc>
+inline size_t PredLoop(const treelite::DenseBatch* batch, size_t num_feature,
+                       size_t rbegin, size_t rend,
+                       float* out_pred, PredFunc func) {
+  if (batch->bin_u8 != nullptr) {
+    return PredLoopBinned_(batch, batch->bin_u8, num_feature, rbegin, rend,
+                           out_pred, func);
+  } else if (batch->bin_u16 != nullptr) {
+    return PredLoopBinned_(batch, batch->bin_u16, num_feature, rbegin, rend,
+                           out_pred, func);
+  } else if (batch->data_f64 != nullptr) {
+    return PredLoopDense_(batch, batch->data_f64, num_feature, rbegin, rend,
+                          out_pred, func);
+  } else {
+    return PredLoopDense_(batch, batch->data, num_feature, rbegin, rend,
+                          out_pred, func);
+  }
+}
+
+/* Copy rows [rbegin, rend) of a dense batch into a row-major float32 buffer */
+template <typename ElementType>
+inline void GatherRows(const treelite::DenseBatch* batch,
+                       const ElementType* data, size_t rbegin, size_t rend,
+                       float* out) {
+  const size_t num_col = batch->num_col;
+  const size_t row_stride = batch->row_stride;
+  const size_t col_stride = batch->col_stride;
+  if (col_stride < row_stride) {  // mostly row-major
+    for (size_t rid = rbegin; rid < rend; ++rid) {
+      const ElementType* row = &data[rid * row_stride];
+      float* out_row = &out[(rid - rbegin) * num_col];
+      for (size_t j = 0; j < num_col; ++j) {
+        out_row[j] = static_cast<float>(row[j * col_stride]);
+      }
+    }
+  } else {  // mostly column-major: walk down each column
+    for (size_t j = 0; j < num_col; ++j) {
+      const ElementType* col = &data[j * col_stride];
+      for (size_t rid = rbegin; rid < rend; ++rid) {
+        out[(rid - rbegin) * num_col + j]
+          = static_cast<float>(col[rid * row_stride]);
+      }
+    }
+  }
+}
+
+// number of rows to gather at a time when a dense batch is not laid out as
+// predict_batch() expects
+constexpr size_t kGatherBlockSize = 256;
+
+// signature of predict_batch()
+using BatchPredFunc = size_t (*)(const float*, size_t, size_t, float, int,
+                                 float*);
+
+template <typename BatchPredFuncType>
+inline size_t BatchPredLoop(const treelite::CSRBatch* batch,
+                            size_t rbegin, size_t rend, bool pred_margin,
+                            size_t num_output_group,
+                            BatchPredFuncType batch_pred_func,
+                            float* out_pred, uint64_t* assemble_ns) {
+  LOG(FATAL) << "predict_batch() does not accept sparse batches";
+  return 0;
+}
+
+/* Score rows with [batch_pred_func], which is called the same way as
+   predict_batch(). Time spent converting rows is added to [assemble_ns] */
+template <typename BatchPredFuncType>
+inline size_t BatchPredLoop(const treelite::DenseBatch* batch,
+                            size_t rbegin, size_t rend, bool pred_margin,
+                            size_t num_output_group,
+                            BatchPredFuncType batch_pred_func,
+                            float* out_pred, uint64_t* assemble_ns) {
+  CHECK(rbegin < rend && rend <= batch->num_row);
+  const size_t num_col = batch->num_col;
+  /* the output of row [rid] is stored at out_pred[rid * num_output_group],
+     same as PredLoop() */
+  if (batch->data != nullptr && batch->col_stride == 1
+      && batch->row_stride == num_col) {
+    // rows are read in place
+    const size_t query_result_size
+      = batch_pred_func(&batch->data[rbegin * num_col], rend - rbegin, num_col,
+                        batch->missing_value, static_cast<int>(pred_margin),
+                        &out_pred[rbegin * num_output_group]);
+    CHECK_GT(query_result_size, 0)
+      << "predict_batch() failed to allocate its working memory";
+    return query_result_size;
+  }
+  /* Other layouts and float64 are converted a few rows at a time, so that
+     only a small, cache-resident copy is made rather than a copy of the
+     whole matrix. */
+  static thread_local std::vector<float> buffer;
+  buffer.resize(std::min(kGatherBlockSize, rend - rbegin) * num_col);
+  size_t total_output_size = 0;
+  for (size_t begin = rbegin; begin < rend; begin += kGatherBlockSize) {
+    const size_t end = std::min(begin + kGatherBlockSize, rend);
+    const uint64_t tstart = GetTimeNs();
+    if (batch->data_f64 != nullptr) {
+      GatherRows(batch, batch->data_f64, begin, end, buffer.data());
+    } else {
+      GatherRows(batch, batch->data, begin, end, buffer.data());
+    }
+    *assemble_ns += GetTimeNs() - tstart;
+    const size_t query_result_size
+      = batch_pred_func(buffer.data(), end - begin, num_col,
+                        batch->missing_value, static_cast<int>(pred_margin),
+                        &out_pred[begin * num_output_group]);
+    CHECK_GT(query_result_size, 0)
+      << "predict_batch() failed to allocate its working memory";
+    total_output_size += query_result_size;
+  }
+  return total_output_size;
+}
+
+/* Score rows with the interpreter: dense rows a block at a time, sparse
+   rows one at a time */
+inline size_t InterpretBatch_(const treelite::CSRBatch* batch, bool pred_margin,
+                              size_t num_feature, size_t num_output_group,
+                              const treelite::Interpreter* interpreter,
+                              size_t rbegin, size_t rend, float* out_pred,
+                              uint64_t* assemble_ns) {
+  return PredLoop(batch, num_feature, rbegin, rend, out_pred,
+    [interpreter, num_output_group, pred_margin]
+    (int64_t rid, TreelitePredictorEntry* inst, float* out_pred) -> size_t {
+      return interpreter->PredictInst(inst, pred_margin,
+                                      &out_pred[rid * num_output_group]);
+    });
+}
+
+inline size_t InterpretBatch_(const treelite::DenseBatch* batch,
+                              bool pred_margin,
+                              size_t num_feature, size_t num_output_group,
+                              const treelite::Interpreter* interpreter,
+                              size_t rbegin, size_t rend, float* out_pred,
+                              uint64_t* assemble_ns) {
+  return BatchPredLoop(batch, rbegin, rend, pred_margin, num_output_group,
+    [interpreter](const float* rows, size_t nrow, size_t ncol, float missing,
+                  int pred_margin, float* out) {
+      return interpreter->PredictBatch(rows, nrow, ncol, missing,
+                                       pred_margin != 0, out);
+    }, out_pred, assemble_ns);
+}
+
 template <typename BatchType>
 inline size_t PredictBatch_(const BatchType* batch, bool pred_margin,
                             size_t num_feature, size_t num_output_group,
                             treelite::Predictor::PredFuncHandle pred_func_handle,
+                            treelite::Predictor::PredFuncHandle batch_pred_func_handle,
+                            const treelite::Interpreter* interpreter,
                             size_t rbegin, size_t rend,
-                            size_t expected_query_result_size, float* out_pred) {
+                            size_t expected_query_result_size, float* out_pred,
+                            uint64_t* assemble_ns) {
+  if (interpreter != nullptr) {
+    return InterpretBatch_(batch, pred_margin, num_feature, num_output_group,
+                           interpreter, rbegin, rend, out_pred, assemble_ns);
+  }
   CHECK(pred_func_handle != nullptr)
     << "A shared library needs to be loaded first using Load()";
+  if (batch_pred_func_handle != nullptr) {
+    return BatchPredLoop(batch, rbegin, rend, pred_margin, num_output_group,
+                         reinterpret_cast<BatchPredFunc>(batch_pred_func_handle),
+                         out_pred, assemble_ns);
+  }
   /* Pass the correct prediction function to PredLoop.
      We also need to specify how the function should be called. */
   size_t query_result_size;
@@ -203,10 +687,94 @@ inline size_t PredictBatch_(const BatchType* batch, bool pred_margin,
   return query_result_size;
 }
 
+/* Repeatedly claim the next chunk of rows and run prediction on it, until
+   the batch is exhausted. The master and the worker threads all draw from
+   the same counters, so that a thread that falls behind (due to a busy core
+   or slow rows) simply ends up claiming fewer chunks. A thread exhausts its
+   home range first and then helps with the other ranges. The time spent
+   scoring rows is saved to [out_busy_ns]. */
+template <typename BatchType>
+inline size_t PredictChunks_(const BatchType* batch, const InputToken& input,
+                             const treelite::Predictor* predictor,
+                             uint64_t* out_busy_ns) {
+  size_t query_result_size = 0;
+  uint64_t busy_ns = 0, assemble_ns = 0;
+  for (int i = 0; i < input.num_range; ++i) {
+    RowRange& range
+      = input.row_ranges[(input.home_range + i) % input.num_range];
+    while (true) {
+      const size_t rbegin = range.next_row.fetch_add(input.chunk_size);
+      if (rbegin >= range.rend) {
+        break;
+      }
+      const size_t rend = std::min(rbegin + input.chunk_size, range.rend);
+      const uint64_t tstart = GetTimeNs();
+      query_result_size
+        += PredictBatch_(batch, input.pred_margin, input.num_feature,
+                         input.num_output_group, input.pred_func_handle,
+                         input.batch_pred_func_handle, input.interpreter,
+                         rbegin, rend,
+                         predictor->QueryResultSize(batch, rbegin, rend),
+                         input.out_pred, &assemble_ns);
+      busy_ns += GetTimeNs() - tstart;
+    }
+  }
+  input.perf->RecordWork(input.thread_index, busy_ns, assemble_ns);
+  *out_busy_ns = busy_ns;
+  return query_result_size;
+}
+
+/* When no chunk size is set, each thread gets to claim about
+   kChunksPerThread chunks, so that the work can be rebalanced if some
+   threads fall behind. Chunks are kept no smaller than kMinChunkSize rows,
+   since claiming a chunk costs an atomic operation and predict_batch()
+   works on blocks of rows. */
+constexpr size_t kChunksPerThread = 4;
+constexpr size_t kMinChunkSize = 16;
+
+inline size_t GetChunkSize(size_t chunk_size, size_t num_row,
+                           int num_worker_thread) {
+  if (chunk_size == 0) {
+    const size_t num_chunk = static_cast<size_t>(num_worker_thread)
+                             * kChunksPerThread;
+    chunk_size = std::max((num_row + num_chunk - 1) / num_chunk, kMinChunkSize);
+  }
+  return chunk_size;
+}
+
+/* Time spent scoring rows, summed over threads, is added to [busy_ns] */
+template <typename BatchType>
+inline size_t PredictBatchShared_(const BatchType* batch,
+                                  const InputToken& request, int nthread,
+                                  const treelite::Predictor* predictor,
+                                  std::atomic<uint64_t>* busy_ns) {
+  return treelite::SharedThreadPool::Get()->ParallelForChunks(
+    request.rbegin, request.rend, request.chunk_size, nthread - 1,
+    [batch, request, predictor, busy_ns](size_t rbegin, size_t rend) {
+      const uint64_t tstart = GetTimeNs();
+      uint64_t assemble_ns = 0;
+      const size_t query_result_size
+        = PredictBatch_(batch, request.pred_margin, request.num_feature,
+                        request.num_output_group, request.pred_func_handle,
+                        request.batch_pred_func_handle, request.interpreter,
+                        rbegin, rend,
+                        predictor->QueryResultSize(batch, rbegin, rend),
+                        request.out_pred, &assemble_ns);
+      const uint64_t chunk_ns = GetTimeNs() - tstart;
+      request.perf->RecordWork(-1, chunk_ns, assemble_ns);
+      busy_ns->fetch_add(chunk_ns, std::memory_order_relaxed);
+      return query_result_size;
+    });
+}
+
 inline size_t PredictInst_(TreelitePredictorEntry* inst,
                            bool pred_margin, size_t num_output_group,
                            treelite::Predictor::PredFuncHandle pred_func_handle,
+                           const treelite::Interpreter* interpreter,
                            size_t expected_query_result_size, float* out_pred) {
+  if (interpreter != nullptr) {
+    return interpreter->PredictInst(inst, pred_margin, out_pred);
+  }
   CHECK(pred_func_handle != nullptr)
     << "A shared library needs to be loaded first using Load()";
   size_t query_result_size; // Dimention of output vector
@@ -223,126 +791,309 @@ inline size_t PredictInst_(TreelitePredictorEntry* inst,
   return query_result_size;
 }
 
+/* Measure the time it takes to hand an empty task to every worker and to
+   hear back from all of them, i.e. the overhead that a batch pays for being
+   spread over threads. The median of a few rounds is taken, since the first
+   rounds may find workers still starting up. */
+inline double MeasureDispatchCost(PredThreadPool* pool, int num_worker,
+                                  treelite::PerfCounters* perf) {
+  constexpr int kNumRound = 9;
+  InputToken ping{};
+  ping.input_type = InputType::kDenseBatch;
+  ping.num_range = 0;  // nothing to claim
+  ping.perf = perf;
+  ping.thread_index = -1;
+  std::vector<uint64_t> round_ns;
+  OutputToken response;
+  for (int round = 0; round < kNumRound; ++round) {
+    const uint64_t tstart = GetTimeNs();
+    for (int tid = 0; tid < num_worker; ++tid) {
+      pool->SubmitTask(tid, ping);
+    }
+    for (int tid = 0; tid < num_worker; ++tid) {
+      pool->WaitForTask(tid, &response);
+    }
+    round_ns.push_back(GetTimeNs() - tstart);
+  }
+  std::nth_element(round_ns.begin(), round_ns.begin() + kNumRound / 2,
+                   round_ns.end());
+  return static_cast<double>(round_ns[kNumRound / 2]);
+}
+
 }  // anonymous namespace
 
 namespace treelite {
 
-Predictor::Predictor(int num_worker_thread)
-                       : lib_handle_(nullptr),
-                         num_output_group_query_func_handle_(nullptr),
-                         num_feature_query_func_handle_(nullptr),
-                         pred_func_handle_(nullptr),
+Predictor::Library::Library()
+    : lib_handle(nullptr), pred_func_handle(nullptr),
+      batch_pred_func_handle(nullptr), binned_pred_func_handle(nullptr),
+      cut_points_query_func_handle(nullptr), may_overwrite_input(false),
+      tempdir(nullptr) {}
+
+Predictor::Library::~Library() {
+  if (lib_handle != nullptr) {
+    CloseLibrary(lib_handle);
+  }
+}
+
+Predictor::Predictor(int num_worker_thread, bool use_shared_pool,
+                     bool numa_aware)
+                       : lib_(nullptr),
+                         lib_generation_(0),
                          thread_pool_handle_(nullptr),
+                         num_output_group_(0),
+                         num_feature_(0),
                          num_worker_thread_(num_worker_thread),
-                         tempdir_(nullptr) {}
+                         use_shared_pool_(use_shared_pool),
+                         numa_aware_(numa_aware),
+                         wait_policy_(WaitPolicy::kSpinThenPark),
+                         max_spin_us_(kDefaultMaxSpinMicroseconds),
+                         perf_(new PerfCounters()),
+                         cost_model_(new ParallelCostModel()),
+                         chunk_size_(0) {
+  CHECK(!(use_shared_pool && numa_aware))
+    << "NUMA-aware mode requires a predictor with its own thread pool";
+}
 Predictor::~Predictor() {
   Free();
 }
 
-void
-Predictor::Load(const char* name) {
+std::shared_ptr<Predictor::Library>
+Predictor::OpenLibrary_(const char* name) {
+  std::shared_ptr<Library> lib = std::make_shared<Library>();
   const std::string protocol = GetProtocol(name);
   if (protocol == "file://" || protocol.empty()) {
     // local file
-    lib_handle_ = OpenLibrary(name);
+    lib->path = name;
   } else {
     // remote file
-    tempdir_.reset(new common::filesystem::TemporaryDirectory());
-    temp_libfile_ = tempdir_->AddFile(common::filesystem::GetBasename(name));
+    lib->tempdir.reset(new common::filesystem::TemporaryDirectory());
+    const std::string temp_libfile
+      = lib->tempdir->AddFile(common::filesystem::GetBasename(name));
     {
       std::unique_ptr<dmlc::Stream> strm(dmlc::Stream::Create(name, "r"));
       dmlc::istream is(strm.get());
-      std::ofstream of(temp_libfile_);
+      std::ofstream of(temp_libfile);
       of << is.rdbuf();
     }
-    lib_handle_ = OpenLibrary(temp_libfile_.c_str());
+    lib->path = temp_libfile;
+  }
+  if (Interpreter::IsBinaryModel(lib->path)) {
+    /* model exported with Model.export_binary(): evaluated by the
+       interpreter, which has no use for the functions of a library */
+    lib->interpreter.reset(new Interpreter(lib->path));
+    lib->num_output_group = lib->interpreter->QueryNumOutputGroup();
+    lib->num_feature = lib->interpreter->QueryNumFeature();
+    lib->pred_transform = lib->interpreter->QueryPredTransform();
+    lib->sigmoid_alpha = lib->interpreter->QuerySigmoidAlpha();
+    lib->global_bias = lib->interpreter->QueryGlobalBias();
+    return lib;
   }
-  if (lib_handle_ == nullptr) {
+  lib->lib_handle = OpenLibrary(lib->path.c_str());
+  if (lib->lib_handle == nullptr) {
     LOG(FATAL) << "Failed to load dynamic shared library `" << name << "'";
   }
 
   /* 1. query # of output groups */
-  num_output_group_query_func_handle_
-    = LoadFunction<QueryFuncHandle>(lib_handle_, "get_num_output_group");
   using UnsignedQueryFunc = size_t (*)(void);
   auto uint_query_func
-    = reinterpret_cast<UnsignedQueryFunc>(num_output_group_query_func_handle_);
+    = reinterpret_cast<UnsignedQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_num_output_group"));
   CHECK(uint_query_func != nullptr)
     << "Dynamic shared library `" << name
     << "' does not contain valid get_num_output_group() function";
-  num_output_group_ = uint_query_func();
+  lib->num_output_group = uint_query_func();
 
   /* 2. query # of features */
-  num_feature_query_func_handle_
-    = LoadFunction<QueryFuncHandle>(lib_handle_, "get_num_feature");
-  uint_query_func = reinterpret_cast<UnsignedQueryFunc>(num_feature_query_func_handle_);
+  uint_query_func
+    = reinterpret_cast<UnsignedQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_num_feature"));
   CHECK(uint_query_func != nullptr)
     << "Dynamic shared library `" << name
     << "' does not contain valid get_num_feature() function";
-  num_feature_ = uint_query_func();
-  CHECK_GT(num_feature_, 0) << "num_feature cannot be zero";
+  lib->num_feature = uint_query_func();
+  CHECK_GT(lib->num_feature, 0) << "num_feature cannot be zero";
 
   /* 3. query # of pred_transform name */
-  pred_transform_query_func_handle_
-    = LoadFunction<QueryFuncHandle>(lib_handle_, "get_pred_transform");
   using StringQueryFunc = const char* (*)(void);
-  auto str_query_func =
-      reinterpret_cast<StringQueryFunc>(pred_transform_query_func_handle_);
+  auto str_query_func
+    = reinterpret_cast<StringQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_pred_transform"));
   if (str_query_func == nullptr) {
     LOG(INFO) << "Dynamic shared library `" << name
               << "' does not contain valid get_pred_transform() function";
-    pred_transform_ = "unknown";
+    lib->pred_transform = "unknown";
   } else {
-    pred_transform_ = str_query_func();
+    lib->pred_transform = str_query_func();
   }
 
   /* 4. query # of sigmoid_alpha */
-  sigmoid_alpha_query_func_handle_
-    = LoadFunction<QueryFuncHandle>(lib_handle_, "get_sigmoid_alpha");
   using FloatQueryFunc = float (*)(void);
-  auto float_query_func =
-      reinterpret_cast<FloatQueryFunc>(sigmoid_alpha_query_func_handle_);
+  auto float_query_func
+    = reinterpret_cast<FloatQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_sigmoid_alpha"));
   if (float_query_func == nullptr) {
     LOG(INFO) << "Dynamic shared library `" << name
               << "' does not contain valid get_sigmoid_alpha() function";
-    sigmoid_alpha_ = NAN;
+    lib->sigmoid_alpha = NAN;
   } else {
-    sigmoid_alpha_ = float_query_func();
+    lib->sigmoid_alpha = float_query_func();
   }
 
   /* 5. query # of global_bias */
-  global_bias_query_func_handle_
-    = LoadFunction<QueryFuncHandle>(lib_handle_, "get_global_bias");
-  float_query_func = reinterpret_cast<FloatQueryFunc>(global_bias_query_func_handle_);
+  float_query_func
+    = reinterpret_cast<FloatQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_global_bias"));
   if (float_query_func == nullptr) {
     LOG(INFO) << "Dynamic shared library `" << name
               << "' does not contain valid get_global_bias() function";
-    global_bias_ = NAN;
+    lib->global_bias = NAN;
   } else {
-    global_bias_ = float_query_func();
+    lib->global_bias = float_query_func();
   }
 
   /* 6. load appropriate function for margin prediction */
-  CHECK_GT(num_output_group_, 0) << "num_output_group cannot be zero";
-  if (num_output_group_ > 1) {   // multi-class classification
-    pred_func_handle_ = LoadFunction<PredFuncHandle>(lib_handle_,
-                                                     "predict_multiclass");
-    using PredFunc = size_t (*)(TreelitePredictorEntry*, int, float*);
-    PredFunc pred_func = reinterpret_cast<PredFunc>(pred_func_handle_);
-    CHECK(pred_func != nullptr)
+  CHECK_GT(lib->num_output_group, 0) << "num_output_group cannot be zero";
+  if (lib->num_output_group > 1) {   // multi-class classification
+    lib->pred_func_handle = LoadFunction<PredFuncHandle>(lib->lib_handle,
+                                                         "predict_multiclass");
+    CHECK(lib->pred_func_handle != nullptr)
       << "Dynamic shared library `" << name
       << "' does not contain valid predict_multiclass() function";
   } else {                      // everything else
-    pred_func_handle_ = LoadFunction<PredFuncHandle>(lib_handle_, "predict");
-    using PredFunc = float (*)(TreelitePredictorEntry*, int);
-    PredFunc pred_func = reinterpret_cast<PredFunc>(pred_func_handle_);
-    CHECK(pred_func != nullptr)
+    lib->pred_func_handle = LoadFunction<PredFuncHandle>(lib->lib_handle,
+                                                         "predict");
+    CHECK(lib->pred_func_handle != nullptr)
       << "Dynamic shared library `" << name
       << "' does not contain valid predict() function";
   }
 
+  /* 7. load batch prediction function, if available. Libraries produced by
+        older versions of treelite do not contain predict_batch(). */
+  lib->batch_pred_func_handle = LoadFunction<PredFuncHandle>(lib->lib_handle,
+                                                             "predict_batch");
+
+  /* 8. load functions for pre-binned input, if the library was compiled with
+        quantize=1 */
+  lib->binned_pred_func_handle
+    = LoadFunction<PredFuncHandle>(lib->lib_handle,
+                                   (lib->num_output_group > 1)
+                                   ? "predict_multiclass_binned"
+                                   : "predict_binned");
+  lib->cut_points_query_func_handle
+    = LoadFunction<QueryFuncHandle>(lib->lib_handle, "get_cut_points");
+
+  /* 9. find out which entries the prediction function overwrites. Older
+        versions of treelite do not say, so their libraries are assumed to
+        overwrite any entry. */
+  using OverwrittenFeaturesQueryFunc = size_t (*)(const unsigned**);
+  auto overwritten_features_query_func
+    = reinterpret_cast<OverwrittenFeaturesQueryFunc>(
+        LoadFunction<QueryFuncHandle>(lib->lib_handle,
+                                      "get_overwritten_features"));
+  if (overwritten_features_query_func == nullptr) {
+    lib->may_overwrite_input = true;
+  } else {
+    const unsigned* overwritten_feature;
+    const size_t num_overwritten_feature
+      = overwritten_features_query_func(&overwritten_feature);
+    lib->overwritten_feature.assign(
+      overwritten_feature, overwritten_feature + num_overwritten_feature);
+    for (unsigned fid : lib->overwritten_feature) {
+      CHECK_LT(fid, lib->num_feature)
+        << "Dynamic shared library `" << name
+        << "' overwrites a feature beyond num_feature";
+    }
+    lib->may_overwrite_input = false;
+  }
+  return lib;
+}
+
+std::shared_ptr<const Predictor::Library>
+Predictor::OpenLibraryForNodes_(const char* name) const {
+  std::shared_ptr<Library> lib = OpenLibrary_(name);
+  /* Opening the same file twice would only give back the same mapping, so
+     each further node gets a copy of the file. The copy is written and
+     loaded by a thread running on that node, so that its pages (and with
+     them the model data baked into the library) are placed in the node's
+     own memory. */
+  for (size_t node = 1; node < numa_nodes_.size(); ++node) {
+    std::shared_ptr<Library> replica;
+    std::exception_ptr error;
+    std::thread loader([&] {
+      try {
+        BindCurrentThread(numa_nodes_[node]);
+        std::unique_ptr<common::filesystem::TemporaryDirectory> tempdir(
+          new common::filesystem::TemporaryDirectory());
+        const std::string temp_libfile
+          = tempdir->AddFile(common::filesystem::GetBasename(lib->path));
+        {
+          std::ifstream is(lib->path, std::ios::binary);
+          std::ofstream of(temp_libfile, std::ios::binary);
+          of << is.rdbuf();
+        }
+        replica = OpenLibrary_(temp_libfile.c_str());
+        replica->tempdir = std::move(tempdir);
+      } catch (...) {
+        error = std::current_exception();
+      }
+    });
+    loader.join();
+    if (error) {
+      std::rethrow_exception(error);
+    }
+    lib->node_replicas.push_back(replica);
+  }
+  return lib;
+}
+
+void
+Predictor::Load(const char* name) {
   if (num_worker_thread_ == -1) {
-    num_worker_thread_ = std::thread::hardware_concurrency();
+    num_worker_thread_ = GetDefaultNumThread();
+  }
+  CHECK_GT(num_worker_thread_, 0) << "Number of threads must be positive";
+  /* In NUMA-aware mode, threads are divided among nodes in proportion to the
+     number of cores each node has, rounding up so that the first node, to
+     which the calling thread is bound, gets at least one. Threads of the
+     same node are placed next to one another. */
+  std::vector<int> affinity;
+  if (numa_aware_) {
+    const std::vector<std::vector<int>> nodes = GetNumaNodes();
+    size_t num_core = 0;
+    for (const std::vector<int>& cores : nodes) {
+      num_core += cores.size();
+    }
+    const size_t num_thread = static_cast<size_t>(num_worker_thread_);
+    size_t num_core_before = 0;
+    for (const std::vector<int>& cores : nodes) {
+      const size_t thread_begin
+        = (num_thread * num_core_before + num_core - 1) / num_core;
+      num_core_before += cores.size();
+      const size_t thread_end
+        = (num_thread * num_core_before + num_core - 1) / num_core;
+      if (thread_end == thread_begin) {
+        continue;
+      }
+      for (size_t i = 0; i < thread_end - thread_begin; ++i) {
+        affinity.push_back(cores[i % cores.size()]);
+        thread_node_.push_back(static_cast<int>(numa_nodes_.size()));
+      }
+      numa_nodes_.push_back(cores);
+    }
+  }
+
+  std::shared_ptr<const Library> lib = OpenLibraryForNodes_(name);
+  num_output_group_ = lib->num_output_group;
+  num_feature_ = lib->num_feature;
+  PublishLibrary_(lib);
+  perf_->SetNumThread(use_shared_pool_ ? 0 : num_worker_thread_);
+  perf_->Reset();
+  cost_model_->Reset();
+
+  if (use_shared_pool_) {
+    // batches will be scored on the process-wide pool; see PredictBatchBase_
+    return;
   }
   thread_pool_handle_ = static_cast<ThreadPoolHandle>(
       new PredThreadPool(num_worker_thread_ - 1, this,
@@ -351,62 +1102,128 @@ Predictor::Load(const char* name) {
                             const Predictor* predictor) {
       InputToken input;
       while (incoming_queue->Pop(&input)) {
-        size_t query_result_size;
-        const size_t rbegin = input.rbegin;
-        const size_t rend = input.rend;
-        switch (input.input_type) {
-         case InputType::kSparseBatch:
-          {
-            const CSRBatch* batch = static_cast<const CSRBatch*>(input.data);
-            query_result_size
-              = PredictBatch_(batch, input.pred_margin, input.num_feature,
-                              input.num_output_group, input.pred_func_handle,
-                              rbegin, rend,
-                              predictor->QueryResultSize(batch, rbegin, rend),
-                              input.out_pred);
-          }
-          break;
-         case InputType::kDenseBatch:
-          {
-            const DenseBatch* batch = static_cast<const DenseBatch*>(input.data);
-            query_result_size
-              = PredictBatch_(batch, input.pred_margin, input.num_feature,
-                              input.num_output_group, input.pred_func_handle,
-                              rbegin, rend,
-                              predictor->QueryResultSize(batch, rbegin, rend),
-                              input.out_pred);
+        size_t query_result_size = 0;
+        uint64_t busy_ns = 0;
+        std::exception_ptr error;
+        // an exception is handed back to the master, which rethrows it once
+        // every worker is done with the batch
+        try {
+          switch (input.input_type) {
+           case InputType::kSparseBatch:
+            {
+              const CSRBatch* batch = static_cast<const CSRBatch*>(input.data);
+              query_result_size
+                = PredictChunks_(batch, input, predictor, &busy_ns);
+            }
+            break;
+           case InputType::kDenseBatch:
+            {
+              const DenseBatch* batch
+                = static_cast<const DenseBatch*>(input.data);
+              query_result_size
+                = PredictChunks_(batch, input, predictor, &busy_ns);
+            }
+            break;
           }
-          break;
+        } catch (...) {
+          error = std::current_exception();
         }
-        outgoing_queue->Push(OutputToken{query_result_size});
+        outgoing_queue->Push(OutputToken{query_result_size, busy_ns, error});
       }
-    }));
+    }, affinity));
+  PredThreadPool* pool = static_cast<PredThreadPool*>(thread_pool_handle_);
+  pool->SetWaitPolicy(wait_policy_, max_spin_us_);
+  thread_affinity_ = pool->GetAffinity();
+  /* The cost of a row can only be measured on real batches, but the cost of
+     dispatch is known up front. With the shared pool, both are measured on
+     the first batch. */
+  if (num_worker_thread_ > 1) {
+    cost_model_->SetDispatchCost(
+      MeasureDispatchCost(pool, num_worker_thread_ - 1, perf_.get()));
+  }
 }
 
 void
 Predictor::Free() {
-  CloseLibrary(lib_handle_);
   delete static_cast<PredThreadPool*>(thread_pool_handle_);
+  thread_pool_handle_ = nullptr;
+  thread_affinity_.clear();
+  thread_node_.clear();
+  numa_nodes_.clear();
+  // the library is closed as soon as no request is using it
+  PublishLibrary_(nullptr);
 }
 
-template <typename BatchType>
-static inline
-std::vector<size_t> SplitBatch(const BatchType* batch, size_t split_factor) {
-  const size_t num_row = batch->num_row;
-  CHECK_LE(split_factor, num_row);
-  const size_t portion = num_row / split_factor;
-  const size_t remainder = num_row % split_factor;
-  std::vector<size_t> workload(split_factor, portion);
-  std::vector<size_t> row_ptr(split_factor + 1, 0);
-  for (size_t i = 0; i < remainder; ++i) {
-    ++workload[i];
+void
+Predictor::Reload(const char* name) {
+  std::shared_ptr<const Library> lib = OpenLibraryForNodes_(name);
+  CHECK(num_feature_ > 0)
+    << "A shared library needs to be loaded first using Load()";
+  CHECK_EQ(lib->num_feature, num_feature_)
+    << "Dynamic shared library `" << name << "' accepts a different number "
+    << "of features than the library currently loaded";
+  CHECK_EQ(lib->num_output_group, num_output_group_)
+    << "Dynamic shared library `" << name << "' produces a different number "
+    << "of output groups than the library currently loaded";
+  // Requests that already hold the old library keep using it; it is closed
+  // when the last of them releases its reference.
+  PublishLibrary_(lib);
+  cost_model_->ResetRowCost();
+}
+
+void
+Predictor::SetChunkSize(size_t chunk_size) {
+  chunk_size_ = chunk_size;
+}
+
+void
+Predictor::SetParallelThreshold(size_t threshold) {
+  cost_model_->SetThreshold(threshold);
+}
+
+size_t
+Predictor::QueryParallelThreshold() const {
+  return cost_model_->GetThreshold();
+}
+
+void
+Predictor::SetWaitPolicy(WaitPolicy policy, uint32_t max_spin_us) {
+  wait_policy_ = policy;
+  max_spin_us_ = max_spin_us;
+  if (use_shared_pool_) {
+    SharedThreadPool::Get()->SetWaitPolicy(policy, max_spin_us);
+  } else if (thread_pool_handle_ != nullptr) {
+    static_cast<PredThreadPool*>(thread_pool_handle_)
+      ->SetWaitPolicy(policy, max_spin_us);
   }
-  size_t accum = 0;
-  for (size_t i = 0; i < split_factor; ++i) {
-    accum += workload[i];
-    row_ptr[i + 1] = accum;
+}
+
+void
+Predictor::SetBatchCallbacks(BatchBeginCallback begin, BatchEndCallback end) {
+  batch_begin_callback_ = begin;
+  batch_end_callback_ = end;
+}
+
+PredictorStats
+Predictor::QueryStats() const {
+  return perf_->Snapshot();
+}
+
+void
+Predictor::ResetStats() {
+  perf_->Reset();
+}
+
+WaitStats
+Predictor::QueryWaitStats() const {
+  if (use_shared_pool_) {
+    return SharedThreadPool::Get()->GetWaitStats();
+  }
+  if (thread_pool_handle_ == nullptr) {
+    return WaitStats{0, 0, 0, 0, 0, 0};
   }
-  return row_ptr;
+  return static_cast<const PredThreadPool*>(thread_pool_handle_)
+    ->GetWaitStats();
 }
 
 template <typename BatchType>
@@ -416,41 +1233,150 @@ Predictor::PredictBatchBase_(const BatchType* batch, int verbose,
   static_assert(std::is_same<BatchType, DenseBatch>::value
                 || std::is_same<BatchType, CSRBatch>::value,
                 "PredictBatchBase_: unrecognized batch type");
-  const double tstart = dmlc::GetTime();
-  PredThreadPool* pool = static_cast<PredThreadPool*>(thread_pool_handle_);
+  const uint64_t tstart = GetTimeNs();
+  if (batch_begin_callback_) {
+    batch_begin_callback_(batch->num_row);
+  }
+  size_t total_size;
+  try {
+    total_size = ScoreBatch_(batch, pred_margin, out_result);
+  } catch (const std::exception& e) {
+    if (batch_end_callback_) {
+      batch_end_callback_(batch->num_row, (GetTimeNs() - tstart) * 1e-9,
+                          e.what());
+    }
+    throw;
+  }
+  const uint64_t elapsed_ns = GetTimeNs() - tstart;
+  perf_->RecordBatch(batch->num_row, elapsed_ns);
+  if (batch_end_callback_) {
+    batch_end_callback_(batch->num_row, elapsed_ns * 1e-9, nullptr);
+  }
+  if (verbose > 0) {
+    LOG(INFO) << "Treelite: Finished prediction in "
+              << elapsed_ns * 1e-9 << " sec";
+  }
+  return total_size;
+}
+
+template <typename BatchType>
+inline size_t
+Predictor::ScoreBatch_(const BatchType* batch, bool pred_margin,
+                       float* out_result) {
+  // hold on to the current library until the whole batch is scored, so that
+  // a concurrent Reload() cannot unload it under the workers
+  const std::shared_ptr<const Library> lib = AcquireLibrary_();
   const InputType input_type
     = std::is_same<BatchType, CSRBatch>::value
       ? InputType::kSparseBatch : InputType::kDenseBatch;
-  InputToken request{input_type, static_cast<const void*>(batch), pred_margin,
-                     num_feature_, num_output_group_, pred_func_handle_,
-                     0, batch->num_row, out_result};
-  OutputToken response;
+  /* predict_batch() is only used for dense batches. Pre-binned batches are
+     scored row by row with predict_binned(). */
+  const bool binned = IsBinned(batch);
+  CHECK(!binned || lib->binned_pred_func_handle != nullptr)
+    << "Pre-binned batches require a library compiled with quantize=1";
+  const PredFuncHandle pred_func_handle
+    = binned ? lib->binned_pred_func_handle : lib->pred_func_handle;
+  const PredFuncHandle batch_pred_func_handle
+    = (input_type == InputType::kDenseBatch && !binned)
+      ? lib->batch_pred_func_handle : nullptr;
   CHECK_GT(batch->num_row, 0);
-  const int nthread = std::min(num_worker_thread_,
-                               static_cast<int>(batch->num_row));
-  const std::vector<size_t> row_ptr = SplitBatch(batch, nthread);
-  for (int tid = 0; tid < nthread - 1; ++tid) {
-    request.rbegin = row_ptr[tid];
-    request.rend = row_ptr[tid + 1];
-    pool->SubmitTask(tid, request);
+  const uint64_t tstart = GetTimeNs();
+  const size_t num_row = batch->num_row;
+  /* Small batches are scored on the calling thread alone, as handing them
+     out to workers would cost more than it saves */
+  bool probe;
+  const int max_thread
+    = cost_model_->GetNumThread(num_row, num_worker_thread_, &probe);
+  size_t chunk_size = GetChunkSize(chunk_size_, num_row, max_thread);
+  if (probe) {
+    // one chunk per thread at least, or the batch would not be spread out
+    chunk_size = std::min(chunk_size,
+                          (num_row + max_thread - 1) / max_thread);
   }
-  size_t total_size = 0;
+  const size_t num_chunk = (num_row + chunk_size - 1) / chunk_size;
+  const int nthread
+    = static_cast<int>(std::min(static_cast<size_t>(max_thread), num_chunk));
+  /* In NUMA-aware mode, each node gets a contiguous range of rows, in
+     proportion to the number of its threads taking part in this batch.
+     Otherwise, all threads claim rows from a single range. */
+  const int num_range
+    = thread_node_.empty() ? 1 : (thread_node_[nthread - 1] + 1);
+  std::vector<RowRange> row_ranges(num_range);
   {
-    // assign work to master
-    const size_t rbegin = row_ptr[nthread - 1];
-    const size_t rend = row_ptr[nthread];
-    const size_t query_result_size
-      = PredictBatch_(batch, pred_margin, num_feature_, num_output_group_,
-                      pred_func_handle_,
-                      rbegin, rend, QueryResultSize(batch, rbegin, rend),
-                      out_result);
-    total_size += query_result_size;
+    size_t row_begin = 0;
+    int num_thread_before = 0;
+    for (int k = 0; k < num_range; ++k) {
+      while (num_thread_before < nthread
+             && (thread_node_.empty() || thread_node_[num_thread_before] == k)) {
+        ++num_thread_before;
+      }
+      const size_t row_end = num_row * num_thread_before / nthread;
+      row_ranges[k].next_row = row_begin;
+      row_ranges[k].rend = row_end;
+      row_begin = row_end;
+    }
   }
-  for (int tid = 0; tid < nthread - 1; ++tid) {
-    if (pool->WaitForTask(tid, &response)) {
-      total_size += response.query_result_size;
+  InputToken request{input_type, static_cast<const void*>(batch), pred_margin,
+                     num_feature_, num_output_group_, pred_func_handle,
+                     batch_pred_func_handle, lib->interpreter.get(),
+                     0, num_row, chunk_size,
+                     row_ranges.data(), num_range, 0, perf_.get(),
+                     use_shared_pool_ ? -1 : 0, out_result};
+  size_t total_size = 0;
+  uint64_t busy_ns = 0;
+  if (nthread == 1) {
+    total_size = PredictChunks_(batch, request, this, &busy_ns);
+  } else if (use_shared_pool_) {
+    std::atomic<uint64_t> shared_busy_ns(0);
+    total_size
+      = PredictBatchShared_(batch, request, nthread, this, &shared_busy_ns);
+    busy_ns = shared_busy_ns.load();
+  } else {
+    PredThreadPool* pool = static_cast<PredThreadPool*>(thread_pool_handle_);
+    OutputToken response;
+    for (int tid = 0; tid < nthread - 1; ++tid) {
+      InputToken worker_request = request;
+      if (!thread_node_.empty()) {
+        // thread 0 is the master, so worker [tid] is thread [tid + 1]
+        const int node = thread_node_[tid + 1];
+        const Library* replica = lib->GetReplica(node);
+        worker_request.pred_func_handle
+          = binned ? replica->binned_pred_func_handle
+                   : replica->pred_func_handle;
+        worker_request.batch_pred_func_handle
+          = (batch_pred_func_handle != nullptr)
+            ? replica->batch_pred_func_handle : nullptr;
+        worker_request.interpreter = replica->interpreter.get();
+        worker_request.home_range = node;
+      }
+      worker_request.thread_index = tid + 1;
+      pool->SubmitTask(tid, worker_request);
+    }
+    /* master claims chunks alongside the workers. The workers use
+       row_ranges and out_result until they respond, so every one of them
+       is waited for before an exception is let through. */
+    std::exception_ptr error;
+    try {
+      total_size = PredictChunks_(batch, request, this, &busy_ns);
+    } catch (...) {
+      error = std::current_exception();
+    }
+    const uint64_t wait_start = GetTimeNs();
+    for (int tid = 0; tid < nthread - 1; ++tid) {
+      if (pool->WaitForTask(tid, &response)) {
+        total_size += response.query_result_size;
+        busy_ns += response.busy_ns;
+        if (response.error && !error) {
+          error = response.error;
+        }
+      }
+    }
+    perf_->RecordWait(GetTimeNs() - wait_start);
+    if (error) {
+      std::rethrow_exception(error);
     }
   }
+  cost_model_->RecordBatch(num_row, nthread, GetTimeNs() - tstart, busy_ns);
   // re-shape output if total_size < dimension of out_result
   if (total_size < QueryResultSize(batch, 0, batch->num_row)) {
     CHECK_GT(num_output_group_, 1);
@@ -465,14 +1391,33 @@ Predictor::PredictBatchBase_(const BatchType* batch, int verbose,
       }
     }
   }
-  const double tend = dmlc::GetTime();
-  if (verbose > 0) {
-    LOG(INFO) << "Treelite: Finished prediction in "
-              << tend - tstart << " sec";
-  }
   return total_size;
 }
 
+template <typename BatchType>
+inline void
+Predictor::PredictBatchAsyncBase_(const BatchType* batch, int verbose,
+                                  bool pred_margin, float* out_result,
+                                  AsyncCallback callback) {
+  CHECK(num_feature_ > 0)
+    << "A shared library needs to be loaded first using Load()";
+  CHECK(use_shared_pool_)
+    << "Asynchronous prediction requires a predictor that uses the shared "
+    << "thread pool";
+  SharedThreadPool::Get()->SubmitTask(
+    [this, batch, verbose, pred_margin, out_result, callback] {
+      size_t query_result_size;
+      try {
+        query_result_size
+          = PredictBatchBase_(batch, verbose, pred_margin, out_result);
+      } catch (const std::exception& e) {
+        callback(0, e.what());
+        return;
+      }
+      callback(query_result_size, nullptr);
+    });
+}
+
 size_t
 Predictor::PredictBatch(const CSRBatch* batch, int verbose,
                         bool pred_margin, float* out_result) {
@@ -485,14 +1430,235 @@ Predictor::PredictBatch(const DenseBatch* batch, int verbose,
   return PredictBatchBase_(batch, verbose, pred_margin, out_result);
 }
 
+void
+Predictor::PredictBatchAsync(const CSRBatch* batch, int verbose,
+                             bool pred_margin, float* out_result,
+                             AsyncCallback callback) {
+  PredictBatchAsyncBase_(batch, verbose, pred_margin, out_result, callback);
+}
+
+void
+Predictor::PredictBatchAsync(const DenseBatch* batch, int verbose,
+                             bool pred_margin, float* out_result,
+                             AsyncCallback callback) {
+  PredictBatchAsyncBase_(batch, verbose, pred_margin, out_result, callback);
+}
+
 size_t
 Predictor::PredictInst(TreelitePredictorEntry* inst, bool pred_margin,
                        float* out_result) {
-  size_t total_size;
-  total_size = PredictInst_(inst, pred_margin, num_output_group_,
-                            pred_func_handle_,
-                            QueryResultSizeSingleInst(), out_result);
-  return total_size;
+  const std::shared_ptr<const Library> lib = AcquireLibrary_();
+  return PredictInstWith_(*lib, inst, pred_margin, out_result);
+}
+
+size_t
+Predictor::PredictInstWith_(const Library& lib, TreelitePredictorEntry* inst,
+                            bool pred_margin, float* out_result) {
+  perf_->RecordInst();
+  return PredictInst_(inst, pred_margin, num_output_group_,
+                      lib.pred_func_handle, lib.interpreter.get(),
+                      QueryResultSizeSingleInst(), out_result);
+}
+
+void
+Predictor::PublishLibrary_(std::shared_ptr<const Library> lib) {
+  std::atomic_store(&lib_, std::move(lib));
+  // after the store, so that whoever sees the new generation finds the new
+  // library in lib_
+  lib_generation_.fetch_add(1, std::memory_order_release);
+}
+
+size_t
+Predictor::QueryCutPoints(unsigned fid, const double** out_cut_points) const {
+  const std::shared_ptr<const Library> lib = AcquireLibrary_();
+  using CutPointsQueryFunc = size_t (*)(unsigned, const double**);
+  CutPointsQueryFunc cut_points_query_func
+    = reinterpret_cast<CutPointsQueryFunc>(lib->cut_points_query_func_handle);
+  CHECK(cut_points_query_func != nullptr)
+    << "The library was not compiled with quantize=1, so it has no cut points";
+  CHECK_LT(fid, lib->num_feature)
+    << "Feature index must be less than " << lib->num_feature;
+  return cut_points_query_func(fid, out_cut_points);
+}
+
+SingleRowPredictor::SingleRowPredictor(Predictor* predictor)
+    : predictor_(predictor), num_dense_filled_(0), lib_generation_(0) {
+  TreelitePredictorEntry missing;
+  missing.missing = -1;
+  inst_.resize(predictor_->QueryNumFeature(), missing);
+}
+
+size_t
+SingleRowPredictor::PredictDense(const float* row, size_t num_col,
+                                 float missing_value, bool pred_margin,
+                                 float* out_result) {
+  CHECK_LE(num_col, inst_.size())
+    << "Too many columns (features) in the given row. Number of features "
+    << "must not exceed " << inst_.size();
+  const bool nan_missing = common::math::CheckNAN(missing_value);
+  // every entry in [0, num_col) is overwritten, so there is nothing to reset
+  // afterwards, except what a longer row may have left beyond num_col
+  for (size_t j = 0; j < num_col; ++j) {
+    if (common::math::CheckNAN(row[j]) || (!nan_missing && row[j] == missing_value)) {
+      inst_[j].missing = -1;
+    } else {
+      inst_[j].fvalue = row[j];
+    }
+  }
+  for (size_t j = num_col; j < num_dense_filled_; ++j) {
+    inst_[j].missing = -1;
+  }
+  num_dense_filled_ = num_col;
+  return predictor_->PredictInstWith_(AcquireLibrary_(), inst_.data(),
+                                      pred_margin, out_result);
+}
+
+size_t
+SingleRowPredictor::PredictSparse(const uint32_t* indices, const float* values,
+                                  size_t nnz, bool pred_margin,
+                                  float* out_result) {
+  for (size_t i = 0; i < nnz; ++i) {
+    CHECK_LT(indices[i], inst_.size())
+      << "Feature index must be less than " << inst_.size();
+  }
+  for (size_t j = 0; j < num_dense_filled_; ++j) {
+    inst_[j].missing = -1;
+  }
+  num_dense_filled_ = 0;
+  for (size_t i = 0; i < nnz; ++i) {
+    inst_[indices[i]].fvalue = values[i];
+  }
+  const size_t query_result_size
+    = predictor_->PredictInstWith_(AcquireLibrary_(), inst_.data(),
+                                   pred_margin, out_result);
+  for (size_t i = 0; i < nnz; ++i) {
+    inst_[indices[i]].missing = -1;
+  }
+  return query_result_size;
+}
+
+const Predictor::Library&
+SingleRowPredictor::AcquireLibrary_() {
+  const uint64_t generation
+    = predictor_->lib_generation_.load(std::memory_order_acquire);
+  if (lib_ == nullptr || generation != lib_generation_) {
+    lib_ = predictor_->AcquireLibrary_();
+    lib_generation_ = generation;
+  }
+  return *lib_;
+}
+
+PredictorGroup::PredictorGroup(int num_worker_thread)
+    : num_output_(0), num_feature_(0), num_worker_thread_(num_worker_thread),
+      chunk_size_(0) {
+  if (num_worker_thread_ == -1) {
+    num_worker_thread_ = GetDefaultNumThread();
+  }
+  CHECK_GT(num_worker_thread_, 0) << "Number of threads must be positive";
+}
+
+void
+PredictorGroup::Load(const char* name) {
+  std::unique_ptr<Predictor> predictor(new Predictor(num_worker_thread_, true));
+  predictor->Load(name);
+  output_offset_.push_back(num_output_);
+  num_output_ += predictor->QueryNumOutputGroup();
+  num_feature_ = std::max(num_feature_, predictor->QueryNumFeature());
+  predictors_.push_back(std::move(predictor));
+}
+
+void
+PredictorGroup::SetChunkSize(size_t chunk_size) {
+  chunk_size_ = chunk_size;
+}
+
+template <typename BatchType>
+inline size_t
+PredictorGroup::PredictBatchBase_(const BatchType* batch, int verbose,
+                                  bool pred_margin, float* out_result) {
+  CHECK(!predictors_.empty())
+    << "At least one shared library needs to be loaded first using Load()";
+  CHECK(!IsBinned(batch))
+    << "PredictorGroup does not accept pre-binned batches, since each model "
+    << "has cut points of its own";
+  const double tstart = dmlc::GetTime();
+  CHECK_GT(batch->num_row, 0);
+  const size_t num_row = batch->num_row;
+  const size_t chunk_size
+    = GetChunkSize(chunk_size_, num_row, num_worker_thread_);
+  const size_t num_chunk = (num_row + chunk_size - 1) / chunk_size;
+  const int nthread
+    = static_cast<int>(std::min(static_cast<size_t>(num_worker_thread_),
+                                num_chunk));
+  const size_t num_feature = num_feature_;
+  const size_t num_output = num_output_;
+  const std::vector<std::unique_ptr<Predictor>>& predictors = predictors_;
+  const std::vector<size_t>& output_offset = output_offset_;
+  // held for the whole batch, rather than acquired for every row
+  std::vector<std::shared_ptr<const Predictor::Library>> libs;
+  for (const std::unique_ptr<Predictor>& predictor : predictors) {
+    libs.push_back(predictor->AcquireLibrary_());
+  }
+  SharedThreadPool::Get()->ParallelForChunks(0, num_row, chunk_size,
+                                             nthread - 1,
+    [&](size_t rbegin, size_t rend) {
+      /* Every model is given the same entries, except that a model whose
+         prediction function overwrites entries (e.g. to quantize feature
+         values) must leave them as it found them for the next model: only
+         the entries it overwrites are saved and restored, unless it cannot
+         tell which they are, in which case it is given a copy. */
+      static thread_local std::vector<TreelitePredictorEntry> saved_inst;
+      saved_inst.resize(num_feature);
+      return PredLoop(batch, num_feature, rbegin, rend, out_result,
+        [&](int64_t rid, TreelitePredictorEntry* inst, float* out_pred) {
+          float* out_row = &out_pred[rid * num_output];
+          for (size_t k = 0; k < predictors.size(); ++k) {
+            Predictor* predictor = predictors[k].get();
+            const Predictor::Library& lib = *libs[k];
+            const size_t num_output_group = predictor->QueryNumOutputGroup();
+            float* out_model = &out_row[output_offset[k]];
+            TreelitePredictorEntry* model_inst = inst;
+            if (lib.may_overwrite_input) {
+              std::copy(inst, inst + lib.num_feature, saved_inst.begin());
+              model_inst = saved_inst.data();
+            } else {
+              for (size_t i = 0; i < lib.overwritten_feature.size(); ++i) {
+                saved_inst[i] = inst[lib.overwritten_feature[i]];
+              }
+            }
+            const size_t query_result_size
+              = predictor->PredictInstWith_(lib, model_inst, pred_margin,
+                                            out_model);
+            if (!lib.may_overwrite_input) {
+              for (size_t i = 0; i < lib.overwritten_feature.size(); ++i) {
+                inst[lib.overwritten_feature[i]] = saved_inst[i];
+              }
+            }
+            std::fill(out_model + query_result_size,
+                      out_model + num_output_group,
+                      std::numeric_limits<float>::quiet_NaN());
+          }
+          return num_output;
+        });
+    });
+  const double tend = dmlc::GetTime();
+  if (verbose > 0) {
+    LOG(INFO) << "Treelite: Finished prediction with " << predictors_.size()
+              << " models in " << tend - tstart << " sec";
+  }
+  return QueryResultSize(batch);
+}
+
+size_t
+PredictorGroup::PredictBatch(const CSRBatch* batch, int verbose,
+                             bool pred_margin, float* out_result) {
+  return PredictBatchBase_(batch, verbose, pred_margin, out_result);
+}
+
+size_t
+PredictorGroup::PredictBatch(const DenseBatch* batch, int verbose,
+                             bool pred_margin, float* out_result) {
+  return PredictBatchBase_(batch, verbose, pred_margin, out_result);
 }
 
 }  // namespace treelite
@@ -0,0 +1,257 @@
+/*!
+* Copyright by 2020 Contributors
+* \file cpu_set.h
+* \brief find out which CPU cores the process may run on, and how many of
+*        them it may keep busy, so that thread pools are sized and pinned
+*        accordingly inside containers
+*/
+#ifndef TREELITE_THREAD_POOL_CPU_SET_H_
+#define TREELITE_THREAD_POOL_CPU_SET_H_
+
+#include <algorithm>
+#include <fstream>
+#include <stdexcept>
+#include <sstream>
+#include <string>
+#include <thread>
+#include <vector>
+#ifdef _WIN32
+#define NOMINMAX
+#include <windows.h>
+#elif defined(__linux__)
+#include <sched.h>
+#endif
+
+namespace treelite {
+
+/*!
+ * \brief get IDs of the CPU cores that the process is allowed to run on,
+ *        as given by its affinity mask (e.g. set by taskset or by a
+ *        container runtime through cpusets)
+ */
+inline std::vector<int> GetAllowedCores() {
+  std::vector<int> cores;
+#ifdef _WIN32
+  DWORD_PTR process_mask, system_mask;
+  if (GetProcessAffinityMask(GetCurrentProcess(), &process_mask,
+                             &system_mask)) {
+    for (int i = 0; i < static_cast<int>(sizeof(DWORD_PTR) * 8); ++i) {
+      if (process_mask & (static_cast<DWORD_PTR>(1) << i)) {
+        cores.push_back(i);
+      }
+    }
+  }
+#elif defined(__linux__)
+  cpu_set_t cpuset;
+  CPU_ZERO(&cpuset);
+  if (sched_getaffinity(0, sizeof(cpu_set_t), &cpuset) == 0) {
+    for (int i = 0; i < CPU_SETSIZE; ++i) {
+      if (CPU_ISSET(i, &cpuset)) {
+        cores.push_back(i);
+      }
+    }
+  }
+#endif
+  if (cores.empty()) {  // affinity mask not available; assume all cores
+    const int num_core
+      = std::max(static_cast<int>(std::thread::hardware_concurrency()), 1);
+    for (int i = 0; i < num_core; ++i) {
+      cores.push_back(i);
+    }
+  }
+  return cores;
+}
+
+/*!
+ * \brief get the number of cores' worth of CPU time that the process may
+ *        use, as limited by the CFS quota of its cgroup or of any cgroup
+ *        above it (e.g. the CPU limit of a Kubernetes pod, or the CPUQuota of
+ *        a systemd slice). Fractional limits are rounded up.
+ * \return CPU limit, or 0 if there is none
+ */
+inline int GetCPUQuota() {
+#ifdef __linux__
+  int limit = 0;
+  // keep the tightest of the limits found
+  auto apply_quota = [&limit](long long quota, long long period) {  // NOLINT(runtime/int)
+    if (quota > 0 && period > 0) {
+      const int num_core = static_cast<int>((quota + period - 1) / period);
+      limit = (limit == 0) ? num_core : std::min(limit, num_core);
+    }
+  };
+  /* cgroup v2: "<quota> <period>" in cpu.max, or "max <period>" if
+     unlimited. A quota set on an ancestor of the cgroup of the process
+     applies to it as well, so the hierarchy is walked from that cgroup up
+     to the root. With a private cgroup namespace, as in most containers,
+     the cgroup of the process is the root of the hierarchy it sees. */
+  std::string cgroup_path;
+  {
+    std::ifstream cgroup("/proc/self/cgroup");
+    std::string line;
+    while (std::getline(cgroup, line)) {
+      if (line.compare(0, 3, "0::") == 0) {
+        cgroup_path = line.substr(3);
+      }
+    }
+  }
+  bool has_cpu_max = false;
+  while (true) {
+    std::ifstream cpu_max("/sys/fs/cgroup" + cgroup_path + "/cpu.max");
+    std::string quota_str;
+    long long period;  // NOLINT(runtime/int)
+    if (cpu_max >> quota_str >> period) {
+      has_cpu_max = true;
+      if (quota_str != "max") {
+        try {
+          apply_quota(std::stoll(quota_str), period);
+        } catch (const std::logic_error&) {
+          // malformed; ignore the quota of this cgroup
+        }
+      }
+    }
+    const std::string::size_type slash = cgroup_path.find_last_of('/');
+    if (slash == std::string::npos) {
+      break;
+    }
+    cgroup_path.erase(slash);
+  }
+  // cgroup v1: quota is -1 if unlimited
+  if (!has_cpu_max) {
+    for (const char* dir : {"/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"}) {
+      std::ifstream quota_file(std::string(dir) + "/cpu.cfs_quota_us");
+      std::ifstream period_file(std::string(dir) + "/cpu.cfs_period_us");
+      long long quota, period;  // NOLINT(runtime/int)
+      if (quota_file >> quota && period_file >> period) {
+        apply_quota(quota, period);
+        break;
+      }
+    }
+  }
+  return limit;
+#else
+  return 0;
+#endif
+}
+
+/*!
+ * \brief parse a list of CPUs (or NUMA nodes) in the format used by sysfs,
+ *        e.g. "0-3,8,10-11"
+ */
+inline std::vector<int> ParseCPUList(const std::string& str) {
+  std::vector<int> cpus;
+  std::istringstream is(str);
+  std::string token;
+  while (std::getline(is, token, ',')) {
+    if (token.empty()) {
+      continue;
+    }
+    const std::string::size_type dash = token.find('-');
+    int first, last;
+    try {
+      first = std::stoi(token.substr(0, dash));
+      last = (dash == std::string::npos) ? first : std::stoi(token.substr(dash + 1));
+    } catch (const std::logic_error&) {
+      return {};  // malformed; callers treat the list as unknown
+    }
+    for (int i = first; i <= last; ++i) {
+      cpus.push_back(i);
+    }
+  }
+  return cpus;
+}
+
+/*!
+ * \brief get the allowed cores (see GetAllowedCores()) of each NUMA node.
+ *        Nodes without any allowed core are left out. If the NUMA topology
+ *        is not known, all allowed cores are put in a single node.
+ */
+inline std::vector<std::vector<int>> GetNumaNodes() {
+  const std::vector<int> allowed_cores = GetAllowedCores();
+  std::vector<std::vector<int>> nodes;
+#ifdef __linux__
+  std::string online;
+  {
+    // node IDs need not be contiguous
+    std::ifstream is("/sys/devices/system/node/online");
+    std::getline(is, online);
+  }
+  for (int node_id : ParseCPUList(online)) {
+    std::ifstream cpulist("/sys/devices/system/node/node"
+                          + std::to_string(node_id) + "/cpulist");
+    std::string str;
+    if (!std::getline(cpulist, str)) {
+      continue;
+    }
+    std::vector<int> cores;
+    for (int core : ParseCPUList(str)) {
+      if (std::find(allowed_cores.begin(), allowed_cores.end(), core)
+          != allowed_cores.end()) {
+        cores.push_back(core);
+      }
+    }
+    if (!cores.empty()) {
+      nodes.push_back(std::move(cores));
+    }
+  }
+#endif
+  if (nodes.empty()) {
+    nodes.push_back(allowed_cores);
+  }
+  return nodes;
+}
+
+#ifdef _WIN32
+/*!
+ * \brief get the affinity mask of the given cores. Windows numbers cores
+ *        within a processor group, which has at most as many cores as
+ *        DWORD_PTR has bits; cores beyond that are left out.
+ */
+inline DWORD_PTR GetCoreMask(const std::vector<int>& cores) {
+  const int num_bit = static_cast<int>(sizeof(DWORD_PTR) * 8);
+  DWORD_PTR mask = 0;
+  for (int core : cores) {
+    if (core >= 0 && core < num_bit) {
+      mask |= static_cast<DWORD_PTR>(1) << core;
+    }
+  }
+  return mask;
+}
+#endif
+
+/*!
+ * \brief restrict the calling thread to the given cores. Memory the thread
+ *        touches first is then placed on the NUMA node(s) of these cores.
+ *        Does nothing where thread affinity is not supported.
+ */
+inline void BindCurrentThread(const std::vector<int>& cores) {
+#ifdef _WIN32
+  const DWORD_PTR mask = GetCoreMask(cores);
+  if (mask != 0) {  // an empty mask would be rejected anyway
+    SetThreadAffinityMask(GetCurrentThread(), mask);
+  }
+#elif defined(__linux__)
+  cpu_set_t cpuset;
+  CPU_ZERO(&cpuset);
+  for (int core : cores) {
+    CPU_SET(core, &cpuset);
+  }
+  sched_setaffinity(0, sizeof(cpu_set_t), &cpuset);
+#endif
+}
+
+/*!
+ * \brief get the number of threads to use by default: the number of cores
+ *        the process may run on, further limited by its CPU quota
+ */
+inline int GetDefaultNumThread() {
+  int num_thread = static_cast<int>(GetAllowedCores().size());
+  const int quota = GetCPUQuota();
+  if (quota > 0) {
+    num_thread = std::min(num_thread, quota);
+  }
+  return std::max(num_thread, 1);
+}
+
+}  // namespace treelite
+
+#endif  // TREELITE_THREAD_POOL_CPU_SET_H_
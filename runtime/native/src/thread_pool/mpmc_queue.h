@@ -0,0 +1,127 @@
+/*!
+* Copyright by 2020 Contributors
+* \file mpmc_queue.h
+* \brief Multi-producer-multi-consumer queue
+*/
+#ifndef TREELITE_THREAD_POOL_MPMC_QUEUE_H_
+#define TREELITE_THREAD_POOL_MPMC_QUEUE_H_
+
+#include <atomic>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <deque>
+#include <cstdint>
+#include <utility>
+#include "wait_state.h"
+
+/*!
+ * \brief Unbounded queue that may be pushed to and popped from by any number
+ *        of threads. Unlike SpscQueue, producers are not tied to consumers,
+ *        so that tasks from many callers can be handed to whichever worker
+ *        becomes free first.
+ */
+template <typename T>
+class MpmcQueue {
+ public:
+  MpmcQueue() : size_(0), exit_now_(false) {}
+
+  void Push(T input) {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      queue_.push_back(std::move(input));
+      push_time_ns_.store(WaitState::NowNs(), std::memory_order_relaxed);
+      size_.fetch_add(1, std::memory_order_release);
+    }
+    cv_.notify_one();
+  }
+
+  bool Pop(T* output) {
+    // When the queue is empty, busy wait a bit (depending on the wait policy)
+    // before going to sleep, same as SpscQueue::Pop()
+    bool waited = (size_.load(std::memory_order_acquire) == 0);
+    int64_t wait_begin = 0;
+    if (waited) {
+      wait_begin = WaitState::NowNs();
+      const int64_t spin_budget = wait_state_.GetSpinBudget();
+      if (spin_budget > 0) {
+        int64_t now = wait_begin;
+        while (size_.load(std::memory_order_acquire) == 0
+               && !exit_now_.load(std::memory_order_relaxed)
+               && now - wait_begin < spin_budget) {
+          std::this_thread::yield();
+          now = WaitState::NowNs();
+        }
+        wait_state_.RecordSpin(now - wait_begin);
+      }
+    }
+    std::unique_lock<std::mutex> lock(mutex_);
+    if (queue_.empty() && !exit_now_.load()) {
+      // also reached when another consumer took the element seen above
+      const int64_t park_begin = WaitState::NowNs();
+      if (!waited) {
+        waited = true;
+        wait_begin = park_begin;
+      }
+      cv_.wait(lock, [this] {
+        return !queue_.empty() || exit_now_.load();
+      });
+      wait_state_.RecordPark(WaitState::NowNs() - park_begin);
+    }
+    if (exit_now_.load(std::memory_order_relaxed)) {
+      return false;
+    }
+    *output = std::move(queue_.front());
+    queue_.pop_front();
+    size_.fetch_sub(1, std::memory_order_release);
+    const int64_t push_time = push_time_ns_.load(std::memory_order_relaxed);
+    lock.unlock();
+    if (waited) {
+      wait_state_.RecordWait(WaitState::NowNs() - wait_begin, push_time);
+    }
+    return true;
+  }
+
+  /*!
+   * \brief Set how consumers wait when the queue is empty. May be called
+   *        while consumers are waiting; the new policy applies from the
+   *        next wait.
+   * \param policy wait policy
+   * \param max_spin_us upper bound on the time spent spinning under
+   *                    WaitPolicy::kSpinThenPark, in microseconds
+   */
+  void SetWaitPolicy(treelite::WaitPolicy policy, uint32_t max_spin_us) {
+    wait_state_.SetWaitPolicy(policy, max_spin_us);
+  }
+
+  /*!
+   * \brief Get statistics on how consumers waited so far, summed over
+   *        consumers
+   */
+  treelite::WaitStats GetWaitStats() const {
+    return wait_state_.GetWaitStats();
+  }
+
+  /*!
+   * \brief Signal to terminate all consumers.
+   */
+  void SignalForKill() {
+    std::lock_guard<std::mutex> lock(mutex_);
+    exit_now_.store(true);
+    cv_.notify_all();
+  }
+
+ private:
+  std::deque<T> queue_;
+  // number of elements in the queue; lets consumers spin without the lock
+  std::atomic<size_t> size_;
+  std::atomic<bool> exit_now_;
+  // when the last element was pushed, in nanoseconds
+  std::atomic<int64_t> push_time_ns_{0};
+  // wait policy and statistics of the consumers
+  WaitState wait_state_;
+  std::mutex mutex_;
+  std::condition_variable cv_;
+};
+
+#endif  // TREELITE_THREAD_POOL_MPMC_QUEUE_H_
@@ -0,0 +1,161 @@
+/*!
+* Copyright by 2020 Contributors
+* \file shared_thread_pool.h
+* \brief a process-wide thread pool that accepts tasks from any thread
+*/
+#ifndef TREELITE_THREAD_POOL_SHARED_THREAD_POOL_H_
+#define TREELITE_THREAD_POOL_SHARED_THREAD_POOL_H_
+
+#include <dmlc/logging.h>
+#include <functional>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <exception>
+#include <memory>
+#include <atomic>
+#include <algorithm>
+#include "mpmc_queue.h"
+#include "cpu_set.h"
+
+namespace treelite {
+
+/*!
+ * \brief Thread pool shared by all predictors in the process. Any number of
+ *        threads may submit tasks concurrently; tasks are queued in a single
+ *        MpmcQueue and picked up by whichever worker is free. Since the
+ *        calling thread is expected to do its share of the work, the pool
+ *        holds one fewer worker than the number of threads given by
+ *        GetDefaultNumThread() (but at least one, so that tasks can also be
+ *        run asynchronously).
+ */
+class SharedThreadPool {
+ public:
+  using Task = std::function<void()>;
+
+  /*!
+   * \brief get the process-wide pool, creating it on first use
+   */
+  static SharedThreadPool* Get() {
+    // never deleted: worker threads may be blocked in the queue at exit, and
+    // joining them from a static destructor is unsafe
+    static SharedThreadPool* pool = new SharedThreadPool(
+      std::max(GetDefaultNumThread() - 1, 1));
+    return pool;
+  }
+
+  inline int NumWorker() const {
+    return num_worker_;
+  }
+
+  /*!
+   * \brief Set how the workers wait when there is no task. Since the pool is
+   *        process-wide, this affects every predictor that uses it.
+   */
+  void SetWaitPolicy(WaitPolicy policy, uint32_t max_spin_us) {
+    queue_.SetWaitPolicy(policy, max_spin_us);
+  }
+
+  /*!
+   * \brief Get statistics on how the workers waited for tasks, summed over
+   *        workers
+   */
+  WaitStats GetWaitStats() const {
+    return queue_.GetWaitStats();
+  }
+
+  void SubmitTask(Task task) {
+    queue_.Push(std::move(task));
+  }
+
+  /*!
+   * \brief Process rows [rbegin, rend) in chunks of chunk_size rows. Chunks
+   *        are claimed from a shared counter by the calling thread and by up
+   *        to num_task tasks submitted to the pool. This function returns as
+   *        soon as every chunk has been processed, without waiting for tasks
+   *        that have not been scheduled yet; such tasks find no chunk left
+   *        and exit without calling func. Any exception thrown by func is
+   *        rethrown here.
+   * \param func function to process chunk [begin, end); returns the size of
+   *             output produced
+   * \return sum of output sizes returned by func
+   */
+  template <typename ChunkFunc>
+  size_t ParallelForChunks(size_t rbegin, size_t rend, size_t chunk_size,
+                           int num_task, ChunkFunc func) {
+    std::shared_ptr<ChunkState> state = std::make_shared<ChunkState>(rbegin);
+    num_task = std::min(num_task, num_worker_);
+    for (int i = 0; i < num_task; ++i) {
+      SubmitTask([state, rend, chunk_size, func] {
+        RunChunks(state.get(), rend, chunk_size, func);
+      });
+    }
+    RunChunks(state.get(), rend, chunk_size, func);
+    std::unique_lock<std::mutex> lock(state->mutex);
+    state->cv.wait(lock, [&state, rbegin, rend] {
+      return state->num_row_done == rend - rbegin;
+    });
+    if (state->error) {
+      std::rethrow_exception(state->error);
+    }
+    return state->output_size;
+  }
+
+ private:
+  /* Progress of a ParallelForChunks() call. It is owned jointly by the
+     caller and the tasks it submits, as a task may be dequeued only after
+     the caller has returned. */
+  struct ChunkState {
+    explicit ChunkState(size_t rbegin) : next_row(rbegin) {}
+    std::atomic<size_t> next_row;
+    size_t num_row_done{0};
+    size_t output_size{0};
+    std::exception_ptr error;
+    std::mutex mutex;
+    std::condition_variable cv;
+  };
+
+  template <typename ChunkFunc>
+  static void RunChunks(ChunkState* state, size_t rend, size_t chunk_size,
+                        const ChunkFunc& func) {
+    while (true) {
+      const size_t begin = state->next_row.fetch_add(chunk_size);
+      if (begin >= rend) {
+        break;
+      }
+      const size_t end = std::min(begin + chunk_size, rend);
+      size_t output_size = 0;
+      std::exception_ptr error;
+      try {
+        output_size = func(begin, end);
+      } catch (...) {
+        error = std::current_exception();
+      }
+      std::lock_guard<std::mutex> lock(state->mutex);
+      state->output_size += output_size;
+      state->num_row_done += end - begin;
+      if (error && !state->error) {
+        state->error = error;
+      }
+      state->cv.notify_all();
+    }
+  }
+
+  explicit SharedThreadPool(int num_worker) : num_worker_(num_worker) {
+    for (int i = 0; i < num_worker_; ++i) {
+      std::thread([this] {
+        Task task;
+        while (queue_.Pop(&task)) {
+          task();
+        }
+      }).detach();
+    }
+  }
+
+  int num_worker_;
+  MpmcQueue<Task> queue_;
+};
+
+}  // namespace treelite
+
+#endif  // TREELITE_THREAD_POOL_SHARED_THREAD_POOL_H_
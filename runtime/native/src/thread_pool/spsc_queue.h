@@ -13,6 +13,7 @@
 #include <mutex>
 #include <condition_variable>
 #include <cstdint>
+#include "wait_state.h"
 
 const constexpr int kL1CacheBytes = 64;
 
@@ -23,8 +24,7 @@ class SpscQueue {
   SpscQueue() :
     buffer_(new T[kRingSize]),
     head_(0),
-    tail_(0) {
-  }
+    tail_(0) {}
 
   ~SpscQueue() {
     delete[] buffer_;
@@ -34,25 +34,41 @@ class SpscQueue {
     while (!Enqueue(input)) {
       std::this_thread::yield();
     }
+    push_time_ns_.store(WaitState::NowNs(), std::memory_order_relaxed);
     if (pending_.fetch_add(1) == -1) {
       std::unique_lock<std::mutex> lock(mutex_);
       cv_.notify_one();
     }
   }
 
-  bool Pop(T* output, uint32_t spin_count = 300000) {
-    // Busy wait a bit when the queue is empty.
-    // If a new element comes to the queue quickly, this wait avoid the worker
-    // from sleeping.
-    // The default spin count is set by following the typical omp convention
-    for (uint32_t i = 0; i < spin_count && pending_.load() == 0; ++i) {
-      std::this_thread::yield();
+  bool Pop(T* output) {
+    // When the queue is empty, busy wait a bit (depending on the wait policy)
+    // before going to sleep, so that an element arriving shortly does not
+    // have to wake the consumer up.
+    const bool waited = (pending_.load() == 0);
+    int64_t wait_begin = 0;
+    if (waited) {
+      wait_begin = WaitState::NowNs();
+      const int64_t spin_budget = wait_state_.GetSpinBudget();
+      if (spin_budget > 0) {
+        int64_t now = wait_begin;
+        while (pending_.load() == 0 && !exit_now_.load(std::memory_order_relaxed)
+               && now - wait_begin < spin_budget) {
+          std::this_thread::yield();
+          now = WaitState::NowNs();
+        }
+        wait_state_.RecordSpin(now - wait_begin);
+      }
     }
     if (pending_.fetch_sub(1) == 0) {
-      std::unique_lock<std::mutex> lock(mutex_);
-      cv_.wait(lock, [this] {
-        return pending_.load() >= 0 || exit_now_.load();
-      });
+      const int64_t park_begin = WaitState::NowNs();
+      {
+        std::unique_lock<std::mutex> lock(mutex_);
+        cv_.wait(lock, [this] {
+          return pending_.load() >= 0 || exit_now_.load();
+        });
+      }
+      wait_state_.RecordPark(WaitState::NowNs() - park_begin);
     }
     if (exit_now_.load(std::memory_order_relaxed)) {
       return false;
@@ -62,9 +78,32 @@ class SpscQueue {
     CHECK(tail_.load(std::memory_order_acquire) != head);
     *output = buffer_[head];
     head_.store((head + 1) % kRingSize, std::memory_order_release);
+    if (waited) {
+      wait_state_.RecordWait(WaitState::NowNs() - wait_begin,
+                             push_time_ns_.load(std::memory_order_relaxed));
+    }
     return true;
   }
 
+  /*!
+   * \brief Set how the consumer waits when the queue is empty. May be called
+   *        while the consumer is waiting; the new policy applies from the
+   *        next wait.
+   * \param policy wait policy
+   * \param max_spin_us upper bound on the time spent spinning under
+   *                    WaitPolicy::kSpinThenPark, in microseconds
+   */
+  void SetWaitPolicy(treelite::WaitPolicy policy, uint32_t max_spin_us) {
+    wait_state_.SetWaitPolicy(policy, max_spin_us);
+  }
+
+  /*!
+   * \brief Get statistics on how the consumer waited so far
+   */
+  treelite::WaitStats GetWaitStats() const {
+    return wait_state_.GetWaitStats();
+  }
+
   /*!
    * \brief Signal to terminate the worker.
    */
@@ -111,6 +150,14 @@ class SpscQueue {
   // signal for exit now
   std::atomic<bool> exit_now_{false};
 
+  cache_line_pad_t pad5_;
+  // when the last element was pushed, in nanoseconds
+  std::atomic<int64_t> push_time_ns_{0};
+
+  cache_line_pad_t pad6_;
+  // wait policy and statistics of the consumer
+  WaitState wait_state_;
+
   // internal mutex
   std::mutex mutex_;
   // cv for consumer
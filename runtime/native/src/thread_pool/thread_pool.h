@@ -8,6 +8,7 @@
 #define TREELITE_THREAD_POOL_THREAD_POOL_H_
 
 #include <treelite/common.h>
+#include <algorithm>
 #include <vector>
 #include <cstdlib>
 #ifdef _WIN32
@@ -17,6 +18,7 @@
 #include <sched.h>
 #endif
 #include "spsc_queue.h"
+#include "cpu_set.h"
 
 namespace treelite {
 
@@ -26,8 +28,20 @@ class ThreadPool {
   using TaskFunc = void(*)(SpscQueue<InputToken>*, SpscQueue<OutputToken>*,
                            const TaskContext*);
 
-  ThreadPool(int num_worker, const TaskContext* context, TaskFunc task)
-    : num_worker_(num_worker), context_(context), task_(task) {
+  /*!
+   * \brief create the pool
+   * \param num_worker number of worker threads
+   * \param context context passed to each worker
+   * \param task function run by each worker
+   * \param affinity cores to bind threads to: the calling thread first,
+   *                 followed by the workers. If empty, threads are spread
+   *                 over the cores the process may run on, unless
+   *                 TREELITE_BIND_THREADS=0 is set.
+   */
+  ThreadPool(int num_worker, const TaskContext* context, TaskFunc task,
+             std::vector<int> affinity = std::vector<int>())
+    : num_worker_(num_worker), context_(context), task_(task),
+      affinity_(std::move(affinity)) {
     CHECK(num_worker_ >= 0 && num_worker_ < std::thread::hardware_concurrency())
     << "Number of worker threads must be between 0 and "
     << (std::thread::hardware_concurrency() - 1);
@@ -43,7 +57,15 @@ class ThreadPool {
     }
     /* bind threads to cores */
     const char* bind_flag = getenv("TREELITE_BIND_THREADS");
-    if (bind_flag == nullptr || std::atoi(bind_flag) == 1) {
+    if (!affinity_.empty()) {
+      CHECK_EQ(affinity_.size(), static_cast<size_t>(num_worker_ + 1))
+        << "A core must be given for every thread";
+      SetAffinity();
+    } else if (bind_flag == nullptr || std::atoi(bind_flag) == 1) {
+      const std::vector<int> cores = GetAllowedCores();
+      for (int i = 0; i <= num_worker_; ++i) {
+        affinity_.push_back(cores[i % cores.size()]);
+      }
       SetAffinity();
     }
   }
@@ -63,6 +85,46 @@ class ThreadPool {
     return outgoing_queue_[tid]->Pop(response);
   }
 
+  /*!
+   * \brief set how threads wait when they have nothing to do: workers waiting
+   *        for tasks, and the thread that created the pool waiting for
+   *        workers to finish. See SpscQueue::SetWaitPolicy().
+   */
+  void SetWaitPolicy(WaitPolicy policy, uint32_t max_spin_us) {
+    for (int i = 0; i < num_worker_; ++i) {
+      incoming_queue_[i]->SetWaitPolicy(policy, max_spin_us);
+      outgoing_queue_[i]->SetWaitPolicy(policy, max_spin_us);
+    }
+  }
+
+  /*!
+   * \brief get statistics on how workers waited for tasks, summed over all
+   *        workers (the longest wake latency is the longest of any worker)
+   */
+  WaitStats GetWaitStats() const {
+    WaitStats total{0, 0, 0, 0, 0, 0};
+    for (int i = 0; i < num_worker_; ++i) {
+      const WaitStats stats = incoming_queue_[i]->GetWaitStats();
+      total.num_wait += stats.num_wait;
+      total.num_park += stats.num_park;
+      total.spin_ns += stats.spin_ns;
+      total.park_ns += stats.park_ns;
+      total.wake_latency_ns += stats.wake_latency_ns;
+      total.max_wake_latency_ns
+        = std::max(total.max_wake_latency_ns, stats.max_wake_latency_ns);
+    }
+    return total;
+  }
+
+  /*!
+   * \brief get the cores that threads were bound to: the thread that created
+   *        the pool first, followed by the workers. Empty if threads were not
+   *        bound (TREELITE_BIND_THREADS=0).
+   */
+  inline const std::vector<int>& GetAffinity() const {
+    return affinity_;
+  }
+
  private:
   int num_worker_;
   std::vector<std::thread> thread_;
@@ -70,25 +132,35 @@ class ThreadPool {
   std::vector<std::unique_ptr<SpscQueue<OutputToken>>> outgoing_queue_;
   TaskFunc task_;
   const TaskContext* context_;
+  std::vector<int> affinity_;
 
+  // bind threads to the cores given by affinity_. By default, threads are
+  // bound only to cores that the process is allowed to run on, one thread
+  // per core as long as there are enough allowed cores
   inline void SetAffinity() {
 #ifdef _WIN32
     /* Windows */
-    SetThreadAffinityMask(GetCurrentThread(), 0x1);
+    // cores outside of the mask (see GetCoreMask()) are left unbound
+    DWORD_PTR mask = GetCoreMask({affinity_[0]});
+    if (mask != 0) {
+      SetThreadAffinityMask(GetCurrentThread(), mask);
+    }
     for (int i = 0; i < num_worker_; ++i) {
-      const int core_id = i + 1;
-      SetThreadAffinityMask(thread_[i].native_handle(), (1 << core_id));
+      mask = GetCoreMask({affinity_[i + 1]});
+      if (mask != 0) {
+        SetThreadAffinityMask(thread_[i].native_handle(), mask);
+      }
     }
 #elif defined(__APPLE__) && defined(__MACH__)
 #include <TargetConditionals.h>
 #if TARGET_OS_MAC == 1
     /* Mac OSX */
     thread_port_t mach_thread = pthread_mach_thread_np(pthread_self());
-    thread_affinity_policy_data_t policy = {0};
+    thread_affinity_policy_data_t policy = {affinity_[0]};
     thread_policy_set(mach_thread, THREAD_AFFINITY_POLICY,
                       (thread_policy_t)&policy, THREAD_AFFINITY_POLICY_COUNT);
     for (int i = 0; i < num_worker_; ++i) {
-      const int core_id = i + 1;
+      const int core_id = affinity_[i + 1];
       mach_thread = pthread_mach_thread_np(thread_[i].native_handle());
       policy = {core_id};
       thread_policy_set(mach_thread, THREAD_AFFINITY_POLICY,
@@ -101,14 +173,14 @@ class ThreadPool {
     /* Linux and others */
     cpu_set_t cpuset;
     CPU_ZERO(&cpuset);
-    CPU_SET(0, &cpuset);
+    CPU_SET(affinity_[0], &cpuset);
 #if defined(__ANDROID__)
     sched_setaffinity(pthread_self(), sizeof(cpu_set_t), &cpuset);
 #else
     pthread_setaffinity_np(pthread_self(), sizeof(cpu_set_t), &cpuset);
 #endif
     for (int i = 0; i < num_worker_; ++i) {
-      const int core_id = i + 1;
+      const int core_id = affinity_[i + 1];
       CPU_ZERO(&cpuset);
       CPU_SET(core_id, &cpuset);
 #if defined(__ANDROID__)
@@ -0,0 +1,139 @@
+/*!
+* Copyright by 2020 Contributors
+* \file wait_state.h
+* \brief Wait policy and wait statistics of the consumers of a queue
+*/
+#ifndef TREELITE_THREAD_POOL_WAIT_STATE_H_
+#define TREELITE_THREAD_POOL_WAIT_STATE_H_
+
+#include <treelite/wait_policy.h>
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <limits>
+
+/*!
+ * \brief How long the consumers of a queue spin before going to sleep when
+ *        the queue is empty, and statistics on their waits. Shared by
+ *        SpscQueue and MpmcQueue. All members may be used from any thread;
+ *        with several consumers, the spin budget is adapted by all of them.
+ */
+class WaitState {
+ public:
+  WaitState() {
+    SetWaitPolicy(treelite::WaitPolicy::kSpinThenPark,
+                  treelite::kDefaultMaxSpinMicroseconds);
+  }
+
+  /*!
+   * \brief Set how consumers wait when the queue is empty. May be called
+   *        while consumers are waiting; the new policy applies from the
+   *        next wait.
+   * \param policy wait policy
+   * \param max_spin_us upper bound on the time spent spinning under
+   *                    WaitPolicy::kSpinThenPark, in microseconds
+   */
+  void SetWaitPolicy(treelite::WaitPolicy policy, uint32_t max_spin_us) {
+    max_spin_ns_.store(static_cast<int64_t>(max_spin_us) * 1000,
+                       std::memory_order_relaxed);
+    spin_budget_ns_.store(static_cast<int64_t>(max_spin_us) * 1000,
+                          std::memory_order_relaxed);
+    policy_.store(policy, std::memory_order_relaxed);
+  }
+
+  /*!
+   * \brief how long a consumer finding the queue empty should spin before
+   *        going to sleep, in nanoseconds
+   */
+  int64_t GetSpinBudget() const {
+    switch (policy_.load(std::memory_order_relaxed)) {
+      case treelite::WaitPolicy::kSpin:
+        return std::numeric_limits<int64_t>::max();
+      case treelite::WaitPolicy::kPark:
+        return 0;
+      default:
+        return spin_budget_ns_.load(std::memory_order_relaxed);
+    }
+  }
+
+  void RecordSpin(int64_t spin_ns) {
+    stats_.spin_ns.fetch_add(spin_ns, std::memory_order_relaxed);
+  }
+
+  void RecordPark(int64_t park_ns) {
+    stats_.num_park.fetch_add(1, std::memory_order_relaxed);
+    stats_.park_ns.fetch_add(park_ns, std::memory_order_relaxed);
+  }
+
+  /*!
+   * \brief Record a completed wait and adapt the spin budget to it
+   * \param wait_ns time from when the consumer found the queue empty until it
+   *                got an element
+   * \param push_time_ns when that element was pushed, as given by NowNs()
+   */
+  void RecordWait(int64_t wait_ns, int64_t push_time_ns) {
+    const uint64_t wake_latency = static_cast<uint64_t>(
+      std::max(NowNs() - push_time_ns, static_cast<int64_t>(0)));
+    stats_.num_wait.fetch_add(1, std::memory_order_relaxed);
+    stats_.wake_latency_ns.fetch_add(wake_latency, std::memory_order_relaxed);
+    if (wake_latency > stats_.max_wake_latency_ns.load(std::memory_order_relaxed)) {
+      stats_.max_wake_latency_ns.store(wake_latency, std::memory_order_relaxed);
+    }
+    AdaptSpinBudget(wait_ns);
+  }
+
+  /*!
+   * \brief Get statistics on how consumers waited so far
+   */
+  treelite::WaitStats GetWaitStats() const {
+    treelite::WaitStats stats;
+    stats.num_wait = stats_.num_wait.load(std::memory_order_relaxed);
+    stats.num_park = stats_.num_park.load(std::memory_order_relaxed);
+    stats.spin_ns = stats_.spin_ns.load(std::memory_order_relaxed);
+    stats.park_ns = stats_.park_ns.load(std::memory_order_relaxed);
+    stats.wake_latency_ns
+      = stats_.wake_latency_ns.load(std::memory_order_relaxed);
+    stats.max_wake_latency_ns
+      = stats_.max_wake_latency_ns.load(std::memory_order_relaxed);
+    return stats;
+  }
+
+  static inline int64_t NowNs() {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(
+      std::chrono::steady_clock::now().time_since_epoch()).count();
+  }
+
+ private:
+  // Spin for about twice as long as the last wait, if that wait was short
+  // enough for spinning to pay off. Otherwise, halve the budget, so that a
+  // consumer left idle soon stops spinning, while one fed in quick
+  // succession keeps spinning.
+  void AdaptSpinBudget(int64_t wait_ns) {
+    const int64_t max_spin = max_spin_ns_.load(std::memory_order_relaxed);
+    int64_t budget = spin_budget_ns_.load(std::memory_order_relaxed);
+    if (wait_ns <= max_spin) {
+      budget = std::min(std::max(budget, 2 * wait_ns), max_spin);
+    } else {
+      budget /= 2;
+    }
+    spin_budget_ns_.store(budget, std::memory_order_relaxed);
+  }
+
+  // wait policy and, for WaitPolicy::kSpinThenPark, current and maximum spin
+  // time; read by consumers
+  std::atomic<treelite::WaitPolicy> policy_;
+  std::atomic<int64_t> spin_budget_ns_;
+  std::atomic<int64_t> max_spin_ns_;
+  // updated by consumers
+  struct {
+    std::atomic<uint64_t> num_wait{0};
+    std::atomic<uint64_t> num_park{0};
+    std::atomic<uint64_t> spin_ns{0};
+    std::atomic<uint64_t> park_ns{0};
+    std::atomic<uint64_t> wake_latency_ns{0};
+    std::atomic<uint64_t> max_wake_latency_ns{0};
+  } stats_;
+};
+
+#endif  // TREELITE_THREAD_POOL_WAIT_STATE_H_
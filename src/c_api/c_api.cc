@@ -347,6 +347,22 @@ int TreeliteExportProtobufModel(const char* filename,
   API_END();
 }
 
+int TreeliteLoadBinaryModel(const char* filename,
+                            ModelHandle* out) {
+  API_BEGIN();
+  Model* model = new Model(std::move(frontend::LoadBinaryModel(filename)));
+  *out = static_cast<ModelHandle>(model);
+  API_END();
+}
+
+int TreeliteExportBinaryModel(const char* filename,
+                              ModelHandle model) {
+  API_BEGIN();
+  Model* model_ = static_cast<Model*>(model);
+  frontend::ExportBinaryModel(filename, *model_);
+  API_END();
+}
+
 int TreeliteFreeModel(ModelHandle handle) {
   API_BEGIN();
   delete static_cast<Model*>(handle);
@@ -0,0 +1,123 @@
+/*!
+ *  Copyright (c) 2020 by Contributors
+ * \file mmap.h
+ * \brief Cross-platform wrapper for read-only memory mapping of files
+ */
+#ifndef TREELITE_COMMON_MMAP_H_
+#define TREELITE_COMMON_MMAP_H_
+
+#include <dmlc/logging.h>
+#include <string>
+
+#ifdef _WIN32
+#define NOMINMAX
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+namespace treelite {
+namespace common {
+
+/*!
+ * \brief read-only memory mapping of a whole file. Pages are loaded on first
+ *        access and belong to the page cache, so that processes mapping the
+ *        same file share a single copy of it. The mapping starts at a page
+ *        boundary.
+ */
+class MappedFile {
+ public:
+  /*!
+   * \brief map a local file into memory
+   * \param path path to the file
+   */
+  explicit MappedFile(const std::string& path) : addr_(nullptr), size_(0) {
+#ifdef _WIN32
+    file_ = CreateFileA(path.c_str(), GENERIC_READ, FILE_SHARE_READ, NULL,
+                        OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    CHECK(file_ != INVALID_HANDLE_VALUE) << "Failed to open `" << path << "'";
+    LARGE_INTEGER size;
+    CHECK(GetFileSizeEx(file_, &size)) << "Failed to query size of `" << path
+                                       << "'";
+    size_ = static_cast<size_t>(size.QuadPart);
+    mapping_ = NULL;
+    if (size_ > 0) {
+      mapping_ = CreateFileMappingA(file_, NULL, PAGE_READONLY, 0, 0, NULL);
+      CHECK(mapping_ != NULL) << "Failed to map `" << path << "'";
+      addr_ = MapViewOfFile(mapping_, FILE_MAP_READ, 0, 0, 0);
+      CHECK(addr_ != NULL) << "Failed to map `" << path << "'";
+    }
+#else
+    const int fd = open(path.c_str(), O_RDONLY);
+    CHECK_NE(fd, -1) << "Failed to open `" << path << "'";
+    struct stat st;
+    if (fstat(fd, &st) != 0) {
+      close(fd);
+      LOG(FATAL) << "Failed to query size of `" << path << "'";
+    }
+    size_ = static_cast<size_t>(st.st_size);
+    if (size_ > 0) {
+      addr_ = mmap(nullptr, size_, PROT_READ, MAP_SHARED, fd, 0);
+    }
+    close(fd);  // the mapping stays valid after the file is closed
+    CHECK(addr_ != MAP_FAILED) << "Failed to map `" << path << "'";
+#endif
+  }
+
+  ~MappedFile() {
+#ifdef _WIN32
+    if (addr_ != nullptr) {
+      UnmapViewOfFile(addr_);
+    }
+    if (mapping_ != NULL) {
+      CloseHandle(mapping_);
+    }
+    CloseHandle(file_);
+#else
+    if (addr_ != nullptr) {
+      munmap(addr_, size_);
+    }
+#endif
+  }
+
+  MappedFile(const MappedFile&) = delete;
+  MappedFile& operator=(const MappedFile&) = delete;
+
+  /*!
+   * \brief ask the operating system to start reading the whole file in the
+   *        background, so that later accesses are less likely to wait for
+   *        the disk. Returns immediately.
+   */
+  inline void Prefetch() const {
+#ifndef _WIN32
+    if (addr_ != nullptr) {
+      madvise(addr_, size_, MADV_WILLNEED);
+    }
+#endif
+  }
+
+  /*! \brief start of the mapping; nullptr if the file is empty */
+  inline const void* data() const {
+    return addr_;
+  }
+  /*! \brief size of the file, in bytes */
+  inline size_t size() const {
+    return size_;
+  }
+
+ private:
+  void* addr_;
+  size_t size_;
+#ifdef _WIN32
+  HANDLE file_;
+  HANDLE mapping_;
+#endif
+};
+
+}  // namespace common
+}  // namespace treelite
+
+#endif  // TREELITE_COMMON_MMAP_H_
@@ -104,6 +104,16 @@ class CodeFolderNode : public ASTNode {
   }
 };
 
+class BranchlessNode : public ASTNode {
+ public:
+  explicit BranchlessNode(int depth) : depth(depth) {}
+  int depth;  // number of split levels, once padded into a complete subtree
+
+  std::string GetDump() const override {
+    return fmt::format("BranchlessNode {{ depth: {} }}", depth);
+  }
+};
+
 class ConditionNode : public ASTNode {
  public:
   ConditionNode(unsigned split_index, bool default_left)
@@ -140,12 +150,16 @@ class NumericalConditionNode : public ConditionNode {
   bool quantized;
   Operator op;
   ThresholdVariant threshold;
+  // bit of the condition cache holding the outcome, if cached
+  dmlc::optional<int> cache_slot;
 
   std::string GetDump() const override {
-    return fmt::format("NumericalConditionNode {{ {}, quantized: {}, op: {}, threshold: {} }}",
+    return fmt::format("NumericalConditionNode {{ {}, quantized: {}, op: {}, threshold: {}{} }}",
                        ConditionNode::GetDump(), quantized, OpName(op),
                        (quantized ? fmt::format("{:d}", threshold.int_val)
-                                  : fmt::format("{:f}", threshold.float_val)));
+                                  : fmt::format("{:f}", threshold.float_val)),
+                       (cache_slot ? fmt::format(", cache_slot: {}", cache_slot.value())
+                                   : std::string()));
   }
 };
 
@@ -173,6 +187,18 @@ class CategoricalConditionNode : public ConditionNode {
   }
 };
 
+class ConditionCacheNode : public ASTNode {
+ public:
+  ConditionCacheNode() {}
+  // conditions to evaluate once per row; the i-th sets bit i of the cache
+  std::vector<const NumericalConditionNode*> conditions;
+
+  std::string GetDump() const override {
+    return fmt::format("ConditionCacheNode {{ num_condition: {} }}",
+                       conditions.size());
+  }
+};
+
 class OutputNode : public ASTNode {
  public:
   explicit OutputNode(tl_float scalar)
@@ -0,0 +1,76 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file branchless.cc
+ * \brief AST manipulation logic to evaluate shallow subtrees without branches
+ */
+#include <algorithm>
+#include <cmath>
+#include "./builder.h"
+
+namespace treelite {
+namespace compiler {
+
+DMLC_REGISTRY_FILE_TAG(branchless);
+
+struct SubtreeShape {
+  bool eligible;  // all splits numerical, with finite thresholds and same op
+  int height;     // number of split levels
+  int num_split;
+  Operator op;    // only meaningful if num_split > 0
+};
+
+static SubtreeShape get_shape(const ASTNode* node) {
+  if (dynamic_cast<const OutputNode*>(node)) {
+    return SubtreeShape{true, 0, 0, Operator::kLT};
+  }
+  const NumericalConditionNode* cond
+    = dynamic_cast<const NumericalConditionNode*>(node);
+  if (!cond || !std::isfinite(cond->threshold.float_val)) {
+    return SubtreeShape{false, 0, 0, Operator::kLT};
+  }
+  CHECK_EQ(node->children.size(), 2);
+  const SubtreeShape left = get_shape(node->children[0]);
+  const SubtreeShape right = get_shape(node->children[1]);
+  const bool eligible
+    = left.eligible && right.eligible
+      && (left.num_split == 0 || left.op == cond->op)
+      && (right.num_split == 0 || right.op == cond->op);
+  return SubtreeShape{eligible, 1 + std::max(left.height, right.height),
+                      1 + left.num_split + right.num_split, cond->op};
+}
+
+int make_branchless(ASTNode* node, int max_depth, ASTBuilder* builder) {
+  if (dynamic_cast<CodeFolderNode*>(node)) {
+    return 0;  // folded subtrees are already evaluated in a loop
+  }
+  if (dynamic_cast<ConditionNode*>(node)) {
+    const SubtreeShape shape = get_shape(node);
+    // a subtree with one split gains nothing from a table
+    if (shape.eligible && shape.height >= 2 && shape.height <= max_depth
+        && 2 * shape.num_split >= (1 << shape.height) - 1) {
+      ASTNode* parent_node = node->parent;
+      BranchlessNode* branchless_node
+        = builder->AddNode<BranchlessNode>(parent_node, shape.height);
+      branchless_node->tree_id = node->tree_id;
+      auto it = std::find(parent_node->children.begin(),
+                          parent_node->children.end(), node);
+      CHECK(it != parent_node->children.end());
+      *it = branchless_node;
+      branchless_node->children.push_back(node);
+      node->parent = branchless_node;
+      return 1;
+    }
+  }
+  int num_converted = 0;
+  for (ASTNode* child : node->children) {
+    num_converted += make_branchless(child, max_depth, builder);
+  }
+  return num_converted;
+}
+
+int ASTBuilder::MakeBranchless(int max_depth) {
+  return make_branchless(this->main_node, max_depth, this);
+}
+
+}  // namespace compiler
+}  // namespace treelite
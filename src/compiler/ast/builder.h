@@ -23,6 +23,7 @@ namespace compiler {
 class ASTBuilder;
 struct CodeFoldingContext;
 bool fold_code(ASTNode*, CodeFoldingContext*, ASTBuilder*);
+int make_branchless(ASTNode*, int, ASTBuilder*);
 bool breakup(ASTNode*, int, int*, ASTBuilder*);
 
 class ASTBuilder {
@@ -50,6 +51,17 @@ class ASTBuilder {
    * \param whether at least one subtree was folded
    */
   bool FoldCode(double magnitude_req, bool create_new_translation_unit = false);
+  /*
+   * \brief evaluate shallow subtrees with branch-free index arithmetic
+   *        instead of if/else blocks. A subtree is chosen if it has at most
+   *        [max_depth] levels of numerical splits and is at least half as
+   *        large as the complete binary tree of the same depth, which it is
+   *        padded into. The largest such subtrees are chosen, i.e. whole
+   *        trees if possible.
+   * \param max_depth maximum depth of subtrees to convert
+   * \return number of subtrees converted
+   */
+  int MakeBranchless(int max_depth);
   /*
    * \brief split prediction function into multiple translation units
    * \param parallel_comp number of translation units
@@ -57,6 +69,15 @@ class ASTBuilder {
   void Split(int parallel_comp);
   /* \brief replace split thresholds with integers */
   void QuantizeThresholds();
+  /*
+   * \brief evaluate numerical split conditions that recur across trees once
+   *        per row, storing the outcomes in a bitset that the splits then
+   *        test. A condition is chosen if the expected number of times a row
+   *        reaches it, estimated from data counts if available, is high
+   *        enough to make up for evaluating it for every row.
+   * \return number of conditions cached
+   */
+  int CacheConditions();
   /* \brief Load data counts from annotation file */
   void LoadDataCounts(const std::vector<std::vector<size_t>>& counts);
   /*
@@ -71,6 +92,7 @@ class ASTBuilder {
  private:
   friend bool treelite::compiler::fold_code(ASTNode*, CodeFoldingContext*,
                                             ASTBuilder*);
+  friend int treelite::compiler::make_branchless(ASTNode*, int, ASTBuilder*);
 
   template <typename NodeType, typename ...Args>
   NodeType* AddNode(ASTNode* parent, Args&& ...args) {
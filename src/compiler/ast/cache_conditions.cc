@@ -0,0 +1,126 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file cache_conditions.cc
+ * \brief AST manipulation logic to evaluate recurring split conditions once
+ *        per row
+ */
+#include <algorithm>
+#include <cmath>
+#include <map>
+#include <tuple>
+#include "./builder.h"
+
+namespace treelite {
+namespace compiler {
+
+DMLC_REGISTRY_FILE_TAG(cache_conditions);
+
+/* Costs are relative to that of evaluating a condition inline: loading the
+   feature value, testing whether it is missing and comparing it with the
+   threshold. */
+// evaluating a condition into the cache, which is done for every row
+constexpr double kCacheEvalCost = 1.0;
+// testing a bit of the cache, which stays in L1 cache
+constexpr double kBitTestCost = 0.5;
+// the cache of a row takes up to 128 bytes
+constexpr size_t kMaxCachedConditions = 1024;
+
+// conditions with identical keys have the same outcome for every row:
+// (split_index, default_left, quantized, op, threshold)
+using ConditionKey = std::tuple<unsigned, bool, bool, Operator, double>;
+
+struct ConditionStat {
+  double expected_visits;  // expected number of evaluations per row
+  std::vector<NumericalConditionNode*> nodes;
+};
+
+static void
+scan_conditions(ASTNode* node, double reach_prob, double root_data_count,
+                std::map<ConditionKey, ConditionStat>* stats) {
+  if (dynamic_cast<CodeFolderNode*>(node)
+      || dynamic_cast<BranchlessNode*>(node)) {
+    return;  // these subtrees are evaluated from arrays
+  }
+  if (node->node_id == 0) {  // root of a tree
+    reach_prob = 1.0;
+    root_data_count
+      = node->data_count ? static_cast<double>(node->data_count.value()) : 0.0;
+  }
+  NumericalConditionNode* num_cond
+    = dynamic_cast<NumericalConditionNode*>(node);
+  // splits with infinite thresholds are evaluated to constants already
+  if (num_cond
+      && (num_cond->quantized || std::isfinite(num_cond->threshold.float_val))) {
+    const ConditionKey key(num_cond->split_index, num_cond->default_left,
+                           num_cond->quantized, num_cond->op,
+                           num_cond->quantized ? num_cond->threshold.int_val
+                                               : num_cond->threshold.float_val);
+    ConditionStat& stat = (*stats)[key];
+    stat.expected_visits += reach_prob;
+    stat.nodes.push_back(num_cond);
+  }
+  for (ASTNode* child : node->children) {
+    double child_reach_prob = reach_prob;
+    if (dynamic_cast<ConditionNode*>(node)) {
+      // without data counts, assume that rows are split evenly
+      child_reach_prob
+        = (root_data_count > 0 && child->data_count)
+          ? static_cast<double>(child->data_count.value()) / root_data_count
+          : reach_prob * 0.5;
+    }
+    scan_conditions(child, child_reach_prob, root_data_count, stats);
+  }
+}
+
+int ASTBuilder::CacheConditions() {
+  std::map<ConditionKey, ConditionStat> stats;
+  scan_conditions(this->main_node, 1.0, 0.0, &stats);
+
+  /* keep the conditions that save more in tests than they cost to cache */
+  using StatIter = std::map<ConditionKey, ConditionStat>::iterator;
+  std::vector<StatIter> chosen;
+  for (StatIter it = stats.begin(); it != stats.end(); ++it) {
+    if (it->second.expected_visits * (1.0 - kBitTestCost) > kCacheEvalCost) {
+      chosen.push_back(it);
+    }
+  }
+  if (chosen.empty()) {
+    return 0;
+  }
+  if (chosen.size() > kMaxCachedConditions) {
+    std::stable_sort(chosen.begin(), chosen.end(), [](StatIter a, StatIter b) {
+      return a->second.expected_visits > b->second.expected_visits;
+    });
+    chosen.resize(kMaxCachedConditions);
+    // fill the cache feature by feature
+    std::sort(chosen.begin(), chosen.end(), [](StatIter a, StatIter b) {
+      return a->first < b->first;
+    });
+  }
+
+  ASTNode* parent_node = this->main_node;
+  CHECK_EQ(parent_node->children.size(), 1);
+  if (dynamic_cast<QuantizerNode*>(parent_node->children[0])) {
+    parent_node = parent_node->children[0];
+    CHECK_EQ(parent_node->children.size(), 1);
+  }
+  ASTNode* top_ac_node = parent_node->children[0];
+  CHECK(dynamic_cast<AccumulatorContextNode*>(top_ac_node));
+
+  ConditionCacheNode* cache_node
+    = AddNode<ConditionCacheNode>(parent_node);
+  for (StatIter it : chosen) {
+    const int slot = static_cast<int>(cache_node->conditions.size());
+    cache_node->conditions.push_back(it->second.nodes[0]);
+    for (NumericalConditionNode* node : it->second.nodes) {
+      node->cache_slot = slot;
+    }
+  }
+  cache_node->children.push_back(top_ac_node);
+  top_ac_node->parent = cache_node;
+  parent_node->children[0] = cache_node;
+  return static_cast<int>(chosen.size());
+}
+
+}  // namespace compiler
+}  // namespace treelite
@@ -39,7 +39,10 @@ rewrite_thresholds(ASTNode* node,
       const auto& v = cut_pts[num_cond->split_index];
       auto loc = common::binary_search(v.begin(), v.end(), threshold);
       CHECK(loc != v.end());
-      num_cond->threshold.int_val = static_cast<size_t>(loc - v.begin()) * 2;
+      // the k-th threshold of a feature falls into bin (2k+1); see quantize()
+      // in the generated code
+      num_cond->threshold.int_val
+        = static_cast<size_t>(loc - v.begin()) * 2 + 1;
       num_cond->quantized = true;
     }  // splits with infinite thresholds will not be quantized
   }
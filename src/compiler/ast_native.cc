@@ -10,6 +10,7 @@
 #include <fmt/format.h>
 #include <algorithm>
 #include <fstream>
+#include <functional>
 #include <unordered_map>
 #include <queue>
 #include <cmath>
@@ -20,6 +21,8 @@
 #include "./native/header_template.h"
 #include "./native/qnode_template.h"
 #include "./native/code_folder_template.h"
+#include "./native/branchless_template.h"
+#include "./native/condition_cache_template.h"
 #include "./common/code_folding_util.h"
 #include "./common/categorical_bitmap.h"
 
@@ -36,6 +39,10 @@ namespace compiler {
 
 DMLC_REGISTRY_FILE_TAG(ast_native);
 
+// exported by every library; see ASTNativeCompiler::HandleMainNode()
+const char* const overwritten_features_function_signature
+  = "size_t get_overwritten_features(const unsigned** out)";
+
 class ASTNativeCompiler : public Compiler {
  public:
   explicit ASTNativeCompiler(const CompilerParam& param)
@@ -60,14 +67,22 @@ class ASTNativeCompiler : public Compiler {
     global_bias_ = model.param.global_bias;
     pred_tranform_func_ = PredTransformFunction("native", model);
     files_.clear();
+    is_categorical_.clear();
+    quantize_loop_.clear();
+    quantize_block_loop_.clear();
+    condition_cache_block_loop_.clear();
+    predict_binned_body_.clear();
+    tree_functions_.clear();
+    unit_function_names_.clear();
+    num_cache_word_ = 0;
 
     ASTBuilder builder;
     builder.BuildAST(model);
     if (builder.FoldCode(param.code_folding_req)
         || param.quantize > 0) {
       // is_categorical[i] : is i-th feature categorical?
-      array_is_categorical_
-        = RenderIsCategoricalArray(builder.GenerateIsCategoricalArray());
+      is_categorical_ = builder.GenerateIsCategoricalArray();
+      array_is_categorical_ = RenderIsCategoricalArray(is_categorical_);
     }
     if (param.annotate_in != "NULL") {
       BranchAnnotator annotator;
@@ -79,10 +94,25 @@ class ASTNativeCompiler : public Compiler {
       LOG(INFO) << "Loading node frequencies from `"
                 << param.annotate_in << "'";
     }
+    if (param.branchless_depth > 0) {
+      const int num_converted = builder.MakeBranchless(param.branchless_depth);
+      if (param.verbose > 0) {
+        LOG(INFO) << num_converted
+                  << " subtrees will be evaluated without branches";
+      }
+    }
     builder.Split(param.parallel_comp);
     if (param.quantize > 0) {
       builder.QuantizeThresholds();
     }
+    if (param.cache_conditions > 0) {
+      const int num_cached = builder.CacheConditions();
+      num_cache_word_ = (num_cached + 63) / 64;
+      if (param.verbose > 0) {
+        LOG(INFO) << num_cached
+                  << " split conditions will be evaluated once per row";
+      }
+    }
 
     {
       const char* destfile = getenv("TREELITE_DUMP_AST");
@@ -92,6 +122,10 @@ class ASTNativeCompiler : public Compiler {
       }
     }
 
+    /* with double thresholds, 16-bit child ID's keep struct Node at 16 bytes */
+    short_child_id_ = (param.quantize == 0
+                       && GetMaxCodeFolderSize(builder.GetRootNode()) <= 0x7FFF);
+
     WalkAST(builder.GetRootNode(), "main.c", 0);
     if (files_.count("arrays.c") > 0) {
       PrependToBuffer("arrays.c", "#include \"header.h\"\n", 0);
@@ -129,7 +163,26 @@ class ASTNativeCompiler : public Compiler {
   float sigmoid_alpha_;
   float global_bias_;
   std::string pred_tranform_func_;
+  std::vector<bool> is_categorical_;
   std::string array_is_categorical_;
+  std::string quantize_loop_;
+  // quantization stage of predict_batch(), applied to a block of rows at once
+  std::string quantize_block_loop_;
+  // body of predict_binned(), which takes bin indices in place of feature
+  // values and so skips the quantize loop; only set if quantize=1
+  std::string predict_binned_body_;
+  // functions evaluating one tree each, and compute_condition_cache();
+  // placed ahead of predict()
+  std::string tree_functions_;
+  // evaluation of the condition cache in predict_batch(), for a block of rows
+  std::string condition_cache_block_loop_;
+  // number of 64-bit words in the condition cache of a row; 0 if no cache
+  int num_cache_word_;
+  // functions that predict() and predict_batch() call in turn, each of which
+  // evaluates a single tree or a whole translation unit
+  std::vector<std::string> unit_function_names_;
+  // whether struct Node stores child ID's as 16-bit integers
+  bool short_child_id_;
   std::unordered_map<std::string, CompiledModel::FileEntry> files_;
 
   void WalkAST(const ASTNode* node,
@@ -142,6 +195,8 @@ class ASTNativeCompiler : public Compiler {
     const TranslationUnitNode* t5;
     const QuantizerNode* t6;
     const CodeFolderNode* t7;
+    const BranchlessNode* t8;
+    const ConditionCacheNode* t9;
     if ( (t1 = dynamic_cast<const MainNode*>(node)) ) {
       HandleMainNode(t1, dest, indent);
     } else if ( (t2 = dynamic_cast<const AccumulatorContextNode*>(node)) ) {
@@ -156,11 +211,43 @@ class ASTNativeCompiler : public Compiler {
       HandleQNode(t6, dest, indent);
     } else if ( (t7 = dynamic_cast<const CodeFolderNode*>(node)) ) {
       HandleCodeFolderNode(t7, dest, indent);
+    } else if ( (t8 = dynamic_cast<const BranchlessNode*>(node)) ) {
+      HandleBranchlessNode(t8, dest, indent);
+    } else if ( (t9 = dynamic_cast<const ConditionCacheNode*>(node)) ) {
+      HandleConditionCacheNode(t9, dest, indent);
     } else {
       LOG(FATAL) << "Unrecognized AST node type";
     }
   }
 
+  // largest number of nodes in a subtree folded into an array
+  static size_t GetMaxCodeFolderSize(const ASTNode* node) {
+    if (dynamic_cast<const CodeFolderNode*>(node)) {
+      std::function<size_t(const ASTNode*)> count_nodes
+        = [&count_nodes](const ASTNode* e) {
+        size_t count = 1;
+        for (const ASTNode* child : e->children) {
+          count += count_nodes(child);
+        }
+        return count;
+      };
+      return count_nodes(node->children[0]);
+    }
+    size_t max_size = 0;
+    for (const ASTNode* child : node->children) {
+      max_size = std::max(max_size, GetMaxCodeFolderSize(child));
+    }
+    return max_size;
+  }
+
+  // size of struct Node in the generated code
+  size_t GetNodeRecordSize() const {
+    const size_t threshold_size = (param.quantize > 0 ? 4 : 8);
+    const size_t child_id_size = (short_child_id_ ? 2 : 4);
+    const size_t size = threshold_size + 4 + 2 * child_id_size;
+    return (size + threshold_size - 1) / threshold_size * threshold_size;
+  }
+
   // append content to a given buffer, with given level of indentation
   inline void AppendToBuffer(const std::string& dest,
                              const std::string& content,
@@ -193,6 +280,9 @@ class ASTNativeCompiler : public Compiler {
           "size_t predict_multiclass(union Entry* data, int pred_margin, "
                                     "float* result)"
         : "float predict(union Entry* data, int pred_margin)";
+    const char* predict_batch_function_signature
+      = "size_t predict_batch(const float* rows, size_t nrow, size_t ncol, "
+                             "float missing, int pred_margin, float* out)";
 
     if (!array_is_categorical_.empty()) {
       array_is_categorical_
@@ -235,8 +325,22 @@ class ASTNativeCompiler : public Compiler {
         "get_global_bias_function_signature"_a
           = get_global_bias_function_signature,
         "predict_function_signature"_a = predict_function_signature,
-        "threshold_type"_a = (param.quantize > 0 ? "int" : "double")),
+        "predict_batch_function_signature"_a = predict_batch_function_signature,
+        "threshold_type"_a = (param.quantize > 0 ? "int" : "double"),
+        "child_id_type"_a = (short_child_id_ ? "int16_t" : "int")),
       indent);
+    /* get_overwritten_features(): features whose entries predict() writes
+       over, so that a caller handing the same row to several models knows
+       which entries to restore in between. With quantize=1, it is defined in
+       HandleQNode(); otherwise, predict() leaves its input alone. */
+    AppendToBuffer("header.h",
+      fmt::format("{}{};\n", DLLEXPORT_KEYWORD,
+                  overwritten_features_function_signature), 0);
+    if (param.quantize == 0) {
+      PrependToBuffer(dest,
+        fmt::format("{} {{\n  *out = NULL;\n  return 0;\n}}\n",
+                    overwritten_features_function_signature), 0);
+    }
 
     CHECK_EQ(node->children.size(), 1);
     WalkAST(node->children[0], dest, indent + 2);
@@ -244,25 +348,83 @@ class ASTNativeCompiler : public Compiler {
     const std::string optional_average_field
       = (node->average_result) ? fmt::format(" / {}", node->num_tree)
                                : std::string("");
-    if (num_output_group_ > 1) {
+    const std::string main_end
+      = (num_output_group_ > 1)
+        ? fmt::format(native::main_end_multiclass_template,
+            "num_output_group"_a = num_output_group_,
+            "optional_average_field"_a = optional_average_field,
+            "global_bias"_a = common::ToStringHighPrecision(node->global_bias))
+        : fmt::format(native::main_end_template,
+            "optional_average_field"_a = optional_average_field,
+            "global_bias"_a = common::ToStringHighPrecision(node->global_bias));
+    AppendToBuffer(dest, main_end, indent);
+
+    /* predict_binned(): same as predict(), except that data[] holds bin
+       indices (see quantize()) rather than feature values */
+    if (param.quantize > 0) {
+      const char* predict_binned_function_signature
+        = (num_output_group_ > 1) ?
+            "size_t predict_multiclass_binned(union Entry* data, "
+                                             "int pred_margin, float* result)"
+          : "float predict_binned(union Entry* data, int pred_margin)";
+      AppendToBuffer("header.h",
+        fmt::format("{}{};\n", DLLEXPORT_KEYWORD,
+                    predict_binned_function_signature), 0);
       AppendToBuffer(dest,
-        fmt::format(native::main_end_multiclass_template,
-          "num_output_group"_a = num_output_group_,
-          "optional_average_field"_a = optional_average_field,
-          "global_bias"_a = common::ToStringHighPrecision(node->global_bias)),
-        indent);
-    } else {
+        fmt::format("{} {{\n", predict_binned_function_signature), indent);
+      AppendToBuffer(dest, predict_binned_body_, 0);
+      AppendToBuffer(dest, main_end, indent);
+    }
+
+    /* predict_batch(): evaluate a block of dense rows, tree by tree */
+    const int block_size = BatchBlockSize();
+    AppendToBuffer(dest,
+      fmt::format(native::predict_batch_start_template,
+        "predict_batch_function_signature"_a = predict_batch_function_signature,
+        "block_size"_a = block_size,
+        "num_feature"_a = num_feature_,
+        "num_output_group"_a = num_output_group_,
+        "dense_native"_a = (param.quantize > 0 ? 0 : 1),
+        "quantize_block_loop"_a
+          = common::IndentMultiLineString(quantize_block_loop_, 4),
+        "condition_cache_block_loop"_a
+          = common::IndentMultiLineString(condition_cache_block_loop_, 4)),
+      indent);
+    for (const std::string& unit_function_name : unit_function_names_) {
       AppendToBuffer(dest,
-        fmt::format(native::main_end_template,
-          "optional_average_field"_a = optional_average_field,
-          "global_bias"_a = common::ToStringHighPrecision(node->global_bias)),
-        indent);
+        fmt::format((num_output_group_ > 1)
+                    ? native::predict_batch_unit_multiclass_template
+                    : native::predict_batch_unit_template,
+          "unit_function_name"_a = unit_function_name,
+          "num_output_group"_a = num_output_group_,
+          "cache_arg"_a = (num_cache_word_ > 0
+                           ? fmt::format(", &cond_cache[r * {}]", num_cache_word_)
+                           : std::string())),
+        indent + 4);
     }
+    AppendToBuffer(dest,
+      fmt::format((num_output_group_ > 1)
+                  ? native::predict_batch_end_multiclass_template
+                  : native::predict_batch_end_template,
+        "num_output_group"_a = num_output_group_,
+        "optional_average_field"_a = optional_average_field,
+        "global_bias"_a = common::ToStringHighPrecision(node->global_bias)),
+      indent);
+
+    /* tree functions must be defined ahead of predict() */
+    PrependToBuffer(dest,
+      fmt::format("#include \"header.h\"\n{}", tree_functions_), 0);
   }
 
   void HandleACNode(const AccumulatorContextNode* node,
                     const std::string& dest,
                     size_t indent) {
+    if (dynamic_cast<const MainNode*>(node->parent)
+        || dynamic_cast<const QuantizerNode*>(node->parent)
+        || dynamic_cast<const ConditionCacheNode*>(node->parent)) {
+      HandleTopLevelACNode(node, dest, indent);
+      return;
+    }
     if (num_output_group_ > 1) {
       AppendToBuffer(dest,
         fmt::format("float sum[{num_output_group}] = {{0.0f}};\n"
@@ -280,6 +442,48 @@ class ASTNativeCompiler : public Compiler {
     }
   }
 
+  // The top-level accumulator does not evaluate trees inline. Instead, each
+  // tree is placed in a function of its own (translation units already are),
+  // so that predict_batch() can apply one tree to a whole block of rows.
+  void HandleTopLevelACNode(const AccumulatorContextNode* node,
+                            const std::string& dest,
+                            size_t indent) {
+    if (num_output_group_ > 1) {
+      AppendToBuffer(dest,
+        fmt::format("float sum[{num_output_group}] = {{0.0f}};\n",
+          "num_output_group"_a = num_output_group_), indent);
+    } else {
+      AppendToBuffer(dest, "float sum = 0.0f;\n", indent);
+    }
+    int tree_id = 0;
+    for (ASTNode* child : node->children) {
+      if (dynamic_cast<const TranslationUnitNode*>(child)) {
+        WalkAST(child, dest, indent);
+        continue;
+      }
+      // use position among siblings, since a folded tree has no tree_id
+      const std::string tree_function_name
+        = fmt::format((num_output_group_ > 1) ? "predict_margin_multiclass_tree{}"
+                                               : "predict_margin_tree{}",
+                      tree_id++);
+      const std::string scratch = tree_function_name + ".c";
+      WalkAST(child, scratch, 2);
+      tree_functions_
+        += fmt::format((num_output_group_ > 1)
+                       ? native::tree_function_multiclass_template
+                       : native::tree_function_template,
+             "tree_function_name"_a = tree_function_name,
+             "cache_param"_a = CacheParam(),
+             "tree_code"_a = files_[scratch].content);
+      files_.erase(scratch);
+      unit_function_names_.push_back(tree_function_name);
+      AppendToBuffer(dest,
+        fmt::format((num_output_group_ > 1) ? "{}(data{}, sum);\n"
+                                             : "sum += {}(data{});\n",
+                    tree_function_name, CacheArg()), indent);
+    }
+  }
+
   void HandleCondNode(const ConditionNode* node,
                       const std::string& dest,
                       size_t indent) {
@@ -287,15 +491,13 @@ class ASTNativeCompiler : public Compiler {
     std::string condition, condition_with_na_check;
     if ( (t = dynamic_cast<const NumericalConditionNode*>(node)) ) {
       /* numerical split */
-      condition = ExtractNumericalCondition(t);
-      const char* condition_with_na_check_template
-        = (node->default_left) ?
-            "!(data[{split_index}].missing != -1) || ({condition})"
-          : " (data[{split_index}].missing != -1) && ({condition})";
-      condition_with_na_check
-        = fmt::format(condition_with_na_check_template,
-            "split_index"_a = node->split_index,
-            "condition"_a = condition);
+      if (t->cache_slot) {
+        const int slot = t->cache_slot.value();
+        condition_with_na_check
+          = fmt::format("(cond_cache[{}] >> {}) & 1", slot / 64, slot % 64);
+      } else {
+        condition_with_na_check = ExtractNumericalConditionWithNACheck(t);
+      }
     } else {   /* categorical split */
       const CategoricalConditionNode* t2
         = dynamic_cast<const CategoricalConditionNode*>(node);
@@ -338,19 +540,21 @@ class ASTNativeCompiler : public Compiler {
       unit_function_name
         = fmt::format("predict_margin_multiclass_unit{}", unit_id);
       unit_function_signature
-        = fmt::format("void {}(union Entry* data, float* result)",
-            unit_function_name);
+        = fmt::format("void {}(union Entry* data{}, float* result)",
+            unit_function_name, CacheParam());
       unit_function_call_signature
-        = fmt::format("{}(data, sum);\n", unit_function_name);
+        = fmt::format("{}(data{}, sum);\n", unit_function_name, CacheArg());
     } else {
       unit_function_name
         = fmt::format("predict_margin_unit{}", unit_id);
       unit_function_signature
-        = fmt::format("float {}(union Entry* data)", unit_function_name);
+        = fmt::format("float {}(union Entry* data{})",
+            unit_function_name, CacheParam());
       unit_function_call_signature
-        = fmt::format("sum += {}(data);\n", unit_function_name);
+        = fmt::format("sum += {}(data{});\n", unit_function_name, CacheArg());
     }
     AppendToBuffer(dest, unit_function_call_signature, indent);
+    unit_function_names_.push_back(unit_function_name);
     AppendToBuffer(new_file,
                    fmt::format("#include \"header.h\"\n"
                                "{} {{\n", unit_function_signature), 0);
@@ -373,69 +577,167 @@ class ASTNativeCompiler : public Compiler {
                    const std::string& dest,
                    size_t indent) {
     /* render arrays needed to convert feature values into bin indices */
-    std::string array_threshold, array_th_begin, array_th_len;
+    std::string array_quantized_feature, array_threshold,
+                array_threshold_eytzinger, array_threshold_rank,
+                array_th_begin, array_th_len;
+    // quantized_feature[] : list of features to be quantized, i.e. numerical
+    //   features that are split on at least once with a finite threshold.
+    //   All other features are skipped entirely, so that the cost of
+    //   quantization does not grow with the number of unused features.
     // threshold[] : list of all thresholds that occur at least once in the
     //   ensemble model. For each feature, an ascending list of unique
-    //   thresholds is generated. The range th_begin[i]:(th_begin[i]+th_len[i])
-    //   of the threshold[] array stores the threshold list for feature i.
-    size_t total_num_threshold;
-      // to hold total number of (distinct) thresholds
+    //   thresholds is generated. The range th_begin[k]:(th_begin[k]+th_len[k])
+    //   of the threshold[] array stores the threshold list for the feature
+    //   quantized_feature[k].
+    // threshold_eytzinger[] : same as threshold[], except that the list for
+    //   each feature is laid out in Eytzinger order for quantize() to search.
+    //   threshold_rank[] gives the position of each of these thresholds in
+    //   the ascending list.
+    std::vector<unsigned> quantized_feature;
+    for (size_t fid = 0; fid < node->cut_pts.size(); ++fid) {
+      // cut_pts had been generated in ASTBuilder::QuantizeThresholds
+      // cut_pts[i][k] stores the k-th threshold of feature i.
+      if (!node->cut_pts[fid].empty()
+          && (fid >= is_categorical_.size() || !is_categorical_[fid])) {
+        quantized_feature.push_back(static_cast<unsigned>(fid));
+      }
+    }
+    {
+      common::ArrayFormatter formatter(80, 2);
+      for (unsigned fid : quantized_feature) {
+        formatter << fid;
+      }
+      array_quantized_feature = formatter.str();
+    }
     {
       common::ArrayFormatter formatter(80, 2);
-      for (const auto& e : node->cut_pts) {
-        // cut_pts had been generated in ASTBuilder::QuantizeThresholds
-        // cut_pts[i][k] stores the k-th threshold of feature i.
-        for (tl_float v : e) {
+      for (unsigned fid : quantized_feature) {
+        for (tl_float v : node->cut_pts[fid]) {
           formatter << v;
         }
       }
       array_threshold = formatter.str();
     }
+    {
+      common::ArrayFormatter formatter(80, 2);
+      common::ArrayFormatter rank_formatter(80, 2);
+      for (unsigned fid : quantized_feature) {
+        for (size_t rank : EytzingerOrder(node->cut_pts[fid].size())) {
+          formatter << node->cut_pts[fid][rank];
+          rank_formatter << rank;
+        }
+      }
+      array_threshold_eytzinger = formatter.str();
+      array_threshold_rank = rank_formatter.str();
+    }
     {
       common::ArrayFormatter formatter(80, 2);
       size_t accum = 0;  // used to compute cumulative sum over threshold counts
-      for (const auto& e : node->cut_pts) {
+      for (unsigned fid : quantized_feature) {
         formatter << accum;
-        accum += e.size();  // e.size() = number of thresholds for each feature
+        accum += node->cut_pts[fid].size();
+          // = number of thresholds for each feature
       }
-      total_num_threshold = accum;
       array_th_begin = formatter.str();
     }
     {
       common::ArrayFormatter formatter(80, 2);
-      for (const auto& e : node->cut_pts) {
-        formatter << e.size();
+      for (unsigned fid : quantized_feature) {
+        formatter << node->cut_pts[fid].size();
       }
       array_th_len = formatter.str();
     }
-    if (!array_threshold.empty() && !array_th_begin.empty() && !array_th_len.empty()) {
+    const char* cut_points_function_signature
+      = "size_t get_cut_points(unsigned fid, const double** out)";
+    AppendToBuffer("header.h",
+      fmt::format("{}{};\n", DLLEXPORT_KEYWORD, cut_points_function_signature),
+      0);
+    if (quantized_feature.empty()) {
       PrependToBuffer(dest,
-        fmt::format(native::qnode_template,
-          "total_num_threshold"_a = total_num_threshold), 0);
-      AppendToBuffer(dest,
-        fmt::format(native::quantize_loop_template,
-          "num_feature"_a = num_feature_), indent);
-    }
-    if (!array_threshold.empty()) {
+        fmt::format("{} {{\n  return 0;\n}}\n", cut_points_function_signature),
+        0);
+      PrependToBuffer(dest,
+        fmt::format("{} {{\n  *out = NULL;\n  return 0;\n}}\n",
+                    overwritten_features_function_signature), 0);
+    } else {
+      // the quantize loop of predict() writes bin indices over the entries
+      // of the quantized features, and no others
+      PrependToBuffer(dest,
+        fmt::format("{} {{\n  *out = quantized_feature;\n  return {};\n}}\n",
+                    overwritten_features_function_signature,
+                    quantized_feature.size()), 0);
+      PrependToBuffer(dest,
+        fmt::format(native::cut_points_template,
+          "cut_points_function_signature"_a = cut_points_function_signature,
+          "num_quantized_feature"_a = quantized_feature.size()), 0);
+      PrependToBuffer(dest, fmt::format(native::qnode_template), 0);
+      quantize_loop_ = fmt::format(native::quantize_loop_template,
+        "num_quantized_feature"_a = quantized_feature.size());
+      AppendToBuffer(dest, quantize_loop_, indent);
+      quantize_block_loop_ = fmt::format(native::quantize_block_loop_template,
+        "num_quantized_feature"_a = quantized_feature.size());
+      PrependToBuffer(dest,
+        fmt::format("static const int threshold_rank[] = {{\n"
+                    "{array_threshold_rank}\n"
+                    "}};\n", "array_threshold_rank"_a = array_threshold_rank),
+        0);
+      PrependToBuffer(dest,
+        fmt::format("static const double threshold_eytzinger[] = {{\n"
+                    "{array_threshold_eytzinger}\n"
+                    "}};\n",
+                    "array_threshold_eytzinger"_a = array_threshold_eytzinger),
+        0);
       PrependToBuffer(dest,
         fmt::format("static const double threshold[] = {{\n"
                     "{array_threshold}\n"
                     "}};\n", "array_threshold"_a = array_threshold), 0);
-    }
-    if (!array_th_begin.empty()) {
       PrependToBuffer(dest,
         fmt::format("static const int th_begin[] = {{\n"
                     "{array_th_begin}\n"
                     "}};\n", "array_th_begin"_a = array_th_begin), 0);
-    }
-    if (!array_th_len.empty()) {
       PrependToBuffer(dest,
         fmt::format("static const int th_len[] = {{\n"
                     "{array_th_len}\n"
                     "}};\n", "array_th_len"_a = array_th_len), 0);
+      PrependToBuffer(dest,
+        fmt::format("static const unsigned quantized_feature[] = {{\n"
+                    "{array_quantized_feature}\n"
+                    "}};\n",
+                    "array_quantized_feature"_a = array_quantized_feature), 0);
     }
+    /* predict_binned() receives bin indices in place of feature values.
+       Categorical features are not binned; for them, the category itself is
+       given and must be converted to floating-point. */
+    std::vector<unsigned> categorical_feature;
+    for (size_t fid = 0; fid < is_categorical_.size(); ++fid) {
+      if (is_categorical_[fid]) {
+        categorical_feature.push_back(static_cast<unsigned>(fid));
+      }
+    }
+    if (!categorical_feature.empty()) {
+      common::ArrayFormatter formatter(80, 2);
+      for (unsigned fid : categorical_feature) {
+        formatter << fid;
+      }
+      PrependToBuffer(dest,
+        fmt::format("static const unsigned categorical_feature[] = {{\n"
+                    "{array_categorical_feature}\n"
+                    "}};\n",
+                    "array_categorical_feature"_a = formatter.str()), 0);
+      predict_binned_body_
+        = common::IndentMultiLineString(
+            fmt::format(native::categorical_loop_template,
+              "num_categorical_feature"_a = categorical_feature.size()),
+            indent);
+    }
+
+    /* the rest of the body is shared by predict() and predict_binned() */
+    const std::string scratch = "predict_body.c";
     CHECK_EQ(node->children.size(), 1);
-    WalkAST(node->children[0], dest, indent);
+    WalkAST(node->children[0], scratch, indent);
+    AppendToBuffer(dest, files_[scratch].content, 0);
+    predict_binned_body_ += files_[scratch].content;
+    files_.erase(scratch);
   }
 
   void HandleCodeFolderNode(const CodeFolderNode* node,
@@ -464,7 +766,8 @@ class ASTNativeCompiler : public Compiler {
     std::string output_switch_statement;
     Operator common_comp_op;
     common_util::RenderCodeFolderArrays(node, param.quantize, false,
-      "{{ {default_left}, {split_index}, {threshold}, {left_child}, {right_child} }}",
+      "{{ {threshold}, {sindex}, {left_child}, {right_child} }}",
+      GetNodeRecordSize(),
       [this](const OutputNode* node) { return RenderOutputStatement(node); },
       &array_nodes, &array_cat_bitmap, &array_cat_begin,
       &output_switch_statement, &common_comp_op);
@@ -515,6 +818,7 @@ class ASTNativeCompiler : public Compiler {
       AppendToBuffer(dest,
                      fmt::format(native::eval_loop_template,
                        "node_array_name"_a = node_array_name,
+                       "missing_check"_a = MissingCheck("fid"),
                        "cat_bitmap_name"_a = cat_bitmap_name,
                        "cat_begin_name"_a = cat_begin_name,
                        "data_field"_a = (param.quantize > 0 ? "qvalue" : "fvalue"),
@@ -525,6 +829,7 @@ class ASTNativeCompiler : public Compiler {
       AppendToBuffer(dest,
                      fmt::format(native::eval_loop_template_without_categorical_feature,
                        "node_array_name"_a = node_array_name,
+                       "missing_check"_a = MissingCheck("fid"),
                        "data_field"_a = (param.quantize > 0 ? "qvalue" : "fvalue"),
                        "comp_op"_a = OpName(common_comp_op),
                        "output_switch_statement"_a
@@ -532,6 +837,159 @@ class ASTNativeCompiler : public Compiler {
     }
   }
 
+  void HandleBranchlessNode(const BranchlessNode* node,
+                            const std::string& dest,
+                            size_t indent) {
+    CHECK_EQ(node->children.size(), 1);
+    const int node_id = node->children[0]->node_id;
+    const int tree_id = node->children[0]->tree_id;
+    const int depth = node->depth;
+    const int num_split = (1 << depth) - 1;
+
+    /* Pad the subtree into a complete binary tree of the given depth and
+       list its nodes breadth-first. A leaf above the last level is repeated
+       under a dummy split, whose outcome then does not matter. */
+    std::vector<const NumericalConditionNode*> splits(num_split, nullptr);
+    std::vector<const OutputNode*> leaves(num_split + 1, nullptr);
+    std::function<void(const ASTNode*, int, int)> place
+      = [&](const ASTNode* e, int pos, int level) {
+      if (level == depth) {
+        leaves[pos - num_split] = dynamic_cast<const OutputNode*>(e);
+        CHECK(leaves[pos - num_split]);
+        return;
+      }
+      const NumericalConditionNode* t
+        = dynamic_cast<const NumericalConditionNode*>(e);
+      splits[pos] = t;
+      place(t ? e->children[0] : e, 2 * pos + 1, level + 1);
+      place(t ? e->children[1] : e, 2 * pos + 2, level + 1);
+    };
+    place(node->children[0], 0, 0);
+
+    /* render arrays: the nodes, and the outputs of the leaves, in order */
+    // branchless_treeXX_nodeXX[] : splits of a particular subtree
+    const std::string node_array_name
+      = fmt::format("branchless_tree{}_node{}", tree_id, node_id);
+    // leaf_treeXX_nodeXX[] : outputs of the leaves of a particular subtree;
+    //                        leaf vectors are stored one after another
+    const std::string leaf_array_name
+      = fmt::format("leaf_tree{}_node{}", tree_id, node_id);
+    Operator comp_op = Operator::kLT;
+    common::ArrayFormatter nodes_formatter(80, 2);
+    for (const NumericalConditionNode* e : splits) {
+      if (e) {
+        comp_op = e->op;  // identical for all splits of the subtree
+        nodes_formatter << fmt::format("{{ {}, {}, {} }}",
+          (e->default_left ? 1 : 0), e->split_index,
+          (e->quantized ? std::to_string(e->threshold.int_val)
+                        : common::ToStringHighPrecision(e->threshold.float_val)));
+      } else {
+        nodes_formatter << "{ 0, 0, 0 }";
+      }
+    }
+    common::ArrayFormatter leaves_formatter(80, 2);
+    for (const OutputNode* e : leaves) {
+      if (e->is_vector) {
+        CHECK_EQ(e->vector.size(), static_cast<size_t>(num_output_group_))
+          << "Ill-formed model: leaf vector must be of length [num_output_group]";
+        for (tl_float v : e->vector) {
+          leaves_formatter << common::ToStringHighPrecision(v);
+        }
+      } else {
+        leaves_formatter << common::ToStringHighPrecision(e->scalar);
+      }
+    }
+    AppendToBuffer("header.h",
+                   fmt::format("extern const struct BranchlessNode {}[];\n"
+                               "extern const float {}[];\n",
+                               node_array_name, leaf_array_name), 0);
+    AppendToBuffer("arrays.c",
+                   fmt::format("const struct BranchlessNode {}[] = {{\n{}\n}};\n"
+                               "const float {}[] = {{\n{}\n}};\n",
+                               node_array_name, nodes_formatter.str(),
+                               leaf_array_name, leaves_formatter.str()), 0);
+
+    /* render evaluation logic: one step per level, then the output */
+    std::string code = "nid = 0;\n";
+    const std::string step
+      = fmt::format(native::branchless_step_template,
+          "node_array_name"_a = node_array_name,
+          "missing_check"_a = MissingCheck("fid"),
+          "data_field"_a = (param.quantize > 0 ? "qvalue" : "fvalue"),
+          "comp_op"_a = OpName(comp_op));
+    for (int level = 0; level < depth; ++level) {
+      code += step;
+    }
+    code += fmt::format("nid -= {};\n", num_split);
+    if (leaves[0]->is_vector) {
+      for (int group_id = 0; group_id < num_output_group_; ++group_id) {
+        code += fmt::format("sum[{group_id}] += {leaf_array_name}"
+                            "[nid * {num_output_group} + {group_id}];\n",
+                  "group_id"_a = group_id,
+                  "leaf_array_name"_a = leaf_array_name,
+                  "num_output_group"_a = num_output_group_);
+      }
+    } else if (num_output_group_ > 1) {
+      code += fmt::format("sum[{}] += {}[nid];\n",
+                          tree_id % num_output_group_, leaf_array_name);
+    } else {
+      code += fmt::format("sum += {}[nid];\n", leaf_array_name);
+    }
+    AppendToBuffer(dest, code, indent);
+  }
+
+  void HandleConditionCacheNode(const ConditionCacheNode* node,
+                                const std::string& dest,
+                                size_t indent) {
+    /* compute_condition_cache() sets bit (i % 64) of word (i / 64) of the
+       cache to the outcome of the i-th condition */
+    std::string cache_code;
+    const size_t num_condition = node->conditions.size();
+    for (size_t i = 0; i < num_condition; ++i) {
+      if (i % 64 == 0) {
+        cache_code += "  word = 0;\n";
+      }
+      cache_code
+        += fmt::format("  word |= (uint64_t)({}) << {};\n",
+             ExtractNumericalConditionWithNACheck(node->conditions[i]), i % 64);
+      if (i % 64 == 63 || i + 1 == num_condition) {
+        cache_code += fmt::format("  cond_cache[{}] = word;\n", i / 64);
+      }
+    }
+    tree_functions_
+      += fmt::format(native::condition_cache_function_template,
+           "cache_code"_a = cache_code);
+    condition_cache_block_loop_
+      = fmt::format(native::condition_cache_block_loop_template,
+          "block_size"_a = BatchBlockSize(),
+          "num_cache_word"_a = num_cache_word_);
+    AppendToBuffer(dest,
+      fmt::format("uint64_t cond_cache[{}];\n"
+                  "compute_condition_cache(data, cond_cache);\n",
+                  num_cache_word_), indent);
+    CHECK_EQ(node->children.size(), 1);
+    WalkAST(node->children[0], dest, indent);
+  }
+
+  // extra parameter of the functions evaluating trees and translation units,
+  // through which the condition cache is passed; empty if there is no cache
+  inline std::string CacheParam() const {
+    return (num_cache_word_ > 0 ? ", const uint64_t* cond_cache" : "");
+  }
+
+  inline std::string CacheArg() const {
+    return (num_cache_word_ > 0 ? ", cond_cache" : "");
+  }
+
+  inline std::string
+  ExtractNumericalConditionWithNACheck(const NumericalConditionNode* node) {
+    const std::string condition = ExtractNumericalCondition(node);
+    const std::string split_index = std::to_string(node->split_index);
+    return (node->default_left) ?
+        fmt::format("{} || ({})", MissingCheck(split_index), condition)
+      : fmt::format("{} && ({})", PresentCheck(split_index), condition);
+  }
+
   inline std::string
   ExtractNumericalCondition(const NumericalConditionNode* node) {
     std::string result;
@@ -572,17 +1030,20 @@ class ASTNativeCompiler : public Compiler {
       if (node->convert_missing_to_zero) {
         // All missing values are converted into zeros
         oss << fmt::format(
-          "((tmp = (data[{0}].missing == -1 ? 0U "
-          ": (unsigned int)(data[{0}].fvalue) )), ", node->split_index);
+          "((tmp = ({1} ? 0U "
+          ": (unsigned int)(data[{0}].fvalue) )), ", node->split_index,
+          MissingCheck(std::to_string(node->split_index)));
       } else {
         if (node->default_left) {
           oss << fmt::format(
-            "data[{0}].missing == -1 || ("
-            "(tmp = (unsigned int)(data[{0}].fvalue) ), ", node->split_index);
+            "{1} || ("
+            "(tmp = (unsigned int)(data[{0}].fvalue) ), ", node->split_index,
+            MissingCheck(std::to_string(node->split_index)));
         } else {
           oss << fmt::format(
-            "data[{0}].missing != -1 && ("
-            "(tmp = (unsigned int)(data[{0}].fvalue) ), ", node->split_index);
+            "{1} && ("
+            "(tmp = (unsigned int)(data[{0}].fvalue) ), ", node->split_index,
+            PresentCheck(std::to_string(node->split_index)));
         }
       }
       oss << "(tmp >= 0 && tmp < 64 && (( (uint64_t)"
@@ -599,6 +1060,39 @@ class ASTNativeCompiler : public Compiler {
     return result;
   }
 
+  // C expression testing whether data[index] is missing
+  inline std::string MissingCheck(const std::string& index) const {
+    return fmt::format("data[{}].missing == -1", index);
+  }
+
+  inline std::string PresentCheck(const std::string& index) const {
+    return fmt::format("data[{}].missing != -1", index);
+  }
+
+  // number of rows predict_batch() evaluates together; the block of Entry rows
+  // is kept to about 128 KB so that it remains in cache while the trees are
+  // applied to it one at a time
+  inline int BatchBlockSize() const {
+    return std::max(1, std::min(64, 32768 / std::max(num_feature_, 1)));
+  }
+
+  // Positions of n ascending elements, listed in Eytzinger order: the i-th
+  // entry (counting from 1) is the root of a binary search tree whose
+  // children are entries 2i and 2i+1.
+  static std::vector<size_t> EytzingerOrder(size_t n) {
+    std::vector<size_t> order(n);
+    size_t next = 0;
+    std::function<void(size_t)> fill = [&](size_t i) {
+      if (i <= n) {
+        fill(2 * i);
+        order[i - 1] = next++;
+        fill(2 * i + 1);
+      }
+    };
+    fill(1);
+    return order;
+  }
+
   inline std::string
   RenderIsCategoricalArray(const std::vector<bool>& is_categorical) {
     common::ArrayFormatter formatter(80, 2);
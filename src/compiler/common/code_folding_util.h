@@ -10,13 +10,13 @@
 #include <dmlc/logging.h>
 #include <treelite/common.h>
 #include <fmt/format.h>
-#include <queue>
 #include <set>
 #include <string>
 #include <vector>
 #include <unordered_map>
 #include "../ast/ast.h"
 #include "./categorical_bitmap.h"
+#include "./node_layout.h"
 
 using namespace fmt::literals;
 
@@ -30,6 +30,7 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
                        bool quantize,
                        bool use_boolean_literal,
                        const char* node_entry_template,
+                       size_t node_record_size,
                        OutputFormatFunc RenderOutputStatement,
                        std::string* array_nodes,
                        std::string* array_cat_bitmap,
@@ -46,16 +47,19 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
   std::vector<uint64_t> cat_bitmap;
   std::vector<size_t> cat_begin{0};
 
-  // 1. Assign new continuous node ID's (0, 1, 2, ...) by traversing the
-  // subtree breadth-first
+  // order in which the nodes are stored (see LayoutTreeNodes())
+  const std::vector<ASTNode*> layout = LayoutTreeNodes(node->children[0],
+    GetLayoutBlockDepth(node_record_size),
+    static_cast<bool>(node->children[0]->data_count),
+    [](ASTNode* e) { return e->children; },
+    [](ASTNode* e) { return e->data_count ? e->data_count.value() : 0; });
+
+  // 1. Assign new continuous node ID's (0, 1, 2, ...) in the order of layout
   {
-    std::queue<ASTNode*> Q;
     std::set<treelite::Operator> ops;
     int new_node_id = 0;
     int new_leaf_id = -1;
-    Q.push(node->children[0]);
-    while (!Q.empty()) {
-      ASTNode* e = Q.front(); Q.pop();
+    for (ASTNode* e : layout) {
       // sanity check: all descendants must have same tree_id
       CHECK_EQ(e->tree_id, tree_id);
       // sanity check: all descendants must be ConditionNode or OutputNode
@@ -71,16 +75,13 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
         }
         descendants[e] = new_node_id++;
       }
-      for (ASTNode* child : e->children) {
-        Q.push(child);
-      }
     }
     // sanity check: all numerical splits must have identical comparison operators
     CHECK_LE(ops.size(), 1);
     *common_comp_op = ops.empty() ? Operator::kLT : *ops.begin();
   }
 
-  // 2. Render node_treeXX_nodeXX[] by traversing the subtree once again.
+  // 2. Render node_treeXX_nodeXX[] by going through the layout once again.
   // Now we can use the re-assigned node ID's.
   {
     common::ArrayFormatter formatter(80, 2);
@@ -93,10 +94,7 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
     NumericalConditionNode* t2;
     CategoricalConditionNode* t3;
 
-    std::queue<ASTNode*> Q;
-    Q.push(node->children[0]);
-    while (!Q.empty()) {
-      ASTNode* e = Q.front(); Q.pop();
+    for (ASTNode* e : layout) {
       if ( (t1 = dynamic_cast<OutputNode*>(e)) ) {
         output_nodes.push_back(t1);
         // don't render OutputNode but save it for later
@@ -122,8 +120,10 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
           std::vector<uint64_t> bitmap
             = GetCategoricalBitmap(t3->left_categories);
           cat_bitmap.insert(cat_bitmap.end(), bitmap.begin(), bitmap.end());
-          cat_begin.push_back(cat_bitmap.size());
         }
+        // cat_begin[] is indexed by node ID, so numerical splits get an
+        // empty range
+        cat_begin.push_back(cat_bitmap.size());
         const char* (*BoolWrapper)(bool);
         if (use_boolean_literal) {
           BoolWrapper = [](bool x) { return x ? "true" : "false"; };
@@ -133,13 +133,13 @@ RenderCodeFolderArrays(const CodeFolderNode* node,
         formatter << fmt::format(node_entry_template,
                                   "default_left"_a = BoolWrapper(default_left),
                                   "split_index"_a = split_index,
+                                  "sindex"_a = fmt::format("0x{:X}",
+                                    split_index | (static_cast<unsigned int>(
+                                                     default_left) << 31)),
                                   "threshold"_a = threshold,
                                   "left_child"_a = left_child_id,
                                   "right_child"_a = right_child_id);
       }
-      for (ASTNode* child : e->children) {
-        Q.push(child);
-      }
     }
     *array_nodes = formatter.str();
   }
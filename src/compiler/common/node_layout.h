@@ -0,0 +1,91 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file node_layout.h
+ * \brief Order the nodes of a tree for evaluation from an array
+ */
+#ifndef TREELITE_COMPILER_COMMON_NODE_LAYOUT_H_
+#define TREELITE_COMPILER_COMMON_NODE_LAYOUT_H_
+
+#include <algorithm>
+#include <vector>
+
+namespace treelite {
+namespace compiler {
+namespace common_util {
+
+constexpr size_t kCacheLineSize = 64;
+
+/*!
+ * \brief number of levels of a block in LayoutTreeNodes(), such that the
+ *        children of all splits in a block fit in one cache line
+ * \param record_size size of a node record, in bytes
+ */
+inline int GetLayoutBlockDepth(size_t record_size) {
+  int depth = 1;
+  while ((size_t(2) << (depth + 1)) - 2 <= kCacheLineSize / record_size) {
+    ++depth;
+  }
+  return depth;
+}
+
+/*!
+ * \brief Choose the order in which the nodes of a tree are stored in an
+ *        array, so that evaluating a row touches few cache lines. The two
+ *        children of every split are stored next to each other, left child
+ *        first.
+ *
+ *        With data counts, subtrees are laid out depth-first, with the
+ *        subtree of the child reached by more rows first, so that the paths
+ *        taken by most rows are stored in a short stretch of the array.
+ *        Without them, the tree is cut into blocks of block_depth levels;
+ *        the children of the splits of a block are stored together, and the
+ *        blocks below it follow in depth-first order.
+ * \param root root of the tree
+ * \param block_depth number of levels per block, when use_data_count=false
+ * \param use_data_count whether to lay out hot subtrees first
+ * \param GetChildren function returning the children of a node (empty for
+ *                    a leaf)
+ * \param GetDataCount function returning the number of rows reaching a node
+ * \return list of nodes, in the order they should be stored
+ */
+template <typename NodeT, typename ChildrenFunc, typename DataCountFunc>
+inline std::vector<NodeT>
+LayoutTreeNodes(NodeT root, int block_depth, bool use_data_count,
+                ChildrenFunc GetChildren, DataCountFunc GetDataCount) {
+  if (use_data_count) {
+    block_depth = 1;
+  }
+  std::vector<NodeT> order{root};
+  // roots of the blocks whose splits are yet to be laid out
+  std::vector<NodeT> stack{root};
+  while (!stack.empty()) {
+    std::vector<NodeT> level{stack.back()};
+    stack.pop_back();
+    for (int depth = 0; depth < block_depth && !level.empty(); ++depth) {
+      std::vector<NodeT> next_level;
+      for (NodeT node : level) {
+        for (NodeT child : GetChildren(node)) {
+          order.push_back(child);
+          if (!GetChildren(child).empty()) {
+            next_level.push_back(child);
+          }
+        }
+      }
+      level = std::move(next_level);
+    }
+    // splits in the level below the block are roots of new blocks
+    if (use_data_count) {
+      std::stable_sort(level.begin(), level.end(), [&](NodeT a, NodeT b) {
+        return GetDataCount(a) > GetDataCount(b);
+      });
+    }
+    stack.insert(stack.end(), level.rbegin(), level.rend());
+  }
+  return order;
+}
+
+}  // namespace common_util
+}  // namespace compiler
+}  // namespace treelite
+
+#endif  // TREELITE_COMPILER_COMMON_NODE_LAYOUT_H_
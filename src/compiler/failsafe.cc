@@ -7,17 +7,21 @@
  */
 
 #include <treelite/tree.h>
+#include <treelite/annotator.h>
 #include <treelite/compiler.h>
 #include <treelite/common.h>
 #include <fmt/format.h>
 #include <cmath>
+#include <memory>
 #include <unordered_map>
 #include <set>
 #include <tuple>
 #include <utility>
+#include <vector>
 #include "./param.h"
 #include "./pred_transform.h"
 #include "./elf/elf_formatter.h"
+#include "./common/node_layout.h"
 
 #if defined(_MSC_VER) || defined(_WIN32)
 #define DLLEXPORT_KEYWORD "__declspec(dllexport) "
@@ -29,6 +33,9 @@ using namespace fmt::literals;
 
 namespace {
 
+// number of rows that predict_batch() walks through each tree together
+constexpr int kRowGroupSize = 8;
+
 struct NodeStructValue {
   unsigned int sindex;
   float info;
@@ -36,6 +43,28 @@ struct NodeStructValue {
   int cright;
 };
 
+struct PackedNodeStructValue {
+  uint16_t sindex;
+  uint16_t cleft;
+  float info;
+};
+
+const char* node_struct = R"TREELITETEMPLATE(
+struct Node {
+  unsigned int sindex;  /* feature index; bit 31 holds default_left */
+  union NodeInfo info;
+  int cleft;            /* -1 for leaves */
+  int cright;           /* always cleft + 1 */
+};)TREELITETEMPLATE";
+
+const char* packed_node_struct = R"TREELITETEMPLATE(
+struct Node {
+  uint16_t sindex;      /* feature index; bit 15 holds default_left */
+  uint16_t cleft;       /* offset of the left child from this node; the right
+                           child comes right after it. 0 for leaves */
+  union NodeInfo info;
+};)TREELITETEMPLATE";
+
 const char* header_template = R"TREELITETEMPLATE(
 #include <stdlib.h>
 #include <string.h>
@@ -51,25 +80,27 @@ union NodeInfo {{
   float leaf_value;
   float threshold;
 }};
-
-struct Node {{
-  unsigned int sindex;
-  union NodeInfo info;
-  int cleft;
-  int cright;
-}};
+{node_struct}
 
 extern const struct Node nodes[];
 extern const int nodes_row_ptr[];
 
 {dllexport}size_t get_num_output_group(void);
 {dllexport}size_t get_num_feature(void);
+{dllexport}size_t get_overwritten_features(const unsigned** out);
 {dllexport}{predict_function_signature};
+{dllexport}{predict_batch_function_signature};
 )TREELITETEMPLATE";
 
 const char* main_template = R"TREELITETEMPLATE(
 #include "header.h"
 
+#if defined(__clang__) || defined(__GNUC__)
+#define PREFETCH(addr) __builtin_prefetch(addr)
+#else
+#define PREFETCH(addr)
+#endif
+
 {nodes_row_ptr}
 
 size_t get_num_output_group(void) {{
@@ -80,6 +111,12 @@ size_t get_num_feature(void) {{
   return {num_feature};
 }}
 
+/* predict() leaves its input alone */
+size_t get_overwritten_features(const unsigned** out) {{
+  *out = NULL;
+  return 0;
+}}
+
 {pred_transform_function}
 
 {predict_function_signature} {{
@@ -87,21 +124,99 @@ size_t get_num_feature(void) {{
 
   for (int tree_id = 0; tree_id < {num_tree}; ++tree_id) {{
     int nid = 0;
+    int cond;
     const struct Node* tree = &nodes[nodes_row_ptr[tree_id]];
-    while (tree[nid].cleft != -1) {{
-      const unsigned feature_id = tree[nid].sindex & ((1U << 31) - 1U);
-      const unsigned char default_left = (tree[nid].sindex >> 31) != 0;
+    while (tree[nid].cleft != {leaf_cleft}) {{
+      const unsigned feature_id
+        = tree[nid].sindex & ((1U << {default_left_bit}) - 1U);
       if (data[feature_id].missing == -1) {{
-        nid = (default_left ? tree[nid].cleft : tree[nid].cright);
+        cond = (tree[nid].sindex >> {default_left_bit}) != 0;
       }} else {{
-        nid = (data[feature_id].fvalue {compare_op} tree[nid].info.threshold
-               ? tree[nid].cleft : tree[nid].cright);
+        cond = data[feature_id].fvalue {compare_op} tree[nid].info.threshold;
       }}
+      nid = {left_child_base}tree[nid].cleft + !cond;
     }}
     {output_statement}
   }}
   {return_statement}
 }}
+
+{predict_batch_function_signature} {{
+  /* Rows are processed in groups of {group_size}. The rows of a group walk
+     each tree in lockstep, one level at a time, so that the node loads of
+     different rows do not depend on each other and their memory latencies
+     overlap, where a single row would wait for each load in turn. */
+  union Entry* block;
+  union Entry* data;
+  const struct Node* tree;
+  const struct Node* node;
+  const float* row;
+  int nid[{group_size}];
+  float sum[{group_size} * {num_output_group}];
+  const int missing_is_nan = isnan(missing);
+  size_t rbegin, ngroup, r, j, total = 0;
+  int tree_id, active, cond;
+  unsigned feature_id;
+
+  block = (union Entry*)malloc(sizeof(union Entry)
+                               * {group_size} * {num_feature});
+  if (block == NULL) {{
+    return 0;
+  }}
+  for (rbegin = 0; rbegin < nrow; rbegin += {group_size}) {{
+    ngroup = (nrow - rbegin < {group_size}) ? (nrow - rbegin) : {group_size};
+    for (r = 0; r < ngroup; ++r) {{
+      row = &rows[(rbegin + r) * ncol];
+      data = &block[r * {num_feature}];
+      for (j = 0; j < ncol && j < {num_feature}; ++j) {{
+        if (isnan(row[j]) || (!missing_is_nan && row[j] == missing)) {{
+          data[j].missing = -1;
+        }} else {{
+          data[j].fvalue = row[j];
+        }}
+      }}
+      for (; j < {num_feature}; ++j) {{
+        data[j].missing = -1;
+      }}
+    }}
+    memset(sum, 0, sizeof(float) * ngroup * {num_output_group});
+    for (tree_id = 0; tree_id < {num_tree}; ++tree_id) {{
+      tree = &nodes[nodes_row_ptr[tree_id]];
+      if (tree_id + 1 < {num_tree}) {{
+        PREFETCH(&nodes[nodes_row_ptr[tree_id + 1]]);
+      }}
+      for (r = 0; r < ngroup; ++r) {{
+        nid[r] = 0;
+      }}
+      do {{
+        active = 0;
+        for (r = 0; r < ngroup; ++r) {{
+          node = &tree[nid[r]];
+          if (node->cleft == {leaf_cleft}) {{
+            continue;
+          }}
+          feature_id = node->sindex & ((1U << {default_left_bit}) - 1U);
+          data = &block[r * {num_feature}];
+          if (data[feature_id].missing == -1) {{
+            cond = (node->sindex >> {default_left_bit}) != 0;
+          }} else {{
+            cond = data[feature_id].fvalue {compare_op} node->info.threshold;
+          }}
+          nid[r] = {batch_left_child_base}node->cleft + !cond;
+          /* needed again only after the other rows have taken a step */
+          PREFETCH(&tree[nid[r]]);
+          active = 1;
+        }}
+      }} while (active);
+      for (r = 0; r < ngroup; ++r) {{
+        {batch_output_statement}
+      }}
+    }}
+{batch_return_statement}
+  }}
+  free(block);
+  return total;
+}}
 )TREELITETEMPLATE";
 
 const char* return_multiclass_template =
@@ -126,41 +241,129 @@ R"TREELITETEMPLATE(
   }}
 )TREELITETEMPLATE";
 
+const char* batch_return_multiclass_template =
+R"TREELITETEMPLATE(
+    for (r = 0; r < ngroup; ++r) {{
+      float* result = &out[(rbegin + r) * {num_output_group}];
+      for (j = 0; j < {num_output_group}; ++j) {{
+        result[j] = sum[r * {num_output_group} + j] + (float)({global_bias});
+      }}
+      total += (pred_margin ? {num_output_group} : pred_transform(result));
+    }}
+)TREELITETEMPLATE";  // only for multiclass classification
+
+const char* batch_return_template =
+R"TREELITETEMPLATE(
+    for (r = 0; r < ngroup; ++r) {{
+      sum[r] += (float)({global_bias});
+      out[rbegin + r] = (pred_margin ? sum[r] : pred_transform(sum[r]));
+    }}
+    total += ngroup;
+)TREELITETEMPLATE";
+
 const char* arrays_template = R"TREELITETEMPLATE(
 #include "header.h"
 
 {nodes}
 )TREELITETEMPLATE";
 
+// Orders the nodes of every tree for storage in nodes[] (see
+// common_util::LayoutTreeNodes()). Returns, for each tree, the list of node ID's
+// in storage order. data_counts[i][j] is the number of rows reaching node j of
+// Tree [i], or data_counts is empty if unknown.
+inline std::vector<std::vector<int>>
+LayoutNodes(const treelite::Model& model,
+            const std::vector<std::vector<size_t>>& data_counts,
+            size_t record_size) {
+  std::vector<std::vector<int>> layout;
+  for (size_t tree_id = 0; tree_id < model.trees.size(); ++tree_id) {
+    const auto& tree = model.trees[tree_id];
+    layout.push_back(treelite::compiler::common_util::LayoutTreeNodes(0,
+      treelite::compiler::common_util::GetLayoutBlockDepth(record_size),
+      !data_counts.empty(),
+      [&tree](int nid) {
+        return (tree[nid].is_leaf() ? std::vector<int>()
+                                    : std::vector<int>{tree[nid].cleft(),
+                                                       tree[nid].cright()});
+      },
+      [&data_counts, tree_id](int nid) { return data_counts[tree_id][nid]; }));
+  }
+  return layout;
+}
+
+// Inverse of a tree layout: position of each node in storage order
+inline std::vector<int> GetNodePositions(const std::vector<int>& tree_layout) {
+  std::vector<int> pos(tree_layout.size());
+  for (size_t i = 0; i < tree_layout.size(); ++i) {
+    pos[tree_layout[i]] = static_cast<int>(i);
+  }
+  return pos;
+}
+
+// Tests whether nodes[] can be stored as 8-byte records (PackedNodeStructValue)
+// with the given layout: feature indices must fit in 15 bits and the offset of
+// every left child from its parent in 16 bits
+inline bool CanPackNodes(const treelite::Model& model,
+                         const std::vector<std::vector<int>>& layout) {
+  if (model.num_feature > (1 << 15)) {
+    return false;
+  }
+  for (size_t tree_id = 0; tree_id < model.trees.size(); ++tree_id) {
+    const auto& tree = model.trees[tree_id];
+    const std::vector<int> pos = GetNodePositions(layout[tree_id]);
+    for (int nid = 0; nid < tree.num_nodes; ++nid) {
+      if (!tree[nid].is_leaf() && pos[tree[nid].cleft()] - pos[nid] > 0xFFFF) {
+        return false;
+      }
+    }
+  }
+  return true;
+}
+
 // Returns formatted nodes[] and nodes_row_ptr[] arrays
-// nodes[]: stores nodes from all decision trees
+// nodes[]: stores nodes from all decision trees, in the order given by layout
 // nodes_row_ptr[]: marks bounaries between decision trees. The nodes belonging to Tree [i] are
 //                  found in nodes[nodes_row_ptr[i]:nodes_row_ptr[i+1]]
-inline std::pair<std::string, std::string> FormatNodesArray(const treelite::Model& model) {
+inline std::pair<std::string, std::string>
+FormatNodesArray(const treelite::Model& model,
+                 const std::vector<std::vector<int>>& layout, bool packed) {
   treelite::common::ArrayFormatter nodes(100, 2);
   treelite::common::ArrayFormatter nodes_row_ptr(100, 2);
   int node_count = 0;
   nodes_row_ptr << "0";
-  for (const auto& tree : model.trees) {
-    for (int nid = 0; nid < tree.num_nodes; ++nid) {
+  for (size_t tree_id = 0; tree_id < model.trees.size(); ++tree_id) {
+    const auto& tree = model.trees[tree_id];
+    const std::vector<int> pos = GetNodePositions(layout[tree_id]);
+    for (int nid : layout[tree_id]) {
       const auto& node = tree[nid];
       if (node.is_leaf()) {
         CHECK(!node.has_leaf_vector())
           << "multi-class random forest classifier is not supported in FailSafeCompiler";
-        nodes << fmt::format("{{ 0x{sindex:X}, {info}, {cleft}, {cright} }}",
-          "sindex"_a = 0,
-          "info"_a = treelite::common::ToStringHighPrecision(node.leaf_value()),
-          "cleft"_a = -1,
-          "cright"_a = -1);
+        const std::string leaf_value
+          = treelite::common::ToStringHighPrecision(node.leaf_value());
+        if (packed) {
+          nodes << fmt::format("{{ 0x0, 0, {info} }}", "info"_a = leaf_value);
+        } else {
+          nodes << fmt::format("{{ 0x0, {info}, -1, -1 }}", "info"_a = leaf_value);
+        }
       } else {
         CHECK(node.split_type() == treelite::SplitFeatureType::kNumerical
               && node.left_categories().empty())
           << "categorical splits are not supported in FailSafeCompiler";
-        nodes << fmt::format("{{ 0x{sindex:X}, {info}, {cleft}, {cright} }}",
-          "sindex"_a = (node.split_index() | (static_cast<uint32_t>(node.default_left()) << 31)),
-          "info"_a = treelite::common::ToStringHighPrecision(node.threshold()),
-          "cleft"_a = node.cleft(),
-          "cright"_a = node.cright());
+        const std::string threshold
+          = treelite::common::ToStringHighPrecision(node.threshold());
+        if (packed) {
+          nodes << fmt::format("{{ 0x{sindex:X}, {cleft}, {info} }}",
+            "sindex"_a = (node.split_index() | (static_cast<uint32_t>(node.default_left()) << 15)),
+            "cleft"_a = pos[node.cleft()] - pos[nid],
+            "info"_a = threshold);
+        } else {
+          nodes << fmt::format("{{ 0x{sindex:X}, {info}, {cleft}, {cright} }}",
+            "sindex"_a = (node.split_index() | (static_cast<uint32_t>(node.default_left()) << 31)),
+            "info"_a = threshold,
+            "cleft"_a = pos[node.cleft()],
+            "cright"_a = pos[node.cright()]);
+        }
       }
     }
     node_count += tree.num_nodes;
@@ -172,31 +375,47 @@ inline std::pair<std::string, std::string> FormatNodesArray(const treelite::Mode
 }
 
 // Variant of FormatNodesArray(), where nodes[] array is dumped as an ELF binary
-inline std::pair<std::vector<char>, std::string> FormatNodesArrayELF(const treelite::Model& model) {
+inline std::pair<std::vector<char>, std::string>
+FormatNodesArrayELF(const treelite::Model& model,
+                    const std::vector<std::vector<int>>& layout, bool packed) {
   std::vector<char> nodes_elf;
   treelite::compiler::AllocateELFHeader(&nodes_elf);
 
   treelite::common::ArrayFormatter nodes_row_ptr(100, 2);
   NodeStructValue val;
+  PackedNodeStructValue packed_val;
   int node_count = 0;
   nodes_row_ptr << "0";
-  for (const auto& tree : model.trees) {
-    for (int nid = 0; nid < tree.num_nodes; ++nid) {
+  for (size_t tree_id = 0; tree_id < model.trees.size(); ++tree_id) {
+    const auto& tree = model.trees[tree_id];
+    const std::vector<int> pos = GetNodePositions(layout[tree_id]);
+    for (int nid : layout[tree_id]) {
       const auto& node = tree[nid];
       if (node.is_leaf()) {
         CHECK(!node.has_leaf_vector())
           << "multi-class random forest classifier is not supported in FailSafeCompiler";
         val = {0, static_cast<float>(node.leaf_value()), -1, -1};
+        packed_val = {0, 0, static_cast<float>(node.leaf_value())};
       } else {
         CHECK(node.split_type() == treelite::SplitFeatureType::kNumerical
               && node.left_categories().empty())
           << "categorical splits are not supported in FailSafeCompiler";
         val = {(node.split_index() | (static_cast<uint32_t>(node.default_left()) << 31)),
-               static_cast<float>(node.threshold()), node.cleft(), node.cright()};
+               static_cast<float>(node.threshold()),
+               pos[node.cleft()], pos[node.cright()]};
+        packed_val = {static_cast<uint16_t>(node.split_index()
+                                            | (static_cast<uint32_t>(node.default_left()) << 15)),
+                      static_cast<uint16_t>(pos[node.cleft()] - pos[nid]),
+                      static_cast<float>(node.threshold())};
       }
       const size_t beg = nodes_elf.size();
-      nodes_elf.resize(beg + sizeof(NodeStructValue));
-      std::memcpy(&nodes_elf[beg], &val, sizeof(NodeStructValue));
+      if (packed) {
+        nodes_elf.resize(beg + sizeof(PackedNodeStructValue));
+        std::memcpy(&nodes_elf[beg], &packed_val, sizeof(PackedNodeStructValue));
+      } else {
+        nodes_elf.resize(beg + sizeof(NodeStructValue));
+        std::memcpy(&nodes_elf[beg], &val, sizeof(NodeStructValue));
+      }
     }
     node_count += tree.num_nodes;
     nodes_row_ptr << std::to_string(node_count);
@@ -246,10 +465,6 @@ class FailSafeCompiler : public Compiler {
     if (param.verbose > 0) {
       LOG(INFO) << "Using FailSafeCompiler";
     }
-    if (param.annotate_in != "NULL") {
-      LOG(INFO) << "Warning: 'annotate_in' parameter is not applicable for "
-                   "FailSafeCompiler";
-    }
     if (param.quantize > 0) {
       LOG(INFO) << "Warning: 'quantize' parameter is not applicable for "
                    "FailSafeCompiler";
@@ -262,6 +477,14 @@ class FailSafeCompiler : public Compiler {
       LOG(INFO) << "Warning: 'code_folding_req' parameter is not applicable "
                    "for FailSafeCompiler";
     }
+    if (param.branchless_depth > 0) {
+      LOG(INFO) << "Warning: 'branchless_depth' parameter is not applicable "
+                   "for FailSafeCompiler";
+    }
+    if (param.cache_conditions > 0) {
+      LOG(INFO) << "Warning: 'cache_conditions' parameter is not applicable "
+                   "for FailSafeCompiler";
+    }
   }
 
   CompiledModel Compile(const Model& model) override {
@@ -280,6 +503,9 @@ class FailSafeCompiler : public Compiler {
           "size_t predict_multiclass(union Entry* data, int pred_margin, "
                                     "float* result)"
         : "float predict(union Entry* data, int pred_margin)";
+    const char* predict_batch_function_signature
+      = "size_t predict_batch(const float* rows, size_t nrow, size_t ncol, "
+                             "float missing, int pred_margin, float* out)";
 
     std::ostringstream main_program;
     std::string accumulator_definition
@@ -294,6 +520,13 @@ class FailSafeCompiler : public Compiler {
              "num_output_group"_a = num_output_group_)
          : std::string("sum += tree[nid].info.leaf_value;"));
 
+    std::string batch_output_statement
+      = (num_output_group_ > 1
+         ? fmt::format("sum[r * {num_output_group} + tree_id % {num_output_group}]"
+                       " += tree[nid[r]].info.leaf_value;",
+             "num_output_group"_a = num_output_group_)
+         : std::string("sum[r] += tree[nid[r]].info.leaf_value;"));
+
     std::string return_statement
       = (num_output_group_ > 1
          ? fmt::format(return_multiclass_template,
@@ -302,15 +535,43 @@ class FailSafeCompiler : public Compiler {
          : fmt::format(return_template,
              "global_bias"_a = common::ToStringHighPrecision(model.param.global_bias)));
 
+    std::string batch_return_statement
+      = (num_output_group_ > 1
+         ? fmt::format(batch_return_multiclass_template,
+             "num_output_group"_a = num_output_group_,
+             "global_bias"_a = common::ToStringHighPrecision(model.param.global_bias))
+         : fmt::format(batch_return_template,
+             "global_bias"_a = common::ToStringHighPrecision(model.param.global_bias)));
+
+    std::vector<std::vector<size_t>> data_counts;
+    if (param.annotate_in != "NULL") {
+      BranchAnnotator annotator;
+      std::unique_ptr<dmlc::Stream> fi(
+        dmlc::Stream::Create(param.annotate_in.c_str(), "r"));
+      annotator.Load(fi.get());
+      data_counts = annotator.Get();
+      CHECK_EQ(data_counts.size(), model.trees.size())
+        << "Annotation in `" << param.annotate_in << "' does not match the model";
+      LOG(INFO) << "Loading node frequencies from `"
+                << param.annotate_in << "'";
+    }
+    /* use 8-byte records for nodes if possible, 16-byte records otherwise */
+    std::vector<std::vector<int>> layout
+      = LayoutNodes(model, data_counts, sizeof(PackedNodeStructValue));
+    const bool packed = CanPackNodes(model, layout);
+    if (!packed) {
+      layout = LayoutNodes(model, data_counts, sizeof(NodeStructValue));
+    }
+
     std::string nodes, nodes_row_ptr;
     std::vector<char> nodes_elf;
     if (param.dump_array_as_elf > 0) {
       if (param.verbose > 0) {
         LOG(INFO) << "Dumping arrays as an ELF relocatable object...";
       }
-      std::tie(nodes_elf, nodes_row_ptr) = FormatNodesArrayELF(model);
+      std::tie(nodes_elf, nodes_row_ptr) = FormatNodesArrayELF(model, layout, packed);
     } else {
-      std::tie(nodes, nodes_row_ptr) = FormatNodesArray(model);
+      std::tie(nodes, nodes_row_ptr) = FormatNodesArray(model, layout, packed);
     }
 
     main_program << fmt::format(main_template,
@@ -323,7 +584,15 @@ class FailSafeCompiler : public Compiler {
       "compare_op"_a = GetCommonOp(model),
       "accumulator_definition"_a = accumulator_definition,
       "output_statement"_a = output_statement,
-      "return_statement"_a = return_statement);
+      "return_statement"_a = return_statement,
+      "predict_batch_function_signature"_a = predict_batch_function_signature,
+      "group_size"_a = kRowGroupSize,
+      "batch_output_statement"_a = batch_output_statement,
+      "batch_return_statement"_a = batch_return_statement,
+      "leaf_cleft"_a = (packed ? "0" : "-1"),
+      "default_left_bit"_a = (packed ? 15 : 31),
+      "left_child_base"_a = (packed ? "nid + " : ""),
+      "batch_left_child_base"_a = (packed ? "nid[r] + " : ""));
 
     files_["main.c"] = CompiledModel::FileEntry(main_program.str());
 
@@ -336,7 +605,9 @@ class FailSafeCompiler : public Compiler {
 
     files_["header.h"] = CompiledModel::FileEntry(fmt::format(header_template,
       "dllexport"_a = DLLEXPORT_KEYWORD,
-      "predict_function_signature"_a = predict_function_signature));
+      "node_struct"_a = (packed ? packed_node_struct : node_struct),
+      "predict_function_signature"_a = predict_function_signature,
+      "predict_batch_function_signature"_a = predict_batch_function_signature));
 
     {
       /* write recipe.json */
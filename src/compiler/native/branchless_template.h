@@ -0,0 +1,30 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file branchless_template.h
+ * \brief template for branch-free evaluation of shallow subtrees
+ */
+
+#ifndef TREELITE_COMPILER_NATIVE_BRANCHLESS_TEMPLATE_H_
+#define TREELITE_COMPILER_NATIVE_BRANCHLESS_TEMPLATE_H_
+
+namespace treelite {
+namespace compiler {
+namespace native {
+
+/* One level of a complete subtree whose nodes are stored in breadth-first
+   order, so that the children of node i are nodes 2i+1 and 2i+2. The
+   condition is computed with bitwise operators, leaving the compiler no
+   reason to emit a conditional branch. */
+const char* branchless_step_template =
+R"TREELITETEMPLATE(
+fid = {node_array_name}[nid].split_index;
+tmp = ({missing_check}) != 0;
+cond = (tmp & {node_array_name}[nid].default_left)
+       | (!tmp & (data[fid].{data_field} {comp_op} {node_array_name}[nid].threshold));
+nid = 2 * nid + 2 - cond;
+)TREELITETEMPLATE";
+
+}  // namespace native
+}  // namespace compiler
+}  // namespace treelite
+#endif  // TREELITE_COMPILER_NATIVE_BRANCHLESS_TEMPLATE_H_
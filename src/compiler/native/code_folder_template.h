@@ -16,9 +16,9 @@ const char* eval_loop_template =
 R"TREELITETEMPLATE(
 nid = 0;
 while (nid >= 0) {{  /* negative nid implies leaf */
-  fid = {node_array_name}[nid].split_index;
-  if (data[fid].missing == -1) {{
-    cond = {node_array_name}[nid].default_left;
+  fid = {node_array_name}[nid].split_index & 0x7FFFFFFFU;
+  if ({missing_check}) {{
+    cond = {node_array_name}[nid].split_index >> 31;
   }} else if (is_categorical[fid]) {{
     tmp = (unsigned int)data[fid].fvalue;
     cond = ({cat_bitmap_name}[{cat_begin_name}[nid] + tmp / 64] >> (tmp % 64)) & 1;
@@ -35,9 +35,9 @@ const char* eval_loop_template_without_categorical_feature =
 R"TREELITETEMPLATE(
 nid = 0;
 while (nid >= 0) {{  /* negative nid implies leaf */
-  fid = {node_array_name}[nid].split_index;
-  if (data[fid].missing == -1) {{
-    cond = {node_array_name}[nid].default_left;
+  fid = {node_array_name}[nid].split_index & 0x7FFFFFFFU;
+  if ({missing_check}) {{
+    cond = {node_array_name}[nid].split_index >> 31;
   }} else {{
     cond = (data[fid].{data_field} {comp_op} {node_array_name}[nid].threshold);
   }}
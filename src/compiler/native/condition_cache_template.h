@@ -0,0 +1,32 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file condition_cache_template.h
+ * \brief template for evaluating recurring split conditions once per row
+ */
+
+#ifndef TREELITE_COMPILER_NATIVE_CONDITION_CACHE_TEMPLATE_H_
+#define TREELITE_COMPILER_NATIVE_CONDITION_CACHE_TEMPLATE_H_
+
+namespace treelite {
+namespace compiler {
+namespace native {
+
+const char* condition_cache_function_template =
+R"TREELITETEMPLATE(
+static void compute_condition_cache(union Entry* data, uint64_t* cond_cache) {{
+  uint64_t word;
+{cache_code}}}
+)TREELITETEMPLATE";
+
+const char* condition_cache_block_loop_template =
+R"TREELITETEMPLATE(
+uint64_t cond_cache[{block_size} * {num_cache_word}];
+for (r = 0; r < nblock; ++r) {{
+  compute_condition_cache(row_data[r], &cond_cache[r * {num_cache_word}]);
+}}
+)TREELITETEMPLATE";
+
+}  // namespace native
+}  // namespace compiler
+}  // namespace treelite
+#endif  // TREELITE_COMPILER_NATIVE_CONDITION_CACHE_TEMPLATE_H_
@@ -27,6 +27,10 @@ R"TREELITETEMPLATE(
 #define UNLIKELY(x) (x)
 #endif
 
+/* tests the bit pattern of an entry for NaN, so that the test holds under
+   -ffast-math as well */
+#define ENTRY_IS_NAN(entry) (((entry).missing & 0x7FFFFFFF) > 0x7F800000)
+
 union Entry {{
   int missing;
   float fvalue;
@@ -34,11 +38,16 @@ union Entry {{
 }};
 
 struct Node {{
+  {threshold_type} threshold;
+  unsigned int split_index;  /* feature index; bit 31 holds default_left */
+  {child_id_type} left_child;  /* negative for leaves */
+  {child_id_type} right_child;
+}};
+
+struct BranchlessNode {{
   uint8_t default_left;
   unsigned int split_index;
   {threshold_type} threshold;
-  int left_child;
-  int right_child;
 }};
 
 extern const unsigned char is_categorical[];
@@ -49,6 +58,7 @@ extern const unsigned char is_categorical[];
 {dllexport}{get_sigmoid_alpha_function_signature};
 {dllexport}{get_global_bias_function_signature};
 {dllexport}{predict_function_signature};
+{dllexport}{predict_batch_function_signature};
 )TREELITETEMPLATE";
 
 }  // namespace native
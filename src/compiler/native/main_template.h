@@ -14,8 +14,6 @@ namespace native {
 
 const char* main_start_template =
 R"TREELITETEMPLATE(
-#include "header.h"
-
 {array_is_categorical};
 
 {get_num_output_group_function_signature} {{
@@ -66,6 +64,127 @@ R"TREELITETEMPLATE(
 }}
 )TREELITETEMPLATE";
 
+const char* tree_function_template =
+R"TREELITETEMPLATE(
+static float {tree_function_name}(union Entry* data{cache_param}) {{
+  float sum = 0.0f;
+  unsigned int tmp;
+  int nid, cond, fid;  /* used for folded subtrees */
+{tree_code}
+  return sum;
+}}
+)TREELITETEMPLATE";
+
+const char* tree_function_multiclass_template =
+R"TREELITETEMPLATE(
+static void {tree_function_name}(union Entry* data{cache_param}, float* sum) {{
+  unsigned int tmp;
+  int nid, cond, fid;  /* used for folded subtrees */
+{tree_code}
+}}
+)TREELITETEMPLATE";  // only for multiclass classification
+
+const char* predict_batch_start_template =
+R"TREELITETEMPLATE(
+{predict_batch_function_signature} {{
+  /* Rows are processed in blocks of {block_size}. Within each block, every
+     tree (or translation unit) is evaluated for all rows before moving on to
+     the next tree, so that the code and thresholds of one tree stay hot in
+     cache while it is applied to many rows. */
+  union Entry* block = NULL;
+  union Entry* row_data[{block_size}];
+  float sum[{block_size} * {num_output_group}];
+  union Entry missing_entry;
+  int missing_is_nan, read_in_place;
+  size_t rbegin, nblock, r, j, total = 0;
+  union Entry* data;
+  const union Entry* row;
+  missing_entry.fvalue = missing;
+  missing_is_nan = ENTRY_IS_NAN(missing_entry);
+  /* The trees test Entry::missing == -1, so an input row is read in place
+     only if it has no missing value, i.e. no NaN when missing values are
+     marked by NaN. Other rows are copied into a block of entries, with
+     their missing values marked as such. */
+  read_in_place = {dense_native} && missing_is_nan && ncol >= {num_feature};
+  for (rbegin = 0; rbegin < nrow; rbegin += {block_size}) {{
+    nblock = (nrow - rbegin < {block_size}) ? (nrow - rbegin) : {block_size};
+    for (r = 0; r < nblock; ++r) {{
+      row = (const union Entry*)&rows[(rbegin + r) * ncol];
+      if (read_in_place) {{
+        for (j = 0; j < {num_feature} && !ENTRY_IS_NAN(row[j]); ++j) {{}}
+        if (j == {num_feature}) {{
+          row_data[r] = (union Entry*)row;
+          continue;
+        }}
+      }}
+      if (block == NULL) {{
+        block = (union Entry*)malloc(sizeof(union Entry)
+                                     * {block_size} * {num_feature});
+        if (block == NULL) {{
+          return 0;
+        }}
+      }}
+      data = row_data[r] = &block[r * {num_feature}];
+      for (j = 0; j < ncol && j < {num_feature}; ++j) {{
+        if (ENTRY_IS_NAN(row[j])
+            || (!missing_is_nan && row[j].fvalue == missing)) {{
+          data[j].missing = -1;
+        }} else {{
+          data[j].fvalue = row[j].fvalue;
+        }}
+      }}
+      for (; j < {num_feature}; ++j) {{
+        data[j].missing = -1;
+      }}
+    }}
+{quantize_block_loop}
+{condition_cache_block_loop}
+    memset(sum, 0, sizeof(float) * nblock * {num_output_group});
+)TREELITETEMPLATE";
+
+const char* predict_batch_unit_template =
+R"TREELITETEMPLATE(
+for (r = 0; r < nblock; ++r) {{
+  sum[r] += {unit_function_name}(row_data[r]{cache_arg});
+}}
+)TREELITETEMPLATE";
+
+const char* predict_batch_unit_multiclass_template =
+R"TREELITETEMPLATE(
+for (r = 0; r < nblock; ++r) {{
+  {unit_function_name}(row_data[r]{cache_arg}, &sum[r * {num_output_group}]);
+}}
+)TREELITETEMPLATE";  // only for multiclass classification
+
+const char* predict_batch_end_template =
+R"TREELITETEMPLATE(
+    for (r = 0; r < nblock; ++r) {{
+      sum[r] = sum[r]{optional_average_field} + (float)({global_bias});
+      out[rbegin + r] = (pred_margin ? sum[r] : pred_transform(sum[r]));
+    }}
+    total += nblock;
+  }}
+  free(block);
+  return total;
+}}
+)TREELITETEMPLATE";
+
+const char* predict_batch_end_multiclass_template =
+R"TREELITETEMPLATE(
+    for (r = 0; r < nblock; ++r) {{
+      float* result = &out[(rbegin + r) * {num_output_group}];
+      for (j = 0; j < {num_output_group}; ++j) {{
+        result[j] = sum[r * {num_output_group} + j]{optional_average_field}
+                    + (float)({global_bias});
+      }}
+      total += (pred_margin ? {num_output_group} : pred_transform(result));
+    }}
+  }}
+  free(block);
+  return total;
+}}
+)TREELITETEMPLATE";  // only for multiclass classification
+
 }  // namespace native
 }  // namespace compiler
 }  // namespace treelite
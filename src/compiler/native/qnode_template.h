@@ -17,51 +17,92 @@ R"TREELITETEMPLATE(
 #include <stdlib.h>
 
 /*
- * \brief function to convert a feature value into bin index.
+ * \brief function to convert a feature value into bin index. The bin index
+ *        is the number of thresholds less than the value plus the number of
+ *        thresholds less than or equal to the value, so that bin 2k+1 holds
+ *        the k-th threshold itself.
+ *        The thresholds of each feature are searched in Eytzinger order
+ *        (the layout of a binary heap), so that the first few levels of the
+ *        search share cache lines and the search does not branch on the
+ *        comparisons.
  * \param val feature value, in floating-point
- * \param fid feature identifier
+ * \param qid position of the feature in quantized_feature[]
  * \return bin index corresponding to given feature value
  */
-static inline int quantize(float val, unsigned fid) {{
-  const size_t offset = th_begin[fid];
-  const double* array = &threshold[offset];
-  int len = th_len[fid];
+static inline int quantize(float val, unsigned qid) {{
+  const double* array = &threshold_eytzinger[th_begin[qid]];
+  const int* rank = &threshold_rank[th_begin[qid]];
+  const int len = th_len[qid];
+  int i = 1;
+  while (i <= len) {{
+    i = 2 * i + (array[i - 1] < val);
+  }}
+  /* undo the trailing right turns, and then the last left turn, to recover
+     the first threshold that is not less than val */
+  while (i & 1) {{
+    i >>= 1;
+  }}
+  i >>= 1;
+  if (i == 0) {{  /* all thresholds are less than val */
+    return len * 2;
+  }}
+  return rank[i - 1] * 2 + (array[i - 1] == val);
+}}
+)TREELITETEMPLATE";
+
+const char* quantize_loop_template =
+R"TREELITETEMPLATE(
+for (int k = 0; k < {num_quantized_feature}; ++k) {{
+  const unsigned fid = quantized_feature[k];
+  if (data[fid].missing != -1) {{
+    data[fid].qvalue = quantize(data[fid].fvalue, k);
+  }}
+}}
+)TREELITETEMPLATE";
+
+const char* quantize_block_loop_template =
+R"TREELITETEMPLATE(
+/* quantize the whole block one feature at a time, so that the thresholds of
+   each feature stay in cache while all rows are binned */
+for (int k = 0; k < {num_quantized_feature}; ++k) {{
+  const unsigned fid = quantized_feature[k];
+  for (r = 0; r < nblock; ++r) {{
+    data = row_data[r];
+    if (data[fid].missing != -1) {{
+      data[fid].qvalue = quantize(data[fid].fvalue, k);
+    }}
+  }}
+}}
+)TREELITETEMPLATE";
+
+const char* cut_points_template =
+R"TREELITETEMPLATE(
+{cut_points_function_signature} {{
   int low = 0;
-  int high = len;
+  int high = {num_quantized_feature};
   int mid;
-  double mval;
-  // It is possible th_begin[i] == [total_num_threshold]. This means that
-  // all features i, (i+1), ... are not used for any of the splits in the model.
-  // So in this case, just return something
-  if (offset == {total_num_threshold} || val < array[0]) {{
-    return -10;
-  }}
-  while (low + 1 < high) {{
+  while (low < high) {{
     mid = (low + high) / 2;
-    mval = array[mid];
-    if (val == mval) {{
-      return mid * 2;
-    }} else if (val < mval) {{
-      high = mid;
+    if (quantized_feature[mid] < fid) {{
+      low = mid + 1;
     }} else {{
-      low = mid;
+      high = mid;
     }}
   }}
-  if (array[low] == val) {{
-    return low * 2;
-  }} else if (high == len) {{
-    return len * 2;
-  }} else {{
-    return low * 2 + 1;
+  if (low == {num_quantized_feature} || quantized_feature[low] != fid) {{
+    return 0;
   }}
+  *out = &threshold[th_begin[low]];
+  return th_len[low];
 }}
 )TREELITETEMPLATE";
 
-const char* quantize_loop_template =
+const char* categorical_loop_template =
 R"TREELITETEMPLATE(
-for (int i = 0; i < {num_feature}; ++i) {{
-  if (data[i].missing != -1 && !is_categorical[i]) {{
-    data[i].qvalue = quantize(data[i].fvalue, i);
+for (int k = 0; k < {num_categorical_feature}; ++k) {{
+  const unsigned fid = categorical_feature[k];
+  if (data[fid].missing != -1) {{
+    data[fid].fvalue = (float)data[fid].qvalue;
   }}
 }}
 )TREELITETEMPLATE";
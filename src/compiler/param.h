@@ -42,6 +42,21 @@ struct CompilerParam : public dmlc::Parameter<CompilerParam> {
              folded. To diable folding, set to +inf. If hessian sums are
              available, they will be used as proxies of data counts. */
   double code_folding_req;
+  /*! \brief if positive, subtrees with at most [branchless_depth] levels of
+             numerical splits are evaluated with branch-free index arithmetic
+             over a small table of nodes, rather than with nested if/else
+             blocks, so that splits that are hard to predict cost no branch
+             mispredictions. A subtree is chosen only if it is at least half
+             full, as it is padded into a complete binary tree. Whole trees
+             are chosen when shallow enough; otherwise their lower parts.
+             Set to 0 to disable. */
+  int branchless_depth;
+  /*! \brief whether to evaluate numerical split conditions that recur across
+             many trees once per row, into a bitset that the trees then test
+             (0: no, >0: yes). A condition is only cached if the rows are
+             expected to reach it often enough for this to pay off; the
+             estimate uses data counts when available. */
+  int cache_conditions;
   /*! \brief Only applicable when compiler is set to ``failsafe``. If set to a positive value,
              the fail-safe compiler will not emit large constant arrays to the C code. Instead,
              the arrays will be emitted as an ELF binary (Linux only). For large arrays, it is
@@ -65,6 +80,13 @@ struct CompilerParam : public dmlc::Parameter<CompilerParam> {
     DMLC_DECLARE_FIELD(code_folding_req)
        .set_default(std::numeric_limits<double>::infinity())
        .set_lower_bound(0);
+    DMLC_DECLARE_FIELD(branchless_depth).set_lower_bound(0).set_upper_bound(12)
+      .set_default(0)
+      .describe("maximum depth of subtrees to evaluate without branches "
+                "(0: disabled)");
+    DMLC_DECLARE_FIELD(cache_conditions).set_lower_bound(0).set_default(0)
+      .describe("whether to evaluate recurring split conditions once per row "
+                "(0: no, >0: yes)");
     DMLC_DECLARE_FIELD(dump_array_as_elf).set_lower_bound(0).set_default(0);
   }
 };
@@ -0,0 +1,622 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file quickscorer.cc
+ * \brief C code generator based on the QuickScorer algorithm. Instead of
+ * walking each tree from the root, the generated code scans the thresholds
+ * of each feature in sorted order and marks the leaves that a row cannot
+ * reach in a per-tree bitvector. The exit leaf of a tree is the first leaf
+ * left unmarked. This avoids the hard-to-predict branches of tree traversal
+ * and suits ensembles of many shallow trees, such as LambdaMART models.
+ *
+ * Reference: C. Lucchese et al., "QuickScorer: A Fast Algorithm to Rank
+ * Documents with Additive Ensembles of Regression Trees", SIGIR 2015.
+ */
+
+#include <treelite/tree.h>
+#include <treelite/compiler.h>
+#include <treelite/common.h>
+#include <fmt/format.h>
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <map>
+#include <sstream>
+#include <unordered_map>
+#include <tuple>
+#include <utility>
+#include <vector>
+#include "./param.h"
+#include "./pred_transform.h"
+
+#if defined(_MSC_VER) || defined(_WIN32)
+#define DLLEXPORT_KEYWORD "__declspec(dllexport) "
+#else
+#define DLLEXPORT_KEYWORD ""
+#endif
+
+using namespace fmt::literals;
+
+namespace {
+
+/* Number of trees whose bitvectors are updated together. Trees are scored
+   block by block, so that the bitvectors of a block (8 bytes per tree) stay
+   in the L1 cache. */
+constexpr size_t kTreeBlockSize = 1024;
+// Each tree gets a 64-bit bitvector, one bit per leaf
+constexpr int kMaxNumLeaf = 64;
+
+const char* header_template = R"TREELITETEMPLATE(
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <stdint.h>
+
+union Entry {{
+  int missing;
+  float fvalue;
+}};
+
+/* Tests of one feature within one block of trees. Entries [begin, end) of
+   the node arrays belong to the feature:
+     [begin, scan_begin): splits that send every present value to the right
+     [scan_begin, scan_end): other splits, sorted by threshold
+     [scan_end, end): splits that send every present value to the left */
+struct FeatureRange {{
+  unsigned int fid;
+  unsigned int begin;
+  unsigned int scan_begin;
+  unsigned int scan_end;
+  unsigned int end;
+}};
+
+extern const unsigned int block_ptr[];
+extern const struct FeatureRange feature_ranges[];
+extern const {threshold_type} thresholds[];
+extern const uint16_t tree_ids[];
+extern const uint64_t masks[];
+extern const unsigned char default_left[];
+extern const unsigned int leaf_ptr[];
+extern const float leaf_values[];
+
+{dllexport}size_t get_num_output_group(void);
+{dllexport}size_t get_num_feature(void);
+{dllexport}size_t get_overwritten_features(const unsigned** out);
+{dllexport}const char* get_pred_transform(void);
+{dllexport}float get_sigmoid_alpha(void);
+{dllexport}float get_global_bias(void);
+{dllexport}{predict_function_signature};
+)TREELITETEMPLATE";
+
+const char* main_template = R"TREELITETEMPLATE(
+#include "header.h"
+
+#if defined(__clang__) || defined(__GNUC__)
+#define CTZ64(x) __builtin_ctzll(x)
+#elif defined(_MSC_VER)
+#include <intrin.h>
+static __inline int CTZ64(uint64_t x) {{
+  unsigned long index;
+  _BitScanForward64(&index, x);
+  return (int)index;
+}}
+#else
+static int CTZ64(uint64_t x) {{
+  int index = 0;
+  while (!(x & 1)) {{
+    x >>= 1;
+    ++index;
+  }}
+  return index;
+}}
+#endif
+
+size_t get_num_output_group(void) {{
+  return {num_output_group};
+}}
+
+size_t get_num_feature(void) {{
+  return {num_feature};
+}}
+
+/* predict() leaves its input alone */
+size_t get_overwritten_features(const unsigned** out) {{
+  *out = NULL;
+  return 0;
+}}
+
+const char* get_pred_transform(void) {{
+  return "{pred_transform}";
+}}
+
+float get_sigmoid_alpha(void) {{
+  return {sigmoid_alpha};
+}}
+
+float get_global_bias(void) {{
+  return {global_bias};
+}}
+
+{pred_transform_function}
+
+{predict_function_signature} {{
+  {accumulator_definition};
+  /* Bit i of leafidx[t] is cleared once the row is known not to reach
+     leaf i of tree t, counting leaves from the left. */
+  uint64_t leafidx[{block_size}];
+  unsigned int block_id, tree_begin, ntree, k, i, t;
+  const struct FeatureRange* range;
+  float fvalue;
+
+  for (block_id = 0; block_id < {num_block}; ++block_id) {{
+    tree_begin = block_id * {block_size};
+    ntree = ({num_tree} - tree_begin < {block_size})
+            ? ({num_tree} - tree_begin) : {block_size};
+    memset(leafidx, 0xFF, sizeof(uint64_t) * ntree);
+    for (k = block_ptr[block_id]; k < block_ptr[block_id + 1]; ++k) {{
+      range = &feature_ranges[k];
+      if (data[range->fid].missing == -1) {{
+        for (i = range->begin; i < range->end; ++i) {{
+          if (!default_left[i]) {{
+            leafidx[tree_ids[i]] &= masks[i];
+          }}
+        }}
+      }} else {{
+        fvalue = data[range->fid].fvalue;
+        for (i = range->begin; i < range->scan_begin; ++i) {{
+          leafidx[tree_ids[i]] &= masks[i];
+        }}
+        /* The split conditions that are false for this row form a prefix
+           of the sorted thresholds. */
+        for (; i < range->scan_end && !(fvalue {compare_op} thresholds[i]);
+             ++i) {{
+          leafidx[tree_ids[i]] &= masks[i];
+        }}
+      }}
+    }}
+    for (t = 0; t < ntree; ++t) {{
+      {output_statement}
+    }}
+  }}
+  {return_statement}
+}}
+)TREELITETEMPLATE";
+
+const char* return_multiclass_template =
+R"TREELITETEMPLATE(
+  for (int i = 0; i < {num_output_group}; ++i) {{
+    result[i] = sum[i]{optional_average_field} + (float)({global_bias});
+  }}
+  if (!pred_margin) {{
+    return pred_transform(result);
+  }} else {{
+    return {num_output_group};
+  }}
+)TREELITETEMPLATE";  // only for multiclass classification
+
+const char* return_template =
+R"TREELITETEMPLATE(
+  sum = sum{optional_average_field} + (float)({global_bias});
+  if (!pred_margin) {{
+    return pred_transform(sum);
+  }} else {{
+    return sum;
+  }}
+)TREELITETEMPLATE";
+
+const char* arrays_template = R"TREELITETEMPLATE(
+#include "header.h"
+
+{arrays}
+)TREELITETEMPLATE";
+
+// A split condition, rewritten so that a true condition leads to the left
+enum class TestKind : uint8_t {
+  kAlwaysRight = 0,  // every present value goes to the right
+  kThreshold = 1,    // feature value is compared with a threshold
+  kAlwaysLeft = 2    // every present value goes to the left
+};
+
+struct TestEntry {
+  TestKind kind;
+  double threshold;
+  uint16_t tree_id;  // position of the tree within its block
+  uint64_t mask;
+  bool default_left;
+};
+
+// Per-feature lists of tests within one block of trees
+using BlockTests = std::map<unsigned, std::vector<TestEntry>>;
+
+class TreeConverter {
+ public:
+  TreeConverter(const treelite::Tree& tree, uint16_t tree_id,
+                treelite::Operator* common_op, BlockTests* tests,
+                std::vector<double>* leaf_values)
+    : tree_(tree), tree_id_(tree_id), common_op_(common_op), tests_(tests),
+      leaf_values_(leaf_values), leaf_begin_(leaf_values->size()) {}
+
+  void Convert() {
+    Visit(0);
+  }
+
+ private:
+  /* Visit the subtree rooted at nid, appending its leaves to leaf_values
+     from left to right, and return the number of leaves in it */
+  int Visit(int nid) {
+    const treelite::Tree::Node& node = tree_[nid];
+    if (node.is_leaf()) {
+      CHECK(!node.has_leaf_vector())
+        << "multi-class random forest classifier is not supported in "
+           "QuickScorerCompiler";
+      CHECK_LT(leaf_values_->size() - leaf_begin_,
+               static_cast<size_t>(kMaxNumLeaf))
+        << "QuickScorerCompiler only supports trees with at most "
+        << kMaxNumLeaf << " leaves; use ast_native instead";
+      leaf_values_->push_back(node.leaf_value());
+      return 1;
+    }
+    CHECK(node.split_type() == treelite::SplitFeatureType::kNumerical
+          && node.left_categories().empty())
+      << "categorical splits are not supported in QuickScorerCompiler";
+
+    /* Turn (x > t) and (x >= t) into (x <= t) and (x < t) with the children
+       swapped, so that all thresholds of a feature can be scanned in
+       ascending order */
+    treelite::Operator op = node.comparison_op();
+    int left = node.cleft();
+    int right = node.cright();
+    bool default_left = node.default_left();
+    bool swapped = false;
+    switch (op) {
+     case treelite::Operator::kLT:
+     case treelite::Operator::kLE:
+      break;
+     case treelite::Operator::kGT:
+     case treelite::Operator::kGE:
+      op = (op == treelite::Operator::kGT) ? treelite::Operator::kLE
+                                           : treelite::Operator::kLT;
+      std::swap(left, right);
+      default_left = !default_left;
+      swapped = true;
+      break;
+     default:
+      LOG(FATAL) << "QuickScorerCompiler does not support the comparison "
+                 << "operator " << treelite::OpName(op);
+    }
+
+    TestEntry entry;
+    entry.tree_id = tree_id_;
+    entry.default_left = default_left;
+    entry.threshold = node.threshold();
+    if (std::isinf(node.threshold())) {
+      /* The compiled code of ast_native gives the same result for every
+         present value, even an infinite one; keep it that way */
+      const bool result = treelite::common::CompareWithOp(
+        0.0, node.comparison_op(), node.threshold());
+      entry.kind = (result != swapped) ? TestKind::kAlwaysLeft
+                                       : TestKind::kAlwaysRight;
+    } else {
+      entry.kind = TestKind::kThreshold;
+      if (*common_op_ == treelite::Operator::kEQ) {  // first threshold seen
+        *common_op_ = op;
+      }
+      CHECK(op == *common_op_)
+        << "QuickScorerCompiler only supports models whose splits all use "
+           "< or >= (or all use <= or >)";
+    }
+
+    const int first_leaf = static_cast<int>(leaf_values_->size() - leaf_begin_);
+    const int num_left_leaf = Visit(left);
+    const int num_right_leaf = Visit(right);
+    /* If the condition is false, no leaf of the left subtree is reachable.
+       The left subtree has at most kMaxNumLeaf - 1 leaves, since the right
+       subtree has at least one. */
+    entry.mask = ~(((uint64_t(1) << num_left_leaf) - 1) << first_leaf);
+    (*tests_)[node.split_index()].push_back(entry);
+    return num_left_leaf + num_right_leaf;
+  }
+
+  const treelite::Tree& tree_;
+  uint16_t tree_id_;
+  treelite::Operator* common_op_;
+  BlockTests* tests_;
+  std::vector<double>* leaf_values_;
+  size_t leaf_begin_;
+};
+
+// Test whether a threshold is exactly representable in single precision
+inline bool IsFloat(double value) {
+  return static_cast<double>(static_cast<float>(value)) == value;
+}
+
+// Test whether a string ends with a given suffix
+inline bool EndsWith(const std::string& str, const std::string& suffix) {
+  return (str.size() >= suffix.size()
+          && str.compare(str.length() - suffix.size(), suffix.size(), suffix) == 0);
+}
+
+}   // anonymous namespace
+
+namespace treelite {
+namespace compiler {
+
+DMLC_REGISTRY_FILE_TAG(quickscorer);
+
+class QuickScorerCompiler : public Compiler {
+ public:
+  explicit QuickScorerCompiler(const CompilerParam& param)
+    : param(param) {
+    if (param.verbose > 0) {
+      LOG(INFO) << "Using QuickScorerCompiler";
+    }
+    if (param.annotate_in != "NULL") {
+      LOG(INFO) << "Warning: 'annotate_in' parameter is not applicable for "
+                   "QuickScorerCompiler";
+    }
+    if (param.quantize > 0) {
+      LOG(INFO) << "Warning: 'quantize' parameter is not applicable for "
+                   "QuickScorerCompiler";
+    }
+    if (param.parallel_comp > 0) {
+      LOG(INFO) << "Warning: 'parallel_comp' parameter is not applicable for "
+                   "QuickScorerCompiler";
+    }
+    if (std::isfinite(param.code_folding_req)) {
+      LOG(INFO) << "Warning: 'code_folding_req' parameter is not applicable "
+                   "for QuickScorerCompiler";
+    }
+    if (param.branchless_depth > 0) {
+      LOG(INFO) << "Warning: 'branchless_depth' parameter is not applicable "
+                   "for QuickScorerCompiler";
+    }
+    if (param.cache_conditions > 0) {
+      LOG(INFO) << "Warning: 'cache_conditions' parameter is not applicable "
+                   "for QuickScorerCompiler";
+    }
+    if (param.dump_array_as_elf > 0) {
+      LOG(INFO) << "Warning: 'dump_array_as_elf' parameter is not applicable "
+                   "for QuickScorerCompiler";
+    }
+  }
+
+  CompiledModel Compile(const Model& model) override {
+    CompiledModel cm;
+    cm.backend = "native";
+
+    num_feature_ = model.num_feature;
+    num_output_group_ = model.num_output_group;
+    CHECK(!model.trees.empty()) << "QuickScorerCompiler needs at least one tree";
+    pred_tranform_func_ = PredTransformFunction("native", model);
+    files_.clear();
+
+    const char* predict_function_signature
+      = (num_output_group_ > 1) ?
+          "size_t predict_multiclass(union Entry* data, int pred_margin, "
+                                    "float* result)"
+        : "float predict(union Entry* data, int pred_margin)";
+
+    std::string accumulator_definition
+      = (num_output_group_ > 1
+         ? fmt::format("float sum[{num_output_group}] = {{0.0f}}",
+             "num_output_group"_a = num_output_group_)
+         : std::string("float sum = 0.0f"));
+
+    // trees are added up in their original order, as in ast_native
+    std::string output_statement
+      = (num_output_group_ > 1
+         ? fmt::format("sum[(tree_begin + t) % {num_output_group}] += "
+                       "leaf_values[leaf_ptr[tree_begin + t] "
+                       "+ CTZ64(leafidx[t])];",
+             "num_output_group"_a = num_output_group_)
+         : std::string("sum += leaf_values[leaf_ptr[tree_begin + t] "
+                       "+ CTZ64(leafidx[t])];"));
+
+    const std::string optional_average_field
+      = model.random_forest_flag ? fmt::format(" / {}", model.trees.size())
+                                 : std::string("");
+    std::string return_statement
+      = (num_output_group_ > 1
+         ? fmt::format(return_multiclass_template,
+             "num_output_group"_a = num_output_group_,
+             "optional_average_field"_a = optional_average_field,
+             "global_bias"_a = common::ToStringHighPrecision(model.param.global_bias))
+         : fmt::format(return_template,
+             "optional_average_field"_a = optional_average_field,
+             "global_bias"_a = common::ToStringHighPrecision(model.param.global_bias)));
+
+    std::string arrays, threshold_type;
+    Operator common_op;
+    std::tie(arrays, threshold_type, common_op) = FormatArrays(model);
+    const size_t num_block
+      = (model.trees.size() + kTreeBlockSize - 1) / kTreeBlockSize;
+
+    files_["main.c"] = CompiledModel::FileEntry(fmt::format(main_template,
+      "num_output_group"_a = num_output_group_,
+      "num_feature"_a = num_feature_,
+      "pred_transform"_a = model.param.pred_transform,
+      "sigmoid_alpha"_a = model.param.sigmoid_alpha,
+      "global_bias"_a = model.param.global_bias,
+      "pred_transform_function"_a = pred_tranform_func_,
+      "predict_function_signature"_a = predict_function_signature,
+      "accumulator_definition"_a = accumulator_definition,
+      "block_size"_a = kTreeBlockSize,
+      "num_block"_a = num_block,
+      "num_tree"_a = model.trees.size(),
+      "compare_op"_a = OpName(common_op),
+      "output_statement"_a = output_statement,
+      "return_statement"_a = return_statement));
+
+    files_["arrays.c"] = CompiledModel::FileEntry(fmt::format(arrays_template,
+      "arrays"_a = arrays));
+
+    files_["header.h"] = CompiledModel::FileEntry(fmt::format(header_template,
+      "dllexport"_a = DLLEXPORT_KEYWORD,
+      "threshold_type"_a = threshold_type,
+      "predict_function_signature"_a = predict_function_signature));
+
+    {
+      /* write recipe.json */
+      std::vector<std::unordered_map<std::string, std::string>> source_list;
+      for (const auto& kv : files_) {
+        if (EndsWith(kv.first, ".c")) {
+          const size_t line_count
+            = std::count(kv.second.content.begin(), kv.second.content.end(), '\n');
+          source_list.push_back({ {"name",
+                                   kv.first.substr(0, kv.first.length() - 2)},
+                                  {"length", std::to_string(line_count)} });
+        }
+      }
+      std::ostringstream oss;
+      auto writer = common::make_unique<dmlc::JSONWriter>(&oss);
+      writer->BeginObject();
+      writer->WriteObjectKeyValue("target", param.native_lib_name);
+      writer->WriteObjectKeyValue("sources", source_list);
+      writer->EndObject();
+      files_["recipe.json"] = CompiledModel::FileEntry(oss.str());
+    }
+    cm.files = std::move(files_);
+    return cm;
+  }
+
+ private:
+  CompilerParam param;
+  int num_feature_;
+  int num_output_group_;
+  std::string pred_tranform_func_;
+  std::unordered_map<std::string, CompiledModel::FileEntry> files_;
+
+  /* Returns the definitions of the arrays read by the generated code, the
+     type of the thresholds, and the comparison operator of the splits.
+     block_ptr[]: marks boundaries between blocks of trees. The features
+                  tested by block [b] are found in
+                  feature_ranges[block_ptr[b]:block_ptr[b+1]]
+     feature_ranges[]: for each block, the features it tests, in ascending
+                       order, and where their tests are in the node arrays
+     thresholds[], tree_ids[], masks[], default_left[]: node arrays, one
+                       element per split node
+     leaf_ptr[], leaf_values[]: the leaves of Tree [i], from left to right,
+                       are found in leaf_values[leaf_ptr[i]:leaf_ptr[i+1]] */
+  std::tuple<std::string, std::string, Operator>
+  FormatArrays(const Model& model) {
+    // kEQ is never used by a converted split, so it stands for "not known yet"
+    Operator common_op = Operator::kEQ;
+    std::vector<double> leaf_values;
+    std::vector<size_t> leaf_ptr{0};
+    std::vector<size_t> block_ptr{0};
+    std::vector<std::vector<size_t>> ranges;  // one entry per feature range
+    std::vector<TestEntry> nodes;
+    for (size_t tree_begin = 0; tree_begin < model.trees.size();
+         tree_begin += kTreeBlockSize) {
+      const size_t tree_end
+        = std::min(tree_begin + kTreeBlockSize, model.trees.size());
+      BlockTests tests;
+      for (size_t tree_id = tree_begin; tree_id < tree_end; ++tree_id) {
+        TreeConverter(model.trees[tree_id],
+                      static_cast<uint16_t>(tree_id - tree_begin), &common_op,
+                      &tests, &leaf_values).Convert();
+        leaf_ptr.push_back(leaf_values.size());
+      }
+      for (auto& kv : tests) {
+        std::vector<TestEntry>& entries = kv.second;
+        std::stable_sort(entries.begin(), entries.end(),
+          [](const TestEntry& a, const TestEntry& b) {
+            if (a.kind != b.kind) {
+              return a.kind < b.kind;
+            }
+            return (a.kind == TestKind::kThreshold
+                    && a.threshold < b.threshold);
+          });
+        const size_t begin = nodes.size();
+        size_t scan_begin = begin, scan_end = begin;
+        for (const TestEntry& e : entries) {
+          nodes.push_back(e);
+          if (e.kind == TestKind::kAlwaysRight) {
+            scan_begin = scan_end = nodes.size();
+          } else if (e.kind == TestKind::kThreshold) {
+            scan_end = nodes.size();
+          }
+        }
+        ranges.push_back({kv.first, begin, scan_begin, scan_end, nodes.size()});
+      }
+      block_ptr.push_back(ranges.size());
+    }
+    CHECK_LE(nodes.size(), std::numeric_limits<uint32_t>::max())
+      << "Model is too large for QuickScorerCompiler";
+    if (common_op == Operator::kEQ) {  // no split has a finite threshold
+      common_op = Operator::kLE;
+    }
+
+    bool use_float = true;
+    for (const TestEntry& e : nodes) {
+      use_float &= IsFloat(e.threshold);
+    }
+
+    common::ArrayFormatter block_ptr_formatter(100, 2);
+    for (size_t e : block_ptr) {
+      block_ptr_formatter << std::to_string(e);
+    }
+    common::ArrayFormatter ranges_formatter(100, 2);
+    for (const auto& e : ranges) {
+      ranges_formatter << fmt::format("{{ {}, {}, {}, {}, {} }}",
+                                      e[0], e[1], e[2], e[3], e[4]);
+    }
+    common::ArrayFormatter thresholds_formatter(100, 2);
+    common::ArrayFormatter tree_ids_formatter(100, 2);
+    common::ArrayFormatter masks_formatter(100, 2);
+    common::ArrayFormatter default_left_formatter(100, 2);
+    for (const TestEntry& e : nodes) {
+      thresholds_formatter
+        << (e.kind == TestKind::kThreshold
+            ? common::ToStringHighPrecision(e.threshold) : std::string("0"));
+      tree_ids_formatter << std::to_string(e.tree_id);
+      masks_formatter << fmt::format("0x{:X}ULL", e.mask);
+      default_left_formatter << (e.default_left ? "1" : "0");
+    }
+    if (nodes.empty()) {  // C does not allow empty arrays
+      thresholds_formatter << "0";
+      tree_ids_formatter << "0";
+      masks_formatter << "0";
+      default_left_formatter << "0";
+    }
+    common::ArrayFormatter leaf_ptr_formatter(100, 2);
+    for (size_t e : leaf_ptr) {
+      leaf_ptr_formatter << std::to_string(e);
+    }
+    common::ArrayFormatter leaf_values_formatter(100, 2);
+    for (double e : leaf_values) {
+      leaf_values_formatter << common::ToStringHighPrecision(e);
+    }
+    if (ranges.empty()) {
+      ranges_formatter << "{ 0, 0, 0, 0, 0 }";
+    }
+
+    const std::string threshold_type = use_float ? "float" : "double";
+    std::ostringstream oss;
+    oss << fmt::format("const unsigned int block_ptr[] = {{\n{}\n}};\n",
+                       block_ptr_formatter.str())
+        << fmt::format("const struct FeatureRange feature_ranges[] = {{\n{}\n}};\n",
+                       ranges_formatter.str())
+        << fmt::format("const {} thresholds[] = {{\n{}\n}};\n",
+                       threshold_type, thresholds_formatter.str())
+        << fmt::format("const uint16_t tree_ids[] = {{\n{}\n}};\n",
+                       tree_ids_formatter.str())
+        << fmt::format("const uint64_t masks[] = {{\n{}\n}};\n",
+                       masks_formatter.str())
+        << fmt::format("const unsigned char default_left[] = {{\n{}\n}};\n",
+                       default_left_formatter.str())
+        << fmt::format("const unsigned int leaf_ptr[] = {{\n{}\n}};\n",
+                       leaf_ptr_formatter.str())
+        << fmt::format("const float leaf_values[] = {{\n{}\n}};\n",
+                       leaf_values_formatter.str());
+    return std::make_tuple(oss.str(), threshold_type, common_op);
+  }
+};
+
+TREELITE_REGISTER_COMPILER(QuickScorerCompiler, "quickscorer")
+.describe("Compiler that scores trees with the QuickScorer algorithm, for "
+          "ensembles of shallow trees (at most 64 leaves each)")
+.set_body([](const CompilerParam& param) -> Compiler* {
+    return new QuickScorerCompiler(param);
+  });
+}  // namespace compiler
+}  // namespace treelite
@@ -0,0 +1,264 @@
+/*!
+ * Copyright (c) 2020 by Contributors
+ * \file binary.cc
+ * \brief Export and load models in the flat binary format of binary_model.h
+ */
+
+#include <dmlc/logging.h>
+#include <dmlc/io.h>
+#include <treelite/frontend.h>
+#include <treelite/tree.h>
+#include <treelite/binary_model.h>
+#include <cmath>
+#include <cstring>
+#include <limits>
+#include <memory>
+#include <queue>
+#include <utility>
+#include <vector>
+#include "../common/mmap.h"
+#include "../compiler/common/categorical_bitmap.h"
+
+namespace {
+
+using treelite::binary_model::ArrayRef;
+
+inline ArrayRef MakeArrayRef(size_t offset, size_t length) {
+  CHECK_LE(offset + length, std::numeric_limits<uint32_t>::max())
+    << "Model is too large for the binary format";
+  return ArrayRef{static_cast<uint32_t>(offset), static_cast<uint32_t>(length)};
+}
+
+/* Fill a record for a numerical split. The compiled code evaluates a split
+   with an infinite threshold to a constant for every feature value that is
+   present, even an infinite one, so such splits are stored with an operator
+   that gives that same constant for every value. */
+inline void SetNumericalSplit(const treelite::Tree::Node& node,
+                              treelite::binary_model::Node* record) {
+  using treelite::binary_model::Operator;
+  record->type
+    = static_cast<uint8_t>(treelite::binary_model::NodeType::kNumericalSplit);
+  record->threshold = node.threshold();
+  treelite::Operator op = node.comparison_op();
+  if (std::isinf(node.threshold())) {
+    const bool result
+      = treelite::common::CompareWithOp(0.0, op, node.threshold());
+    if (node.threshold() > 0) {
+      op = result ? treelite::Operator::kLE : treelite::Operator::kGT;
+    } else {
+      op = result ? treelite::Operator::kGE : treelite::Operator::kLT;
+    }
+  }
+  record->op = static_cast<uint8_t>(op);
+}
+
+/* Recover the list of categories that go to the left child, in ascending
+   order, from a categorical bitmap */
+inline std::vector<uint32_t> GetLeftCategories(const uint64_t* bitmap,
+                                               uint32_t num_word) {
+  std::vector<uint32_t> left_categories;
+  for (uint32_t i = 0; i < num_word; ++i) {
+    for (uint32_t j = 0; j < 64; ++j) {
+      if ((bitmap[i] >> j) & 1) {
+        left_categories.push_back(i * 64 + j);
+      }
+    }
+  }
+  return left_categories;
+}
+
+}  // anonymous namespace
+
+namespace treelite {
+namespace frontend {
+
+Model LoadBinaryModel(const char* filename) {
+  namespace bm = binary_model;
+  const common::MappedFile file(filename);
+  const bm::ModelView view = bm::GetModelView(file.data(), file.size());
+  // nodes are checked as they are converted, rather than in a pass of their
+  // own over the file
+  bm::CheckTreeOffsets(view);
+  const bm::Header& header = *view.header;
+  CHECK_LT(header.num_feature,
+           static_cast<uint32_t>(std::numeric_limits<int>::max()))
+    << "num_feature too big";
+  CHECK_LT(header.num_output_group,
+           static_cast<uint32_t>(std::numeric_limits<int>::max()))
+    << "num_output_group too big";
+
+  Model model;
+  model.num_feature = static_cast<int>(header.num_feature);
+  model.num_output_group = static_cast<int>(header.num_output_group);
+  model.random_forest_flag = (header.average_tree_output != 0);
+  model.param.pred_transform = header.pred_transform;
+  model.param.sigmoid_alpha = header.sigmoid_alpha;
+  model.param.global_bias = header.global_bias;
+
+  for (uint32_t tree_id = 0; tree_id < header.num_tree; ++tree_id) {
+    const bm::Node* nodes = view.nodes + view.tree_offset[tree_id];
+    const int num_node
+      = static_cast<int>(view.tree_offset[tree_id + 1]
+                         - view.tree_offset[tree_id]);
+    model.trees.emplace_back();
+    Tree& tree = model.trees.back();
+    tree.Init();
+    // assign node ID's so that a breadth-wise traversal would yield
+    // the monotonic sequence 0, 1, 2, ...
+    std::queue<std::pair<int32_t, int>> Q;  // (index in file, ID)
+    Q.push({0, 0});
+    while (!Q.empty()) {
+      const std::pair<int32_t, int> elem = Q.front(); Q.pop();
+      bm::CheckNode(view, tree_id, elem.first);
+      const bm::Node& node = nodes[elem.first];
+      const int id = elem.second;
+      const bool default_left = (node.flags & bm::kDefaultLeft) != 0;
+      switch (static_cast<bm::NodeType>(node.type)) {
+       case bm::NodeType::kLeaf:
+        if (node.flags & bm::kLeafVector) {
+          const double* leaf_vector
+            = &view.leaf_vector[node.leaf_vector.offset];
+          tree[id].set_leaf_vector(std::vector<tl_float>(
+            leaf_vector, leaf_vector + node.leaf_vector.length));
+        } else {
+          tree[id].set_leaf(static_cast<tl_float>(node.leaf_value));
+        }
+        break;
+       case bm::NodeType::kNumericalSplit:
+        tree.AddChilds(id);
+        tree[id].set_numerical_split(node.split_index,
+                                     static_cast<tl_float>(node.threshold),
+                                     default_left,
+                                     static_cast<Operator>(node.op));
+        break;
+       case bm::NodeType::kCategoricalSplit:
+        tree.AddChilds(id);
+        tree[id].set_categorical_split(
+          node.split_index, default_left,
+          (node.flags & bm::kMissingCategoryToZero) != 0,
+          GetLeftCategories(&view.category_bitmap[node.category_bitmap.offset],
+                            node.category_bitmap.length));
+        break;
+      }
+      if (!tree[id].is_leaf()) {
+        // a node reached twice would make the tree grow without bound
+        CHECK_LE(tree.num_nodes, num_node)
+          << "Tree " << tree_id << " of the binary model is not a tree";
+        Q.push({node.cleft, tree[id].cleft()});
+        Q.push({node.cright, tree[id].cright()});
+      }
+    }
+  }
+  return model;
+}
+
+void ExportBinaryModel(const char* filename, const Model& model) {
+  namespace bm = binary_model;
+  CHECK(bm::IsLittleEndian())
+    << "The binary model format can only be written on little-endian machines";
+  CHECK_GT(model.num_feature, 0) << "num_feature cannot be zero";
+  CHECK_GT(model.num_output_group, 0) << "num_output_group cannot be zero";
+  std::vector<uint64_t> tree_offset{0};
+  std::vector<bm::Node> nodes;
+  std::vector<uint64_t> category_bitmap;
+  std::vector<double> leaf_vector;
+  for (const Tree& tree : model.trees) {
+    for (int nid = 0; nid < tree.num_nodes; ++nid) {
+      const Tree::Node& node = tree[nid];
+      bm::Node record;
+      std::memset(&record, 0, sizeof(record));
+      if (node.is_leaf()) {
+        record.type = static_cast<uint8_t>(bm::NodeType::kLeaf);
+        record.cleft = record.cright = -1;
+        if (node.has_leaf_vector()) {
+          CHECK_EQ(node.leaf_vector().size(),
+                   static_cast<size_t>(model.num_output_group))
+            << "The length of leaf vector must be identical to the "
+            << "number of output groups";
+          record.flags |= bm::kLeafVector;
+          record.leaf_vector
+            = MakeArrayRef(leaf_vector.size(), node.leaf_vector().size());
+          leaf_vector.insert(leaf_vector.end(), node.leaf_vector().begin(),
+                             node.leaf_vector().end());
+        } else {
+          record.leaf_value = node.leaf_value();
+        }
+      } else {
+        record.split_index = node.split_index();
+        record.cleft = node.cleft();
+        record.cright = node.cright();
+        if (node.default_left()) {
+          record.flags |= bm::kDefaultLeft;
+        }
+        if (node.split_type() == SplitFeatureType::kCategorical) {
+          record.type = static_cast<uint8_t>(bm::NodeType::kCategoricalSplit);
+          const std::vector<uint64_t> bitmap
+            = compiler::common_util::GetCategoricalBitmap(
+                node.left_categories());
+          record.category_bitmap
+            = MakeArrayRef(category_bitmap.size(), bitmap.size());
+          category_bitmap.insert(category_bitmap.end(), bitmap.begin(),
+                                 bitmap.end());
+          if (node.missing_category_to_zero()) {
+            record.flags |= bm::kMissingCategoryToZero;
+          }
+          // with no category to the left, even missing values go right
+          bool all_zeros = true;
+          for (uint64_t e : bitmap) {
+            all_zeros &= (e == 0);
+          }
+          if (all_zeros) {
+            record.flags |= bm::kMissingCategoryToZero;
+          }
+        } else {
+          SetNumericalSplit(node, &record);
+        }
+      }
+      nodes.push_back(record);
+    }
+    tree_offset.push_back(nodes.size());
+  }
+
+  bm::Header header;
+  std::memset(&header, 0, sizeof(header));
+  std::memcpy(header.magic, bm::kMagic, sizeof(header.magic));
+  header.format_version = bm::kFormatVersion;
+  header.num_feature = static_cast<uint32_t>(model.num_feature);
+  header.num_output_group = static_cast<uint32_t>(model.num_output_group);
+  header.num_tree = static_cast<uint32_t>(model.trees.size());
+  header.average_tree_output = model.random_forest_flag ? 1 : 0;
+  header.global_bias = model.param.global_bias;
+  header.sigmoid_alpha = model.param.sigmoid_alpha;
+  CHECK_LT(model.param.pred_transform.length(), sizeof(header.pred_transform))
+    << "pred_transform is too long";
+  std::strncpy(header.pred_transform, model.param.pred_transform.c_str(),
+               sizeof(header.pred_transform));
+  header.common_op = bm::kNoCommonOp;
+  bool op_seen = false;
+  for (const bm::Node& node : nodes) {
+    if (node.type == static_cast<uint8_t>(bm::NodeType::kCategoricalSplit)
+        || (op_seen && node.type
+                       == static_cast<uint8_t>(bm::NodeType::kNumericalSplit)
+            && node.op != header.common_op)) {
+      header.common_op = bm::kNoCommonOp;
+      break;
+    } else if (!op_seen && node.type
+               == static_cast<uint8_t>(bm::NodeType::kNumericalSplit)) {
+      header.common_op = node.op;
+      op_seen = true;
+    }
+  }
+  header.num_node = nodes.size();
+  header.num_category_word = category_bitmap.size();
+  header.num_leaf_vector_elem = leaf_vector.size();
+
+  std::unique_ptr<dmlc::Stream> fo(dmlc::Stream::Create(filename, "w"));
+  fo->Write(&header, sizeof(header));
+  fo->Write(tree_offset.data(), tree_offset.size() * sizeof(uint64_t));
+  fo->Write(nodes.data(), nodes.size() * sizeof(bm::Node));
+  fo->Write(category_bitmap.data(), category_bitmap.size() * sizeof(uint64_t));
+  fo->Write(leaf_vector.data(), leaf_vector.size() * sizeof(double));
+}
+
+}  // namespace frontend
+}  // namespace treelite
@@ -5,7 +5,10 @@ import unittest
 import sys
 import os
 import subprocess
+import struct
 from zipfile import ZipFile
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import numpy as np
 from scipy.sparse import csr_matrix
 from sklearn.datasets import load_svmlight_file
@@ -13,7 +16,8 @@ import treelite
 import treelite.runtime
 import pytest
 from util import load_txt, os_compatible_toolchains, os_platform, libname, \
-                 run_pipeline_test, make_annotation, assert_almost_equal
+                 run_pipeline_test, make_annotation, assert_almost_equal, \
+                 to_dense, export_example_lib, load_example_test
 
 dpath = os.path.abspath(os.path.join(os.getcwd(), 'tests/examples/'))
 
@@ -50,13 +54,43 @@ class TestBasic(unittest.TestCase):
                               multiclass=multiclass, use_annotation=use_annotation,
                               use_quantize=use_quantize,
                               use_parallel_comp=use_parallel_comp)
-      for use_elf in [True, False] if is_linux else [False]:
+      for use_quantize in [True, False]:
+        run_pipeline_test(model=model, dtest_path=dtest_path,
+                          libname_fmt=libname_fmt,
+                          expected_prob_path=expected_prob_path,
+                          expected_margin_path=expected_margin_path,
+                          multiclass=multiclass, use_quantize=use_quantize,
+                          use_branchless_depth=6)
+      for use_annotation in ['./annotation.json', None]:
+        for use_quantize in [True, False]:
+          run_pipeline_test(model=model, dtest_path=dtest_path,
+                            libname_fmt=libname_fmt,
+                            expected_prob_path=expected_prob_path,
+                            expected_margin_path=expected_margin_path,
+                            multiclass=multiclass, use_annotation=use_annotation,
+                            use_quantize=use_quantize, use_cache_conditions=1)
+      if os_platform() != 'windows':
+        # missing values must still be detected when NaN is assumed away
         run_pipeline_test(model=model, dtest_path=dtest_path,
                           libname_fmt=libname_fmt,
                           expected_prob_path=expected_prob_path,
                           expected_margin_path=expected_margin_path,
-                          multiclass=multiclass, use_elf=use_elf,
-                          use_compiler='failsafe')
+                          multiclass=multiclass, use_toolchains=['gcc'],
+                          use_options=['-ffast-math'])
+      for use_elf in [True, False] if is_linux else [False]:
+        for use_annotation in ['./annotation.json', None]:
+          run_pipeline_test(model=model, dtest_path=dtest_path,
+                            libname_fmt=libname_fmt,
+                            expected_prob_path=expected_prob_path,
+                            expected_margin_path=expected_margin_path,
+                            multiclass=multiclass, use_elf=use_elf,
+                            use_annotation=use_annotation,
+                            use_compiler='failsafe')
+      run_pipeline_test(model=model, dtest_path=dtest_path,
+                        libname_fmt=libname_fmt,
+                        expected_prob_path=expected_prob_path,
+                        expected_margin_path=expected_margin_path,
+                        multiclass=multiclass, use_compiler='quickscorer')
       if not is_linux:
         # Expect to see an exception when using ELF in non-Linux OS
         with pytest.raises(treelite.common.util.TreeliteError):
@@ -86,6 +120,11 @@ class TestBasic(unittest.TestCase):
                       expected_margin_path='letor/mq2008.test.pred',
                       multiclass=False, use_elf=is_linux,
                       use_compiler='failsafe')
+    run_pipeline_test(model=model, dtest_path='letor/mq2008.test',
+                      libname_fmt='./mq2008{}',
+                      expected_prob_path=None,
+                      expected_margin_path='letor/mq2008.test.pred',
+                      multiclass=False, use_compiler='quickscorer')
 
   @pytest.mark.skipif(os_platform() == 'windows', reason='Make unavailable on Windows')
   def test_srcpkg(self):
@@ -125,12 +164,8 @@ class TestBasic(unittest.TestCase):
     than the training data used for the model. In this case, the matrix
     should be padded with zeros.
     """
-    model_path = os.path.join(dpath, 'mushroom/mushroom.model')
-    libpath = libname('./mushroom{}')
-    model = treelite.Model.load(model_path, model_format='xgboost')
-    toolchain = os_compatible_toolchains()[0]
-    model.export_lib(toolchain=toolchain, libpath=libpath,
-                     params={'quantize': 1}, verbose=True)
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}',
+                                 params={'quantize': 1})
     X = csr_matrix(([], ([], [])), shape=(3, 3))
     batch = treelite.runtime.Batch.from_csr(X)
     predictor = treelite.runtime.Predictor(libpath=libpath, verbose=True)
@@ -142,12 +177,8 @@ class TestBasic(unittest.TestCase):
     than the training data used for the model. In this case, an exception
     should be thrown
     """
-    model_path = os.path.join(dpath, 'mushroom/mushroom.model')
-    libpath = libname('./mushroom{}')
-    model = treelite.Model.load(model_path, model_format='xgboost')
-    toolchain = os_compatible_toolchains()[0]
-    model.export_lib(toolchain=toolchain, libpath=libpath,
-                     params={'quantize': 1}, verbose=True)
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}',
+                                 params={'quantize': 1})
     X = csr_matrix(([], ([], [])), shape=(3, 1000))
     batch = treelite.runtime.Batch.from_csr(X)
     predictor = treelite.runtime.Predictor(libpath=libpath, verbose=True)
@@ -155,6 +186,418 @@ class TestBasic(unittest.TestCase):
     err = treelite_runtime.common.util.TreeliteError
     pytest.raises(err, predictor.predict, batch)  # should crash
 
+  def test_chunk_size(self):
+    """
+    Test if predictions stay the same regardless of the number of rows that
+    worker threads claim at a time
+    """
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    dtest, batch, _, expected_margin \
+      = load_example_test('dermatology/dermatology.test')
+    for chunk_size in [0, 1, 7, 1000]:
+      predictor = treelite.runtime.Predictor(libpath=libpath,
+                                             chunk_size=chunk_size)
+      out_margin = predictor.predict(batch, pred_margin=True)
+      assert_almost_equal(out_margin, expected_margin)
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    pytest.raises(err, treelite.runtime.Predictor, libpath=libpath,
+                  chunk_size=-1)
+
+  def test_parallel_threshold(self):
+    """
+    Test if predictions stay the same whether batches are scored on the
+    calling thread or spread over threads
+    """
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    dtest, batch, _, expected_margin \
+      = load_example_test('dermatology/dermatology.test')
+    for shared_pool in [False, True]:
+      predictor = treelite.runtime.Predictor(libpath=libpath, nthread=2,
+                                             shared_pool=shared_pool)
+      for _ in range(3):
+        out_margin = predictor.predict(batch, pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin)
+      # the costs are measured on the first batch
+      assert predictor.parallel_threshold > 0
+      for threshold in [1, dtest.shape[0] + 1]:
+        predictor.set_parallel_threshold(threshold)
+        assert predictor.parallel_threshold == threshold
+        out_margin = predictor.predict(batch, pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin)
+      predictor.set_parallel_threshold(0)
+      assert predictor.parallel_threshold > 0
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    pytest.raises(err, predictor.set_parallel_threshold, -1)
+
+  def test_parallel_threshold_small_batch(self):
+    """
+    Test if batches too small to be split into chunks of the usual size are
+    still spread over threads when the costs need to be measured
+    """
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    dtest, _, _, expected_margin \
+      = load_example_test('dermatology/dermatology.test')
+    small_batch = treelite.runtime.Batch.from_npy2d(to_dense(dtest)[:4])
+    # With the shared pool, the cost of dispatch is unknown until a batch has
+    # been spread over threads, so the first batch must be spread out
+    predictor = treelite.runtime.Predictor(libpath=libpath, nthread=2,
+                                           shared_pool=True)
+    assert predictor.parallel_threshold == 0
+    out_margin = predictor.predict(small_batch, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin[:4])
+    assert predictor.parallel_threshold > 0
+    # Once in a while, a batch that would be scored inline is given a second
+    # thread, so that the costs are measured again
+    predictor = treelite.runtime.Predictor(libpath=libpath, nthread=2)
+    predictor.predict(treelite.runtime.Batch.from_csr(dtest))
+    num_wait = predictor.wait_stats['num_wait']
+    for _ in range(200):
+      out_margin = predictor.predict(small_batch, pred_margin=True)
+      assert_almost_equal(out_margin, expected_margin[:4])
+    assert predictor.wait_stats['num_wait'] > num_wait
+
+  def test_thread_layout(self):
+    """
+    Test if threads are only bound to cores that the process may run on
+    """
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}')
+    predictor = treelite.runtime.Predictor(libpath=libpath)
+    if hasattr(os, 'sched_getaffinity'):
+      allowed_cores = os.sched_getaffinity(0)
+      assert 1 <= predictor.nthread <= len(allowed_cores)
+      if predictor.thread_affinity:
+        assert len(predictor.thread_affinity) == predictor.nthread
+        assert set(predictor.thread_affinity) <= allowed_cores
+    predictor = treelite.runtime.Predictor(libpath=libpath, shared_pool=True)
+    assert predictor.thread_affinity == []
+
+  def test_numa(self):
+    """
+    Test if a NUMA-aware predictor makes the same predictions as others
+    """
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}')
+    _, batch, expected_prob, _ = load_example_test('mushroom/agaricus.test')
+    predictor = treelite.runtime.Predictor(libpath=libpath, numa=True,
+                                           chunk_size=64)
+    out_prob = predictor.predict(batch)
+    assert_almost_equal(out_prob, expected_prob)
+    predictor.reload(libpath)
+    out_prob = predictor.predict(batch)
+    assert_almost_equal(out_prob, expected_prob)
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    pytest.raises(err, treelite.runtime.Predictor, libpath=libpath,
+                  numa=True, shared_pool=True)
+
+  def test_wait_policy(self):
+    """
+    Test if predictions stay the same under each wait policy, and if wait
+    statistics are collected
+    """
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}')
+    _, batch, expected_prob, _ = load_example_test('mushroom/agaricus.test')
+    predictor = treelite.runtime.Predictor(libpath=libpath, nthread=2,
+                                           chunk_size=64, wait_policy='park')
+    for policy in ['park', 'spin', 'spin_then_park']:
+      predictor.set_wait_policy(policy, max_spin_us=100)
+      for _ in range(3):
+        out_prob = predictor.predict(batch)
+        assert_almost_equal(out_prob, expected_prob)
+    stats = predictor.wait_stats
+    assert stats['num_wait'] > 0
+    assert stats['num_park'] <= stats['num_wait']
+    assert 0.0 <= stats['wake_latency'] <= stats['max_wake_latency']
+    pytest.raises(ValueError, predictor.set_wait_policy, 'sleep')
+    # The wait policy of the shared pool applies to the whole process
+    predictor = treelite.runtime.Predictor(libpath=libpath, shared_pool=True,
+                                           chunk_size=64)
+    for policy in ['park', 'spin', 'spin_then_park']:
+      predictor.set_wait_policy(policy)
+      for _ in range(3):
+        out_prob = predictor.predict(batch)
+        assert_almost_equal(out_prob, expected_prob)
+    stats = predictor.wait_stats
+    assert stats['num_park'] <= stats['num_wait']
+    assert 0.0 <= stats['wake_latency'] <= stats['max_wake_latency']
+
+  def test_stats(self):
+    """
+    Test if performance counters and batch callbacks keep track of batches
+    """
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}')
+    _, batch, _, _ = load_example_test('mushroom/agaricus.test')
+    num_row = batch.shape()[0]
+    predictor = treelite.runtime.Predictor(libpath=libpath, nthread=2)
+    events = []
+    predictor.set_batch_callbacks(
+      begin=lambda n: events.append(('begin', n)),
+      end=lambda n, elapsed, error: events.append(('end', n, error)))
+    for _ in range(3):
+      predictor.predict(batch)
+    assert events == [('begin', num_row), ('end', num_row, None)] * 3
+    stats = predictor.stats()
+    assert stats['num_batch'] == 3
+    assert stats['num_row'] == 3 * num_row
+    assert sum(stats['latency_histogram']) == 3
+    assert len(stats['thread_busy_time']) == predictor.nthread
+    assert stats['eval_time'] > 0
+    assert stats['batch_time'] >= stats['wait_time']
+    predictor.reset_stats()
+    assert predictor.stats()['num_batch'] == 0
+    predictor = treelite.runtime.Predictor(libpath=libpath, shared_pool=True)
+    predictor.predict(batch)
+    stats = predictor.stats()
+    assert stats['num_batch'] == 1
+    assert stats['thread_busy_time'] == []
+
+  def test_shared_pool(self):
+    """
+    Test if a predictor on the shared thread pool can serve predictions to
+    multiple threads at once
+    """
+    libpath = export_example_lib('mushroom/mushroom.model', './mushroom{}')
+    _, batch, expected_prob, _ = load_example_test('mushroom/agaricus.test')
+    predictor = treelite.runtime.Predictor(libpath=libpath, shared_pool=True,
+                                           chunk_size=64)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+      results = list(executor.map(lambda _: predictor.predict(batch),
+                                  range(16)))
+    for out_prob in results:
+      assert_almost_equal(out_prob, expected_prob)
+
+  def test_predict_async(self):
+    """
+    Test asynchronous prediction, through both concurrent.futures and asyncio
+    """
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    _, batch, expected_prob, _ \
+      = load_example_test('dermatology/dermatology.test')
+
+    predictor = treelite.runtime.Predictor(libpath=libpath, shared_pool=True)
+    futures = [predictor.predict_async(batch) for _ in range(8)]
+    for future in futures:
+      assert_almost_equal(future.result(), expected_prob)
+
+    loop = asyncio.new_event_loop()
+    try:
+      out_prob = loop.run_until_complete(
+        predictor.predict_asyncio(batch, loop=loop))
+    finally:
+      loop.close()
+    assert_almost_equal(out_prob, expected_prob)
+
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    predictor = treelite.runtime.Predictor(libpath=libpath)
+    pytest.raises(err, predictor.predict_async, batch)
+
+  def test_reload(self):
+    """
+    Test if a predictor can switch to another library while other threads are
+    making predictions with it
+    """
+    libpaths = [export_example_lib('mushroom/mushroom.model',
+                                   './mushroom{}{{}}'.format(i), params=params)
+                for i, params in enumerate([{}, {'quantize': 1}])]
+    _, batch, expected_prob, _ = load_example_test('mushroom/agaricus.test')
+    predictor = treelite.runtime.Predictor(libpath=libpaths[0],
+                                           shared_pool=True, chunk_size=64)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+      futures = [executor.submit(predictor.predict, batch) for _ in range(16)]
+      for i in range(8):
+        predictor.reload(libpaths[(i + 1) % 2])
+      for future in futures:
+        assert_almost_equal(future.result(), expected_prob)
+    assert_almost_equal(predictor.predict(batch), expected_prob)
+
+    # the new library must have the same shape of input and output
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    pytest.raises(err, predictor.reload, libpath)
+    assert_almost_equal(predictor.predict(batch), expected_prob)
+
+  def test_interpreter(self):
+    """
+    Test if a model exported in the binary format can be loaded by the
+    runtime, without compiling it, and gives the same predictions as a
+    compiled library
+    """
+    for model_name, dtest_name in \
+        [('mushroom/mushroom.model', 'mushroom/agaricus.test'),
+         ('dermatology/dermatology.model', 'dermatology/dermatology.test')]:
+      model = treelite.Model.load(os.path.join(dpath, model_name),
+                                  model_format='xgboost')
+      model.export_binary('./model.tlbin')
+      dtest, _, expected_prob, expected_margin = load_example_test(dtest_name)
+      predictor = treelite.runtime.Predictor(libpath='./model.tlbin')
+      assert predictor.num_feature == model.num_feature
+      assert predictor.num_output_group == model.num_output_group
+      for batch in [treelite.runtime.Batch.from_csr(dtest),
+                    treelite.runtime.Batch.from_npy2d(to_dense(dtest))]:
+        assert_almost_equal(predictor.predict(batch), expected_prob)
+        assert_almost_equal(predictor.predict(batch, pred_margin=True),
+                            expected_margin)
+      out_inst = predictor.predict_instance(to_dense(dtest)[0])
+      assert_almost_equal(out_inst, expected_prob[0])
+      # every node is checked on loading only if asked for
+      os.environ['TREELITE_CHECK_BINARY_MODEL'] = '1'
+      try:
+        checked_predictor = treelite.runtime.Predictor(libpath='./model.tlbin')
+      finally:
+        del os.environ['TREELITE_CHECK_BINARY_MODEL']
+      assert_almost_equal(
+        checked_predictor.predict(treelite.runtime.Batch.from_csr(dtest)),
+        expected_prob)
+      # otherwise, a node is checked when prediction reaches it; here, the
+      # root of the first tree is made into its own child
+      with open('./model.tlbin', 'rb') as f:
+        content = bytearray(f.read())
+      num_tree = struct.unpack_from('<I', content, 20)[0]
+      root_offset = 96 + (num_tree + 1) * 8
+      struct.pack_into('<ii', content, root_offset + 12, 0, 0)
+      with open('./model_malformed.tlbin', 'wb') as f:
+        f.write(content)
+      import treelite_runtime
+      err = treelite_runtime.common.util.TreeliteError
+      malformed_predictor \
+        = treelite.runtime.Predictor(libpath='./model_malformed.tlbin')
+      pytest.raises(err, malformed_predictor.predict,
+                    treelite.runtime.Batch.from_csr(dtest))
+      del malformed_predictor
+
+      # switch over to the compiled library, e.g. once it has been built;
+      # compile the model as loaded back from the binary file
+      model = treelite.Model.load('./model.tlbin', model_format='binary')
+      assert model.num_feature == predictor.num_feature
+      assert model.num_output_group == predictor.num_output_group
+      libpath = libname('./model{}')
+      model.export_lib(toolchain=os_compatible_toolchains()[0],
+                       libpath=libpath, params={}, verbose=True)
+      predictor.reload(libpath)
+      assert_almost_equal(
+        predictor.predict(treelite.runtime.Batch.from_csr(dtest)),
+        expected_prob)
+
+  def test_binned_batch(self):
+    """
+    Test if pre-binned features yield the same predictions as the feature
+    values they were binned from
+    """
+    for model_name, dtest_name in [('mushroom', 'agaricus.test'),
+                                   ('dermatology', 'dermatology.test')]:
+      libpath = export_example_lib('{0}/{0}.model'.format(model_name),
+                                   './{}_quantized{{}}'.format(model_name),
+                                   params={'quantize': 1})
+      predictor = treelite.runtime.Predictor(libpath=libpath)
+      dtest, _, _, _ \
+        = load_example_test('{}/{}'.format(model_name, dtest_name))
+      mat = to_dense(dtest)
+      cut_points = predictor.cut_points
+      assert len(cut_points) == predictor.num_feature
+      binned = np.full(mat.shape, np.iinfo(np.uint16).max, dtype=np.uint16)
+      for fid in range(mat.shape[1]):
+        present = ~np.isnan(mat[:, fid])
+        binned[present, fid] = (
+          np.searchsorted(cut_points[fid], mat[present, fid], side='left')
+          + np.searchsorted(cut_points[fid], mat[present, fid], side='right'))
+      expected_margin = predictor.predict(
+        treelite.runtime.Batch.from_npy2d(mat), pred_margin=True)
+      buf = bytearray(binned.nbytes + 1)
+      misaligned_binned = np.frombuffer(buf, dtype=np.uint16, offset=1,
+                                        count=binned.size).reshape(binned.shape)
+      misaligned_binned[:] = binned
+      for bins in [binned, np.asfortranarray(binned), binned.astype(np.uint8),
+                   misaligned_binned]:
+        if bins.dtype == np.uint8:
+          bins[binned == np.iinfo(np.uint16).max] = np.iinfo(np.uint8).max
+        out_margin = predictor.predict(
+          treelite.runtime.Batch.from_binned(bins), pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin)
+
+    # libraries compiled without quantize=1 do not accept bin indices
+    import treelite_runtime
+    err = treelite_runtime.common.util.TreeliteError
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    predictor = treelite.runtime.Predictor(libpath=libpath)
+    pytest.raises(err, predictor.predict,
+                  treelite.runtime.Batch.from_binned(binned))
+
+  def test_predictor_group(self):
+    """
+    Test if a group of models produces the same predictions as the models
+    would separately, including models that quantize the entries they are
+    given
+    """
+    libpaths = [export_example_lib('dermatology/dermatology.model',
+                                   './dermatology{}{{}}'.format(i),
+                                   params=params)
+                for i, params in enumerate([{'quantize': 1}, {},
+                                            {'quantize': 1,
+                                             'parallel_comp': 2}])]
+    dtest, _, _, expected_margin \
+      = load_example_test('dermatology/dermatology.test')
+    for batch in [treelite.runtime.Batch.from_csr(dtest),
+                  treelite.runtime.Batch.from_npy2d(to_dense(dtest))]:
+      group = treelite.runtime.PredictorGroup(libpaths, chunk_size=64)
+      assert group.num_output == 18
+      assert group.output_offset == [0, 6, 12]
+      out_margin = group.predict(batch, pred_margin=True)
+      assert out_margin.shape == (dtest.shape[0], 18)
+      for libpath, begin in zip(libpaths, [0, 6, 12]):
+        assert_almost_equal(out_margin[:, begin:begin + 6], expected_margin)
+        predictor = treelite.runtime.Predictor(libpath=libpath)
+        assert_almost_equal(out_margin[:, begin:begin + 6],
+                            predictor.predict(batch, pred_margin=True))
+
+  def test_reuse_batch_and_output(self):
+    """
+    Test if predictions can be made into a preallocated output buffer, with
+    a dense batch that is refilled in place
+    """
+    libpath = export_example_lib('dermatology/dermatology.model',
+                                 './dermatology{}')
+    dtest, _, _, expected_margin \
+      = load_example_test('dermatology/dermatology.test')
+    mat = to_dense(dtest)
+    nrow = mat.shape[0] // 2
+
+    predictor = treelite.runtime.Predictor(libpath=libpath)
+    batch = treelite.runtime.Batch.from_npy2d(mat[:nrow])
+    out = np.empty((nrow, predictor.num_output_group), dtype=np.float32)
+    res = predictor.predict(batch, pred_margin=True, out=out)
+    assert np.shares_memory(res, out)
+    assert_almost_equal(out, expected_margin[:nrow])
+    # refill the batch with other rows, in place or through a converted copy;
+    # elements that are misaligned or in foreign byte order are copied
+    buf = bytearray(mat.nbytes + 1)
+    misaligned_mat = np.frombuffer(buf, dtype=np.float32, offset=1,
+                                   count=mat.size).reshape(mat.shape)
+    misaligned_mat[:] = mat
+    assert not misaligned_mat.flags.aligned
+    for new_mat in [mat[nrow:(nrow * 2)],
+                    np.asfortranarray(mat[nrow:(nrow * 2)], dtype=np.float64),
+                    mat[nrow:(nrow * 2)].astype(np.float16),
+                    misaligned_mat[nrow:(nrow * 2)],
+                    mat[nrow:(nrow * 2)].astype('>f4')]:
+      batch.update_from(new_mat)
+      predictor.predict(batch, pred_margin=True, out=out)
+      assert_almost_equal(out, expected_margin[nrow:(nrow * 2)])
+    out_margin = predictor.predict(
+      treelite.runtime.Batch.from_npy2d(misaligned_mat), pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)
+    pytest.raises(ValueError, batch.update_from, mat)
+    pytest.raises(ValueError, predictor.predict, batch,
+                  out=np.empty(3, dtype=np.float32))
+
   def test_tree_limit_setting(self):
     """
     Test Model.set_tree_limit
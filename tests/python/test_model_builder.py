@@ -1489,3 +1489,69 @@ class TestModelBuilder(unittest.TestCase):
           assert pred == expected_pred, \
             'Prediction wrong for f0={}, f1={}, f2={}: '.format(f0, f1, f2) + \
             'expected_pred = {} vs actual_pred = {}'.format(expected_pred, pred)
+
+  def test_quantize_cut_points(self):
+    """
+    Test if quantized libraries bin feature values right at and next to cut
+    points, when only some features have cut points
+    """
+    # features 0, 2 and 5 are never split on, so they have no cut points
+    thresholds = {1: [-2.5, -1.0, 0.0, 0.25, 0.5, 3.0, 100.0],
+                  3: [1.5],
+                  4: [-0.75, 0.125, 6.5, 1e6]}
+    ops = {'<': np.less, '<=': np.less_equal,
+           '>': np.greater, '>=': np.greater_equal}
+    builder = treelite.ModelBuilder(num_feature=6)
+    stumps = []
+    for fid, feature_thresholds in thresholds.items():
+      for threshold in feature_thresholds:
+        for opname in sorted(ops):
+          default_left = (len(stumps) % 2 == 0)
+          left_value = len(stumps) + 1.0
+          right_value = -0.5 * left_value
+          tree = treelite.ModelBuilder.Tree()
+          tree[0].set_numerical_test_node(
+            feature_id=fid, opname=opname, threshold=threshold,
+            default_left=default_left, left_child_key=1, right_child_key=2)
+          tree[1].set_leaf_node(leaf_value=left_value)
+          tree[2].set_leaf_node(leaf_value=right_value)
+          tree[0].set_root()
+          builder.append(tree)
+          stumps.append((fid, opname, threshold, default_left, left_value,
+                         right_value))
+    model = builder.commit()
+
+    # values on, just below and just above every cut point, along with
+    # infinities and missing values
+    rng = np.random.RandomState(0)
+    num_row = 300
+    X = np.zeros((num_row, 6), dtype=np.float32)
+    for fid in range(6):
+      values = [0.0, np.inf, -np.inf, np.nan]
+      for threshold in thresholds.get(fid, [2.0]):
+        threshold = np.float32(threshold)
+        values += [threshold, np.nextafter(threshold, np.float32(-np.inf)),
+                   np.nextafter(threshold, np.float32(np.inf))]
+      X[:, fid] = rng.choice(np.array(values, dtype=np.float32), num_row)
+    expected_margin = np.zeros(num_row)
+    with np.errstate(invalid='ignore'):
+      for fid, opname, threshold, default_left, left_value, right_value \
+          in stumps:
+        go_left = np.where(np.isnan(X[:, fid]), default_left,
+                           ops[opname](X[:, fid], np.float32(threshold)))
+        expected_margin += np.where(go_left, left_value, right_value)
+
+    toolchain = os_compatible_toolchains()[0]
+    for quantize in [0, 1]:
+      libpath = libname('./quantize{}{{}}'.format(quantize))
+      model.export_lib(toolchain=toolchain, libpath=libpath,
+                       params={'quantize': quantize}, verbose=True)
+      predictor = treelite.runtime.Predictor(libpath=libpath)
+      # predict_batch() quantizes a block of rows feature by feature
+      out_margin = predictor.predict(
+        treelite.runtime.Batch.from_npy2d(X), pred_margin=True)
+      assert_almost_equal(out_margin, expected_margin)
+      # predict() quantizes a row at a time
+      for i in range(num_row):
+        out_inst = predictor.predict_instance(X[i], pred_margin=True)
+        assert_almost_equal(out_inst, expected_margin[i])
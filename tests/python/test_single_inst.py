@@ -39,6 +39,7 @@ class TestSingleInst(unittest.TestCase):
       model.export_lib(toolchain=toolchain, libpath=libpath,
                        params=params, verbose=True)
       predictor = treelite.runtime.Predictor(libpath=libpath, verbose=True)
+      single_row_predictor = treelite.runtime.SingleRowPredictor(predictor)
       for i in range(X_test.shape[0]):
         x = X_test[i,:]
         # Scipy CSR matrix
@@ -46,6 +47,15 @@ class TestSingleInst(unittest.TestCase):
         out_margin = predictor.predict_instance(x, pred_margin=True)
         assert_almost_equal(out_prob, expected_prob[i])
         assert_almost_equal(out_margin, expected_margin[i])
+        # SingleRowPredictor, with (indices, values) pair and dense rows
+        out_prob = single_row_predictor.predict((x.indices, x.data))
+        assert_almost_equal(out_prob, expected_prob[i])
+        out_margin = single_row_predictor.predict(
+          x.toarray().flatten(), missing=0.0, pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin[i])
+        out_margin = single_row_predictor.predict((x.indices, x.data),
+                                                  pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin[i])
         # NumPy 1D array with 0 as missing value
         x = x.toarray().flatten()
         out_prob = predictor.predict_instance(x, missing=0.0)
@@ -64,6 +74,14 @@ class TestSingleInst(unittest.TestCase):
         out_margin = predictor.predict_instance(x, pred_margin=True)
         assert_almost_equal(out_prob, expected_prob[i])
         assert_almost_equal(out_margin, expected_margin[i])
+        # NaN is missing even when another value is given as missing
+        x[::2][np.isnan(x[::2])] = -999.0
+        out_margin = predictor.predict_instance(x, missing=-999.0,
+                                                pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin[i])
+        out_margin = single_row_predictor.predict(x, missing=-999.0,
+                                                  pred_margin=True)
+        assert_almost_equal(out_margin, expected_margin[i])
 
   def test_single_inst(self):
     for model_path, dtrain_path, dtest_path, libname_fmt, \
@@ -36,6 +36,37 @@ def os_platform():
 def libname(fmt):
   return fmt.format(_libext())
 
+def export_example_lib(model_path, libname_fmt, params=None):
+  """Compile one of the example models into a shared library; return its
+  path"""
+  dpath = os.path.abspath(os.path.join(os.getcwd(), 'tests/examples/'))
+  libpath = libname(libname_fmt)
+  model = treelite.Model.load(os.path.join(dpath, model_path),
+                              model_format='xgboost')
+  toolchain = os_compatible_toolchains()[0]
+  model.export_lib(toolchain=toolchain, libpath=libpath,
+                   params=(params if params is not None else {}),
+                   verbose=True)
+  return libpath
+
+def load_example_test(dtest_path):
+  """
+  Get the test rows of one of the examples, as a DMatrix and as a batch,
+  along with the expected probabilities and margins. For multi-class
+  models, the expected outputs have one row per test row.
+  """
+  dpath = os.path.abspath(os.path.join(os.getcwd(), 'tests/examples/'))
+  dtest_path = os.path.join(dpath, dtest_path)
+  dtest = treelite.DMatrix(dtest_path)
+  batch = treelite.runtime.Batch.from_csr(dtest)
+  expected_prob = load_txt(dtest_path + '.prob')
+  expected_margin = load_txt(dtest_path + '.margin')
+  nrow = dtest.shape[0]
+  if expected_margin.shape[0] > nrow:
+    expected_prob = expected_prob.reshape((nrow, -1))
+    expected_margin = expected_margin.reshape((nrow, -1))
+  return dtest, batch, expected_prob, expected_margin
+
 def make_annotation(model, dtrain_path, annotation_path):
   dpath = os.path.abspath(os.path.join(os.getcwd(), 'tests/examples/'))
   dtrain_path = os.path.join(dpath, dtrain_path)
@@ -85,16 +116,46 @@ def assert_almost_equal(a, b, rtol=None, atol=None, names=('a', 'b'), equal_nan=
                           names=names)
   raise AssertionError(msg)
 
+def to_dense(csr):
+  """Convert a sparse matrix into a dense one, with absent entries set to NaN"""
+  nrow, ncol = csr.shape
+  mat = np.full((nrow, ncol), np.nan, dtype=np.float32)
+  row_ind = np.repeat(np.arange(nrow), np.diff(csr.indptr).astype(np.int64))
+  mat[row_ind, csr.indices] = csr.data
+  return mat
+
 def run_pipeline_test(model, dtest_path, libname_fmt,
                       expected_prob_path, expected_margin_path,
                       multiclass, use_annotation=None, use_quantize=None,
                       use_parallel_comp=None, use_code_folding=None,
-                      use_toolchains=None, use_elf=False, use_compiler=None):
+                      use_toolchains=None, use_elf=False, use_compiler=None,
+                      use_branchless_depth=None, use_cache_conditions=None,
+                      use_options=None):
   dpath = os.path.abspath(os.path.join(os.getcwd(), 'tests/examples/'))
   dtest_path = os.path.join(dpath, dtest_path)
   libpath = libname(libname_fmt)
   dtest = treelite.DMatrix(dtest_path)
   batch = treelite.runtime.Batch.from_csr(dtest)
+  dense_batch = treelite.runtime.Batch.from_npy2d(to_dense(dtest))
+  # same rows, with missing values marked by a sentinel instead of NaN
+  dense_mat = to_dense(dtest)
+  dense_mat[np.isnan(dense_mat)] = -999.0
+  dense_batch_sentinel \
+    = treelite.runtime.Batch.from_npy2d(dense_mat, missing=-999.0)
+  # NaN is missing even when another value is given as missing
+  mixed_mat = to_dense(dtest)
+  mixed_mat[:, ::2][np.isnan(mixed_mat[:, ::2])] = -999.0
+  dense_batch_mixed \
+    = treelite.runtime.Batch.from_npy2d(mixed_mat, missing=-999.0)
+  # same rows, read in place from column-major float64 and from a view into
+  # a wider matrix
+  dense_batch_f64 = treelite.runtime.Batch.from_npy2d(
+    np.asfortranarray(to_dense(dtest), dtype=np.float64))
+  wide_mat = np.full((dtest.shape[0], dtest.shape[1] + 3), -1.0,
+                     dtype=np.float32)
+  wide_mat[:, :dtest.shape[1]] = to_dense(dtest)
+  dense_batch_view \
+    = treelite.runtime.Batch.from_npy2d(wide_mat[:, :dtest.shape[1]])
 
   expected_prob_path = os.path.join(dpath, expected_prob_path) \
                        if expected_prob_path is not None else None
@@ -115,6 +176,10 @@ def run_pipeline_test(model, dtest_path, libname_fmt,
     params['parallel_comp'] = use_parallel_comp
   if use_code_folding is not None:
     params['code_folding_req'] = use_code_folding
+  if use_branchless_depth is not None:
+    params['branchless_depth'] = use_branchless_depth
+  if use_cache_conditions is not None:
+    params['cache_conditions'] = use_cache_conditions
   if use_elf:
     params['dump_array_as_elf'] = 1
   if use_compiler is None:
@@ -129,10 +194,25 @@ def run_pipeline_test(model, dtest_path, libname_fmt,
     toolchains = [(gcc if x == 'gcc' else x) for x in use_toolchains]
   for toolchain in toolchains:
     model.export_lib(toolchain=toolchain, libpath=libpath,
-                     compiler=use_compiler, params=params, verbose=True)
+                     compiler=use_compiler, params=params, verbose=True,
+                     options=use_options)
     predictor = treelite.runtime.Predictor(libpath=libpath, verbose=True)
     out_prob = predictor.predict(batch)
     if expected_prob is not None:
       assert_almost_equal(out_prob, expected_prob)
     out_margin = predictor.predict(batch, pred_margin=True)
     assert_almost_equal(out_margin, expected_margin)
+    # dense batches go through predict_batch(), if the library exports one
+    if expected_prob is not None:
+      out_prob = predictor.predict(dense_batch)
+      assert_almost_equal(out_prob, expected_prob)
+    out_margin = predictor.predict(dense_batch, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)
+    out_margin = predictor.predict(dense_batch_sentinel, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)
+    out_margin = predictor.predict(dense_batch_mixed, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)
+    out_margin = predictor.predict(dense_batch_f64, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)
+    out_margin = predictor.predict(dense_batch_view, pred_margin=True)
+    assert_almost_equal(out_margin, expected_margin)